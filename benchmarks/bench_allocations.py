@@ -0,0 +1,103 @@
+"""
+Time the overhead of CallTracer(track_allocations=True) on a synthetic workload.
+
+The workload is a small order pipeline: one entry call runs everything, so a
+sample that lands on it would cover the whole run. Each size is timed without
+a tracer, traced, and traced with allocation tracking at each sampling rate,
+and the last column shows what allocation tracking adds on top of tracing. It
+should stay about the same as the workload grows, and fall as fewer calls are
+sampled.
+
+Usage:
+    python benchmarks/bench_allocations.py
+    python benchmarks/bench_allocations.py --orders 1000 4000 16000 --sample-every 4 16 64 --repeat 3
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+from trace_runner import CallTracer
+
+
+class Inventory:
+    def __init__(self):
+        self.stock = {}
+
+    def reserve(self, sku, quantity):
+        self.stock[sku] = self.stock.get(sku, 100) - quantity
+        return self.stock[sku] >= 0
+
+
+class OrderLine:
+    def __init__(self, sku, quantity, price):
+        self.sku = sku
+        self.quantity = quantity
+        self.price = price
+
+    def total(self):
+        return self.quantity * self.price
+
+
+class OrderService:
+    def __init__(self):
+        self.inventory = Inventory()
+        self.orders = []
+
+    def place(self, order_id):
+        lines = [OrderLine(f"sku-{(order_id + i) % 50}", i + 1, 2.5) for i in range(4)]
+        accepted = [line for line in lines if self.inventory.reserve(line.sku, line.quantity)]
+        self.orders.append({'id': order_id, 'lines': accepted, 'total': sum(line.total() for line in accepted)})
+
+    def run(self, order_count):
+        for order_id in range(order_count):
+            self.place(order_id)
+        return len(self.orders)
+
+
+def run_workload(order_count):
+    return OrderService().run(order_count)
+
+
+def timed(order_count, traced=True, **tracer_options):
+    """Seconds to run the workload, traced with a CallTracer(**tracer_options) if traced."""
+    tracer = None
+    if traced:
+        tracer = CallTracer(entry_script=str(Path(__file__).resolve()), project_root=str(BENCH_DIR), **tracer_options)
+        tracer.start_tracing()
+    started = time.perf_counter()
+    try:
+        run_workload(order_count)
+    finally:
+        elapsed = time.perf_counter() - started
+        if tracer is not None:
+            tracer.stop_tracing()
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time allocation tracking overhead on a synthetic workload.")
+    parser.add_argument('--orders', type=int, nargs='+', default=[1000, 4000, 16000],
+                        help="Workload sizes (orders placed)")
+    parser.add_argument('--sample-every', type=int, nargs='+', default=[1, 4, 16, 64],
+                        help="Values of allocation_sample_every to time")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement; the fastest counts")
+    args = parser.parse_args(argv)
+
+    print(f"{'orders':>8} {'sample':>7} {'plain s':>9} {'traced s':>9} {'+alloc s':>9} {'alloc/traced':>13}")
+    for order_count in args.orders:
+        plain = min(timed(order_count, traced=False) for _ in range(args.repeat))
+        traced = min(timed(order_count) for _ in range(args.repeat))
+        for sample_every in args.sample_every:
+            allocations = min(timed(order_count, track_allocations=True, allocation_sample_every=sample_every)
+                              for _ in range(args.repeat))
+            print(f"{order_count:>8} {sample_every:>7} {plain:>9.3f} {traced:>9.3f} {allocations:>9.3f} "
+                  f"{allocations / traced:>12.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Time the server-side class layout on synthetic graphs.
+
+Each class gets a few methods, and methods call into nearby classes with an
+occasional long-range call, roughly like a layered application.
+
+Usage:
+    python benchmarks/bench_layout.py
+    python benchmarks/bench_layout.py --classes 500 2000 5000 --iterations 300
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from renderer.layout import compute_layout
+
+
+def synthetic_graph(class_count, methods_per_class=4, calls_per_method=2, seed=0):
+    """
+    Build a graph in the generate_d3_data shape with class_count classes.
+
+    Args:
+        class_count: Number of classes
+        methods_per_class: Methods in every class
+        calls_per_method: Outgoing calls from every method
+        seed: Random seed
+
+    Returns:
+        Graph data with 'nodes' and 'links'
+    """
+    rng = random.Random(seed)
+    nodes = []
+    links = []
+    for c in range(class_count):
+        class_id = f"pkg.module{c // 20}.Class{c}"
+        nodes.append({'id': class_id, 'name': f"Class{c}", 'type': 'class'})
+        for m in range(methods_per_class):
+            method_id = f"{class_id}.method_{m}"
+            nodes.append({'id': method_id, 'name': f"method_{m}", 'type': 'method', 'class': class_id})
+            links.append({'source': class_id, 'target': method_id, 'type': 'contains'})
+
+    for c in range(class_count):
+        for m in range(methods_per_class):
+            for _ in range(calls_per_method):
+                if rng.random() < 0.9:
+                    target = min(class_count - 1, c + rng.randint(1, 10))
+                else:
+                    target = rng.randrange(class_count)
+                if target == c:
+                    continue
+                links.append({
+                    'source': f"pkg.module{c // 20}.Class{c}.method_{m}",
+                    'target': f"pkg.module{target // 20}.Class{target}.method_{rng.randrange(methods_per_class)}",
+                    'type': 'calls'
+                })
+    return {'nodes': nodes, 'links': links}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time compute_layout on synthetic graphs.")
+    parser.add_argument('--classes', type=int, nargs='+', default=[500, 2000, 5000],
+                        help="Class counts to lay out")
+    parser.add_argument('--iterations', type=int, default=300, help="Simulation steps")
+    args = parser.parse_args(argv)
+
+    print(f"{'classes':>8} {'links':>8} {'seconds':>9}")
+    for class_count in args.classes:
+        graph_data = synthetic_graph(class_count)
+        started = time.perf_counter()
+        compute_layout(graph_data, iterations=args.iterations)
+        elapsed = time.perf_counter() - started
+        print(f"{class_count:>8} {len(graph_data['links']):>8} {elapsed:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
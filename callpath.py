@@ -0,0 +1,239 @@
+"""Scoped tracing: trace only while a function or block of interest runs.
+
+::
+
+    import callpath
+
+    callpath.configure(project_root=project_root, entry_script=__file__)
+
+    class CreateOrderUseCase:
+        @callpath.trace_scope
+        def execute(self, request):
+            ...
+
+    with callpath.scope('checkout'):
+        ...
+
+    callpath.end()  # writes renderer/static/trace_data.json and stores the run
+
+``sys.settrace`` is per thread, so entering a scope installs a CallTracer on
+the entering thread only, and leaving the outermost scope on that thread takes
+it off again. Other threads, and the same thread outside any scope, run with
+no trace function at all. (Python 3.11 has no ``sys.monitoring`` with per-code
+local events; this is the thread-local settrace variant.)
+
+Scopes nest: an inner scope on the same thread joins the tracer already
+running and its calls are tagged with the innermost scope's name. Concurrent
+scopes on different threads each get their own tracer, and ``end`` merges
+them. Every event gets a ``scope`` tag, method nodes and calls links get
+per-scope call counts as ``scopes``, and the graph data lists the scopes
+under ``scopes``.
+
+A scope traces only its own thread: threads it starts are not traced, and
+other coroutines that run on the thread while a scope is open are.
+"""
+
+import functools
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from trace_runner import CallTracer
+
+
+_lock = threading.Lock()
+_local = threading.local()
+# CallTracer options of threads entering their first scope
+_options: Dict[str, Any] = {}
+# One tracer per thread that entered a scope, kept after the thread ends
+_tracers: List[CallTracer] = []
+# Scope name -> finished entries
+_entries = Counter()
+
+
+class _ThreadScopes:
+    """A thread's tracer and its open scopes."""
+
+    def __init__(self, tracer: CallTracer):
+        self.tracer = tracer
+        self.open = []  # (name, index of its first event)
+        self.previous_trace = None  # Trace function to restore after the outermost scope
+
+
+def configure(project_root: Optional[str] = None, entry_script: Optional[str] = None,
+              timing: bool = True, call_context: bool = False,
+              max_context_depth: int = 64, max_context_nodes: int = 100000):
+    """
+    Set the tracer options of scopes; threads that already entered a scope keep theirs.
+
+    Args:
+        project_root: Project root, as for CallTracer
+        entry_script: Entry script, as for CallTracer; a scope's outermost
+                      calls are drawn as called from its module code
+        timing: Record wall and self time of the calls
+        call_context: Build calling context trees (merged over all threads)
+        max_context_depth: Depth limit of the calling context trees
+        max_context_nodes: Size limit of each calling context tree
+    """
+    with _lock:
+        _options.clear()
+        _options.update(project_root=project_root, entry_script=entry_script, timing=timing,
+                        call_context=call_context, max_context_depth=max_context_depth,
+                        max_context_nodes=max_context_nodes)
+
+
+def trace_scope(func: Optional[Callable] = None, *, name: Optional[str] = None):
+    """
+    Decorator that traces the calls made while the function runs.
+
+    Use it bare (``@callpath.trace_scope``, named after the function's
+    qualified name) or with a name (``@callpath.trace_scope(name='checkout')``).
+    """
+    def decorate(func):
+        scope_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def traced(*args, **kwargs):
+            _enter(scope_name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _exit()
+        return traced
+
+    if func is not None:
+        return decorate(func)
+    return decorate
+
+
+class scope:
+    """Context manager that traces the calls made inside its block."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        _enter(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _exit()
+        return False
+
+
+def _enter(name: str):
+    state = getattr(_local, 'scopes', None)
+    if state is None:
+        with _lock:
+            tracer = CallTracer(**_options)
+            _tracers.append(tracer)
+        state = _local.scopes = _ThreadScopes(tracer)
+    if not state.open:
+        state.previous_trace = sys.gettrace()
+        state.tracer.start_tracing()
+    state.open.append((name, len(state.tracer.call_events)))
+
+
+def _exit():
+    state = _local.scopes
+    name, first = state.open.pop()
+    if not state.open:
+        state.tracer.stop_tracing()
+        sys.settrace(state.previous_trace)
+        state.previous_trace = None
+    # Inner scopes end first, so their events are already tagged
+    events = state.tracer.call_events
+    for index in range(first, len(events)):
+        events[index].setdefault('scope', name)
+    with _lock:
+        _entries[name] += 1
+
+
+def scoped_events() -> List[Dict[str, Any]]:
+    """Events of all finished scopes, on all threads."""
+    with _lock:
+        tracers = list(_tracers)
+    return [event for tracer in tracers for event in list(tracer.call_events) if 'scope' in event]
+
+
+def graph_data() -> Dict[str, Any]:
+    """
+    Graph data of all finished scopes, as CallTracer.end() writes it.
+
+    Returns:
+        generate_d3_data output plus the merged 'call_context', the combined
+        'tracer_stats' and 'scopes': name, entries, calls and threads of each scope
+    """
+    from renderer.call_context import merge_call_contexts
+    from renderer.data_processor import generate_d3_data
+    from renderer.tracer_stats import combine_tracer_stats
+
+    with _lock:
+        tracers = list(_tracers)
+        entries = dict(_entries)
+    events = scoped_events()
+    data = generate_d3_data(events, project_root=_options.get('project_root'), track_module_calls=True)
+
+    calls = Counter(event['scope'] for event in events)
+    threads = Counter()
+    for tracer in tracers:
+        for name in {event['scope'] for event in list(tracer.call_events) if 'scope' in event}:
+            threads[name] += 1
+    data['scopes'] = [
+        {'name': name, 'entries': count, 'calls': calls[name], 'threads': threads[name]}
+        for name, count in sorted(entries.items())
+    ]
+
+    contexts = [tracer.context.to_dict() for tracer in tracers if tracer.context is not None]
+    merged = merge_call_contexts(contexts)
+    if merged is not None:
+        data['call_context'] = merged.to_dict()
+    data['tracer_stats'] = combine_tracer_stats([tracer.stats() for tracer in tracers])
+    return data
+
+
+def end(output_file: Optional[str] = None, scenario: Optional[str] = None, store_run: bool = True):
+    """
+    Write the graph of all finished scopes and store it as a run.
+
+    Scopes still open are left out. Scopes entered later are traced as
+    before, and the next call writes them together with these.
+
+    Args:
+        output_file: Where to write the graph JSON (defaults to renderer/static/trace_data.json)
+        scenario: Scenario name for the trace store (defaults to the entry script name)
+        store_run: If True, also keep this run in the trace store
+    """
+    import json
+    from renderer.trace_store import TraceStore, detect_git_info
+
+    data = graph_data()
+    if output_file is None:
+        output_file = str(Path(__file__).parent / 'renderer' / 'static' / 'trace_data.json')
+    Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+    with open(output_file, 'w') as f:
+        json.dump(data, f, indent=2)
+
+    event_count = sum(entry['calls'] for entry in data['scopes'])
+    print(f"Captured {event_count} trace events in {len(data['scopes'])} scopes")
+    print(f"Trace data saved to: {output_file}")
+    print(f"Generated {len(data['nodes'])} nodes and {len(data['links'])} links")
+
+    if store_run:
+        entry_script = _options.get('entry_script')
+        if scenario is None and entry_script:
+            scenario = Path(entry_script).stem
+        project_root = _options.get('project_root')
+        git_info = detect_git_info(project_root or str(Path(__file__).parent))
+        run_id = TraceStore().save(
+            data,
+            scenario=scenario,
+            branch=git_info['branch'],
+            commit=git_info['commit'],
+            metadata={'event_count': event_count, 'project_root': project_root,
+                      'scopes': [entry['name'] for entry in data['scopes']]}
+        )
+        print(f"Stored trace run: {run_id}")
+
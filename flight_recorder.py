@@ -0,0 +1,429 @@
+"""Flight recorder: on-demand call tracing of a long-running process.
+
+A service installs a FlightRecorder once at startup and keeps running
+untraced; tracing costs nothing until it is switched on. While it records,
+a CallTracer keeps only the most recent ``max_events`` calls in a ring buffer
+(and bounded calling context and type samples), so memory stays bounded
+however long it runs. A snapshot in the normal graph format can be dumped at
+any time without stopping the service or the recording.
+
+Control it with signals::
+
+    kill -USR2 <pid>    # start recording, or stop it if it is recording
+    kill -USR1 <pid>    # dump a snapshot
+
+or through a local control socket, one command per connection::
+
+    python flight_recorder.py --socket /tmp/service.sock start
+    python flight_recorder.py --socket /tmp/service.sock dump --output /tmp/snapshot.json
+    python flight_recorder.py --socket /tmp/service.sock stop
+
+``sys.settrace`` only affects the thread that calls it, so recording starts
+on the main thread, in the toggle signal's handler: the control socket queues
+its command and signals the process. Threads started while recording get a
+CallTracer of their own through ``threading.settrace``, which records calls
+and times only, and all of them add their calls to the same ring buffer. Python 3.11 has no way to switch tracing
+on for another running thread, so threads that were already running when
+recording started are not traced. On stop, every traced thread drops its
+trace function at its next event.
+
+A handler may interrupt a trace callback half way; then stop and dump are
+applied at the next call on the main thread, between two callbacks. Otherwise
+the handler applies them right away, which is also what happens when the main
+thread waits in a blocking call such as ``accept()`` or ``join()``. If the
+main thread is stuck in code that does not run signal handlers, the control
+thread applies stop and dump itself once the main thread has not moved for
+IDLE_INTERVAL. Dumps then build and write the graph on another thread, so the
+service only pauses for copying the ring buffer.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import weakref
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from trace_runner import CallTracer
+
+
+DEFAULT_MAX_EVENTS = 100000
+DEFAULT_TOGGLE_SIGNAL = signal.SIGUSR2
+DEFAULT_DUMP_SIGNAL = signal.SIGUSR1
+
+# Seconds a control command waits for the main thread to act on it
+COMMAND_TIMEOUT = 10.0
+# Seconds the main thread must not move before the control thread acts for it
+IDLE_INTERVAL = 0.2
+
+# Threads the recorder starts for itself, which are never traced
+THREAD_NAME_PREFIX = 'callpath-flight-'
+
+COMMANDS = ('start', 'stop', 'status', 'dump')
+
+
+class _Request:
+    """A state change or snapshot for the main thread, and its result."""
+
+    def __init__(self, action: str, callback: Optional[Callable[['_Request'], None]] = None):
+        self.action = action
+        self.callback = callback
+        self.result = None
+        self.done = threading.Event()
+        self._claimed = False
+        self._lock = threading.Lock()
+
+    def claim(self) -> bool:
+        """True for the one thread that gets to run the request."""
+        with self._lock:
+            if self._claimed:
+                return False
+            self._claimed = True
+            return True
+
+
+class FlightRecorder:
+    """A bounded CallTracer that can be started, stopped and dumped at runtime."""
+
+    def __init__(self, max_events: int = DEFAULT_MAX_EVENTS, output_file: Optional[str] = None,
+                 project_root: Optional[str] = None, entry_script: Optional[str] = None,
+                 store_runs: bool = False, scenario: Optional[str] = None, **tracer_options):
+        """
+        Args:
+            max_events: Most recent calls kept while recording
+            output_file: Default snapshot file (defaults to renderer/static/trace_data.json)
+            project_root: Project root, as for CallTracer
+            entry_script: The service's entry script, as for CallTracer
+            store_runs: If True, also store every snapshot in the trace store
+            scenario: Scenario name of stored snapshots (defaults to the entry script name)
+            **tracer_options: Further CallTracer options (timing, sample_types, ...)
+        """
+        self.tracer = CallTracer(entry_script=entry_script, project_root=project_root,
+                                 max_events=max_events, **tracer_options)
+        # Tracers of the other threads traced in this recording; a thread's tracer lives as long as its trace function
+        self._thread_tracers = weakref.WeakSet()
+        self.max_events = max_events
+        self.output_file = output_file or str(Path(__file__).parent / 'renderer' / 'static' / 'trace_data.json')
+        self.store_runs = store_runs
+        self.scenario = scenario or (Path(entry_script).stem if entry_script else None)
+        self.dumps = 0
+        self.last_dump = None
+        self.toggle_signal = None
+        # Requests queued for the toggle signal's handler, and those it left for the next call
+        self._pending = deque()
+        self._deferred = deque()
+        self._server = None
+
+    @property
+    def is_recording(self) -> bool:
+        return self.tracer.is_tracing
+
+    def install(self, toggle_signal: int = DEFAULT_TOGGLE_SIGNAL,
+                dump_signal: Optional[int] = DEFAULT_DUMP_SIGNAL,
+                control_socket: Optional[str] = None):
+        """
+        Install the signal handlers and optionally start the control socket.
+
+        Must be called from the main thread, where recording starts.
+
+        Args:
+            toggle_signal: Signal that starts or stops recording
+            dump_signal: Signal that writes a snapshot to output_file, or None
+            control_socket: Path of a Unix socket to accept commands on
+        """
+        self.toggle_signal = toggle_signal
+        signal.signal(toggle_signal, self._on_toggle_signal)
+        if dump_signal is not None:
+            signal.signal(dump_signal, self._on_dump_signal)
+        if control_socket:
+            self.serve_control_socket(control_socket)
+
+    def start(self):
+        """Start recording (on the main thread)."""
+        self._apply([_Request('start')])
+
+    def stop(self):
+        """Stop recording (on the main thread)."""
+        self._apply([_Request('stop')])
+
+    def status(self) -> Dict[str, Any]:
+        """Whether it records, how many calls it holds, and the dumps written so far."""
+        return {
+            'recording': self.is_recording,
+            'events': len(self.tracer.call_events),
+            'max_events': self.max_events,
+            'dumps': self.dumps,
+            'last_dump': self.last_dump,
+            'pid': os.getpid(),
+        }
+
+    def request(self, action: str, timeout: float = COMMAND_TIMEOUT) -> _Request:
+        """
+        Have the main thread start, stop or snapshot, from any thread.
+
+        Stop and dump are applied on the calling thread instead if the main
+        thread sits idle outside the tracer without acting on the request.
+
+        Args:
+            action: 'start', 'stop' or 'dump' (returns the snapshot as the result)
+            timeout: Seconds to wait for the main thread
+
+        Raises:
+            RuntimeError: If install() was not called
+            TimeoutError: If the main thread did not act in time
+        """
+        if self.toggle_signal is None:
+            raise RuntimeError("Call install() on the main thread first")
+        pending = _Request(action)
+        self._pending.append(pending)
+        os.kill(os.getpid(), self.toggle_signal)
+        waited = 0.0
+        position = self._main_thread_position()
+        while not pending.done.wait(min(IDLE_INTERVAL, timeout - waited)):
+            waited += IDLE_INTERVAL
+            if action != 'start':
+                last_position, position = position, self._main_thread_position()
+                if position is not None and position == last_position and pending.claim():
+                    self._run(pending)
+                    break
+            if waited >= timeout:
+                raise TimeoutError(f"The main thread did not {action} within {timeout} seconds")
+        return pending
+
+    def _main_thread_position(self):
+        """Where the main thread is (frame and instruction), or None while it runs a trace callback."""
+        frame = sys._current_frames().get(threading.main_thread().ident)
+        if frame is None or _in_trace_callback(frame):
+            return None
+        return frame, frame.f_lasti
+
+    def dump(self, output_file: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Snapshot the recorded calls and write them as graph data, from any thread but the main one.
+
+        Args:
+            output_file: Where to write (defaults to output_file)
+
+        Returns:
+            Dictionary with the output file, event, node and link counts, and the run id if stored
+        """
+        return self.write_snapshot(self.request('dump').result, output_file)
+
+    def write_snapshot(self, snapshot: Dict[str, Any], output_file: Optional[str] = None) -> Dict[str, Any]:
+        """Build the graph data of a CallTracer.snapshot() and write it (off the main thread)."""
+        from renderer.data_processor import generate_d3_data
+        graph_data = generate_d3_data(snapshot['events'], project_root=self.tracer.project_root,
+                                      track_module_calls=True, type_samples=snapshot['type_samples'])
+        graph_data.update(snapshot['sections'])
+        graph_data['flight_recorder'] = {'events': len(snapshot['events']), 'max_events': self.max_events}
+
+        output_file = output_file or self.output_file
+        Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so the renderer never reads a partial file
+        temp_file = f"{output_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(graph_data, f, indent=2)
+        os.replace(temp_file, output_file)
+
+        result = {
+            'output_file': output_file,
+            'events': len(snapshot['events']),
+            'nodes': len(graph_data['nodes']),
+            'links': len(graph_data['links']),
+        }
+        if self.store_runs:
+            from renderer.trace_store import TraceStore, detect_git_info
+            git_info = detect_git_info(self.tracer.project_root or str(Path(__file__).parent))
+            result['run_id'] = TraceStore().save(
+                graph_data,
+                scenario=self.scenario,
+                branch=git_info['branch'],
+                commit=git_info['commit'],
+                metadata={'event_count': len(snapshot['events']), 'project_root': self.tracer.project_root,
+                          'flight_recorder': True}
+            )
+        self.dumps += 1
+        self.last_dump = output_file
+        return result
+
+    def _on_toggle_signal(self, signum, frame):
+        requests = []
+        while self._pending:
+            requests.append(self._pending.popleft())
+        if not requests:
+            # Sent from outside the process: flip the state
+            requests.append(_Request('stop' if self.is_recording else 'start'))
+        self._apply(requests, frame)
+
+    def _on_dump_signal(self, signum, frame):
+        def write_in_background(request):
+            threading.Thread(target=self.write_snapshot, args=(request.result,),
+                             name=f'{THREAD_NAME_PREFIX}dump', daemon=True).start()
+        self._apply([_Request('dump', callback=write_in_background)], frame)
+
+    def _apply(self, requests, interrupted_frame=None):
+        """Run requests on the main thread now, or at its next call event if a signal interrupted a trace callback."""
+        if not self.is_recording or interrupted_frame is None or not _in_trace_callback(interrupted_frame):
+            for request in requests:
+                if request.claim():
+                    self._run(request)
+            return
+        self._deferred.extend(requests)
+        sys.settrace(self._control_trace)
+
+    def _control_trace(self, frame, event, arg):
+        """Global trace function for one call: runs the deferred requests, then traces on."""
+        sys.settrace(self.tracer.trace_calls)
+        while self._deferred:
+            request = self._deferred.popleft()
+            if request.claim():
+                self._run(request)
+        if not self.is_recording:
+            return None
+        return self.tracer.trace_calls(frame, event, arg)
+
+    def _run(self, request: _Request):
+        """Run a claimed request on the main thread, or on the control thread while the main thread is idle."""
+        if request.action == 'start':
+            if not self.is_recording:
+                self.tracer.start_tracing()
+                threading.settrace(self._trace_new_thread)
+            request.result = self.status()
+        elif request.action == 'stop':
+            if self.is_recording:
+                threading.settrace(None)
+                for tracer in list(self._thread_tracers):
+                    # Their threads drop the trace function at their next event
+                    tracer.is_tracing = False
+                self._thread_tracers.clear()
+                self.tracer.stop_tracing()
+            request.result = self.status()
+        elif request.action == 'dump':
+            request.result = self.tracer.snapshot(on_traced_thread=threading.current_thread() is threading.main_thread())
+        request.done.set()
+        if request.callback is not None:
+            request.callback(request)
+
+    def _trace_new_thread(self, frame, event, arg):
+        """Global trace function of threads started while recording: gives the thread a tracer of its own."""
+        if not self.is_recording or threading.current_thread().name.startswith(THREAD_NAME_PREFIX):
+            sys.settrace(None)
+            return None
+        main_tracer = self.tracer
+        tracer = CallTracer(entry_script=main_tracer.entry_script, project_root=main_tracer.project_root,
+                            timing=main_tracer.timing)
+        # Same ring buffer and clock as the main thread; deque appends are thread-safe
+        tracer.call_events = main_tracer.call_events
+        tracer.dispatch_overhead_ns = main_tracer.dispatch_overhead_ns
+        tracer._origin_ns = main_tracer._origin_ns
+        tracer.is_tracing = True
+        self._thread_tracers.add(tracer)
+        sys.settrace(tracer.trace_calls)
+        return tracer.trace_calls(frame, event, arg)
+
+    def serve_control_socket(self, socket_path: str):
+        """Accept commands on a Unix socket from a background thread."""
+        if os.path.exists(socket_path):
+            # A socket file left behind by a process that did not shut down cleanly
+            os.unlink(socket_path)
+        self._server = _ControlServer(socket_path, _ControlHandler)
+        self._server.recorder = self
+        threading.Thread(target=self._server.serve_forever, name=f'{THREAD_NAME_PREFIX}control', daemon=True).start()
+
+    def close(self):
+        """Stop the control socket (recording is left as it is)."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            if os.path.exists(self._server.server_address):
+                os.unlink(self._server.server_address)
+            self._server = None
+
+    def handle_command(self, line: str) -> Dict[str, Any]:
+        """Run one control socket command: 'start', 'stop', 'status' or 'dump [output file]'."""
+        parts = line.split(maxsplit=1)
+        command = parts[0] if parts else ''
+        if command not in COMMANDS:
+            return {'error': 'Unknown command', 'message': f"commands: {', '.join(COMMANDS)}"}
+        try:
+            if command == 'status':
+                return self.status()
+            if command == 'dump':
+                return self.dump(parts[1] if len(parts) > 1 else None)
+            return self.request(command).result
+        except (RuntimeError, TimeoutError, OSError) as e:
+            return {'error': f"{command} failed", 'message': str(e)}
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline().decode('utf-8').strip()
+        response = self.server.recorder.handle_command(line)
+        self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+
+
+class _ControlServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    block_on_close = False
+
+    def process_request(self, request, client_address):
+        # Named so that recording does not trace the recorder's own command threads
+        threading.Thread(target=self.process_request_thread, args=(request, client_address),
+                         name=f'{THREAD_NAME_PREFIX}command', daemon=True).start()
+
+
+def _in_trace_callback(frame) -> bool:
+    """Whether a frame is inside a trace callback (of CallTracer or the recorder)."""
+    while frame is not None:
+        if frame.f_code in TRACE_CALLBACK_CODES:
+            return True
+        frame = frame.f_back
+    return False
+
+
+TRACE_CALLBACK_CODES = frozenset((CallTracer.trace_calls.__code__, FlightRecorder._control_trace.__code__,
+                                  FlightRecorder._trace_new_thread.__code__))
+
+
+def send_command(socket_path: str, command: str, timeout: float = COMMAND_TIMEOUT + 60) -> Dict[str, Any]:
+    """
+    Send one command to a flight recorder's control socket.
+
+    Args:
+        socket_path: The recorder's control socket
+        command: 'start', 'stop', 'status' or 'dump [output file]'
+        timeout: Seconds to wait for the answer (dumps of large traces take a while)
+
+    Returns:
+        The recorder's JSON answer
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall((command + '\n').encode('utf-8'))
+        with sock.makefile('rb') as answer:
+            return json.loads(answer.readline())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Control the flight recorder of a running process.")
+    parser.add_argument('--socket', required=True, help="The process's control socket")
+    parser.add_argument('command', choices=COMMANDS)
+    parser.add_argument('--output', help="Snapshot file for dump (defaults to the recorder's output file)")
+    args = parser.parse_args(argv)
+
+    command = f"dump {args.output}" if args.command == 'dump' and args.output else args.command
+    answer = send_command(args.socket, command)
+    print(json.dumps(answer, indent=2))
+    if 'error' in answer:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 """Script to run the DDD sample scenario for tracing."""
 
 # Add sample_ddd_project to Python path so internal imports work
+import argparse
 import sys
 from pathlib import Path
 current_dir = Path(__file__).parent
@@ -21,10 +22,15 @@ from application.use_cases.create_order_use_case import CreateOrderUseCase
 # Import tracer after all other imports
 from trace_runner import CallTracer
 
+parser = argparse.ArgumentParser(description="Trace the DDD sample scenario into renderer/static/trace_data.json.")
+parser.add_argument('--call-context', action='store_true',
+                    help="Also build the calling context tree behind the page's call path list")
+args = parser.parse_args()
+
 # Initialize tracer (but don't start tracing yet)
 # Set project root to sample_ddd_project directory where the DDD code is located
 project_root = str(current_dir / 'sample_ddd_project')
-tracer = CallTracer(entry_script=__file__, project_root=project_root)
+tracer = CallTracer(entry_script=__file__, project_root=project_root, call_context=args.call_context)
 
 # Start tracing AFTER imports are complete
 tracer.begin()
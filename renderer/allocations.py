@@ -0,0 +1,197 @@
+"""Memory allocated by traced calls, measured in sampled subtrees.
+
+CallTracer(track_allocations=True) samples subtrees of the call tree: one
+call in ``sample_every`` per code object starts one, and every recorded call
+below it is measured. A code object's first call is not sampled, so code
+that runs once, such as a module or ``main()``, does not put the whole run
+under measurement. A subtree is cut off after ``max_subtree_calls`` measured
+calls: its calls that are still open get no figures, and nothing is measured
+until the next sampled call.
+
+tracemalloc runs only while a subtree is measured: it is started when the
+sampled call starts and stopped when it returns or the subtree is cut off.
+Outside subtrees allocations cost nothing extra, so ``sample_every`` sets the
+cost. Starting and stopping it costs in proportion to the traces the subtree
+left, which the cap bounds. (If the program already runs tracemalloc, it is
+left on, but its peak is reset, and no block counts are taken.)
+
+Bytes are the most the call had allocated at once above what was traced
+when it started (``tracemalloc.get_traced_memory()`` peak, reset after
+every trace callback), children included. Memory the call allocates and
+frees again still counts. The self figure is the most the call's own code
+allocated at once between two calls it made: the largest rise of the peak
+over what was traced when its code resumed, outside its measured children.
+
+Blocks are counted once per subtree, from a tracemalloc snapshot taken when
+the sampled call returns: the memory blocks the subtree allocated and still
+holds, and the ones of those allocated on the sampled call's own lines.
+
+What the tracer allocates for its own bookkeeping while measuring is counted
+like its time overhead and left out of the calls it happens in.
+"""
+
+import tracemalloc
+from array import array
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+DEFAULT_SAMPLE_EVERY = 16
+DEFAULT_MAX_SUBTREE_CALLS = 256
+
+# Frames tracemalloc keeps per allocation; the innermost says which lines allocated a block
+TRACEMALLOC_FRAMES = 1
+
+# Counters of a measured call
+BASELINE, SELF, PEAK, SUBTREE = range(4)
+
+
+class AllocationMeter:
+    """Decides which calls start a measured subtree and keeps the allocation counters.
+
+    Counters are kept in preallocated arrays, so keeping them allocates
+    nothing that would be counted in turn. The program's own allocations are
+    the reading minus the tracer's overhead so far, which does not change
+    during a callback.
+    """
+
+    def __init__(self, sample_every: int = DEFAULT_SAMPLE_EVERY,
+                 max_subtree_calls: int = DEFAULT_MAX_SUBTREE_CALLS,
+                 tracer_files: Iterable[str] = ()):
+        """
+        Args:
+            sample_every: Measure the subtree of one call in this many per code object
+            max_subtree_calls: Measured calls after which a subtree is cut off
+            tracer_files: Source files of the tracer, whose blocks are not counted
+        """
+        self.sample_every = max(1, sample_every)
+        self.max_subtree_calls = max(1, max_subtree_calls)
+        # Code object -> calls left until its next sampled subtree
+        self._countdown: Dict[Any, int] = {}
+        self.depth = 0  # Measured calls currently open
+        self.subtrees = 0  # Sampled subtrees so far; also the id of the current one
+        self.subtrees_cut = 0  # Subtrees cut off at max_subtree_calls
+        self._subtree_calls = 0  # Measured calls in the current subtree
+        self._open = []  # Counters of the open measured calls, innermost last
+        self._root_code = None  # Code object of the current subtree's sampled call
+        self._program = array('q', (0,))  # Reading minus overhead, as of the current callback
+        self._overhead = array('q', (0,))  # The tracer's own net allocations in this subtree
+        self._started_tracemalloc = False
+        self._tracer_files = {__file__, tracemalloc.__file__, *tracer_files}
+
+    def stop(self):
+        """End measuring when tracing stops, open measured calls included."""
+        self._end_subtree()
+
+    def should_sample(self, code) -> bool:
+        """Count a call of `code` outside any measured subtree; True if it starts one."""
+        left = self._countdown.get(code, self.sample_every - 1)
+        if left:
+            self._countdown[code] = left - 1
+            return False
+        self._countdown[code] = self.sample_every - 1
+        return True
+
+    def start_subtree(self, code):
+        """Start tracemalloc and counting for a sampled call of `code`."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        self.subtrees += 1
+        self._subtree_calls = 0
+        self._root_code = code
+        self._overhead[0] = 0
+        self.callback_started()
+
+    def _end_subtree(self):
+        """Stop counting, and stop tracemalloc if the subtree started it."""
+        self.depth = 0
+        self._open.clear()
+        self._root_code = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def callback_started(self):
+        """Read the counters at the start of a trace callback.
+
+        The peak since the last callback belongs to the innermost open measured
+        call: the program ran its code, or calls that are not recorded, since.
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        overhead = self._overhead[0]
+        if self._open:
+            innermost = self._open[-1]
+            peak -= overhead
+            if peak > innermost[PEAK]:
+                innermost[PEAK] = peak
+            # The program's reading is still the one from the start of the stretch
+            if peak - self._program[0] > innermost[SELF]:
+                innermost[SELF] = peak - self._program[0]
+        self._program[0] = current - overhead
+
+    def callback_finished(self):
+        """Count what the tracer allocated since callback_started() as its own, and restart the peak."""
+        self._overhead[0] = tracemalloc.get_traced_memory()[0] - self._program[0]
+        tracemalloc.reset_peak()
+
+    def new_call(self) -> Optional[array]:
+        """
+        Counters of a call that starts being measured: its baseline, its self
+        figure, its peak and its subtree.
+
+        Returns:
+            The counters, or None if the subtree just reached max_subtree_calls and was cut off
+        """
+        if self._subtree_calls >= self.max_subtree_calls:
+            self._end_subtree()
+            self.subtrees_cut += 1
+            return None
+        self._subtree_calls += 1
+        self.depth += 1
+        program = self._program[0]
+        counters = array('q', (program, 0, program, self.subtrees))
+        self._open.append(counters)
+        return counters
+
+    def end_call(self, call: array) -> Optional[Tuple[int, int, Optional[Tuple[int, int]]]]:
+        """
+        Figures of a measured call that returns, in its return callback.
+
+        Returns:
+            (bytes, self bytes, blocks), or None if its subtree was cut off.
+            blocks is (blocks, self blocks) for the call that started the
+            subtree, None for the calls below it.
+        """
+        if call[SUBTREE] != self.subtrees or not self.depth:
+            return None
+        self.depth -= 1
+        self._open.pop()
+        peak = call[PEAK]
+        figures_bytes = peak - call[BASELINE], call[SELF]
+        if self._open:
+            caller = self._open[-1]
+            if peak > caller[PEAK]:
+                caller[PEAK] = peak
+            return (*figures_bytes, None)
+        blocks = self._subtree_blocks()
+        self._end_subtree()
+        return (*figures_bytes, blocks)
+
+    def _subtree_blocks(self) -> Optional[Tuple[int, int]]:
+        """Blocks the subtree allocated and still holds, and those of them the sampled call's lines allocated."""
+        if not self._started_tracemalloc:
+            # The traces include the program's from before the subtree
+            return None
+        statistics = tracemalloc.take_snapshot().statistics('lineno')
+        code = self._root_code
+        # Nested functions and comprehensions share their lines with the code they are in
+        own_lines = {line for _, _, line in code.co_lines() if line is not None}
+        blocks = self_blocks = 0
+        for statistic in statistics:
+            frame = statistic.traceback[0]
+            if frame.filename in self._tracer_files:
+                continue
+            blocks += statistic.count
+            if frame.filename == code.co_filename and frame.lineno in own_lines:
+                self_blocks += statistic.count
+        return blocks, self_blocks
@@ -1,30 +1,159 @@
 """FastAPI backend for call path visualization."""
 
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi import Body, FastAPI, Query, Request
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 import json
+import re
 import subprocess
 import sys
+from time import perf_counter
+from typing import List
 
-app = FastAPI(title="Call Path Visualizer")
+# Add parent directory to path so the renderer package imports work from any cwd
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from renderer.call_context import CallingContextTree, merge_call_contexts
+from renderer.data_processor import generate_import_graph_data
+from renderer.graph_analysis import DEFAULT_CYCLE_LIMIT, analyze_graph, annotate_graph
+from renderer.graph_index import GraphIndex
+from renderer.graph_stream import iter_graph_records, iter_ndjson
+from renderer.layout import LayoutCache
+from renderer.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, ApiMetrics, serialization_seconds
+from renderer.reachability import Reachability
+from renderer.trace_store import TraceStore, diff_graphs
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that adds its encoding time to the current request's metrics."""
+
+    def render(self, content) -> bytes:
+        start = perf_counter()
+        body = super().render(content)
+        timings = serialization_seconds.get()
+        if timings is not None:
+            timings.append(perf_counter() - start)
+        return body
+
+
+app = FastAPI(title="Call Path Visualizer", default_response_class=TimedJSONResponse)
+
+# Request and serialization latencies, served at /metrics
+api_metrics = ApiMetrics()
+
+
+@app.exception_handler(RequestValidationError)
+async def invalid_query_response(request: Request, exc: RequestValidationError):
+    """Report missing or out-of-range query parameters like the endpoints' own query errors.
+
+    Other validation errors (request bodies, path parameters) keep FastAPI's 422 response.
+    """
+    errors = exc.errors()
+    if not all(error['loc'] and error['loc'][0] == 'query' for error in errors):
+        return await request_validation_exception_handler(request, exc)
+    message = "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'][1:])}: {error['msg']}" for error in errors
+    )
+    return JSONResponse(status_code=400, content={"error": "Invalid query", "message": message})
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Time every request by route template, including the JSON encoding of its body."""
+    timings = []
+    serialization_seconds.set(timings)
+    start = perf_counter()
+    response = await call_next(request)
+    route = request.scope.get('route')
+    api_metrics.observe_request(
+        request.method,
+        getattr(route, 'path', 'unmatched'),
+        response.status_code,
+        perf_counter() - start,
+        serialization=sum(timings) if timings else None
+    )
+    return response
 
 # Mount static files
 static_dir = Path(__file__).parent / "static"
 static_dir.mkdir(exist_ok=True)
 app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
 
+# Stored trace runs (one directory per run under renderer/runs)
+trace_store = TraceStore()
+
+# Precomputed class positions, one file per graph hash under renderer/layout_cache
+layout_cache = LayoutCache()
+
+
+# Seconds the stream waits after its last chunk for a layout still being computed
+STREAM_LAYOUT_WAIT = 60.0
+
+
+def _with_layout(graph_data):
+    """Attach the cached class positions to graph data, or a pending layout while they are computed."""
+    graph_data['layout'] = layout_cache.lookup_or_schedule(graph_data)
+    return graph_data
+
+
+TRACE_LAYERS = ("calls", "imports")
+
+# Deepest neighbourhood /api/graph/neighbors expands; beyond it, ask for the reachable set instead
+MAX_NEIGHBOR_DEPTH = 20
+
+
+def _layer_graph(graph_data, layer):
+    """Return the requested layer of graph data, or an error response."""
+    if layer == "imports":
+        if 'imports' not in graph_data:
+            return JSONResponse(
+                status_code=404,
+                content={
+                    "error": "No import data",
+                    "message": "Trace with CallTracer(trace_imports=True) to record imports"
+                }
+            )
+        graph_data = generate_import_graph_data(graph_data['imports'])
+    return graph_data
+
+
+def _analyzed_graph(graph_data, layer):
+    """The requested layer with each class's topological layer and component, or an error response."""
+    graph_data = _layer_graph(graph_data, layer)
+    if isinstance(graph_data, JSONResponse):
+        return graph_data
+    return annotate_graph(graph_data)
+
+
+def _invalid_layer_response():
+    return JSONResponse(
+        status_code=400,
+        content={"error": "Invalid layer", "message": f"layer must be one of: {', '.join(TRACE_LAYERS)}"}
+    )
+
+
+def _load_graph_data(run_id=None):
+    """Load a stored run, or the current trace data (generating it if missing).
+
+    Returns:
+        The graph data, or an error response
+    """
+    if run_id:
+        try:
+            return trace_store.load(run_id)
+        except KeyError:
+            return JSONResponse(
+                status_code=404,
+                content={"error": "Run not found", "message": run_id}
+            )
 
-@app.get("/api/trace")
-def get_trace_data():
-    """Generate and return trace data."""
     trace_data_file = Path(__file__).parent.parent / "renderer" / "static" / "trace_data.json"
 
     if trace_data_file.exists():
         with open(trace_data_file, 'r') as f:
-            graph_data = json.load(f)
-        return graph_data
+            return json.load(f)
     
     # Run generate_trace_data.py to create/update the trace data
     try:
@@ -56,8 +185,7 @@ def get_trace_data():
     # Load and return the generated trace data
     try:
         with open(trace_data_file, 'r') as f:
-            graph_data = json.load(f)
-        return graph_data
+            return json.load(f)
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -68,6 +196,328 @@ def get_trace_data():
         )
 
 
+@app.get("/api/trace")
+def get_trace_data(run_id: str = None, layer: str = "calls"):
+    """Generate and return trace data, or the data of a stored run if run_id is given.
+
+    `layer` selects the call graph ("calls") or the module import graph ("imports").
+    """
+    if layer not in TRACE_LAYERS:
+        return _invalid_layer_response()
+
+    graph_data = _load_graph_data(run_id)
+    if isinstance(graph_data, JSONResponse):
+        return graph_data
+    graph_data = _analyzed_graph(graph_data, layer)
+    if isinstance(graph_data, JSONResponse):
+        return graph_data
+    return _with_layout(graph_data)
+
+
+@app.get("/api/trace/stream")
+def stream_trace_data(run_id: str = None, layer: str = "calls"):
+    """Stream the same graph as /api/trace as NDJSON, busiest classes first.
+
+    A cached layout goes out in the meta record. Otherwise the meta record
+    carries a pending layout, the layout is computed in the background while
+    the chunks go out, and it follows the last chunk as a "layout" record if
+    it is ready within STREAM_LAYOUT_WAIT seconds.
+    """
+    if layer not in TRACE_LAYERS:
+        return _invalid_layer_response()
+
+    graph_data = _load_graph_data(run_id)
+    if isinstance(graph_data, JSONResponse):
+        return graph_data
+    graph_data = _analyzed_graph(graph_data, layer)
+    if isinstance(graph_data, JSONResponse):
+        return graph_data
+
+    layout = _with_layout(graph_data)['layout']
+
+    def records():
+        for record in iter_graph_records(graph_data):
+            if record['type'] == 'end' and layout['source'] == 'pending':
+                computed = layout_cache.wait(layout['hash'], STREAM_LAYOUT_WAIT)
+                if computed is not None:
+                    yield {'type': 'layout', 'layout': computed}
+            yield record
+
+    return StreamingResponse(iter_ndjson(records()), media_type="application/x-ndjson")
+
+
+@app.get("/api/graph/condensed")
+def get_condensed_graph(run_id: str = None, layer: str = "calls", limit: int = DEFAULT_CYCLE_LIMIT):
+    """Return the class graph condensed into strongly connected components, and its largest cycles.
+
+    Components are numbered callers first, each with its member classes and
+    topological layer; `limit` caps the cycles listed.
+    """
+    if layer not in TRACE_LAYERS:
+        return _invalid_layer_response()
+
+    graph_data = _load_graph_data(run_id)
+    if isinstance(graph_data, JSONResponse):
+        return graph_data
+    graph_data = _layer_graph(graph_data, layer)
+    if isinstance(graph_data, JSONResponse):
+        return graph_data
+    return analyze_graph(graph_data, cycle_limit=max(0, min(limit, 1000)))
+
+
+# Adjacency index, reachability and calling context tree for the current trace file,
+# rebuilt when the file changes
+_graph_index_cache = {'mtime': None, 'index': None, 'reachability': None,
+                      'call_context_data': None, 'call_context': None, 'tracer_stats': None}
+
+
+def _get_graph_index():
+    """Return the GraphIndex for the current trace data, or None if there is none."""
+    trace_data_file = Path(__file__).parent / "static" / "trace_data.json"
+    if not trace_data_file.exists():
+        return None
+
+    mtime = trace_data_file.stat().st_mtime
+    if _graph_index_cache['index'] is None or _graph_index_cache['mtime'] != mtime:
+        with open(trace_data_file, 'r') as f:
+            graph_data = json.load(f)
+        _graph_index_cache['index'] = GraphIndex(graph_data)
+        _graph_index_cache['reachability'] = None
+        _graph_index_cache['call_context_data'] = graph_data.get('call_context')
+        _graph_index_cache['call_context'] = None
+        _graph_index_cache['tracer_stats'] = graph_data.get('tracer_stats')
+        _graph_index_cache['mtime'] = mtime
+
+    return _graph_index_cache['index']
+
+
+def _get_reachability():
+    """Return the Reachability for the current trace data, or None if there is none."""
+    index = _get_graph_index()
+    if index is None:
+        return None
+
+    if _graph_index_cache['reachability'] is None:
+        _graph_index_cache['reachability'] = Reachability(index)
+
+    return _graph_index_cache['reachability']
+
+
+def _get_call_context():
+    """Return the CallingContextTree of the current trace data, or None if it has none."""
+    if _get_graph_index() is None or _graph_index_cache['call_context_data'] is None:
+        return None
+
+    if _graph_index_cache['call_context'] is None:
+        _graph_index_cache['call_context'] = CallingContextTree.from_dict(_graph_index_cache['call_context_data'])
+
+    return _graph_index_cache['call_context']
+
+
+def _annotated_subgraph(graph_data):
+    """Add layers to a GraphIndex subgraph, whose class nodes are the index's own, so copy them first."""
+    graph_data['nodes'] = [dict(node) if node['type'] == 'class' else node for node in graph_data['nodes']]
+    return annotate_graph(graph_data)
+
+
+def _no_trace_data_response():
+    """Error response for graph queries when no trace has been generated yet."""
+    return JSONResponse(
+        status_code=404,
+        content={
+            "error": "No trace data available",
+            "message": "Run generate_trace_data.py or load /api/trace first"
+        }
+    )
+
+
+@app.get("/api/graph/neighbors")
+def get_graph_neighbors(node: str, depth: int = Query(1, ge=1, le=MAX_NEIGHBOR_DEPTH),
+                        direction: str = "both", used_only: bool = False):
+    """Return the subgraph within `depth` call hops of a class or method node."""
+    index = _get_graph_index()
+    if index is None:
+        return _no_trace_data_response()
+
+    try:
+        return _annotated_subgraph(index.neighbors(node, depth=depth, direction=direction, used_only=used_only))
+    except KeyError:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Node not found", "message": node}
+        )
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid query", "message": str(e)}
+        )
+
+
+@app.get("/api/graph/subgraph")
+def get_graph_subgraph(include: str = None, exclude: str = None, used_only: bool = False):
+    """Return the subgraph of classes matching the regex and used-only filters."""
+    index = _get_graph_index()
+    if index is None:
+        return _no_trace_data_response()
+
+    try:
+        return _annotated_subgraph(index.filter(include=include, exclude=exclude, used_only=used_only))
+    except re.error as e:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid regex", "message": str(e)}
+        )
+
+
+@app.get("/api/graph/reachable")
+def get_graph_reachable(node: str, direction: str = "out"):
+    """Return every method reachable from a class or method node, with the links on the way."""
+    reachability = _get_reachability()
+    if reachability is None:
+        return _no_trace_data_response()
+
+    try:
+        return reachability.reachable(node, direction=direction)
+    except KeyError:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Node not found", "message": node}
+        )
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid query", "message": str(e)}
+        )
+
+
+@app.get("/api/graph/paths")
+def get_graph_paths(from_: str = Query(..., alias="from"), to: str = Query(...),
+                    k: int = 5, mode: str = "shortest", max_length: int = 20):
+    """Return up to k call paths between two methods."""
+    reachability = _get_reachability()
+    if reachability is None:
+        return _no_trace_data_response()
+
+    # Keep enumeration bounded regardless of what the client asks for
+    k = max(0, min(k, 100))
+    max_length = max(1, min(max_length, 50))
+
+    try:
+        return reachability.paths(from_, to, k=k, mode=mode, max_length=max_length)
+    except KeyError as e:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Node not found", "message": str(e.args[0])}
+        )
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid query", "message": str(e)}
+        )
+
+
+@app.get("/api/call-paths")
+def get_call_paths(method: str, run_id: List[str] = Query(None), limit: int = 20):
+    """Return the distinct call paths that reach a method, heaviest first.
+
+    Uses the calling context tree of the current trace, or the merged trees of
+    the stored runs given as (repeated) run_id parameters.
+    """
+    limit = max(1, min(limit, 200))
+
+    if run_id:
+        contexts = []
+        for rid in run_id:
+            try:
+                graph_data = trace_store.load(rid)
+            except KeyError:
+                return JSONResponse(
+                    status_code=404,
+                    content={"error": "Run not found", "message": rid}
+                )
+            if 'call_context' in graph_data:
+                contexts.append(graph_data['call_context'])
+        context = merge_call_contexts(contexts)
+    else:
+        if _get_graph_index() is None:
+            return _no_trace_data_response()
+        context = _get_call_context()
+
+    if context is None:
+        return JSONResponse(
+            status_code=404,
+            content={
+                "error": "No calling context data",
+                "message": "Trace with CallTracer(call_context=True) (python generate_trace_data.py --call-context) to record call paths"
+            }
+        )
+
+    return context.paths_to(method, limit=limit)
+
+
+@app.post("/api/layout/{layout_hash}")
+def save_layout(layout_hash: str, payload: dict = Body(...)):
+    """Store class positions settled in the browser for a graph hash."""
+    positions = payload.get('positions')
+    if not isinstance(positions, dict):
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid layout", "message": "Expected a 'positions' object"}
+        )
+
+    try:
+        updated = layout_cache.update_positions(layout_hash, positions)
+    except KeyError:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Layout not found", "message": layout_hash}
+        )
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid layout", "message": str(e)}
+        )
+    return {"hash": layout_hash, "updated": updated}
+
+
+@app.get("/api/runs")
+def list_runs(scenario: str = None, branch: str = None, commit: str = None):
+    """List stored trace runs, newest first, optionally filtered by tag."""
+    return {"runs": trace_store.list_runs(scenario=scenario, branch=branch, commit=commit)}
+
+
+@app.delete("/api/runs/{run_id}")
+def delete_run(run_id: str):
+    """Delete a stored trace run."""
+    try:
+        trace_store.delete(run_id)
+    except KeyError:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Run not found", "message": run_id}
+        )
+    return {"message": f"Run {run_id} deleted", "status": "success"}
+
+
+@app.get("/api/diff")
+def diff_runs(base: str, head: str, threshold: float = 0.5):
+    """Compare the call edges of two stored runs."""
+    try:
+        base_data = trace_store.load(base)
+        head_data = trace_store.load(head)
+    except KeyError as e:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Run not found", "message": str(e.args[0])}
+        )
+
+    diff = diff_graphs(base_data, head_data, threshold=threshold)
+    annotate_graph(diff['graph'])
+    diff['base'] = base
+    diff['head'] = head
+    return diff
+
+
 @app.post("/clear-trace")
 def clear_trace_data():
     """Clear the trace data file."""
@@ -108,6 +558,40 @@ def clear_trace_data():
         )
 
 
+@app.get("/api/tracer/stats")
+def get_tracer_stats(run_id: str = None):
+    """Return the tracer's own counters for the current trace, or for a stored run."""
+    if run_id:
+        try:
+            stats = trace_store.load(run_id).get('tracer_stats')
+        except KeyError:
+            return JSONResponse(
+                status_code=404,
+                content={"error": "Run not found", "message": run_id}
+            )
+    else:
+        if _get_graph_index() is None:
+            return _no_trace_data_response()
+        stats = _graph_index_cache['tracer_stats']
+
+    if stats is None:
+        return JSONResponse(
+            status_code=404,
+            content={
+                "error": "No tracer stats",
+                "message": "The trace was recorded before the tracer kept stats"
+            }
+        )
+    return stats
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text metrics: API request and serialization latencies, and the current trace's tracer stats."""
+    stats = _graph_index_cache['tracer_stats'] if _get_graph_index() is not None else None
+    return Response(content=api_metrics.render(stats), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.get("/", response_class=HTMLResponse)
 def index():
     """Serve the main visualization page."""
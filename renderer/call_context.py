@@ -0,0 +1,261 @@
+"""Calling context tree (CCT) of traced calls.
+
+Call links only say that one method called another. A calling context tree
+keeps the whole route: every node is a method together with the context it
+was called from (its parent node), so ``OrderRepository::save`` reached via
+``CreateOrderUseCase::execute -> OrderService::create_order`` and via
+``OrderService::process_order`` are different nodes, each with its own call
+count and time.
+
+The tree is built while tracing, one lookup per call, and stays bounded:
+
+- contexts deeper than ``max_depth`` are not created
+- once ``max_nodes`` contexts exist, no new ones are created
+
+Calls that would need a missing context are counted in ``truncated_calls``
+and their self time is kept on the deepest context that exists, so time still
+adds up along every path. Nodes live in parallel arrays (parent, method,
+depth, calls, times) with methods interned to small integers, and trees from
+several runs or processes can be merged.
+"""
+
+from array import array
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_MAX_DEPTH = 64
+DEFAULT_MAX_NODES = 100000
+
+# Call paths returned per method by paths_to
+DEFAULT_PATH_LIMIT = 20
+
+ROOT = 0
+
+
+class CallingContextTree:
+    """Array-backed calling context tree with depth and node-count limits.
+
+    Node 0 is the root (no method). ``enter`` returns a node index, or, when a
+    limit stopped the context from being created, the bitwise inverse
+    (``~index``) of the deepest existing context, which ``enter`` and
+    ``add_time`` accept as a parent or node as well.
+    """
+
+    def __init__(self, max_depth: int = DEFAULT_MAX_DEPTH, max_nodes: int = DEFAULT_MAX_NODES):
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.methods: List[str] = []
+        self._method_index: Dict[str, int] = {}
+        self.parent = array('q', [-1])
+        self.method = array('q', [-1])
+        self.depth = array('q', [0])
+        self.calls = array('q', [0])
+        self.total_ns = array('q', [0])
+        self.self_ns = array('q', [0])
+        self.timed = False
+        self.truncated_calls = 0
+        # (parent << 32) | method -> child node
+        self._children: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def intern(self, method: str) -> int:
+        """Small integer id of a method id ("Class::method")."""
+        index = self._method_index.get(method)
+        if index is None:
+            index = self._method_index[method] = len(self.methods)
+            self.methods.append(method)
+        return index
+
+    def child(self, parent: int, method: int) -> int:
+        """Find or create the context of `method` called from `parent`.
+
+        Returns:
+            The child node, or ~parent when a limit prevents creating it
+        """
+        key = (parent << 32) | method
+        node = self._children.get(key)
+        if node is not None:
+            return node
+        depth = self.depth[parent] + 1
+        if depth > self.max_depth or len(self.parent) >= self.max_nodes:
+            return ~parent
+        node = self._children[key] = len(self.parent)
+        self.parent.append(parent)
+        self.method.append(method)
+        self.depth.append(depth)
+        self.calls.append(0)
+        self.total_ns.append(0)
+        self.self_ns.append(0)
+        return node
+
+    def enter(self, parent: int, method: str) -> int:
+        """Count a call of `method` from the context `parent` and return its context.
+
+        Args:
+            parent: Context of the caller (ROOT for calls without a traced caller)
+            method: Method id of the callee
+        """
+        if parent < 0:
+            # Inside a call whose context was not created
+            self.truncated_calls += 1
+            return parent
+        node = self.child(parent, self.intern(method))
+        if node < 0:
+            self.truncated_calls += 1
+        else:
+            self.calls[node] += 1
+        return node
+
+    def add_time(self, node: int, wall_ns: int, self_ns: int):
+        """Add the time of a finished call to the context `enter` returned for it."""
+        self.timed = True
+        if node < 0:
+            # Its caller's context already includes the wall time
+            self.self_ns[~node] += self_ns
+            return
+        self.total_ns[node] += wall_ns
+        self.self_ns[node] += self_ns
+
+    def merge(self, other: 'CallingContextTree'):
+        """Add the contexts, calls and times of another tree to this one.
+
+        Contexts the other tree has but this one's limits do not allow are
+        folded into their deepest existing ancestor, like while tracing.
+        """
+        methods = [self.intern(name) for name in other.methods]
+        # Node of `other` -> node of this tree (negative when folded)
+        mapped = [ROOT] * len(other)
+        for node in range(1, len(other)):
+            parent = mapped[other.parent[node]]
+            target = parent if parent < 0 else self.child(parent, methods[other.method[node]])
+            mapped[node] = target
+            if target < 0:
+                self.truncated_calls += other.calls[node]
+                self.self_ns[~target] += other.self_ns[node]
+            else:
+                self.calls[target] += other.calls[node]
+                self.total_ns[target] += other.total_ns[node]
+                self.self_ns[target] += other.self_ns[node]
+        self.truncated_calls += other.truncated_calls
+        self.timed = self.timed or other.timed
+
+    def path(self, node: int) -> List[str]:
+        """Method ids from the outermost call down to `node`."""
+        path = []
+        while node > ROOT:
+            path.append(self.methods[self.method[node]])
+            node = self.parent[node]
+        path.reverse()
+        return path
+
+    def paths_to(self, method: str, limit: int = DEFAULT_PATH_LIMIT) -> Dict[str, Any]:
+        """
+        Distinct call paths that reach a method, heaviest first.
+
+        Args:
+            method: Method id, e.g. "OrderRepository::save"
+            limit: Most paths to return
+
+        Returns:
+            Dictionary with the method, its total calls and time over all
+            contexts, the number of distinct paths, and up to `limit` paths
+            with their calls, share of the calls and, for timed trees,
+            total and self time
+        """
+        index = self._method_index.get(method)
+        nodes = [] if index is None else [node for node in range(1, len(self)) if self.method[node] == index]
+        total_calls = sum(self.calls[node] for node in nodes)
+        nodes.sort(key=lambda node: (-self.calls[node], -self.total_ns[node]))
+
+        paths = []
+        for node in nodes[:limit]:
+            entry = {
+                'path': self.path(node),
+                'calls': self.calls[node],
+                'share': round(self.calls[node] / total_calls, 4) if total_calls else 0,
+            }
+            if self.timed:
+                entry['total_time_ns'] = self.total_ns[node]
+                entry['self_time_ns'] = self.self_ns[node]
+            paths.append(entry)
+
+        result = {
+            'method': method,
+            'calls': total_calls,
+            'path_count': len(nodes),
+            'paths': paths,
+            'truncated_calls': self.truncated_calls,
+        }
+        if self.timed:
+            # A recursive method's contexts nest, so only the outermost ones add to its total
+            outermost = [node for node in nodes if not self._has_ancestor(node, index)]
+            result['total_time_ns'] = sum(self.total_ns[node] for node in outermost)
+        return result
+
+    def _has_ancestor(self, node: int, method: int) -> bool:
+        node = self.parent[node]
+        while node > ROOT:
+            if self.method[node] == method:
+                return True
+            node = self.parent[node]
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable form, stored under 'call_context' in the graph data."""
+        data = {
+            'max_depth': self.max_depth,
+            'max_nodes': self.max_nodes,
+            'truncated_calls': self.truncated_calls,
+            'methods': self.methods,
+            'parent': self.parent.tolist(),
+            'method': self.method.tolist(),
+            'calls': self.calls.tolist(),
+        }
+        if self.timed:
+            data['total_ns'] = self.total_ns.tolist()
+            data['self_ns'] = self.self_ns.tolist()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CallingContextTree':
+        """Rebuild a tree from to_dict() output."""
+        tree = cls(max_depth=data['max_depth'], max_nodes=data['max_nodes'])
+        tree.truncated_calls = data['truncated_calls']
+        for name in data['methods']:
+            tree.intern(name)
+        tree.parent = array('q', data['parent'])
+        tree.method = array('q', data['method'])
+        tree.calls = array('q', data['calls'])
+        size = len(tree.parent)
+        tree.timed = 'total_ns' in data
+        tree.total_ns = array('q', data['total_ns'] if tree.timed else [0] * size)
+        tree.self_ns = array('q', data['self_ns'] if tree.timed else [0] * size)
+        # Parents always come before their children
+        tree.depth = array('q', [0] * size)
+        for node in range(1, size):
+            parent = tree.parent[node]
+            tree.depth[node] = tree.depth[parent] + 1
+            tree._children[(parent << 32) | tree.method[node]] = node
+        return tree
+
+
+def merge_call_contexts(contexts: List[Dict[str, Any]]) -> Optional[CallingContextTree]:
+    """
+    Merge serialized calling context trees, e.g. of several stored runs.
+
+    Args:
+        contexts: to_dict() outputs; the first one's limits apply to the result
+
+    Returns:
+        The merged tree, or None if the list is empty
+    """
+    merged = None
+    for data in contexts:
+        tree = CallingContextTree.from_dict(data)
+        if merged is None:
+            merged = tree
+        else:
+            merged.merge(tree)
+    return merged
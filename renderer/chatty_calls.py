@@ -0,0 +1,180 @@
+"""Detect N+1 and chatty call patterns in tracer events.
+
+An N+1 pattern is one invocation of a method calling the same callee many
+times, typically a repository lookup or an external service call per item of
+a loop. CallTracer deduplicates these into one call link with a count, which
+hides whether the count came from one loop or from many separate requests.
+This pass walks the raw events and counts, for every invocation of a parent
+method, how often it calls each callee.
+"""
+
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+
+# Calls of one callee from one parent invocation at which a pair is reported
+DEFAULT_THRESHOLD = 5
+
+# Lower threshold for callees in infrastructure modules (repositories, external services)
+DEFAULT_INFRASTRUCTURE_THRESHOLD = 2
+
+DEFAULT_INFRASTRUCTURE_PREFIXES = ('infrastructure',)
+
+# Call sites listed per finding
+MAX_CALL_SITES = 5
+
+
+def method_id(call: Dict[str, Any]) -> str:
+    """Graph node id of a traced call, named the way generate_d3_data names it."""
+    if call.get('class'):
+        return f"{call['class']}::{call['function']}"
+    filename = call.get('filename')
+    module = f"<module:{Path(filename).stem}>" if filename else "<module>"
+    return f"{module}::{call.get('function', '<module>')}"
+
+
+def _is_infrastructure(module: Optional[str], prefixes: Sequence[str]) -> bool:
+    if not module:
+        return False
+    return any(module == prefix or module.startswith(prefix + '.') for prefix in prefixes)
+
+
+class _PairStats:
+    """Fan-out of one callee across the invocations of one parent method."""
+
+    __slots__ = ('invocations', 'chatty_invocations', 'total_calls', 'max_per_invocation',
+                 'time_ns', 'call_sites', 'module')
+
+    def __init__(self, module: Optional[str]):
+        self.invocations = 0
+        self.chatty_invocations = 0
+        self.total_calls = 0
+        self.max_per_invocation = 0
+        self.time_ns = 0
+        self.call_sites = Counter()
+        self.module = module
+
+
+class _Invocation:
+    """Calls made by one open parent invocation, grouped by callee."""
+
+    __slots__ = ('depth', 'method_id', 'calls', 'call_sites', 'time_ns', 'modules')
+
+    def __init__(self, depth: int, method_id: str):
+        self.depth = depth
+        self.method_id = method_id
+        self.calls = Counter()
+        self.call_sites = defaultdict(Counter)
+        self.time_ns = Counter()
+        self.modules = {}
+
+
+def detect_chatty_calls(tracer_events: Iterable[Dict[str, Any]],
+                        threshold: int = DEFAULT_THRESHOLD,
+                        infrastructure_threshold: int = DEFAULT_INFRASTRUCTURE_THRESHOLD,
+                        infrastructure_prefixes: Sequence[str] = DEFAULT_INFRASTRUCTURE_PREFIXES
+                        ) -> List[Dict[str, Any]]:
+    """
+    Find parent methods that call the same callee repeatedly within one invocation.
+
+    Events are processed in call order; an invocation's counts are folded into
+    the per-pair statistics as soon as it returns, so memory grows with stack
+    depth and the number of distinct caller/callee pairs, not with the trace.
+
+    Args:
+        tracer_events: Events from CallTracer, in call order
+        threshold: Calls per parent invocation at which a callee is reported
+        infrastructure_threshold: Same, for callees whose module starts with one
+                                  of `infrastructure_prefixes`
+        infrastructure_prefixes: Module name prefixes of infrastructure code
+
+    Returns:
+        One finding per (parent method, callee) pair that reached its threshold
+        in at least one invocation, infrastructure callees and most excess calls
+        first. Each finding has source/target method ids, the callee module,
+        fan-out statistics over all invocations of the parent that made the
+        call, the busiest call sites and, for timed traces, total_time_ns.
+    """
+    parent_invocations = Counter()
+    pairs: Dict[tuple, _PairStats] = {}
+    open_invocations: List[_Invocation] = []
+    timed = False
+
+    def close(invocation: _Invocation):
+        parent_invocations[invocation.method_id] += 1
+        for callee_id, count in invocation.calls.items():
+            module = invocation.modules[callee_id]
+            key = (invocation.method_id, callee_id)
+            stats = pairs.get(key)
+            if stats is None:
+                stats = pairs[key] = _PairStats(module)
+            stats.invocations += 1
+            stats.total_calls += count
+            stats.max_per_invocation = max(stats.max_per_invocation, count)
+            stats.time_ns += invocation.time_ns[callee_id]
+            limit = infrastructure_threshold if _is_infrastructure(module, infrastructure_prefixes) else threshold
+            if count >= limit:
+                stats.chatty_invocations += 1
+                stats.call_sites.update(invocation.call_sites[callee_id])
+
+    for event in tracer_events:
+        depth = event.get('depth', 0)
+        while open_invocations and open_invocations[-1].depth >= depth:
+            close(open_invocations.pop())
+
+        if event.get('class'):
+            if open_invocations:
+                parent = open_invocations[-1]
+            elif event.get('entry_script'):
+                # Top-level code of the entry script counts as one invocation
+                parent = _Invocation(-1, f"<module:{Path(event['entry_script']).stem}>::<module>")
+                open_invocations.append(parent)
+            else:
+                parent = None
+
+            if parent is not None:
+                callee_id = method_id(event)
+                parent.calls[callee_id] += 1
+                parent.modules[callee_id] = event.get('module')
+                if event.get('call_line') is not None:
+                    parent.call_sites[callee_id][(event.get('call_file'), event['call_line'])] += 1
+                if 'wall_ns' in event:
+                    timed = True
+                    parent.time_ns[callee_id] += event['wall_ns']
+
+        open_invocations.append(_Invocation(depth, method_id(event)))
+
+    while open_invocations:
+        close(open_invocations.pop())
+
+    findings = []
+    for (source, target), stats in pairs.items():
+        if not stats.chatty_invocations:
+            continue
+        infrastructure = _is_infrastructure(stats.module, infrastructure_prefixes)
+        finding = {
+            'source': source,
+            'target': target,
+            'target_module': stats.module,
+            'infrastructure': infrastructure,
+            'threshold': infrastructure_threshold if infrastructure else threshold,
+            'parent_invocations': parent_invocations[source],
+            'invocations': stats.invocations,
+            'chatty_invocations': stats.chatty_invocations,
+            'total_calls': stats.total_calls,
+            'max_per_invocation': stats.max_per_invocation,
+            'mean_per_invocation': round(stats.total_calls / stats.invocations, 2),
+            # Calls beyond one per invocation, i.e. what batching could save
+            'excess_calls': stats.total_calls - stats.invocations,
+            'call_sites': [
+                {'file': filename, 'line': line, 'calls': calls}
+                for (filename, line), calls in stats.call_sites.most_common(MAX_CALL_SITES)
+            ],
+        }
+        if timed:
+            finding['total_time_ns'] = stats.time_ns
+        findings.append(finding)
+
+    findings.sort(key=lambda f: (not f['infrastructure'], -f['excess_calls'], f['source'], f['target']))
+    return findings
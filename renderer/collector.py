@@ -0,0 +1,499 @@
+"""Out-of-process trace collector fed over a Unix domain socket.
+
+A traced process that runs ``CallTracer(collector=path)`` keeps no events and
+builds no graph. Its tracer only counts calls (and their times) per
+caller/callee edge in the current batch; batches are sealed every
+``batch_calls`` calls or ``flush_interval`` seconds and handed to a bounded
+ring buffer that a background thread drains into the socket. When the
+collector falls behind and the ring is full, the oldest batch is dropped and
+counted, so the traced process never blocks on the collector and its memory
+stays bounded.
+
+The collector accepts any number of producers (workers, subprocesses) at the
+same time, sums their edges and writes the combined graph to the renderer's
+``trace_data.json`` whenever a producer finishes. When the collector stops it
+stores the combined run in the TraceStore, with every producer's call and drop
+counts in the run metadata.
+
+Wire format: a stream of frames, each a ``!BI`` header (frame type, payload
+length) followed by the payload. String ids are per connection.
+
+- HELLO: JSON object with ``pid``, ``name``, ``project_root`` and ``timing``
+- STRINGS: repeated ``!IH`` (string id, byte length) + UTF-8 method id
+- EDGES: repeated ``!IIIQQQQ`` (caller id, callee id, calls, total ns, self ns,
+  non-reentrant ns, edge non-reentrant ns); caller id 0 means the call has no
+  attributable caller, and times are ``NO_TIME`` when the producer traces
+  without timings
+- DROPS: ``!QQ`` batches and calls dropped so far (cumulative)
+- CONTEXT: JSON calling context tree (CallingContextTree.to_dict()), sent
+  once before END; the collector merges the trees of all producers
+- STATS: JSON tracer stats (CallTracer.stats()), sent once before END; the
+  collector keeps them per producer and adds them up under ``tracer_stats``
+- END: empty; the producer is done
+
+Run a collector with::
+
+    python -m renderer.collector --socket /tmp/callpath.sock
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import struct
+import threading
+from collections import deque
+from pathlib import Path
+from time import perf_counter_ns
+from typing import Any, Dict, List, Optional, Tuple
+
+from renderer.call_context import CallingContextTree
+from renderer.tracer_stats import combine_tracer_stats
+
+
+FRAME_HELLO = 1
+FRAME_STRINGS = 2
+FRAME_EDGES = 3
+FRAME_DROPS = 4
+FRAME_END = 5
+FRAME_CONTEXT = 6
+FRAME_STATS = 7
+
+FRAME_HEADER = struct.Struct('!BI')
+STRING_HEADER = struct.Struct('!IH')
+EDGE_RECORD = struct.Struct('!IIIQQQQ')
+DROPS_RECORD = struct.Struct('!QQ')
+
+# Time field value of producers that trace without timings
+NO_TIME = 2 ** 64 - 1
+
+DEFAULT_BATCH_CALLS = 4096
+DEFAULT_FLUSH_INTERVAL = 0.5
+DEFAULT_MAX_BATCHES = 64
+
+# (caller id or None, callee id), ids named "Class::method"
+Edge = Tuple[Optional[str], str]
+
+
+def _frame(frame_type: int, payload: bytes = b'') -> bytes:
+    return FRAME_HEADER.pack(frame_type, len(payload)) + payload
+
+
+class CollectorClient:
+    """Producer side: batches call edges and sends them to a collector in the background.
+
+    record_call and add_time are called from the tracer on the traced thread;
+    only the sender thread touches the socket.
+    """
+
+    def __init__(self, socket_path: str, name: Optional[str] = None,
+                 project_root: Optional[str] = None, timing: bool = True,
+                 batch_calls: int = DEFAULT_BATCH_CALLS,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_batches: int = DEFAULT_MAX_BATCHES):
+        """
+        Connect to a collector and start the sender thread.
+
+        Args:
+            socket_path: Path of the collector's Unix socket
+            name: Producer name shown in the collector's stats (e.g. the entry script)
+            project_root: Project root the collector uses for static analysis
+            timing: Whether the tracer records call times
+            batch_calls: Calls after which the current batch is sealed
+            flush_interval: Seconds after which the current batch is sealed at the next call
+            max_batches: Sealed batches kept while the collector is behind
+
+        Raises:
+            OSError: If the collector cannot be reached
+        """
+        self.socket_path = socket_path
+        self.timing = timing
+        self.batch_calls = batch_calls
+        self.flush_interval_ns = int(flush_interval * 1e9)
+        self.max_batches = max_batches
+        self.sent_batches = 0
+        self.dropped_batches = 0
+        self.dropped_calls = 0
+
+        # Current batch: edge -> [calls, total ns, self ns, non-reentrant ns, edge non-reentrant ns]
+        self._batch: Dict[Edge, List[int]] = {}
+        self._batch_call_count = 0
+        self._batch_started_ns = perf_counter_ns()
+        # Sealed batches as (edges, call count)
+        self._ring = deque()
+        self._ready = threading.Condition()
+        self._closed = False
+        self._broken = False
+        self._context = None
+        self._stats = None
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(socket_path)
+        hello = {'pid': os.getpid(), 'name': name, 'project_root': project_root, 'timing': timing}
+        self._sock.sendall(_frame(FRAME_HELLO, json.dumps(hello).encode('utf-8')))
+
+        self._sender = threading.Thread(target=self._send_loop, name='callpath-collector', daemon=True)
+        self._sender.start()
+
+    def record_call(self, edge: Edge):
+        """Count one call of an edge in the current batch."""
+        stats = self._batch.get(edge)
+        if stats is None:
+            stats = self._batch[edge] = [0, 0, 0, 0, 0]
+        stats[0] += 1
+        self._batch_call_count += 1
+        if (self._batch_call_count >= self.batch_calls
+                or perf_counter_ns() - self._batch_started_ns >= self.flush_interval_ns):
+            self.flush()
+
+    def add_time(self, edge: Edge, wall_ns: int, self_ns: int, reentrant: bool, edge_reentrant: bool):
+        """Add the time of a finished call to its edge in the current batch.
+
+        The call may have been counted in an earlier batch; the collector sums
+        both, so only the split across batches differs.
+        """
+        stats = self._batch.get(edge)
+        if stats is None:
+            stats = self._batch[edge] = [0, 0, 0, 0, 0]
+        stats[1] += wall_ns
+        stats[2] += self_ns
+        if not reentrant:
+            stats[3] += wall_ns
+        if not edge_reentrant:
+            stats[4] += wall_ns
+
+    def flush(self):
+        """Seal the current batch and queue it for sending, dropping the oldest batch if the ring is full."""
+        self._batch_started_ns = perf_counter_ns()
+        if not self._batch:
+            return
+        batch = (self._batch, self._batch_call_count)
+        self._batch = {}
+        self._batch_call_count = 0
+        with self._ready:
+            if len(self._ring) >= self.max_batches:
+                _, calls = self._ring.popleft()
+                self.dropped_batches += 1
+                self.dropped_calls += calls
+            self._ring.append(batch)
+            self._ready.notify()
+
+    def buffered_bytes(self) -> int:
+        """Encoded size of the calls recorded but not sent yet (current batch and ring)."""
+        with self._ready:
+            edges = len(self._batch) + sum(len(edges) for edges, _ in self._ring)
+        return edges * EDGE_RECORD.size
+
+    def close(self, timeout: float = 10.0, context: Optional[Dict[str, Any]] = None,
+              stats: Optional[Dict[str, Any]] = None):
+        """Send what is left, tell the collector this producer is done and disconnect.
+
+        Args:
+            timeout: Seconds to wait for the sender to drain the ring
+            context: Serialized calling context tree to send along
+            stats: Tracer stats to send along
+        """
+        self.flush()
+        with self._ready:
+            self._context = context
+            self._stats = stats
+            self._closed = True
+            self._ready.notify()
+        self._sender.join(timeout)
+
+    def _send_loop(self):
+        strings: Dict[str, int] = {}
+        sent_drops = (0, 0)
+        while True:
+            with self._ready:
+                while not self._ring and not self._closed:
+                    self._ready.wait()
+                if not self._ring:
+                    break
+                edges, calls = self._ring.popleft()
+                drops = (self.dropped_batches, self.dropped_calls)
+
+            if self._broken:
+                self._count_unsent(calls)
+                continue
+            frames = self._encode(edges, strings)
+            if drops != sent_drops:
+                frames.append(_frame(FRAME_DROPS, DROPS_RECORD.pack(*drops)))
+                sent_drops = drops
+            try:
+                self._sock.sendall(b''.join(frames))
+                self.sent_batches += 1
+            except OSError:
+                # The collector went away; keep counting what it misses
+                self._broken = True
+                self._count_unsent(calls)
+
+        try:
+            if not self._broken:
+                drops = (self.dropped_batches, self.dropped_calls)
+                if drops != sent_drops:
+                    self._sock.sendall(_frame(FRAME_DROPS, DROPS_RECORD.pack(*drops)))
+                if self._context is not None:
+                    self._sock.sendall(_frame(FRAME_CONTEXT, json.dumps(self._context).encode('utf-8')))
+                if self._stats is not None:
+                    self._sock.sendall(_frame(FRAME_STATS, json.dumps(self._stats).encode('utf-8')))
+                self._sock.sendall(_frame(FRAME_END))
+        except OSError:
+            self._broken = True
+        finally:
+            self._sock.close()
+
+    def _count_unsent(self, calls: int):
+        with self._ready:
+            self.dropped_batches += 1
+            self.dropped_calls += calls
+
+    def _encode(self, edges: Dict[Edge, List[int]], strings: Dict[str, int]) -> List[bytes]:
+        """Encode a batch as a STRINGS frame for new method ids and an EDGES frame."""
+        new_strings = bytearray()
+        records = bytearray()
+
+        def string_id(value: Optional[str]) -> int:
+            if value is None:
+                return 0
+            sid = strings.get(value)
+            if sid is None:
+                sid = strings[value] = len(strings) + 1
+                encoded = value.encode('utf-8')
+                new_strings.extend(STRING_HEADER.pack(sid, len(encoded)) + encoded)
+            return sid
+
+        for (caller, callee), (calls, total_ns, self_ns, outer_ns, edge_outer_ns) in edges.items():
+            if not self.timing:
+                total_ns = self_ns = outer_ns = edge_outer_ns = NO_TIME
+            records.extend(EDGE_RECORD.pack(string_id(caller), string_id(callee), calls,
+                                            total_ns, self_ns, outer_ns, edge_outer_ns))
+
+        frames = []
+        if new_strings:
+            frames.append(_frame(FRAME_STRINGS, bytes(new_strings)))
+        frames.append(_frame(FRAME_EDGES, bytes(records)))
+        return frames
+
+
+class _ProducerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.collector.handle_producer(self.rfile)
+
+
+class _CollectorServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class TraceCollector:
+    """Collector side: sums the call edges of all connected producers."""
+
+    def __init__(self, socket_path: str, output_file: Optional[str] = None,
+                 store_runs: bool = True, scenario: Optional[str] = None):
+        """
+        Args:
+            socket_path: Path of the Unix socket to listen on
+            output_file: Where to write the combined graph JSON
+                         (defaults to renderer/static/trace_data.json)
+            store_runs: If True, store the combined run in the TraceStore on shutdown
+            scenario: Scenario name for the stored run (defaults to the first producer's name)
+        """
+        self.socket_path = socket_path
+        self.output_file = output_file or str(Path(__file__).parent / 'static' / 'trace_data.json')
+        self.store_runs = store_runs
+        self.scenario = scenario
+        self.project_root = None
+        self.producers: List[Dict[str, Any]] = []
+        # (caller id, callee id) -> [calls, total ns, self ns, non-reentrant ns, edge non-reentrant ns]
+        self._edges: Dict[Edge, List[Optional[int]]] = {}
+        self._context = None  # Merged CallingContextTree of all producers
+        self._lock = threading.Lock()
+        self._server = None
+
+    def serve_forever(self):
+        """Listen on the socket until shutdown() is called."""
+        if os.path.exists(self.socket_path):
+            # A socket file left behind by a collector that did not shut down cleanly
+            os.unlink(self.socket_path)
+        self._server = _CollectorServer(self.socket_path, _ProducerHandler)
+        self._server.collector = self
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def shutdown(self):
+        """Stop serving (from another thread)."""
+        if self._server is not None:
+            self._server.shutdown()
+
+    def handle_producer(self, stream):
+        """Read one producer's frames until it ends or disconnects.
+
+        Args:
+            stream: Binary file object reading from the producer's connection
+        """
+        producer = {'pid': None, 'name': None, 'status': 'connected', 'batches': 0, 'calls': 0,
+                    'dropped_batches': 0, 'dropped_calls': 0}
+        with self._lock:
+            self.producers.append(producer)
+        strings: Dict[int, Optional[str]] = {0: None}
+
+        while True:
+            header = stream.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                producer['status'] = 'disconnected'
+                break
+            frame_type, length = FRAME_HEADER.unpack(header)
+            payload = stream.read(length)
+            if len(payload) < length:
+                producer['status'] = 'disconnected'
+                break
+
+            if frame_type == FRAME_HELLO:
+                hello = json.loads(payload)
+                producer['pid'] = hello.get('pid')
+                producer['name'] = hello.get('name')
+                with self._lock:
+                    if self.project_root is None:
+                        self.project_root = hello.get('project_root')
+            elif frame_type == FRAME_STRINGS:
+                offset = 0
+                while offset < length:
+                    sid, size = STRING_HEADER.unpack_from(payload, offset)
+                    offset += STRING_HEADER.size
+                    strings[sid] = payload[offset:offset + size].decode('utf-8')
+                    offset += size
+            elif frame_type == FRAME_EDGES:
+                calls = self._merge(
+                    (strings[caller], strings[callee], *record)
+                    for caller, callee, *record in EDGE_RECORD.iter_unpack(payload)
+                )
+                producer['batches'] += 1
+                producer['calls'] += calls
+            elif frame_type == FRAME_DROPS:
+                producer['dropped_batches'], producer['dropped_calls'] = DROPS_RECORD.unpack(payload)
+            elif frame_type == FRAME_CONTEXT:
+                tree = CallingContextTree.from_dict(json.loads(payload))
+                with self._lock:
+                    if self._context is None:
+                        self._context = tree
+                    else:
+                        self._context.merge(tree)
+            elif frame_type == FRAME_STATS:
+                producer['tracer'] = json.loads(payload)
+            elif frame_type == FRAME_END:
+                producer['status'] = 'ended'
+                break
+
+        self.write_snapshot()
+
+    def _merge(self, records) -> int:
+        calls = 0
+        with self._lock:
+            for caller, callee, count, total_ns, self_ns, outer_ns, edge_outer_ns in records:
+                stats = self._edges.get((caller, callee))
+                if stats is None:
+                    stats = self._edges[(caller, callee)] = [0, None, None, None, None]
+                stats[0] += count
+                calls += count
+                if total_ns != NO_TIME:
+                    stats[1] = (stats[1] or 0) + total_ns
+                    stats[2] = (stats[2] or 0) + self_ns
+                    stats[3] = (stats[3] or 0) + outer_ns
+                    stats[4] = (stats[4] or 0) + edge_outer_ns
+        return calls
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-producer call and drop counts, and their totals."""
+        with self._lock:
+            producers = [dict(producer) for producer in self.producers]
+        return {
+            'producers': producers,
+            'calls': sum(producer['calls'] for producer in producers),
+            'dropped_calls': sum(producer['dropped_calls'] for producer in producers),
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Build the combined graph of everything received so far."""
+        from renderer.data_processor import generate_d3_data_from_edges
+        with self._lock:
+            edges = {edge: list(stats) for edge, stats in self._edges.items()}
+            context = self._context.to_dict() if self._context is not None else None
+        graph_data = generate_d3_data_from_edges(edges, project_root=self.project_root)
+        if context is not None:
+            graph_data['call_context'] = context
+        graph_data['collector'] = self.stats()
+        tracer_stats = combine_tracer_stats(
+            [producer['tracer'] for producer in graph_data['collector']['producers'] if 'tracer' in producer]
+        )
+        if tracer_stats is not None:
+            graph_data['tracer_stats'] = tracer_stats
+        return graph_data
+
+    def write_snapshot(self) -> Dict[str, Any]:
+        """Write the combined graph to the output file."""
+        graph_data = self.snapshot()
+        Path(self.output_file).parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so the renderer never reads a partial file
+        temp_file = f"{self.output_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(graph_data, f, indent=2)
+        os.replace(temp_file, self.output_file)
+        return graph_data
+
+    def store_run(self) -> Optional[str]:
+        """Store the combined run in the TraceStore.
+
+        Returns:
+            The new run id, or None when nothing was received
+        """
+        from renderer.trace_store import TraceStore, detect_git_info
+        if not self._edges:
+            return None
+        graph_data = self.snapshot()
+        stats = graph_data.pop('collector')
+        scenario = self.scenario or next((p['name'] for p in stats['producers'] if p['name']), None)
+        git_info = detect_git_info(self.project_root or str(Path(__file__).parent.parent))
+        return TraceStore().save(
+            graph_data,
+            scenario=scenario,
+            branch=git_info['branch'],
+            commit=git_info['commit'],
+            metadata={'collector': stats, 'project_root': self.project_root}
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Collect call edges from traced processes over a Unix socket.")
+    parser.add_argument('--socket', required=True, help="Path of the Unix socket to listen on")
+    parser.add_argument('--output', help="Graph JSON to write (defaults to renderer/static/trace_data.json)")
+    parser.add_argument('--scenario', help="Scenario name for the stored run")
+    parser.add_argument('--no-store', action='store_true', help="Do not store the run in the trace store on exit")
+    args = parser.parse_args(argv)
+
+    collector = TraceCollector(args.socket, output_file=args.output,
+                               store_runs=not args.no_store, scenario=args.scenario)
+    print(f"Collecting traces on {args.socket} (Ctrl+C to stop)")
+    # Stop the same way on SIGTERM, e.g. from a process manager
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        collector.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+    stats = collector.stats()
+    print(f"Received {stats['calls']} calls from {len(stats['producers'])} producer(s), "
+          f"{stats['dropped_calls']} dropped")
+    if collector.store_runs:
+        run_id = collector.store_run()
+        if run_id:
+            print(f"Stored trace run: {run_id}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 """Process tracer events into D3.js network graph data."""
 
-from collections import defaultdict
+from collections import Counter, defaultdict
 from pathlib import Path
 import sys
 
@@ -8,88 +8,93 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from static_analyzer import find_classes_and_methods
+from renderer.chatty_calls import detect_chatty_calls
 
 
-def generate_d3_data(tracer_events, track_module_calls=False, project_root=None):
+def call_edge(event, track_module_calls=False):
     """
-    Convert tracer events to D3.js network graph format.
-    
+    Return the (from_class, from_method, to_class, to_method) call edge of a tracer event.
+
+    Module-level callers are named ``<module:script>``. Returns None for events
+    that are not method calls, and for calls whose caller cannot be attributed.
+
     Args:
-        tracer_events: List of trace events from CallTracer
-        track_module_calls: If True, include calls from module-level code (e.g., __init__ from scripts).
-                          Default False to avoid showing incorrect module-to-class links.
-        project_root: Optional root directory for static analysis to find all classes/methods.
-                     If provided, includes classes and methods that exist but were never called.
+        event: A CallTracer event
+        track_module_calls: If True, attribute calls from module-level code
+    """
+    # Track all method calls (must have a class to be a method call)
+    if not event.get('class'):
+        return None
+    to_class = event['class']
+    to_method = event['function']
+
+    # Determine the caller - handle both class-based callers and module-level callers
+    caller = event.get('caller')
+    if caller:
+        # Caller exists - check if it has a class or is module-level
+        if caller.get('class'):
+            return caller['class'], caller['function'], to_class, to_method
+        # Module-level caller - use filename as identifier
+        if not track_module_calls:
+            # Skip module-level callers when flag is disabled
+            return None
+        caller_filename = caller.get('filename', 'module')
+        from_class = f"<module:{Path(caller_filename).stem}>" if caller_filename else "<module>"
+        return from_class, caller.get('function', '<module>'), to_class, to_method
+
+    # No caller in stack - this is a top-level call (module-level instantiation)
+    if not track_module_calls:
+        # Skip module-level calls when flag is disabled
+        return None
+    # Only create links if we have entry_script - we need to know which script initiated this
+    entry_script = event.get('entry_script')
+    if not entry_script:
+        # No entry_script - we can't reliably determine the caller
+        # Skip creating this link to avoid incorrect attribution
+        return None
+    # Top-level code execution
+    return f"<module:{Path(entry_script).stem}>", '<module>', to_class, to_method
+
+
+def _add_allocations(totals, event):
+    """Add a measured call's allocation figures to
+    [bytes, self bytes, measured calls, blocks, self blocks, calls with blocks]."""
+    # A recursive call's memory is already inside its outermost activation
+    if not event.get('reentrant'):
+        totals[0] += event['alloc_bytes']
+    totals[1] += event['alloc_self_bytes']
+    totals[2] += 1
+    # Only the call that started a sampled subtree counts blocks
+    if 'alloc_blocks' in event:
+        totals[3] += event['alloc_blocks']
+        totals[4] += event['alloc_self_blocks']
+        totals[5] += 1
+
+
+def _set_allocations(item, totals):
+    """Store allocation totals on a method node or calls link."""
+    item['alloc_bytes'], item['alloc_self_bytes'], item['alloc_samples'] = totals[:3]
+    if totals[5]:
+        item['alloc_blocks'], item['alloc_self_blocks'], item['alloc_block_samples'] = totals[3:]
+
+
+def _build_graph(classes_data, called_methods, call_counts, method_times=None, call_times=None,
+                 class_instances=None, call_instance_pairs=None):
+    """
+    Build the class/method nodes and the contains/calls links of a graph.
+
+    Args:
+        classes_data: Class name -> set of method names
+        called_methods: Set of (class, method) pairs that were called
+        call_counts: (from_class, from_method, to_class, to_method) -> call count
+        method_times: Optional (class, method) -> [total_ns, self_ns]
+        call_times: Optional call edge -> [total_ns, self_ns]
+        class_instances: Optional class name -> set of instance ids
+        call_instance_pairs: Optional call edge -> set of (caller, callee) instance ids
+
+    Returns:
+        (nodes, links) lists
     """
-    # Build class -> methods mapping from trace events
-    classes_data = defaultdict(set)
-    called_methods = set()  # Track which methods were actually called
-    
-    for event in tracer_events:
-        if event.get('class'):
-            classes_data[event['class']].add(event['function'])
-            called_methods.add((event['class'], event['function']))
-    
-    # If project_root is provided, also find all classes and methods via static analysis
-    if project_root:
-        static_classes = find_classes_and_methods(project_root)
-        
-        # Merge static analysis with trace data
-        for class_name, methods in static_classes.items():
-            if class_name not in classes_data:
-                classes_data[class_name] = set()
-            classes_data[class_name].update(methods)
-    
-    # Build call relationships
-    calls = []
-    for event in tracer_events:
-        # Track all method calls (must have a class to be a method call)
-        if event.get('class'):
-            to_class = event['class']
-            to_method = event['function']
-            
-            # Determine the caller - handle both class-based callers and module-level callers
-            caller = event.get('caller')
-            if caller:
-                # Caller exists - check if it has a class or is module-level
-                if caller.get('class'):
-                    from_class = caller['class']
-                    from_method = caller['function']
-                else:
-                    # Module-level caller - use filename as identifier
-                    if not track_module_calls:
-                        # Skip module-level callers when flag is disabled
-                        continue
-                    caller_filename = caller.get('filename', 'module')
-                    from_class = f"<module:{Path(caller_filename).stem}>" if caller_filename else "<module>"
-                    from_method = caller.get('function', '<module>')
-                    # Add module-level "class" and its "method" to the data
-                    classes_data[from_class].add(from_method)
-            else:
-                # No caller in stack - this is a top-level call (module-level instantiation)
-                if not track_module_calls:
-                    # Skip module-level calls when flag is disabled
-                    continue
-                # Only create links if we have entry_script - we need to know which script initiated this
-                entry_script = event.get('entry_script')
-                if entry_script:
-                    script_path = Path(entry_script)
-                    from_class = f"<module:{script_path.stem}>"
-                    from_method = '<module>'  # Top-level code execution
-                    # Add module-level "class" to the data
-                    classes_data[from_class].add(from_method)
-                else:
-                    # No entry_script - we can't reliably determine the caller
-                    # Skip creating this link to avoid incorrect attribution
-                    continue
-            
-            
-            # Include all calls, including same-class method calls and module-to-class calls
-            calls.append((from_class, from_method, to_class, to_method))
-    
-    # Remove duplicates
-    calls = list(set(calls))
-    
     # Build nodes: classes + methods as separate nodes
     nodes = []
     method_nodes = []
@@ -101,26 +106,37 @@ def generate_d3_data(tracer_events, track_module_calls=False, project_root=None)
         class_was_used = any((class_name, method) in called_methods for method in methods)
         
         # Add class node with usage indicator
-        nodes.append({
+        class_node = {
             'id': class_name,
             'name': class_name,
             'type': 'class',
             'method_count': len(methods),
             'was_used': class_was_used
-        })
+        }
+        if method_times is not None:
+            class_node['self_time_ns'] = sum(method_times[(class_name, method)][1]
+                                             for method in methods if (class_name, method) in method_times)
+        if class_instances and class_name in class_instances:
+            class_node['instance_count'] = len(class_instances[class_name])
+        nodes.append(class_node)
         
         # Add method nodes with usage indicator
         for method in methods:
             method_id = f"{class_name}::{method}"
             method_was_called = (class_name, method) in called_methods
             
-            method_nodes.append({
+            method_node = {
                 'id': method_id,
                 'name': method,
                 'type': 'method',
                 'class': class_name,
                 'was_called': method_was_called
-            })
+            }
+            if method_times is not None:
+                total_ns, self_ns = method_times.get((class_name, method), (0, 0))
+                method_node['total_time_ns'] = total_ns
+                method_node['self_time_ns'] = self_ns
+            method_nodes.append(method_node)
     
     # Combine all nodes
     all_nodes = nodes + method_nodes
@@ -139,16 +155,372 @@ def generate_d3_data(tracer_events, track_module_calls=False, project_root=None)
         })
     
     # Then, add method-to-method call links
-    for from_class, from_method, to_class, to_method in calls:
+    for call in call_counts:
+        from_class, from_method, to_class, to_method = call
         from_method_id = f"{from_class}::{from_method}"
         to_method_id = f"{to_class}::{to_method}"
-        links.append({
+        link = {
             'source': from_method_id,
             'target': to_method_id,
             'type': 'calls',
             'source_method': from_method,
-            'target_method': to_method
-        })
+            'target_method': to_method,
+            'call_count': call_counts[call]
+        }
+        if call_times is not None:
+            total_ns, self_ns = call_times.get(call, (0, 0))
+            link['total_time_ns'] = total_ns
+            link['self_time_ns'] = self_ns
+        if call_instance_pairs is not None:
+            link['instance_pairs'] = len(call_instance_pairs.get(call, ()))
+        links.append(link)
+    
+    return all_nodes, links
+
+
+def generate_d3_data(tracer_events, track_module_calls=False, project_root=None, detect_chatty=True,
+                     type_samples=None):
+    """
+    Convert tracer events to D3.js network graph format.
     
+    Args:
+        tracer_events: List of trace events from CallTracer
+        track_module_calls: If True, include calls from module-level code (e.g., __init__ from scripts).
+                          Default False to avoid showing incorrect module-to-class links.
+        project_root: Optional root directory for static analysis to find all classes/methods.
+                     If provided, includes classes and methods that exist but were never called.
+        detect_chatty: If True, run the N+1 / chatty call detector. Its findings are
+                      returned under 'chatty_calls' and summarised on the matching
+                      calls links as 'chatty'.
+        type_samples: Optional TypeSampler.histograms() of the same trace. Method
+                     nodes and calls links it has samples for get them as 'types'.
+
+    When the events carry timings (CallTracer with timing enabled), method nodes and
+    calls links get ``total_time_ns`` (inclusive) and ``self_time_ns``, and class
+    nodes get the ``self_time_ns`` of their methods.
+
+    When the events carry allocation figures (CallTracer with track_allocations
+    enabled), method nodes and calls links get ``alloc_bytes`` (inclusive) and
+    ``alloc_self_bytes`` summed over their measured calls, and ``alloc_samples``: how many calls were measured.
+    Those with calls that started a sampled subtree also get ``alloc_blocks`` and
+    ``alloc_self_blocks`` summed over those calls, and ``alloc_block_samples``. Class
+    nodes get the ``alloc_self_bytes`` of their methods.
+
+    When the events carry scope names (callpath.trace_scope / callpath.scope),
+    method nodes and calls links get ``scopes``: calls per scope name.
+
+    When the events carry instance ids (CallTracer with track_instances enabled),
+    class nodes get ``instance_count``, calls links get ``instance_pairs`` (distinct
+    caller/callee instance pairs), ``composes`` links are added from each class to
+    the classes its ``__init__`` stored as attributes, and an ``instances`` section
+    lists the instance-level calls and attribute wiring.
+    """
+    # Build class -> methods mapping from trace events
+    classes_data = defaultdict(set)
+    called_methods = set()  # Track which methods were actually called
+    
+    for event in tracer_events:
+        if event.get('class'):
+            classes_data[event['class']].add(event['function'])
+            called_methods.add((event['class'], event['function']))
+    
+    # If project_root is provided, also find all classes and methods via static analysis
+    if project_root:
+        static_classes = find_classes_and_methods(project_root)
+        
+        # Merge static analysis with trace data
+        for class_name, methods in static_classes.items():
+            if class_name not in classes_data:
+                classes_data[class_name] = set()
+            classes_data[class_name].update(methods)
+    
+    # Build call relationships
+    calls = []
+    # Time per method and per call edge: [total_ns, self_ns]
+    method_times = defaultdict(lambda: [0, 0])
+    call_times = defaultdict(lambda: [0, 0])
+    has_timings = False
+    # Instance ids per class, and caller/callee instance pairs per call edge
+    class_instances = defaultdict(set)
+    call_instance_pairs = defaultdict(set)
+    instance_calls = Counter()
+    wiring = []
+    has_instances = False
+    # Calls per scope name, per method and per call edge
+    method_scopes = defaultdict(Counter)
+    call_scopes = defaultdict(Counter)
+    # Allocations per method id and per call edge (see _add_allocations)
+    method_allocations = defaultdict(lambda: [0, 0, 0, 0, 0, 0])
+    call_allocations = defaultdict(lambda: [0, 0, 0, 0, 0, 0])
+    for event in tracer_events:
+        # Track all method calls (must have a class to be a method call)
+        if event.get('class'):
+            to_class = event['class']
+            to_method = event['function']
+            
+            wall_ns = event.get('wall_ns')
+            if wall_ns is not None:
+                has_timings = True
+                method_time = method_times[(to_class, to_method)]
+                # A recursive call's time is already inside its outermost activation
+                if not event.get('reentrant'):
+                    method_time[0] += wall_ns
+                method_time[1] += event['self_ns']
+            
+            scope = event.get('scope')
+            if scope is not None:
+                method_scopes[f"{to_class}::{to_method}"][scope] += 1
+            
+            if 'alloc_bytes' in event:
+                _add_allocations(method_allocations[f"{to_class}::{to_method}"], event)
+            
+            instance = event.get('instance')
+            if 'instance' in event:
+                has_instances = True
+                if instance is not None:
+                    class_instances[to_class].add(instance)
+                for attribute, component_class, component in event.get('wiring', ()):
+                    wiring.append((to_class, instance, attribute, component_class, component))
+            
+            edge = call_edge(event, track_module_calls)
+            if edge is None:
+                continue
+            from_class, from_method = edge[0], edge[1]
+            if from_class.startswith('<module'):
+                # Add module-level "class" and its "method" to the data
+                classes_data[from_class].add(from_method)
+            
+            # Include all calls, including same-class method calls and module-to-class calls
+            caller = event.get('caller')
+            calls.append((from_class, from_method, to_class, to_method))
+            if wall_ns is not None:
+                call_time = call_times[(from_class, from_method, to_class, to_method)]
+                # A recursive edge's time is already inside its outermost activation, as for methods
+                if not event.get('edge_reentrant'):
+                    call_time[0] += wall_ns
+                call_time[1] += event['self_ns']
+            if scope is not None:
+                call_scopes[(f"{from_class}::{from_method}", f"{to_class}::{to_method}")][scope] += 1
+            if 'alloc_bytes' in event:
+                _add_allocations(call_allocations[(f"{from_class}::{from_method}", f"{to_class}::{to_method}")], event)
+            caller_instance = caller.get('instance') if caller else None
+            if instance is not None and caller_instance is not None:
+                call_instance_pairs[(from_class, from_method, to_class, to_method)].add((caller_instance, instance))
+                instance_calls[(from_class, caller_instance, to_class, instance)] += 1
+    
+    # Remove duplicates, keeping how often each call happened
+    call_counts = Counter(calls)
+    
+    all_nodes, links = _build_graph(
+        classes_data, called_methods, call_counts,
+        method_times=method_times if has_timings else None,
+        call_times=call_times if has_timings else None,
+        class_instances=class_instances if has_instances else None,
+        call_instance_pairs=call_instance_pairs if has_instances else None
+    )
+    
+    graph_data = {'nodes': all_nodes, 'links': links}
+    
+    if type_samples is not None:
+        for node in all_nodes:
+            if node['type'] == 'method' and node['id'] in type_samples['methods']:
+                node['types'] = type_samples['methods'][node['id']]
+        for link in links:
+            types = type_samples['edges'].get((link['source'], link['target']))
+            if types is not None:
+                link['types'] = types
+    
+    if method_scopes:
+        for node in all_nodes:
+            if node['type'] == 'method' and node['id'] in method_scopes:
+                node['scopes'] = dict(method_scopes[node['id']])
+        for link in links:
+            scopes = call_scopes.get((link['source'], link['target']))
+            if scopes is not None and link['type'] == 'calls':
+                link['scopes'] = dict(scopes)
+    
+    if method_allocations:
+        class_self_bytes = Counter()
+        for node in all_nodes:
+            if node['type'] == 'method' and node['id'] in method_allocations:
+                _set_allocations(node, method_allocations[node['id']])
+                class_self_bytes[node['class']] += node['alloc_self_bytes']
+        for node in all_nodes:
+            if node['type'] == 'class':
+                node['alloc_self_bytes'] = class_self_bytes[node['id']]
+        for link in links:
+            allocations = call_allocations.get((link['source'], link['target']))
+            if allocations is not None and link['type'] == 'calls':
+                _set_allocations(link, allocations)
+    
+    if has_instances:
+        # Class-level composition: which classes hold which, through which attributes
+        composition = defaultdict(lambda: {'attributes': set(), 'owners': set()})
+        for owner_class, owner, attribute, component_class, component in wiring:
+            if component_class in classes_data:
+                composed = composition[(owner_class, component_class)]
+                composed['attributes'].add(attribute)
+                composed['owners'].add(owner)
+        for (owner_class, component_class), composed in sorted(composition.items()):
+            links.append({
+                'source': owner_class,
+                'target': component_class,
+                'type': 'composes',
+                'source_method': None,
+                'target_method': None,
+                'attributes': sorted(composed['attributes']),
+                'instance_count': len(composed['owners'])
+            })
+        
+        graph_data['instances'] = {
+            'calls': [
+                {'source_class': source_class, 'source_instance': source,
+                 'target_class': target_class, 'target_instance': target, 'call_count': count}
+                for (source_class, source, target_class, target), count in instance_calls.items()
+            ],
+            'wiring': [
+                {'owner_class': owner_class, 'owner_instance': owner, 'attribute': attribute,
+                 'component_class': component_class, 'component_instance': component}
+                for owner_class, owner, attribute, component_class, component in wiring
+            ]
+        }
+    
+    if detect_chatty:
+        findings = detect_chatty_calls(tracer_events)
+        links_by_pair = {(link['source'], link['target']): link for link in links if link['type'] == 'calls'}
+        for finding in findings:
+            link = links_by_pair.get((finding['source'], finding['target']))
+            if link is not None:
+                link['chatty'] = {
+                    'max_per_invocation': finding['max_per_invocation'],
+                    'mean_per_invocation': finding['mean_per_invocation'],
+                    'chatty_invocations': finding['chatty_invocations'],
+                    'infrastructure': finding['infrastructure'],
+                    'call_sites': finding['call_sites'],
+                }
+        graph_data['chatty_calls'] = findings
+    
+    return graph_data
+
+
+def generate_d3_data_from_edges(edge_stats, project_root=None):
+    """
+    Convert aggregated call edges (as sent to the trace collector) to D3.js network graph format.
+    
+    Args:
+        edge_stats: Mapping of (caller id, callee id) to
+                   [count, total_ns, self_ns, outer_ns, edge_outer_ns], with ids named
+                   "Class::method". The caller id is None for calls that could not be
+                   attributed to a caller; those only mark the callee as called.
+                   outer_ns is the time of the calls that were not reentrant, so a
+                   recursive method's total time is not counted twice, and
+                   edge_outer_ns the time of the calls whose caller/callee pair was
+                   not already open, for the edge's total time. Time fields are
+                   None when the producers traced without timings.
+        project_root: Optional root directory for static analysis to find all classes/methods.
+    
+    Returns:
+        Graph data in the same shape as generate_d3_data, without instance data and
+        chatty call findings (those need the individual events)
+    """
+    classes_data = defaultdict(set)
+    called_methods = set()
+    call_counts = Counter()
+    method_times = defaultdict(lambda: [0, 0])
+    call_times = {}
+    has_timings = False
+    
+    for (caller_id, callee_id), (count, total_ns, self_ns, outer_ns, edge_outer_ns) in edge_stats.items():
+        to_class, _, to_method = callee_id.partition('::')
+        classes_data[to_class].add(to_method)
+        called_methods.add((to_class, to_method))
+        if total_ns is not None:
+            has_timings = True
+            method_time = method_times[(to_class, to_method)]
+            method_time[0] += outer_ns
+            method_time[1] += self_ns
+        if caller_id is None:
+            continue
+        from_class, _, from_method = caller_id.partition('::')
+        classes_data[from_class].add(from_method)
+        call = (from_class, from_method, to_class, to_method)
+        call_counts[call] += count
+        if total_ns is not None:
+            call_times[call] = [edge_outer_ns, self_ns]
+    
+    if project_root:
+        for class_name, methods in find_classes_and_methods(project_root).items():
+            classes_data[class_name].update(methods)
+    
+    all_nodes, links = _build_graph(
+        classes_data, called_methods, call_counts,
+        method_times=method_times if has_timings else None,
+        call_times=call_times if has_timings else None
+    )
     return {'nodes': all_nodes, 'links': links}
 
+
+def generate_import_graph_data(imports):
+    """
+    Convert recorded imports (ImportTracer.data()) to D3.js network graph format.
+    
+    Every module becomes a class node with a single ``<module>`` method node, and
+    every import a calls link between those, so the import layer renders with the
+    call graph views. Method nodes get the module's ``total_time_ns`` (inclusive
+    import time), ``self_time_ns`` (exclusive) and ``code_ns`` (module-level code);
+    class nodes get the exclusive time. Links get ``loaded`` and, for the import
+    that loaded the module, its inclusive and exclusive time. Modules that were
+    already loaded when tracing started are marked ``preloaded`` and cost nothing.
+    
+    Args:
+        imports: The 'imports' section of the graph data
+    
+    Returns:
+        Graph data with 'nodes' and 'links'
+    """
+    modules = {module['name']: module for module in imports['modules']}
+    classes_data = defaultdict(set)
+    call_counts = Counter()
+    method_times = {}
+    call_times = {}
+    
+    for name, module in modules.items():
+        classes_data[name].add('<module>')
+        method_times[(name, '<module>')] = [module['inclusive_ns'], module['exclusive_ns']]
+    
+    for edge in imports['edges']:
+        source, target = edge['source'], edge['target']
+        classes_data[source].add('<module>')
+        classes_data[target].add('<module>')
+        call = (source, '<module>', target, '<module>')
+        call_counts[call] = 1
+        module = modules.get(target)
+        if edge['loaded'] and module:
+            call_times[call] = [module['inclusive_ns'], module['exclusive_ns']]
+    
+    called_methods = {(name, '<module>') for name in classes_data}
+    all_nodes, links = _build_graph(classes_data, called_methods, call_counts,
+                                    method_times=method_times, call_times=call_times)
+    
+    for node in all_nodes:
+        module_name = node['id'] if node['type'] == 'class' else node['class']
+        module = modules.get(module_name)
+        if node['type'] == 'class':
+            node['layer'] = 'imports'
+            node['in_project'] = bool(module and module['in_project'])
+            if module is None:
+                node['preloaded'] = True
+            elif module.get('failed'):
+                node['failed'] = True
+        elif module is not None:
+            node['code_ns'] = module['code_ns']
+            node['file'] = module['file']
+    
+    loaded_edges = {(edge['source'], edge['target']) for edge in imports['edges'] if edge['loaded']}
+    for link in links:
+        if link['type'] == 'calls':
+            # An import happens once per importer; a count would only be noise
+            del link['call_count']
+            link['loaded'] = (link['source'][:-len('::<module>')], link['target'][:-len('::<module>')]) in loaded_edges
+    
+    return {'nodes': all_nodes, 'links': links}
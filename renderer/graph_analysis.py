@@ -0,0 +1,272 @@
+"""Strongly connected components, condensation and layering of call graphs.
+
+Traced graphs are full of cycles: mutual recursion, services calling back
+into each other. Collapsing every strongly connected component into a single
+node leaves a DAG, which can be layered left to right and walked without
+cycle checks. Every step is linear in nodes plus edges: an iterative Tarjan
+for the components, one pass over the edges to condense them, and one pass
+over the components in topological order for the layers.
+
+``analyze_graph`` runs this on the class level of graph data (classes linked
+by the calls between their methods), where cycles are architectural, and
+reports the largest of them. ``annotate_graph`` stores each class's layer and
+component on its node for the page's layered layout.
+"""
+
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Cycles listed by analyze_graph, largest first
+DEFAULT_CYCLE_LIMIT = 10
+
+
+def strongly_connected_components(node_count, successors):
+    """
+    Find strongly connected components with an iterative Tarjan's algorithm.
+
+    Args:
+        node_count: Number of nodes, numbered 0..node_count-1
+        successors: List of successor lists, indexed by node
+
+    Returns:
+        List of components (lists of node numbers) in reverse topological
+        order: every component appears before the components that call into it.
+    """
+    index_of = [-1] * node_count
+    lowlink = [0] * node_count
+    on_stack = [False] * node_count
+    stack = []
+    components = []
+    next_index = 0
+
+    for root in range(node_count):
+        if index_of[root] != -1:
+            continue
+
+        # Each work item is (node, position in its successor list)
+        work = [(root, 0)]
+        index_of[root] = lowlink[root] = next_index
+        next_index += 1
+        stack.append(root)
+        on_stack[root] = True
+
+        while work:
+            node, position = work[-1]
+            node_successors = successors[node]
+
+            if position < len(node_successors):
+                work[-1] = (node, position + 1)
+                successor = node_successors[position]
+                if index_of[successor] == -1:
+                    index_of[successor] = lowlink[successor] = next_index
+                    next_index += 1
+                    stack.append(successor)
+                    on_stack[successor] = True
+                    work.append((successor, 0))
+                elif on_stack[successor]:
+                    lowlink[node] = min(lowlink[node], index_of[successor])
+                continue
+
+            # All successors visited - close the node
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+            if lowlink[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+
+    return components
+
+
+def condense(successors, components):
+    """
+    Collapse every component into a single node.
+
+    Args:
+        successors: List of successor lists, indexed by node
+        components: strongly_connected_components() of the same graph
+
+    Returns:
+        (component_of, component_successors): the component of every node, and
+        the distinct other components each component calls into
+    """
+    component_of = [0] * len(successors)
+    for component_id, members in enumerate(components):
+        for member in members:
+            component_of[member] = component_id
+
+    component_successors = [[] for _ in components]
+    # Last component that listed a successor, so each is listed once without a set per component
+    listed_by = [-1] * len(components)
+    for component_id, members in enumerate(components):
+        for member in members:
+            for successor in successors[member]:
+                target = component_of[successor]
+                if target != component_id and listed_by[target] != component_id:
+                    listed_by[target] = component_id
+                    component_successors[component_id].append(target)
+    return component_of, component_successors
+
+
+def topological_layers(component_successors):
+    """
+    Longest-path layer of every component of a condensation.
+
+    Components must come in reverse topological order, as
+    strongly_connected_components returns them. Components nothing calls get
+    layer 0, every other one the layer after its deepest caller.
+    """
+    layers = [0] * len(component_successors)
+    # Reverse topological order lists callees first, so walk it backwards
+    for component_id in reversed(range(len(component_successors))):
+        next_layer = layers[component_id] + 1
+        for successor in component_successors[component_id]:
+            if layers[successor] < next_layer:
+                layers[successor] = next_layer
+    return layers
+
+
+def node_layers(node_count, successors) -> Tuple[List[int], int]:
+    """
+    Layer of every node of a graph: the layer of its component in the condensation.
+
+    Returns:
+        (layer per node, number of layers)
+    """
+    components = strongly_connected_components(node_count, successors)
+    component_of, component_successors = condense(successors, components)
+    layers = topological_layers(component_successors)
+    return [layers[component] for component in component_of], max(layers, default=-1) + 1
+
+
+def class_call_graph(graph_data: Dict[str, Any]) -> Tuple[List[str], Dict[Tuple[int, int], int]]:
+    """
+    The class level of a call graph.
+
+    Args:
+        graph_data: Graph data with 'nodes' and 'links'
+
+    Returns:
+        (class ids, {(source position, target position): call count}), with
+        the calls between methods of the same class left out
+    """
+    class_ids = sorted(node['id'] for node in graph_data['nodes'] if node['type'] == 'class')
+    position = {class_id: i for i, class_id in enumerate(class_ids)}
+    owner = {node['id']: position.get(node['class']) for node in graph_data['nodes'] if node['type'] == 'method'}
+
+    calls = defaultdict(int)
+    for link in graph_data['links']:
+        if link['type'] != 'calls':
+            continue
+        source, target = owner.get(link['source']), owner.get(link['target'])
+        if source is not None and target is not None and source != target:
+            calls[(source, target)] += link.get('call_count', 1)
+    return class_ids, calls
+
+
+def analyze_graph(graph_data: Dict[str, Any], cycle_limit: int = DEFAULT_CYCLE_LIMIT) -> Dict[str, Any]:
+    """
+    Condense the class-level call graph and report its largest cycles.
+
+    Args:
+        graph_data: Graph data with 'nodes' and 'links'
+        cycle_limit: Cycles to list, largest first
+
+    Returns:
+        Dictionary with 'components' (id, member classes and layer of every
+        component, numbered in topological order, callers first), 'links'
+        (calls between components), 'layer_count', 'cycle_count' and 'cycles'
+        (the largest components of more than one class, with the calls inside them)
+    """
+    class_ids, calls = class_call_graph(graph_data)
+    successors = [[] for _ in class_ids]
+    for source, target in calls:
+        successors[source].append(target)
+
+    components = strongly_connected_components(len(class_ids), successors)
+    component_of, component_successors = condense(successors, components)
+    layers = topological_layers(component_successors)
+    # Number components callers first; Tarjan's order is the reverse
+    last = len(components) - 1
+
+    component_calls = defaultdict(int)
+    internal_links = defaultdict(list)
+    for (source, target), count in calls.items():
+        source_component, target_component = component_of[source], component_of[target]
+        if source_component == target_component:
+            internal_links[source_component].append(
+                {'source': class_ids[source], 'target': class_ids[target], 'call_count': count})
+        else:
+            component_calls[(last - source_component, last - target_component)] += count
+
+    cycle_components = [component_id for component_id, members in enumerate(components) if len(members) > 1]
+    cycle_components.sort(key=lambda component_id: (
+        -len(components[component_id]),
+        -sum(link['call_count'] for link in internal_links[component_id]),
+        min(class_ids[member] for member in components[component_id]),
+    ))
+
+    return {
+        'components': [
+            {
+                'id': last - component_id,
+                'classes': sorted(class_ids[member] for member in components[component_id]),
+                'layer': layers[component_id],
+            }
+            for component_id in reversed(range(len(components)))
+        ],
+        'links': [
+            {'source': source, 'target': target, 'call_count': count}
+            for (source, target), count in sorted(component_calls.items())
+        ],
+        'layer_count': max(layers, default=-1) + 1,
+        'cycle_count': len(cycle_components),
+        'cycles': [
+            {
+                'component': last - component_id,
+                'classes': sorted(class_ids[member] for member in components[component_id]),
+                'call_count': sum(link['call_count'] for link in internal_links[component_id]),
+                'links': sorted(internal_links[component_id], key=lambda link: (link['source'], link['target'])),
+            }
+            for component_id in cycle_components[:cycle_limit]
+        ],
+    }
+
+
+def annotate_graph(graph_data: Dict[str, Any], analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Store the layer and component of every class on its node.
+
+    Class nodes get 'layer' and 'component', and the graph data gets
+    'layer_count' and 'cycle_count'.
+
+    Args:
+        graph_data: Graph data, changed in place
+        analysis: analyze_graph() of the same graph, computed if not given
+
+    Returns:
+        The graph data
+    """
+    if analysis is None:
+        analysis = analyze_graph(graph_data, cycle_limit=0)
+    component_of = {}
+    for component in analysis['components']:
+        for class_id in component['classes']:
+            component_of[class_id] = component
+    for node in graph_data['nodes']:
+        component = component_of.get(node['id']) if node['type'] == 'class' else None
+        if component is not None:
+            node['layer'] = component['layer']
+            node['component'] = component['id']
+    graph_data['layer_count'] = analysis['layer_count']
+    graph_data['cycle_count'] = analysis['cycle_count']
+    return graph_data
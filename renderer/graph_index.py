@@ -0,0 +1,158 @@
+"""Adjacency index over D3 graph data for server-side subgraph queries."""
+
+import re
+from collections import defaultdict, deque
+
+
+class GraphIndex:
+    """Precomputed adjacency index over the node/link data from generate_d3_data.
+
+    The index is built once per graph and answers neighbourhood and filter
+    queries by returning only the requested subgraph, in the same node/link
+    shape that /api/trace returns.
+    """
+
+    def __init__(self, graph_data):
+        self.nodes = {}
+        self.class_methods = defaultdict(list)  # class id -> method ids
+        self.outgoing = defaultdict(list)  # method id -> call links leaving it
+        self.incoming = defaultdict(list)  # method id -> call links entering it
+
+        for node in graph_data.get('nodes', []):
+            self.nodes[node['id']] = node
+
+        for link in graph_data.get('links', []):
+            if link['type'] == 'contains':
+                self.class_methods[link['source']].append(link['target'])
+            elif link['type'] == 'calls':
+                self.outgoing[link['source']].append(link)
+                self.incoming[link['target']].append(link)
+
+    def seed_methods(self, node_id):
+        """Resolve a node id to the method ids a query should start from."""
+        node = self.nodes.get(node_id)
+        if node is None:
+            raise KeyError(node_id)
+        if node['type'] == 'class':
+            return list(self.class_methods.get(node_id, []))
+        return [node_id]
+
+    def _is_visible(self, method_id, used_only):
+        """Check whether a method passes the used-only filter."""
+        node = self.nodes.get(method_id)
+        if node is None:
+            return False
+        return not (used_only and node.get('was_called') is False)
+
+    def neighbors(self, node_id, depth=1, direction='both', used_only=False):
+        """
+        Return the subgraph within `depth` call hops of a node.
+
+        Args:
+            node_id: Method id (e.g. "OrderService::process_order") or class id.
+                     A class id starts the search from all of its methods.
+            depth: Maximum number of call hops to follow (at least 1)
+            direction: 'out' for callees, 'in' for callers, 'both' for either
+            used_only: If True, skip methods that were never called
+
+        Returns:
+            Dictionary with 'nodes' and 'links' for the neighbourhood
+        """
+        if direction not in ('in', 'out', 'both'):
+            raise ValueError(f"Invalid direction: {direction}")
+        if depth < 1:
+            raise ValueError(f"Invalid depth: {depth}")
+
+        seeds = [m for m in self.seed_methods(node_id) if self._is_visible(m, used_only)]
+        visited = set(seeds)
+        call_links = {}
+        queue = deque((method_id, 0) for method_id in seeds)
+
+        while queue:
+            method_id, distance = queue.popleft()
+            if distance >= depth:
+                continue
+
+            candidates = []
+            if direction in ('out', 'both'):
+                candidates.extend((link, link['target']) for link in self.outgoing.get(method_id, []))
+            if direction in ('in', 'both'):
+                candidates.extend((link, link['source']) for link in self.incoming.get(method_id, []))
+
+            for link, other_id in candidates:
+                if not self._is_visible(other_id, used_only):
+                    continue
+                call_links[(link['source'], link['target'])] = link
+                if other_id not in visited:
+                    visited.add(other_id)
+                    queue.append((other_id, distance + 1))
+
+        return self.build_subgraph(visited, call_links.values())
+
+    def filter(self, include=None, exclude=None, used_only=False):
+        """
+        Return the subgraph of classes matching the given filters.
+
+        Args:
+            include: Optional regex; only classes whose name matches are kept
+            exclude: Optional regex; classes whose name matches are hidden
+                     (the same semantics as the frontend class filter)
+            used_only: If True, hide classes and methods that were never called
+
+        Returns:
+            Dictionary with 'nodes' and 'links' for the filtered graph
+        """
+        include_regex = re.compile(include, re.IGNORECASE) if include else None
+        exclude_regex = re.compile(exclude, re.IGNORECASE) if exclude else None
+
+        method_ids = set()
+        for class_id, methods in self.class_methods.items():
+            class_node = self.nodes.get(class_id)
+            if class_node is None:
+                continue
+            if include_regex and not include_regex.search(class_id):
+                continue
+            if exclude_regex and exclude_regex.search(class_id):
+                continue
+            if used_only and class_node.get('was_used') is False:
+                continue
+            method_ids.update(m for m in methods if self._is_visible(m, used_only))
+
+        call_links = [
+            link
+            for method_id in method_ids
+            for link in self.outgoing.get(method_id, [])
+            if link['target'] in method_ids
+        ]
+        return self.build_subgraph(method_ids, call_links)
+
+    def build_subgraph(self, method_ids, call_links):
+        """
+        Assemble graph data for a set of methods and the call links between them.
+
+        Class nodes and contains links are added for every class that owns
+        one of the methods, so the result renders like a full trace.
+        """
+        class_ids = set()
+        method_nodes = []
+        for method_id in sorted(method_ids):
+            node = self.nodes.get(method_id)
+            if node is None:
+                continue
+            method_nodes.append(node)
+            class_ids.add(node['class'])
+
+        class_nodes = [self.nodes[class_id] for class_id in sorted(class_ids) if class_id in self.nodes]
+
+        links = []
+        for method_node in method_nodes:
+            links.append({
+                'source': method_node['class'],
+                'target': method_node['id'],
+                'type': 'contains',
+                'source_method': None,
+                'target_method': None
+            })
+        links.extend(call_links)
+
+        return {'nodes': class_nodes + method_nodes, 'links': links}
@@ -0,0 +1,117 @@
+"""Split graph data into NDJSON chunks, most important classes first.
+
+The page can then draw the busiest part of a large graph as soon as the first
+chunk arrives, instead of waiting for the whole JSON body. The stream is:
+
+- one ``meta`` record: node, link and class counts plus every top-level key of
+  the graph data except the nodes and links (layout, chatty calls, ...)
+- ``chunk`` records: a batch of class nodes with their method nodes, and every
+  link whose endpoints have all been sent by the end of the batch
+- one ``end`` record
+
+Classes are ranked by the calls going into and out of their methods. Batches
+start small and double in size, so the first render does not wait for much
+data and large graphs still arrive in a handful of records.
+"""
+
+import json
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List
+
+
+FIRST_CHUNK_CLASSES = 25
+MAX_CHUNK_CLASSES = 800
+
+# Bulky sections other endpoints serve; the page does not need them
+STREAM_SKIPPED_KEYS = ('nodes', 'links', 'call_context', 'imports', 'instances')
+
+
+def rank_classes(graph_data: Dict[str, Any]) -> List[str]:
+    """
+    Order class ids by importance: calls into and out of their methods, then name.
+
+    Args:
+        graph_data: Graph data with 'nodes' and 'links'
+
+    Returns:
+        Class ids, most called first
+    """
+    owner = _owners(graph_data)
+    calls = defaultdict(int)
+    for link in graph_data['links']:
+        if link['type'] != 'calls':
+            continue
+        count = link.get('call_count', 1)
+        source, target = owner.get(link['source']), owner.get(link['target'])
+        calls[source] += count
+        if target != source:
+            calls[target] += count
+    class_ids = [node['id'] for node in graph_data['nodes'] if node['type'] == 'class']
+    return sorted(class_ids, key=lambda class_id: (-calls[class_id], class_id))
+
+
+def _owners(graph_data: Dict[str, Any]) -> Dict[str, str]:
+    """Node id -> id of the class node it belongs to."""
+    return {
+        node['id']: node['class'] if node['type'] == 'method' else node['id']
+        for node in graph_data['nodes']
+    }
+
+
+def iter_graph_records(graph_data: Dict[str, Any], first_chunk: int = FIRST_CHUNK_CLASSES,
+                       max_chunk: int = MAX_CHUNK_CLASSES) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the meta, chunk and end records of a graph.
+
+    Args:
+        graph_data: Graph data with 'nodes' and 'links'
+        first_chunk: Classes in the first chunk; each further chunk doubles
+        max_chunk: Upper bound on the classes per chunk
+    """
+    order = rank_classes(graph_data)
+    owner = _owners(graph_data)
+    nodes_by_class = defaultdict(list)
+    for node in graph_data['nodes']:
+        nodes_by_class[owner[node['id']]].append(node)
+
+    # Chunk index of every class
+    chunk_of = {}
+    boundaries = []
+    start, size = 0, max(1, first_chunk)
+    while start < len(order):
+        end = min(len(order), start + size)
+        for class_id in order[start:end]:
+            chunk_of[class_id] = len(boundaries)
+        boundaries.append((start, end))
+        start, size = end, min(size * 2, max_chunk)
+
+    # A link goes out with the chunk that completes its endpoints
+    links_by_chunk = defaultdict(list)
+    for link in (graph_data['links'] if boundaries else ()):
+        chunks = [chunk_of.get(owner.get(link['source'])), chunk_of.get(owner.get(link['target']))]
+        if None in chunks:
+            # Dangling link; the full graph carries it, so keep it with the last chunk
+            chunks = [len(boundaries) - 1]
+        links_by_chunk[max(chunks)].append(link)
+
+    meta = {key: value for key, value in graph_data.items() if key not in STREAM_SKIPPED_KEYS}
+    meta.update({
+        'type': 'meta',
+        'node_count': len(graph_data['nodes']),
+        'link_count': len(graph_data['links']),
+        'class_count': len(order),
+        'chunk_count': len(boundaries),
+    })
+    yield meta
+
+    for index, (start, end) in enumerate(boundaries):
+        nodes = [node for class_id in order[start:end] for node in nodes_by_class[class_id]]
+        yield {'type': 'chunk', 'index': index, 'classes': end, 'nodes': nodes, 'links': links_by_chunk[index]}
+
+    yield {'type': 'end'}
+
+
+def iter_ndjson(records: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    """Encode records as newline-delimited JSON."""
+    for record in records:
+        yield (json.dumps(record) + '\n').encode('utf-8')
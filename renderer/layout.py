@@ -0,0 +1,540 @@
+"""Server-side force-directed layout of class boxes, cached per graph hash."""
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from renderer.graph_analysis import node_layers
+
+
+DEFAULT_CACHE_DIR = Path(__file__).parent / "layout_cache"
+
+# Simulation bounds used by the frontend for small graphs
+MIN_BOUNDS = (2000.0, 1500.0)
+MARGIN = 50.0
+
+# Nodes per repulsion grid cell on average; pairs in neighbouring cells repel exactly
+NODES_PER_CELL = 4
+MIN_CELL_SIZE = 20.0
+
+
+def _class_boxes(graph_data):
+    """
+    Collect class ids, their box sizes and the class-to-class call pairs.
+
+    Box sizes follow the frontend: the class name or widest method sets the
+    width, each method adds a 40px row, plus 10px padding on every side.
+    """
+    nodes = {node['id']: node for node in graph_data.get('nodes', [])}
+    class_ids = sorted(node_id for node_id, node in nodes.items() if node['type'] == 'class')
+    class_methods = {class_id: [] for class_id in class_ids}
+    pairs = set()
+
+    for link in graph_data.get('links', []):
+        if link['type'] == 'contains' and link['source'] in class_methods:
+            class_methods[link['source']].append(link['target'])
+        elif link['type'] == 'calls':
+            source_class = nodes.get(link['source'], {}).get('class')
+            target_class = nodes.get(link['target'], {}).get('class')
+            if source_class and target_class and source_class != target_class:
+                pairs.add((source_class, target_class))
+
+    sizes = []
+    for class_id in class_ids:
+        class_name_width = max(len(nodes[class_id]['name']) * 9 + 20, 150)
+        method_width = 80
+        for method_id in class_methods[class_id]:
+            method = nodes.get(method_id)
+            if method:
+                method_width = max(method_width, len(method['name']) * 7 + 10)
+        width = max(class_name_width, method_width) + 20
+        height = 40 + len(class_methods[class_id]) * 40 + 20
+        sizes.append((width, height))
+
+    return class_ids, sizes, sorted(pairs)
+
+
+def graph_layout_hash(graph_data):
+    """Hash the parts of a graph that affect its layout: classes, box sizes and call pairs."""
+    return _boxes_hash(*_class_boxes(graph_data))
+
+
+def _boxes_hash(class_ids, sizes, pairs):
+    payload = json.dumps([class_ids, sizes, pairs], separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def layout_bounds(sizes):
+    """Simulation bounds: the frontend's 2000x1500 area, grown for large graphs."""
+    total_area = sum(width * height for width, height in sizes)
+    # Leave roughly three times the box area free so the layout can breathe
+    scale = max(1.0, np.sqrt(3.0 * total_area / (MIN_BOUNDS[0] * MIN_BOUNDS[1])))
+    return float(MIN_BOUNDS[0] * scale), float(MIN_BOUNDS[1] * scale)
+
+
+def _neighbour_pairs(positions, cell_size):
+    """
+    Find all node pairs in the same or adjacent grid cells.
+
+    Nodes are sorted by cell, so each cell is a contiguous slice; the pairs
+    for each of the nine neighbouring cell offsets are expanded with
+    np.repeat instead of a Python loop.
+
+    Returns:
+        Tuple (i, j) of index arrays with i < j
+    """
+    cells = np.floor(positions / cell_size).astype(np.int64)
+    cells -= cells.min(axis=0)
+    grid_width = cells[:, 0].max() + 3
+    keys = (cells[:, 1] + 1) * grid_width + (cells[:, 0] + 1)
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    unique_keys, starts, counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+
+    pair_i = []
+    pair_j = []
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            neighbour_keys = keys + dy * grid_width + dx
+            slot = np.searchsorted(unique_keys, neighbour_keys)
+            slot = np.minimum(slot, len(unique_keys) - 1)
+            found = unique_keys[slot] == neighbour_keys
+            node_counts = np.where(found, counts[slot], 0)
+            node_starts = starts[slot]
+
+            total = node_counts.sum()
+            if total == 0:
+                continue
+            i = np.repeat(np.arange(len(positions)), node_counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(node_counts) - node_counts, node_counts)
+            j = order[np.repeat(node_starts, node_counts) + offsets]
+            pair_i.append(i)
+            pair_j.append(j)
+
+    i = np.concatenate(pair_i)
+    j = np.concatenate(pair_j)
+    keep = i < j
+    return i[keep], j[keep]
+
+
+def _overlap_candidates(positions, half, cell_size):
+    """
+    Find the pairs of boxes that share a grid cell, as candidates for collision.
+
+    Every box is entered in each cell it covers, so a box larger than the
+    cells still meets every box it overlaps, and cells can follow the typical
+    box size instead of the largest one.
+
+    Returns:
+        Tuple (i, j) of index arrays with i < j, each pair once
+    """
+    count = len(positions)
+    low = np.floor((positions - half) / cell_size).astype(np.int64)
+    high = np.floor((positions + half) / cell_size).astype(np.int64)
+    span = high - low + 1
+    covered = span[:, 0] * span[:, 1]
+
+    # One entry per (box, covered cell)
+    box = np.repeat(np.arange(count), covered)
+    offset = np.arange(covered.sum()) - np.repeat(np.cumsum(covered) - covered, covered)
+    cell_x = low[box, 0] + offset % span[box, 0]
+    cell_y = low[box, 1] + offset // span[box, 0]
+    cell_x -= cell_x.min()
+    cell_y -= cell_y.min()
+    keys = cell_y * (cell_x.max() + 1) + cell_x
+
+    order = np.argsort(keys, kind='stable')
+    box = box[order]
+    _, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+    # Pair every entry with the entries after it in the same cell
+    entry = np.arange(len(box))
+    after = np.repeat(starts + counts, counts) - entry - 1
+    i = np.repeat(box, after)
+    partner = np.repeat(entry + 1, after) + np.arange(after.sum()) - np.repeat(np.cumsum(after) - after, after)
+    j = box[partner]
+
+    low_box, high_box = np.minimum(i, j), np.maximum(i, j)
+    distinct = low_box != high_box
+    pair_keys = np.unique(low_box[distinct] * count + high_box[distinct])
+    return pair_keys // count, pair_keys % count
+
+
+def _far_field(positions, cell_size, strength, forces):
+    """
+    Add the repulsion between well-separated groups of nodes, quadtree style.
+
+    The finest grid is the near field's (``cell_size``), and every coarser
+    level doubles the cells. At each level a node is pushed by the centre of
+    mass of every cell that is not next to its own but whose parent is next
+    to its parent: the cells that first become well separated from it there.
+    Together with the exact near field over neighbouring finest cells, every
+    pair of nodes is counted exactly once. Each level costs at most 27 cells
+    per node, and there are about log2(spread / cell_size) levels.
+
+    Args:
+        positions: Node positions
+        cell_size: Cell size of the finest grid, as used for the near field
+        strength: Repulsion strength (-charge * alpha)
+        forces: Force array to add to
+    """
+    cells = np.floor(positions / cell_size).astype(np.int64)
+    cells -= cells.min(axis=0)
+    # Offsets of the children of the parent's 3x3 neighbourhood, relative to the first one
+    child_x, child_y = np.meshgrid(np.arange(6), np.arange(6))
+    child_x = child_x.ravel()
+    child_y = child_y.ravel()
+
+    # Once every cell is next to every other, nothing is well separated any more
+    while (cells.max(axis=0) > 1).any():
+        grid_width = cells[:, 0].max() + 1
+        keys = cells[:, 1] * grid_width + cells[:, 0]
+        cell_keys, cell_index = np.unique(keys, return_inverse=True)
+        cell_index = cell_index.ravel()
+        mass = np.bincount(cell_index).astype(float)
+        center_x = np.bincount(cell_index, weights=positions[:, 0]) / mass
+        center_y = np.bincount(cell_index, weights=positions[:, 1]) / mass
+
+        # Candidate cells per node: (nodes, 36)
+        candidate_x = (cells[:, 0:1] >> 1) * 2 - 2 + child_x
+        candidate_y = (cells[:, 1:2] >> 1) * 2 - 2 + child_y
+        separated = ((np.abs(candidate_x - cells[:, 0:1]) > 1) | (np.abs(candidate_y - cells[:, 1:2]) > 1))
+        inside = (candidate_x >= 0) & (candidate_x < grid_width) & (candidate_y >= 0)
+        candidate_keys = candidate_y * grid_width + candidate_x
+        slot = np.minimum(np.searchsorted(cell_keys, candidate_keys), len(cell_keys) - 1)
+        occupied = separated & inside & (cell_keys[slot] == candidate_keys)
+
+        node, column = np.nonzero(occupied)
+        target = slot[node, column]
+        delta_x = positions[node, 0] - center_x[target]
+        delta_y = positions[node, 1] - center_y[target]
+        push = strength * mass[target] / np.maximum(delta_x ** 2 + delta_y ** 2, 1.0)
+        count = len(positions)
+        forces[:, 0] += np.bincount(node, weights=push * delta_x, minlength=count)
+        forces[:, 1] += np.bincount(node, weights=push * delta_y, minlength=count)
+
+        cells = cells >> 1
+
+
+def _scatter_add(target, index, values):
+    """Add rows of `values` into `target` at `index` (a much faster np.add.at for 2D points)."""
+    count = len(target)
+    target[:, 0] += np.bincount(index, weights=values[:, 0], minlength=count)
+    target[:, 1] += np.bincount(index, weights=values[:, 1], minlength=count)
+
+
+def compute_layout(graph_data, iterations=300, charge=-1000.0, link_distance=200.0,
+                   link_strength=0.3, x_strength=0.3, collision_strength=0.7, seed=0):
+    """
+    Lay out class boxes with a vectorised force simulation.
+
+    Mirrors the frontend's d3 forces: many-body repulsion, class-to-class
+    link springs, the layered x-pull and rectangular collision. Repulsion is
+    exact between nodes in neighbouring cells of a grid sized to hold a few
+    nodes per cell, and approximated by the centres of mass of a quadtree of
+    coarser cells further out (see _far_field), so a step costs about
+    O(N log N). Collision candidates come from a separate grid sized like
+    the typical box.
+
+    Args:
+        graph_data: Graph data from generate_d3_data
+        iterations: Number of simulation steps
+        charge: Many-body strength (negative repels, as in d3.forceManyBody)
+        link_distance: Rest length of class-to-class links
+        link_strength: Spring strength of class-to-class links
+        x_strength: Strength of the pull towards each class's x target
+        collision_strength: Strength of the rectangular collision push
+        seed: Random seed for the initial placement
+
+    Returns:
+        Dictionary with 'positions' ({class id: {'x', 'y'}}) and 'bounds'
+    """
+    class_ids, sizes, pairs = _class_boxes(graph_data)
+    node_count = len(class_ids)
+    bounds = layout_bounds(sizes)
+    if node_count == 0:
+        return {'positions': {}, 'bounds': {'width': bounds[0], 'height': bounds[1]}}
+
+    size = np.array(sizes, dtype=float)
+    half = size / 2
+    center = np.array([bounds[0] / 2, bounds[1] / 2])
+    position_of = {class_id: i for i, class_id in enumerate(class_ids)}
+
+    link_source = np.array([position_of[s] for s, t in pairs], dtype=np.int64)
+    link_target = np.array([position_of[t] for s, t in pairs], dtype=np.int64)
+
+    # Classes are pulled towards the x of their topological layer, like the frontend's _xWeight
+    successors = [[] for _ in range(node_count)]
+    for source, target in zip(link_source.tolist(), link_target.tolist()):
+        successors[source].append(target)
+    layers, layer_count = node_layers(node_count, successors)
+    x_weight = np.array(layers, dtype=float) / (layer_count - 1) if layer_count > 1 else np.full(node_count, 0.5)
+    x_target = 200 + x_weight * (bounds[0] - 500)
+
+    # Deduplicate undirected springs and weight them like d3.forceLink (1 / min degree)
+    undirected = {tuple(sorted(pair)) for pair in zip(link_source.tolist(), link_target.tolist())}
+    spring_i = np.array([a for a, b in undirected], dtype=np.int64)
+    spring_j = np.array([b for a, b in undirected], dtype=np.int64)
+    degree = np.bincount(np.concatenate([spring_i, spring_j]), minlength=node_count)
+    spring_bias = degree[spring_i] / np.maximum(degree[spring_i] + degree[spring_j], 1)
+    spring_weight = link_strength / np.maximum(np.minimum(degree[spring_i], degree[spring_j]), 1)
+
+    rng = np.random.default_rng(seed)
+    radius = 10.0 * np.sqrt(0.5 + np.arange(node_count))
+    angle = np.arange(node_count) * np.pi * (3 - np.sqrt(5))
+    positions = center + np.column_stack([radius * np.cos(angle), radius * np.sin(angle)])
+    positions += rng.normal(scale=1e-3, size=positions.shape)
+    velocities = np.zeros_like(positions)
+
+    # Collision cells follow the typical box; larger boxes cover several cells
+    collision_cell_size = float(np.median(size.max(axis=1)))
+    alpha = 1.0
+    alpha_min = 0.001
+    alpha_decay = 1 - alpha_min ** (1 / iterations)
+    velocity_decay = 0.4
+
+    for _ in range(iterations):
+        forces = np.zeros_like(positions)
+        # About NODES_PER_CELL nodes per cell of the area the nodes take up now
+        spread = np.maximum(np.ptp(positions, axis=0), 1.0)
+        cell_size = max(float(np.sqrt(spread[0] * spread[1] * NODES_PER_CELL / node_count)), MIN_CELL_SIZE)
+        near_i, near_j = _neighbour_pairs(positions, cell_size)
+
+        # Near field: exact pairwise repulsion
+        delta = positions[near_i] - positions[near_j]
+        distance_sq = np.maximum((delta ** 2).sum(axis=1), 1.0)
+        push = (-charge * alpha / distance_sq)[:, None] * delta
+        _scatter_add(forces, near_i, push)
+        _scatter_add(forces, near_j, -push)
+
+        # Far field: centres of mass of ever larger cells
+        _far_field(positions, cell_size, -charge * alpha, forces)
+
+        # Class-to-class springs
+        if len(spring_i):
+            delta = positions[spring_j] + velocities[spring_j] - positions[spring_i] - velocities[spring_i]
+            distance = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), 1e-6)
+            stretch = (distance - link_distance) / distance * alpha * spring_weight
+            correction = delta * stretch[:, None]
+            _scatter_add(velocities, spring_j, -correction * spring_bias[:, None])
+            _scatter_add(velocities, spring_i, correction * (1 - spring_bias)[:, None])
+
+        # Horizontal pull towards the in/out target and a weak centring pull
+        forces[:, 0] += (x_target - positions[:, 0]) * x_strength * alpha
+        forces[:, 1] += (center[1] - positions[:, 1]) * 0.02 * alpha
+
+        velocities += forces
+        velocities *= 1 - velocity_decay
+        positions += velocities
+
+        # Rectangular collision: push overlapping boxes apart along the axis of least overlap
+        near_i, near_j = _overlap_candidates(positions, half, collision_cell_size)
+        delta = positions[near_i] - positions[near_j]
+        overlap = half[near_i] + half[near_j] - np.abs(delta)
+        colliding = (overlap > 0).all(axis=1)
+        if colliding.any():
+            near_i, near_j = near_i[colliding], near_j[colliding]
+            delta, overlap = delta[colliding], overlap[colliding]
+            along_x = overlap[:, 0] < overlap[:, 1]
+            direction = np.where(delta >= 0, 1.0, -1.0)
+            push = np.zeros_like(delta)
+            push[along_x, 0] = direction[along_x, 0] * overlap[along_x, 0]
+            push[~along_x, 1] = direction[~along_x, 1] * overlap[~along_x, 1]
+            push *= collision_strength / 2
+            _scatter_add(positions, near_i, push)
+            _scatter_add(positions, near_j, -push)
+
+        positions[:, 0] = np.clip(positions[:, 0], MARGIN, bounds[0] - MARGIN)
+        positions[:, 1] = np.clip(positions[:, 1], MARGIN, bounds[1] - MARGIN)
+
+        alpha += (0 - alpha) * alpha_decay
+        # Stop early once the layout has settled
+        if alpha < alpha_min or np.abs(velocities).max() < 0.05:
+            break
+
+    return {
+        'positions': {
+            class_id: {'x': float(positions[i, 0]), 'y': float(positions[i, 1])}
+            for i, class_id in enumerate(class_ids)
+        },
+        'bounds': {'width': bounds[0], 'height': bounds[1]}
+    }
+
+
+class LayoutCache:
+    """
+    Stores computed layouts as <cache_dir>/<graph hash>.json.
+
+    lookup_or_schedule computes missing layouts on a background thread, one
+    per graph hash, so requests never wait for the simulation.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self._lock = threading.Lock()
+        # Graph hash -> Event set once its background computation has finished
+        self._pending = {}
+
+    def _cache_file(self, layout_hash):
+        # Hashes are hex digests; anything else cannot name a cache file
+        if not layout_hash or any(c not in '0123456789abcdef' for c in layout_hash):
+            raise KeyError(layout_hash)
+        return self.cache_dir / f"{layout_hash}.json"
+
+    def get(self, layout_hash):
+        """Return a cached layout, or None if there is none."""
+        cache_file = self._cache_file(layout_hash)
+        if not cache_file.exists():
+            return None
+        try:
+            with open(cache_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, layout_hash, layout):
+        """Store a layout for a graph hash."""
+        cache_file = self._cache_file(layout_hash)
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_file, 'w') as f:
+            json.dump(layout, f)
+
+    def update_positions(self, layout_hash, positions, source='client'):
+        """
+        Merge positions settled elsewhere (e.g. in the browser) into a cached layout.
+
+        Only classes that are already part of the cached layout are updated,
+        so a client cannot grow the cache file with unknown ids.
+
+        Args:
+            layout_hash: Graph hash the positions belong to
+            positions: Dictionary of class id -> {'x', 'y'}
+            source: Recorded as the layout's 'source'
+
+        Returns:
+            Number of classes whose position was updated
+
+        Raises:
+            KeyError: If no layout is cached for the hash
+            ValueError: If a position is not a pair of finite numbers
+        """
+        layout = self.get(layout_hash)
+        if layout is None:
+            raise KeyError(layout_hash)
+
+        cached_positions = layout.get('positions', {})
+        updated = 0
+        for class_id, position in positions.items():
+            if class_id not in cached_positions:
+                continue
+            try:
+                x = float(position['x'])
+                y = float(position['y'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Invalid position for {class_id}")
+            if not (np.isfinite(x) and np.isfinite(y)):
+                raise ValueError(f"Invalid position for {class_id}")
+            cached_positions[class_id] = {'x': x, 'y': y}
+            updated += 1
+
+        if updated:
+            layout['source'] = source
+            self.put(layout_hash, layout)
+        return updated
+
+    def lookup(self, graph_data):
+        """
+        Return the cached layout for a graph without computing one.
+
+        Returns:
+            Dictionary with 'hash', 'positions', 'bounds' and 'source', or None on a miss
+        """
+        layout_hash = graph_layout_hash(graph_data)
+        layout = self.get(layout_hash)
+        if layout is not None:
+            layout['hash'] = layout_hash
+        return layout
+
+    def get_or_compute(self, graph_data):
+        """
+        Return the layout for a graph, computing and caching it on a miss.
+
+        Returns:
+            Dictionary with 'hash', 'positions', 'bounds' and 'source'
+        """
+        layout_hash = graph_layout_hash(graph_data)
+        layout = self.get(layout_hash)
+        if layout is None:
+            layout = compute_layout(graph_data)
+            layout['source'] = 'server'
+            self.put(layout_hash, layout)
+        layout['hash'] = layout_hash
+        return layout
+
+    def lookup_or_schedule(self, graph_data):
+        """
+        Return the cached layout for a graph, or start computing it in the background.
+
+        On a miss the returned layout has no positions and 'source' set to
+        'pending'; its bounds are already final. Later calls return the cached
+        layout once the computation has finished (see wait).
+
+        Returns:
+            Dictionary with 'hash', 'positions', 'bounds' and 'source'
+        """
+        class_ids, sizes, pairs = _class_boxes(graph_data)
+        layout_hash = _boxes_hash(class_ids, sizes, pairs)
+        layout = self.get(layout_hash)
+        if layout is not None:
+            layout['hash'] = layout_hash
+            return layout
+
+        with self._lock:
+            if layout_hash not in self._pending:
+                self._pending[layout_hash] = threading.Event()
+                # The request may go on to add keys to graph_data, so the thread gets its own lists
+                graph_copy = {'nodes': list(graph_data.get('nodes', [])), 'links': list(graph_data.get('links', []))}
+                threading.Thread(target=self._compute_in_background, args=(layout_hash, graph_copy),
+                                 name=f'layout-{layout_hash[:8]}', daemon=True).start()
+
+        width, height = layout_bounds(sizes)
+        return {
+            'hash': layout_hash,
+            'positions': {},
+            'bounds': {'width': width, 'height': height},
+            'source': 'pending'
+        }
+
+    def wait(self, layout_hash, timeout=None):
+        """
+        Wait for a background computation started by lookup_or_schedule.
+
+        Args:
+            layout_hash: Graph hash of the pending layout
+            timeout: Seconds to wait at most, or None to wait until it is done
+
+        Returns:
+            The cached layout (with 'hash'), or None if it is not ready in time
+        """
+        with self._lock:
+            done = self._pending.get(layout_hash)
+        if done is not None and not done.wait(timeout):
+            return None
+        layout = self.get(layout_hash)
+        if layout is not None:
+            layout['hash'] = layout_hash
+        return layout
+
+    def _compute_in_background(self, layout_hash, graph_data):
+        # A failure is reported by the thread; waiters then find no cached layout
+        try:
+            layout = compute_layout(graph_data)
+            layout['source'] = 'server'
+            self.put(layout_hash, layout)
+        finally:
+            with self._lock:
+                self._pending.pop(layout_hash).set()
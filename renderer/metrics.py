@@ -0,0 +1,171 @@
+"""Prometheus text metrics of the API and of the tracer that produced the trace.
+
+API requests are timed per method, route template and status by a middleware,
+up to the point the response starts (streamed bodies are not included). JSON
+encoding of response bodies is timed separately per route. The tracer stats
+of the current trace data (``tracer_stats``, see renderer.tracer_stats) are
+exported as gauges, since they describe that one trace rather than counting
+up while the server runs.
+
+Rendered by hand in the text exposition format (version 0.0.4), so the
+renderer needs no Prometheus client library.
+"""
+
+import threading
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# The response adds the charset
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# JSON encoding time of the current request, filled in by the response class
+serialization_seconds: ContextVar[Optional[List[float]]] = ContextVar('serialization_seconds', default=None)
+
+# Tracer stats exported as gauges: (stats key, metric name, help)
+TRACER_GAUGES = (
+    ('events', 'callpath_tracer_events', 'Tracer callbacks handled'),
+    ('calls_seen', 'callpath_tracer_calls_seen', 'Calls the tracer saw'),
+    ('calls_recorded', 'callpath_tracer_calls_recorded', 'Calls the tracer recorded'),
+    ('filter_cache_hits', 'callpath_tracer_filter_cache_hits', 'File filter decisions taken from the cache'),
+    ('filter_cache_misses', 'callpath_tracer_filter_cache_misses', 'File filter decisions computed'),
+    ('peak_depth', 'callpath_tracer_peak_stack_depth', 'Deepest call stack seen'),
+    ('callback_time_ns', 'callpath_tracer_callback_seconds', 'Time spent in tracer callbacks (sampled estimate)'),
+    ('callback_mean_ns', 'callpath_tracer_callback_mean_seconds', 'Mean time of one tracer callback (sampled)'),
+    ('tracer_time_ns', 'callpath_tracer_overhead_seconds', 'Measured tracer time, including dispatch'),
+    ('buffer_bytes', 'callpath_tracer_buffer_bytes', 'Approximate memory held for the trace output'),
+    ('dropped_calls', 'callpath_tracer_dropped_calls', 'Calls the collector never received'),
+    ('truncated_context_calls', 'callpath_tracer_truncated_context_calls', 'Calls beyond the calling context tree limits'),
+    ('evicted_instances', 'callpath_tracer_evicted_instances', 'Instances evicted from the instance registry'),
+)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class LatencyHistogram:
+    """Cumulative-bucket histogram of durations in seconds."""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+
+    def lines(self, name: str, labels: Dict[str, str]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels({**labels, "le": _number(bound)})} {cumulative}')
+        lines.append(f'{name}_bucket{_labels({**labels, "le": "+Inf"})} {self.count}')
+        lines.append(f'{name}_sum{_labels(labels)} {_number(self.sum)}')
+        lines.append(f'{name}_count{_labels(labels)} {self.count}')
+        return lines
+
+
+class ApiMetrics:
+    """Request and serialization latencies of the API, safe to update from any thread."""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # (method, route, status) -> request count
+        self._requests: Dict[Tuple[str, str, str], int] = {}
+        # (method, route) -> LatencyHistogram
+        self._latency: Dict[Tuple[str, str], LatencyHistogram] = {}
+        # route -> LatencyHistogram
+        self._serialization: Dict[str, LatencyHistogram] = {}
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float,
+                        serialization: Optional[float] = None):
+        """
+        Record one handled request.
+
+        Args:
+            method: HTTP method
+            route: Route template (e.g. "/api/runs/{run_id}"), not the raw path
+            status: Response status code
+            seconds: Time until the response started
+            serialization: Time spent encoding the JSON body, if it was JSON
+        """
+        with self._lock:
+            key = (method, route, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            histogram = self._latency.get((method, route))
+            if histogram is None:
+                histogram = self._latency[(method, route)] = LatencyHistogram(self.buckets)
+            histogram.observe(seconds)
+            if serialization is not None:
+                histogram = self._serialization.get(route)
+                if histogram is None:
+                    histogram = self._serialization[route] = LatencyHistogram(self.buckets)
+                histogram.observe(serialization)
+
+    def render(self, tracer_stats: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Render all metrics in the Prometheus text format.
+
+        Args:
+            tracer_stats: Tracer stats of the current trace, if it has them
+        """
+        lines = [
+            '# HELP callpath_api_requests_total API requests handled',
+            '# TYPE callpath_api_requests_total counter',
+        ]
+        with self._lock:
+            for (method, route, status), count in sorted(self._requests.items()):
+                lines.append(f'callpath_api_requests_total'
+                             f'{_labels({"method": method, "route": route, "status": status})} {count}')
+            lines += [
+                '# HELP callpath_api_request_duration_seconds Time until the response starts',
+                '# TYPE callpath_api_request_duration_seconds histogram',
+            ]
+            for (method, route), histogram in sorted(self._latency.items()):
+                lines += histogram.lines('callpath_api_request_duration_seconds', {'method': method, 'route': route})
+            lines += [
+                '# HELP callpath_api_serialization_seconds Time spent encoding JSON response bodies',
+                '# TYPE callpath_api_serialization_seconds histogram',
+            ]
+            for route, histogram in sorted(self._serialization.items()):
+                lines += histogram.lines('callpath_api_serialization_seconds', {'route': route})
+
+        if tracer_stats:
+            for key, name, help_text in TRACER_GAUGES:
+                if key not in tracer_stats:
+                    continue
+                value = tracer_stats[key]
+                if name.endswith('_seconds'):
+                    value = value / 1e9
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {_number(value)}']
+            lines += [
+                '# HELP callpath_tracer_calls_skipped Calls the tracer skipped, by reason',
+                '# TYPE callpath_tracer_calls_skipped gauge',
+            ]
+            for reason, count in sorted(tracer_stats.get('calls_skipped', {}).items()):
+                lines.append(f'callpath_tracer_calls_skipped{_labels({"reason": reason})} {count}')
+        return '\n'.join(lines) + '\n'
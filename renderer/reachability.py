@@ -0,0 +1,313 @@
+"""Precomputed reachability and path queries over the method call graph."""
+
+from collections import deque
+
+from renderer.graph_analysis import condense, strongly_connected_components
+
+
+def _iter_bits(bits):
+    """Yield the positions of the set bits in an integer bitset."""
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+
+class Reachability:
+    """Reachability bitsets over the condensed call graph of a GraphIndex.
+
+    Cycles are collapsed into strongly connected components, and every
+    component gets a bitset (a Python int) of the components it can reach
+    downstream and upstream. "Can A reach B" is then a single bit test, and
+    the full reachable set is read straight out of the bitset. A node only
+    reaches itself when it is on a cycle.
+    """
+
+    def __init__(self, graph_index):
+        self.graph_index = graph_index
+        self.method_ids = sorted(
+            node_id for node_id, node in graph_index.nodes.items() if node['type'] == 'method'
+        )
+        self.position = {method_id: i for i, method_id in enumerate(self.method_ids)}
+
+        node_count = len(self.method_ids)
+        self.successors = [[] for _ in range(node_count)]
+        self.predecessors = [[] for _ in range(node_count)]
+        for method_id, links in graph_index.outgoing.items():
+            source = self.position.get(method_id)
+            if source is None:
+                continue
+            for link in links:
+                target = self.position.get(link['target'])
+                if target is not None:
+                    self.successors[source].append(target)
+                    self.predecessors[target].append(source)
+
+        # Condense cycles; components come out sinks-first
+        self.components = strongly_connected_components(node_count, self.successors)
+        self.component_of, component_successors = condense(self.successors, self.components)
+        # Components whose members reach themselves: several methods, or one that calls itself
+        self.cyclic = [
+            len(members) > 1 or members[0] in self.successors[members[0]]
+            for members in self.components
+        ]
+        component_predecessors = [[] for _ in self.components]
+        for component_id, targets in enumerate(component_successors):
+            for target in targets:
+                component_predecessors[target].append(component_id)
+
+        # Sinks-first order means successors are finished before their callers
+        self.downstream = [0] * len(self.components)
+        for component_id in range(len(self.components)):
+            bits = 1 << component_id
+            for successor in component_successors[component_id]:
+                bits |= self.downstream[successor]
+            self.downstream[component_id] = bits
+
+        self.upstream = [0] * len(self.components)
+        for component_id in reversed(range(len(self.components))):
+            bits = 1 << component_id
+            for predecessor in component_predecessors[component_id]:
+                bits |= self.upstream[predecessor]
+            self.upstream[component_id] = bits
+
+    def _positions(self, node_id):
+        """Resolve a class or method id to method positions."""
+        return [
+            self.position[method_id]
+            for method_id in self.graph_index.seed_methods(node_id)
+            if method_id in self.position
+        ]
+
+    def can_reach(self, from_id, to_id):
+        """Check whether any call path (of at least one call) leads from one method to another."""
+        source = self.component_of[self.position[from_id]]
+        target = self.component_of[self.position[to_id]]
+        if source == target:
+            return self.cyclic[source]
+        return bool((self.downstream[source] >> target) & 1)
+
+    def _beyond(self, closure, component_id):
+        """A component's reachable set without the component itself, unless it is on a cycle."""
+        if self.cyclic[component_id]:
+            return closure[component_id]
+        return closure[component_id] & ~(1 << component_id)
+
+    def _expand(self, bits):
+        """Turn a component bitset into the sorted method ids it covers."""
+        members = []
+        for component_id in _iter_bits(bits):
+            members.extend(self.components[component_id])
+        return members
+
+    def reachable(self, node_id, direction='out'):
+        """
+        Return every method reachable from a node and the call links on those paths.
+
+        Args:
+            node_id: Method id or class id (a class starts from all its methods)
+            direction: 'out' for everything it calls, 'in' for everything that
+                       calls it, 'both' for the union
+
+        Returns:
+            Dictionary with the reached method ids (the node's own methods only if
+            they are on a cycle or reached from another of them) and the call
+            links between them and from or to the node
+        """
+        if direction not in ('in', 'out', 'both'):
+            raise ValueError(f"Invalid direction: {direction}")
+
+        positions = self._positions(node_id)
+        links = []
+        downstream_ids = []
+        upstream_ids = []
+
+        if direction in ('out', 'both'):
+            bits = 0
+            for position in positions:
+                bits |= self._beyond(self.downstream, self.component_of[position])
+            members = self._expand(bits)
+            downstream_ids = sorted(self.method_ids[m] for m in members)
+            for source in set(members).union(positions):
+                for target in self.successors[source]:
+                    links.append({
+                        'source': self.method_ids[source],
+                        'target': self.method_ids[target],
+                        'direction': 'out'
+                    })
+
+        if direction in ('in', 'both'):
+            bits = 0
+            for position in positions:
+                bits |= self._beyond(self.upstream, self.component_of[position])
+            members = self._expand(bits)
+            upstream_ids = sorted(self.method_ids[m] for m in members)
+            for target in set(members).union(positions):
+                for source in self.predecessors[target]:
+                    links.append({
+                        'source': self.method_ids[source],
+                        'target': self.method_ids[target],
+                        'direction': 'in'
+                    })
+
+        return {
+            'node': node_id,
+            'downstream': downstream_ids,
+            'upstream': upstream_ids,
+            'links': links
+        }
+
+    def _shortest_path(self, source, target, blocked_nodes, blocked_edges):
+        """Breadth-first shortest path that avoids blocked nodes and edges."""
+        target_component = self.component_of[target]
+        parents = {source: None}
+        queue = deque([source])
+
+        while queue:
+            node = queue.popleft()
+            if node == target:
+                path = []
+                while node is not None:
+                    path.append(node)
+                    node = parents[node]
+                return path[::-1]
+
+            for successor in self.successors[node]:
+                if successor in parents or successor in blocked_nodes:
+                    continue
+                if (node, successor) in blocked_edges:
+                    continue
+                # Prune branches that cannot reach the target at all
+                if not (self.downstream[self.component_of[successor]] >> target_component) & 1:
+                    continue
+                parents[successor] = node
+                queue.append(successor)
+
+        return None
+
+    def _k_shortest_paths(self, source, target, k):
+        """Yen's algorithm for the k shortest simple paths (unit edge weights)."""
+        first = self._shortest_path(source, target, set(), set())
+        if first is None:
+            return []
+
+        paths = [first]
+        candidates = []
+        while len(paths) < k:
+            previous = paths[-1]
+            for i in range(len(previous) - 1):
+                spur_node = previous[i]
+                root = previous[:i + 1]
+
+                blocked_edges = set()
+                for path in paths:
+                    if path[:i + 1] == root and len(path) > i + 1:
+                        blocked_edges.add((path[i], path[i + 1]))
+                blocked_nodes = set(root[:-1])
+
+                spur = self._shortest_path(spur_node, target, blocked_nodes, blocked_edges)
+                if spur is not None:
+                    candidate = root[:-1] + spur
+                    if candidate not in paths and candidate not in candidates:
+                        candidates.append(candidate)
+
+            if not candidates:
+                break
+            candidates.sort(key=len)
+            paths.append(candidates.pop(0))
+
+        return paths
+
+    def _all_simple_paths(self, source, target, limit, max_length):
+        """Depth-first enumeration of simple paths, pruned by reachability."""
+        target_component = self.component_of[target]
+        paths = []
+        path = [source]
+        on_path = {source}
+        # Each work item is (node, position in its successor list)
+        work = [(source, 0)]
+
+        while work and len(paths) < limit:
+            node, position = work[-1]
+            node_successors = self.successors[node]
+
+            if node == target or position >= len(node_successors) or len(path) > max_length:
+                if node == target:
+                    paths.append(list(path))
+                work.pop()
+                on_path.discard(path.pop())
+                continue
+
+            work[-1] = (node, position + 1)
+            successor = node_successors[position]
+            if successor in on_path:
+                continue
+            if not (self.downstream[self.component_of[successor]] >> target_component) & 1:
+                continue
+            path.append(successor)
+            on_path.add(successor)
+            work.append((successor, 0))
+
+        return paths
+
+    def _cycles_through(self, node, k, mode, max_length):
+        """Cycles from a method back to itself: the shortest one per first call, or all in depth-first order."""
+        cycles = []
+        for successor in self.successors[node]:
+            if successor == node:
+                cycles.append([node, node])
+            elif mode == 'shortest':
+                rest = self._shortest_path(successor, node, set(), set())
+                if rest is not None:
+                    cycles.append([node] + rest)
+            else:
+                rest = self._all_simple_paths(successor, node, k - len(cycles), max_length - 1)
+                cycles.extend([node] + path for path in rest)
+            if mode == 'all' and len(cycles) >= k:
+                break
+        if mode == 'shortest':
+            cycles.sort(key=len)
+        return cycles[:k]
+
+    def paths(self, from_id, to_id, k=5, mode='shortest', max_length=20):
+        """
+        Find call paths from one method to another.
+
+        Args:
+            from_id: Method id the paths start at
+            to_id: Method id the paths end at
+            k: Maximum number of paths to return
+            mode: 'shortest' for the k shortest simple paths, 'all' for up to k
+                  simple paths in depth-first order (for a method on a cycle
+                  and itself, the cycles through it)
+            max_length: Maximum number of hops per path in 'all' mode
+
+        Returns:
+            Dictionary with the paths as lists of method ids
+        """
+        if mode not in ('shortest', 'all'):
+            raise ValueError(f"Invalid mode: {mode}")
+        if from_id not in self.position:
+            raise KeyError(from_id)
+        if to_id not in self.position:
+            raise KeyError(to_id)
+
+        source = self.position[from_id]
+        target = self.position[to_id]
+        reachable = self.can_reach(from_id, to_id)
+
+        found = []
+        if reachable and k > 0:
+            if source == target:
+                found = self._cycles_through(source, k, mode, max_length)
+            elif mode == 'shortest':
+                found = self._k_shortest_paths(source, target, k)
+            else:
+                found = self._all_simple_paths(source, target, k, max_length)
+
+        return {
+            'from': from_id,
+            'to': to_id,
+            'reachable': reachable,
+            'paths': [[self.method_ids[node] for node in path] for path in found]
+        }
@@ -10,6 +10,12 @@ const class_box_attrs = {
     "stroke-width": 2
 };
 
+// A collapsed cycle: one box standing for all classes of a strongly connected component
+const cycle_box_attrs = {
+    fill: "rgba(142, 68, 173, 0.12)",
+    stroke: "#8e44ad"
+};
+
 const class_name_attrs = {
     "text-anchor": "middle",
     fill: "#2c3e50",
@@ -32,6 +38,13 @@ const method_text_attrs = {
     "font-size": "11px"
 };
 
+const instance_count_attrs = {
+    "text-anchor": "end",
+    fill: "#8e44ad",
+    "font-weight": "bold",
+    "font-size": "10px"
+};
+
 const calls_link_attrs = {
     "stroke-width": 2,
     "stroke-dasharray": "3,3",
@@ -54,251 +67,344 @@ const arrowhead_path_attrs = {
 };
 
 // Helper functions for path highlighting
-function highlightPaths(sourceId, targetId, callsLink, classNode, data, methodNodes, classMethodsMap) {
-    // Find all paths leading TO the source (source paths)
-    const sourcePaths = new Set();
-    const visitedNodes = new Set();
 
-    function findSourcePaths(nodeId) {
-        if (visitedNodes.has(nodeId)) return;
-        visitedNodes.add(nodeId);
+// Resolve a link endpoint to its node id (d3 may have replaced it with the node object)
+function linkEndpointId(endpoint) {
+    return typeof endpoint === 'string' ? endpoint : (endpoint?.id || endpoint);
+}
 
-        // Find all links that have this node as target
-        callsLink.each(function(d) {
-            const linkTargetId = typeof d.target === 'string' ? d.target : (d.target?.id || d.target);
-            if (linkTargetId === nodeId) {
-                const linkSourceId = typeof d.source === 'string' ? d.source : (d.source?.id || d.source);
-                sourcePaths.add(linkSourceId + '::' + linkTargetId);
-                findSourcePaths(linkSourceId); // Recursively find paths leading to this source
-            }
+// Build element lookups once per render, so a hover only walks the edges it
+// reaches (through the model's adjacency maps) and only touches the elements it changes
+function buildHighlightIndex(model, callsLink, classNode, classEdge) {
+    const index = {
+        outgoing: model.outgoing,  // method id -> calls links leaving it
+        incoming: model.incoming,  // method id -> calls links entering it
+        linkElements: new Map(),   // link datum -> path element
+        classEdgeElements: new Map(), // link datum -> path element of its collapsed class edge
+        methodElements: new Map(), // method id -> method box element
+        methodClass: new Map(),    // method id -> class id
+        classElements: new Map(),  // class id -> class group element
+        highlighted: []            // [element, className] pairs to undo on clear
+    };
+
+    callsLink.each(function(d) {
+        index.linkElements.set(d, this);
+    });
+    
+    classEdge.each(function(edge) {
+        edge.links.forEach(link => index.classEdgeElements.set(link, this));
+    });
+
+    classNode.each(function(d) {
+        index.classElements.set(d.id, this);
+        d3.select(this).selectAll(".method-box").each(function(method) {
+            index.methodElements.set(method.id, this);
         });
-    }
+    });
+    // Methods of a collapsed cycle have no box of their own; they light up the cycle's box
+    model.methodSlots.forEach((slot, methodId) => index.methodClass.set(methodId, slot.classNode.id));
+
+    return index;
+}
 
-    // Find all paths leading FROM the target (target paths)
-    const targetPaths = new Set();
-    const visitedTargetNodes = new Set();
+function markHighlighted(index, element, className) {
+    if (!element || element.classList.contains(className)) return;
+    element.classList.add(className);
+    index.highlighted.push([element, className]);
+}
 
-    function findTargetPaths(nodeId) {
-        if (visitedTargetNodes.has(nodeId)) return;
-        visitedTargetNodes.add(nodeId);
+// Iterative traversal over one adjacency map; returns the links and nodes reached
+function traverseLinks(startIds, adjacency, nextNodeId) {
+    const visitedNodes = new Set(startIds);
+    const stack = [...startIds];
+    const reachedLinks = [];
 
-        // Find all links that have this node as source
-        callsLink.each(function(d) {
-            const linkSourceId = typeof d.source === 'string' ? d.source : (d.source?.id || d.source);
-            if (linkSourceId === nodeId) {
-                const linkTargetId = typeof d.target === 'string' ? d.target : (d.target?.id || d.target);
-                targetPaths.add(linkSourceId + '::' + linkTargetId);
-                findTargetPaths(linkTargetId); // Recursively find paths from this target
+    while (stack.length) {
+        const links = adjacency.get(stack.pop());
+        if (!links) continue;
+        for (const link of links) {
+            reachedLinks.push(link);
+            const nextId = nextNodeId(link);
+            if (!visitedNodes.has(nextId)) {
+                visitedNodes.add(nextId);
+                stack.push(nextId);
             }
-        });
+        }
     }
 
-    findSourcePaths(sourceId);
-    findTargetPaths(targetId);
+    return { links: reachedLinks, nodes: visitedNodes };
+}
 
-    // Highlight source paths (leading TO)
-    callsLink.each(function(d) {
-        const linkSourceId = typeof d.source === 'string' ? d.source : (d.source?.id || d.source);
-        const linkTargetId = typeof d.target === 'string' ? d.target : (d.target?.id || d.target);
-        const linkKey = linkSourceId + '::' + linkTargetId;
+// Mark a calls link and the class edge that stands for it when zoomed out
+function highlightLink(index, link, className) {
+    markHighlighted(index, index.linkElements.get(link), className);
+    markHighlighted(index, index.classEdgeElements.get(link), className);
+}
 
-        if (sourcePaths.has(linkKey)) {
-            d3.select(this).classed("source-path", true);
-        }
-        if (targetPaths.has(linkKey)) {
-            d3.select(this).classed("target-path", true);
-        }
+function highlightNodes(index, nodeIds) {
+    nodeIds.forEach(nodeId => {
+        markHighlighted(index, index.methodElements.get(nodeId), "highlighted-method");
+        markHighlighted(index, index.classElements.get(index.methodClass.get(nodeId) || nodeId), "highlighted-class");
     });
+}
 
-    // Highlight source and target nodes
-    const allHighlightedNodes = new Set();
-    sourcePaths.forEach(pathKey => {
-        const [srcId] = pathKey.split('::');
-        allHighlightedNodes.add(srcId);
-    });
-    targetPaths.forEach(pathKey => {
-        const [, tgtId] = pathKey.split('::');
-        allHighlightedNodes.add(tgtId);
-    });
-    allHighlightedNodes.add(sourceId);
-    allHighlightedNodes.add(targetId);
+function highlightPaths(sourceId, targetId, index) {
+    // Paths leading TO the source and paths leading FROM the target
+    const sourcePaths = traverseLinks([sourceId], index.incoming, link => linkEndpointId(link.source));
+    const targetPaths = traverseLinks([targetId], index.outgoing, link => linkEndpointId(link.target));
 
-    // Highlight class and method nodes
-    classNode.each(function(d) {
-        const classGroup = d3.select(this);
-        const methods = classMethodsMap[d.id] || [];
-        let hasHighlightedMethod = false;
+    sourcePaths.links.forEach(link => highlightLink(index, link, "source-path"));
+    targetPaths.links.forEach(link => highlightLink(index, link, "target-path"));
 
-        methods.forEach(methodId => {
-            if (allHighlightedNodes.has(methodId)) {
-                hasHighlightedMethod = true;
-                classGroup.select(`[data-method-id="${methodId}"]`)
-                    .classed("highlighted-method", true);
-            }
-        });
+    highlightNodes(index, sourcePaths.nodes);
+    highlightNodes(index, targetPaths.nodes);
+}
 
-        if (hasHighlightedMethod || allHighlightedNodes.has(d.id)) {
-            classGroup.classed("highlighted-class", true);
-        }
-    });
+// Precomputed reachability of the current trace's call graph on the server
+// (/api/graph/reachable), one request per node id. null while the page shows a
+// graph the server has not indexed (a run diff, the import layer); those are
+// walked in the browser instead.
+let serverReachable = null;
+
+function useServerQueries(enabled) {
+    serverReachable = enabled ? new Map() : null;
 }
 
-// New function for highlighting all paths from a starting node (for head nodes)
-function highlightAllPathsFromNode(startNodeId, callsLink, classNode, data, methodNodes, classMethodsMap) {
-    const allPaths = new Set();
-    const allHighlightedNodes = new Set();
-    const visitedNodes = new Set();
+function fetchReachable(nodeId) {
+    let request = serverReachable.get(nodeId);
+    if (!request) {
+        request = fetch('/api/graph/reachable?' + new URLSearchParams({ node: nodeId, direction: 'out' }).toString())
+            .then(response => response.ok ? response.json() : Promise.reject(new Error(response.statusText)));
+        serverReachable.set(nodeId, request);
+    }
+    return request;
+}
 
-    function traverseFromNode(nodeId) {
-        if (visitedNodes.has(nodeId)) return;
-        visitedNodes.add(nodeId);
-        allHighlightedNodes.add(nodeId);
+// The model's calls links for {source, target} id pairs; links not in the model are skipped
+function modelLinks(model, pairs) {
+    const links = [];
+    pairs.forEach(pair => {
+        const link = (model.outgoing.get(pair.source) || []).find(l => linkEndpointId(l.target) === pair.target);
+        if (link) links.push(link);
+    });
+    return links;
+}
 
-        // Find all links that have this node as source
-        callsLink.each(function(d) {
-            const linkSourceId = typeof d.source === 'string' ? d.source : (d.source?.id || d.source);
-            if (linkSourceId === nodeId) {
-                const linkTargetId = typeof d.target === 'string' ? d.target : (d.target?.id || d.target);
-                const linkKey = linkSourceId + '::' + linkTargetId;
-                allPaths.add(linkKey);
-                allHighlightedNodes.add(linkTargetId);
-                // Recursively traverse from the target
-                traverseFromNode(linkTargetId);
-            }
-        });
+// Everything a node reaches downstream and the links on the way, as traverseLinks
+// returns it: from the server's index when it has the graph, otherwise by walking
+// the model. startIds are the methods the node stands for (a class's methods).
+// A collapsed cycle is not a node of the server's graph, so it is always walked here.
+async function reachableFrom(nodeId, startIds, model) {
+    if (serverReachable && model.nodeById.has(nodeId)) {
+        try {
+            const reached = await fetchReachable(nodeId);
+            return { links: modelLinks(model, reached.links), nodes: new Set([...startIds, ...reached.downstream]) };
+        } catch (error) {
+            // Ask again on the next hover; walk the model this time
+            serverReachable.delete(nodeId);
+        }
     }
+    return traverseLinks(startIds, model.outgoing, link => linkEndpointId(link.target));
+}
 
-    // Start traversal from the given node
-    traverseFromNode(startNodeId);
+// Methods a class box stands for: its visible methods, or those of every class of a collapsed cycle
+function boxMethodIds(model, classId) {
+    return model.cycleMethods.get(classId) || model.classMethodsMap[classId] || [];
+}
 
-    // Highlight all found paths
-    callsLink.each(function(d) {
-        const linkSourceId = typeof d.source === 'string' ? d.source : (d.source?.id || d.source);
-        const linkTargetId = typeof d.target === 'string' ? d.target : (d.target?.id || d.target);
-        const linkKey = linkSourceId + '::' + linkTargetId;
+// Id of the class box a method is drawn in: its class, or the collapsed cycle standing for it
+function boxIdOfMethod(model, methodId) {
+    const slot = model.methodSlots.get(methodId);
+    return slot ? slot.classNode.id : model.nodeById.get(methodId)?.class;
+}
 
-        if (allPaths.has(linkKey)) {
-            d3.select(this).classed("target-path", true);
-        }
+// Hover highlight still wanted: bumped by every new highlight and every clear
+let highlightGeneration = 0;
+
+// Highlight all paths from a node (a method, or a class and all its methods) once they are known
+function highlightAllPathsFromNode(nodeId, startIds, index, model) {
+    const generation = ++highlightGeneration;
+    reachableFrom(nodeId, startIds, model).then(reached => {
+        if (generation !== highlightGeneration) return;
+        reached.links.forEach(link => highlightLink(index, link, "target-path"));
+        highlightNodes(index, reached.nodes);
     });
+}
 
-    // Highlight all nodes in the traversal
-    classNode.each(function(d) {
-        const classGroup = d3.select(this);
-        const methods = classMethodsMap[d.id] || [];
-        let hasHighlightedMethod = false;
+function clearHighlights(index) {
+    highlightGeneration++;
+    index.highlighted.forEach(([element, className]) => element.classList.remove(className));
+    index.highlighted = [];
+}
 
-        methods.forEach(methodId => {
-            if (allHighlightedNodes.has(methodId)) {
-                hasHighlightedMethod = true;
-                classGroup.select(`[data-method-id="${methodId}"]`)
-                    .classed("highlighted-method", true);
-            }
-        });
+// Helper functions for colouring by time or allocated memory
 
-        if (hasHighlightedMethod || allHighlightedNodes.has(d.id)) {
-            classGroup.classed("highlighted-class", true);
-        }
-    });
+// Number of colour/width steps for timed links and methods (the canvas batches by step)
+const TIME_LEVELS = 8;
+
+// Field of links and method nodes each colour metric reads
+const COLOUR_METRICS = {
+    total: 'total_time_ns',
+    self: 'self_time_ns',
+    alloc: 'alloc_bytes',
+    alloc_self: 'alloc_self_bytes'
+};
+
+// 'none' or a key of COLOUR_METRICS: what colours links and methods
+let currentTimeMetric = 'none';
+
+// Graph layer shown: the call graph ('calls') or the module import graph ('imports')
+let currentLayer = 'calls';
+
+function formatDuration(ns) {
+    if (ns >= 1e9) return `${(ns / 1e9).toFixed(2)} s`;
+    if (ns >= 1e6) return `${(ns / 1e6).toFixed(2)} ms`;
+    if (ns >= 1e3) return `${(ns / 1e3).toFixed(1)} µs`;
+    return `${ns} ns`;
 }
 
-function clearHighlights(callsLink, classNode) {
-    // Clear link highlighting
-    callsLink.classed("source-path", false)
-             .classed("target-path", false)
-             .classed("hover", false);
-    
-    // Clear node highlighting
-    classNode.classed("highlighted-class", false);
-    classNode.selectAll(".method-box").classed("highlighted-method", false);
+// Tooltip line with the time spent along a calls link, if the trace was timed
+function linkTimeInfo(link) {
+    if (link.total_time_ns === undefined) return '';
+    return `<br>Time: ${formatDuration(link.total_time_ns)} total, ${formatDuration(link.self_time_ns)} self`;
 }
 
-// Custom force for rectangular collision detection
-function rectangularCollision() {
-    let nodes;
-    let strength = 0.7;
-    let iterations = 1;
-    
-    function force(alpha) {
-        const quadtree = d3.quadtree()
-            .x(d => d.x)
-            .y(d => d.y)
-            .addAll(nodes);
-        
-        for (let iteration = 0; iteration < iterations; ++iteration) {
-            for (let i = 0; i < nodes.length; ++i) {
-                const node = nodes[i];
-                const w = (node._bboxWidth || 100) / 2;
-                const h = (node._bboxHeight || 100) / 2;
-                
-                // Check for collisions with other nodes
-                quadtree.visit((quad, x0, y0, x1, y1) => {
-                    if (quad.data && quad.data !== node) {
-                        const other = quad.data;
-                        const ow = (other._bboxWidth || 100) / 2;
-                        const oh = (other._bboxHeight || 100) / 2;
-                        
-                        // Calculate distance between centers
-                        const dx = node.x - other.x;
-                        const dy = node.y - other.y;
-                        
-                        // Calculate minimum separation (rectangle collision)
-                        const minDx = w + ow;
-                        const minDy = h + oh;
-                        
-                        // Check for collision
-                        if (Math.abs(dx) < minDx && Math.abs(dy) < minDy) {
-                            // Collision detected - push nodes apart
-                            const overlapX = minDx - Math.abs(dx);
-                            const overlapY = minDy - Math.abs(dy);
-                            
-                            // Use the dimension with less overlap for separation
-                            let fx = 0;
-                            let fy = 0;
-                            
-                            if (overlapX < overlapY) {
-                                // Separate horizontally (less overlap in X)
-                                fx = (dx > 0 ? 1 : -1) * overlapX * strength * alpha;
-                            } else {
-                                // Separate vertically (less overlap in Y)
-                                fy = (dy > 0 ? 1 : -1) * overlapY * strength * alpha;
-                            }
-                            
-                            node.vx += fx;
-                            node.vy += fy;
-                            other.vx -= fx;
-                            other.vy -= fy;
-                            
-                            return true; // Don't descend further
-                        }
-                        
-                        return false; // Continue searching
-                    }
-                    return false;
-                });
-            }
-        }
+function formatBytes(bytes) {
+    const size = Math.abs(bytes);
+    if (size >= 1 << 30) return `${(bytes / (1 << 30)).toFixed(2)} GiB`;
+    if (size >= 1 << 20) return `${(bytes / (1 << 20)).toFixed(2)} MiB`;
+    if (size >= 1 << 10) return `${(bytes / (1 << 10)).toFixed(1)} KiB`;
+    return `${bytes} B`;
+}
+
+// Tooltip lines with the memory the measured calls of a link allocated, and the blocks their subtrees kept
+function allocInfo(link) {
+    if (link.alloc_bytes === undefined) return '';
+    const blocks = link.alloc_blocks === undefined ? '' :
+        `<br>Blocks kept: ${link.alloc_blocks} total, ${link.alloc_self_blocks} self` +
+        ` (${link.alloc_block_samples} sampled call${link.alloc_block_samples === 1 ? '' : 's'})`;
+    return `<br>Memory: ${formatBytes(link.alloc_bytes)} total, ${formatBytes(link.alloc_self_bytes)} self` +
+        ` (${link.alloc_samples} measured call${link.alloc_samples === 1 ? '' : 's'})` + blocks;
+}
+
+// Tooltip lines for a calls link flagged by the N+1 / chatty call detector
+function chattyInfo(link) {
+    const chatty = link.chatty;
+    if (!chatty) return '';
+    const site = chatty.call_sites[0];
+    const siteInfo = site ? `<br>at ${site.file.split('/').pop()}:${site.line}` : '';
+    return `<br><strong>N+1:</strong> up to ${chatty.max_per_invocation} calls per caller invocation` +
+        ` (${chatty.chatty_invocations} invocation${chatty.chatty_invocations === 1 ? '' : 's'})${siteInfo}`;
+}
+
+// Tooltip line for a link of the import layer
+function importInfo(link) {
+    if (link.loaded === undefined) return '';
+    return link.loaded ? '<br>This import loaded the module' : '<br>Module was already loaded';
+}
+
+// Sampled argument and return types (CallTracer(sample_types=True)) as text,
+// e.g. "(product: Product ×4, quantity: int ×3 | float ×1) → bool ×4"
+function formatTypes(types) {
+    const counts = histogram => Object.entries(histogram).map(([name, count]) => `${name} ×${count}`).join(' | ');
+    const args = Object.entries(types.args).map(([param, histogram]) => `${param}: ${counts(histogram)}`);
+    return `(${args.join(', ')}) → ${counts(types.returns)}`;
+}
+
+// Tooltip line with the sampled types of a calls link
+function typeInfo(link) {
+    if (!link.types) return '';
+    const text = formatTypes(link.types).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+    return `<br>Types (${link.types.kept_samples} of ${link.types.sampled_calls} sampled calls): ${text}`;
+}
+
+// Tooltip line with the calls of a link per trace scope (callpath.trace_scope / callpath.scope)
+function scopeInfo(link) {
+    if (!link.scopes) return '';
+    const text = Object.entries(link.scopes).map(([name, count]) => `${name} ×${count}`).join(', ')
+        .replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+    return `<br>Scopes: ${text}`;
+}
+
+// CSS class of a calls link: run diff status first, then chatty marker
+function callsLinkClass(link) {
+    if (link.diff_status) return `link diff-${link.diff_status}`;
+    return link.chatty ? "link chatty" : "link";
+}
+
+// Step 1..TIME_LEVELS of a value relative to the largest one (square root, so small values stay visible).
+// Memory freed rather than allocated counts as none.
+function timeLevel(value, maxValue) {
+    if (!(value > 0) || !maxValue) return 0;
+    return Math.max(1, Math.round(Math.sqrt(value / maxValue) * TIME_LEVELS));
+}
+
+function timeLevelColor(level) {
+    return d3.interpolateYlOrRd(0.2 + 0.8 * level / TIME_LEVELS);
+}
+
+// Stroke and width of a calls link under the current metric, or null when not colouring
+// (or when no link of the trace has the metric)
+function linkTimeStyle(link) {
+    if (currentTimeMetric === 'none' || !currentGraph || !currentGraph.maxLinkValue[currentTimeMetric]) return null;
+    const level = timeLevel(link[COLOUR_METRICS[currentTimeMetric]], currentGraph.maxLinkValue[currentTimeMetric]);
+    return { level, stroke: timeLevelColor(level), width: 1 + level * 0.75 };
+}
+
+// Method box fill under the current metric, or null when not colouring
+function methodTimeFill(method) {
+    if (currentTimeMetric === 'none' || !currentGraph || !currentGraph.maxMethodValue[currentTimeMetric]) return null;
+    const level = timeLevel(method[COLOUR_METRICS[currentTimeMetric]], currentGraph.maxMethodValue[currentTimeMetric]);
+    return level ? timeLevelColor(level) : null;
+}
+
+// Build the graph request URL from the page query string. ?node= loads only that
+// node's neighbourhood and ?include=/?exclude= load a filtered subgraph, so the
+// browser holds just what is on screen; otherwise the full trace is loaded.
+function getGraphRequestUrl() {
+    const params = new URLSearchParams(window.location.search);
+    const query = new URLSearchParams();
+
+    // Neighbourhood and subgraph queries only cover the call graph
+    if (currentLayer !== 'calls') {
+        query.set('layer', currentLayer);
+        return '/api/trace?' + query.toString();
     }
-    
-    force.initialize = function(_) {
-        nodes = _;
-    };
-    
-    force.strength = function(_) {
-        return arguments.length ? (strength = +_, force) : strength;
-    };
-    
-    force.iterations = function(_) {
-        return arguments.length ? (iterations = +_, force) : iterations;
-    };
-    
-    return force;
+
+    if (params.has('node')) {
+        query.set('node', params.get('node'));
+        query.set('depth', params.get('depth') || '1');
+        query.set('direction', params.get('direction') || 'both');
+        if (params.has('used_only')) query.set('used_only', params.get('used_only'));
+        return '/api/graph/neighbors?' + query.toString();
+    }
+
+    if (params.has('include') || params.has('exclude')) {
+        ['include', 'exclude', 'used_only'].forEach(key => {
+            if (params.has(key)) query.set(key, params.get(key));
+        });
+        return '/api/graph/subgraph?' + query.toString();
+    }
+
+    return '/api/trace';
 }
 
 async function loadGraph() {
+    // The server indexes the current trace's call graph, whichever part of it is shown
+    useServerQueries(currentLayer === 'calls');
     try {
-        const response = await fetch('/api/trace');
+        const url = getGraphRequestUrl();
+        // Whole traces are streamed, so large graphs start drawing early
+        const streamUrl = url.replace(/^\/api\/trace(?=\?|$)/, '/api/trace/stream');
+        if (streamUrl !== url) {
+            await streamGraph(streamUrl);
+            return;
+        }
+        const response = await fetch(url);
         const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.message || data.error || response.statusText);
+        }
         renderGraph(data);
     } catch (error) {
         document.getElementById('graph').innerHTML = 
@@ -306,38 +412,204 @@ async function loadGraph() {
     }
 }
 
-// Store original data globally so filters can access it
-let originalData = null;
+// Read an NDJSON graph stream (/api/trace/stream) line by line and hand each
+// record to a stream receiver as soon as it is complete
+async function streamGraph(url) {
+    const response = await fetch(url);
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.message || error.error || response.statusText);
+    }
+    const receiver = createGraphStreamReceiver();
+    
+    // Without a readable body, parse the whole response at once
+    if (!response.body) {
+        const text = await response.text();
+        text.split('\n').forEach(line => {
+            if (line) receiver.add(JSON.parse(line));
+        });
+        return;
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+        const { done, value } = await reader.read();
+        buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+            // false: another graph replaced this one while it was loading
+            if (line && !receiver.add(JSON.parse(line))) {
+                reader.cancel();
+                return;
+            }
+        }
+        if (done) break;
+    }
+    if (buffer) receiver.add(JSON.parse(buffer));
+}
+
+// Builds the graph from stream records: the first chunk renders it, later
+// chunks are added to the live view, and a layout computed after the last
+// chunk restarts the simulation from the server positions.
+function createGraphStreamReceiver() {
+    const progress = document.getElementById('load-progress');
+    let meta = null;
+    let data = null;
+    let rendered = false;
+    let refreshPending = false;
+    
+    function showProgress(classes) {
+        if (!progress) return;
+        progress.textContent = `Loading graph: ${classes} of ${meta.class_count} classes`;
+        progress.style.display = 'block';
+    }
+    
+    // Chunks can arrive faster than frames; re-filter at most once per frame
+    function scheduleRefresh() {
+        if (refreshPending) return;
+        refreshPending = true;
+        requestAnimationFrame(() => {
+            refreshPending = false;
+            if (currentGraph.data === data) applyFilters();
+        });
+    }
+    
+    function addChunk(chunk) {
+        chunk.nodes.forEach(node => data.nodes.push(node));
+        chunk.links.forEach(link => data.links.push(link));
+        if (!rendered) {
+            rendered = true;
+            renderGraph(data);
+            return;
+        }
+        const classCount = currentGraph.classNodes.length;
+        extendGraphIndex(currentGraph, chunk.nodes, chunk.links);
+        restoreNodePositions(currentGraph.classNodes.slice(classCount), data.layout);
+        scheduleRefresh();
+    }
+    
+    function applyLayout(layout) {
+        data.layout = layout;
+        currentGraph.simWidth = layout.bounds?.width || currentGraph.simWidth;
+        currentGraph.simHeight = layout.bounds?.height || currentGraph.simHeight;
+        restoreNodePositions(currentGraph.classNodes, layout);
+        // The running simulation keeps its own positions, so start a new one
+        if (currentSimulation) {
+            currentSimulation.stop();
+            currentSimulation = null;
+        }
+        currentModel = null;
+        applyFilters();
+    }
+    
+    return {
+        // Returns false once the graph being streamed is no longer shown
+        add(record) {
+            if (record.type === 'meta') {
+                const { type, node_count, link_count, class_count, chunk_count, ...graphData } = record;
+                meta = record;
+                data = { ...graphData, nodes: [], links: [] };
+                showProgress(0);
+                return true;
+            }
+            if (rendered && currentGraph.data !== data) {
+                return false;
+            }
+            if (record.type === 'chunk') {
+                addChunk(record);
+                showProgress(record.classes);
+            } else if (record.type === 'layout') {
+                if (rendered) {
+                    applyLayout(record.layout);
+                } else {
+                    data.layout = record.layout;
+                }
+            } else if (record.type === 'end') {
+                // A graph without classes has no chunks
+                if (!rendered) {
+                    rendered = true;
+                    renderGraph(data);
+                }
+                if (progress) progress.style.display = 'none';
+            }
+            return true;
+        }
+    };
+}
+
+// Page state: the loaded graph, the part of it currently visible, the running
+// layout and the view (SVG or canvas) drawing it
+let currentGraph = null;
+let currentModel = null;
 let currentSimulation = null;
 let currentContainer = null;
 let currentSvg = null;
 let currentZoom = null;
+let currentSvgView = null;
+let currentCanvasRenderer = null;
+let currentView = null;
+
+// Track current force value for Ctrl+scroll adjustment
+let currentForceStrength = -1000;
+
+const GRAPH_WIDTH = 1400;
+const GRAPH_HEIGHT = 1000;
+
+// Typing in the class filter re-filters this long after the last keystroke
+const FILTER_DEBOUNCE_MS = 150;
+
+// Alpha used to settle the layout after the visible set changes
+const FILTER_REHEAT_ALPHA = 0.3;
 
 function renderGraph(data) {
+    // Cycles opened or closed by hand belong to the previous graph
+    toggledCycles = new Set();
+
     // Clear any existing position save interval
     if (window.positionSaveInterval) {
         clearInterval(window.positionSaveInterval);
         window.positionSaveInterval = null;
     }
+    
+    // A new graph gets a fresh layout and fresh views
+    if (currentSimulation) {
+        currentSimulation.stop();
+        currentSimulation = null;
+    }
+    currentModel = null;
+    currentView = null;
 
-    // Store original data for filtering
-    originalData = JSON.parse(JSON.stringify(data)); // Deep copy
+    // Index the graph once; filtering only selects from it
+    currentGraph = createGraphIndex(data);
+    
+    // Restore saved or server-computed node positions before creating simulation
+    restoreNodePositions(currentGraph.classNodes, data.layout);
+    
+    renderChattySummary(data.chatty_calls || []);
+    // Call paths belong to the previous graph
+    document.getElementById('call-paths').style.display = 'none';
 
     // Clear loading message
-    document.getElementById('graph').innerHTML = '';
+    const graphElement = document.getElementById('graph');
+    graphElement.innerHTML = '';
     
-    currentSvg = d3.select("#graph")
+    currentSvg = d3.select(graphElement)
         .append("svg")
-        .attr("width", 1400)
-        .attr("height", 1000);
-    
-    const tooltip = d3.select("#tooltip");
+        .attr("width", GRAPH_WIDTH)
+        .attr("height", GRAPH_HEIGHT);
     
     // Create container group for pan/zoom
     currentContainer = currentSvg.append("g");
     
-    // Track current force value for Ctrl+scroll adjustment
-    let currentForceStrength = -1000;
+    // Arrow marker for method calls
+    currentContainer.append("defs")
+        .append("marker")
+        .attrs(arrowhead_marker_attrs)
+        .append("path")
+        .attrs(arrowhead_path_attrs);
     
     // Add zoom behavior with Ctrl/Cmd+scroll override for force adjustment
     currentZoom = d3.zoom()
@@ -348,6 +620,7 @@ function renderGraph(data) {
                 return;
             }
             currentContainer.attr("transform", event.transform);
+            currentSvgView.setScale(event.transform.k);
         })
         .filter(function(event) {
             // Allow zoom with wheel if Ctrl/Cmd is NOT held
@@ -360,11 +633,32 @@ function renderGraph(data) {
     
     currentSvg.call(currentZoom);
     
-    // Initial render with unfiltered data
-    rebuildGraphWithFilters(data, currentContainer, currentSvg, currentForceStrength);
+    const dragHandlers = createNodeDragHandlers(currentGraph.classNodes);
+    currentSvgView = createSvgView(currentContainer, currentSvg, dragHandlers);
+    
+    // Canvas used instead of the SVG for large graphs
+    currentCanvasRenderer = createCanvasRenderer(graphElement, GRAPH_WIDTH, GRAPH_HEIGHT, dragHandlers);
+    
+    setupForceWheel(graphElement);
+    
+    // Setup filter controls; applying them draws the initial graph
+    setupFilters();
+
+    // Set up periodic saving of node positions every 10 seconds
+    window.positionSaveInterval = setInterval(() => {
+        saveNodePositions(currentGraph.classNodes);
+    }, 10000); // Save every 10 seconds
+}
+
+// Ctrl/Cmd+scroll adjusts the repulsion force (native event listener for better Mac support).
+// Listens on the graph element so it works for both the SVG and the canvas.
+let forceWheelInitialized = false;
+
+function setupForceWheel(graphElement) {
+    if (forceWheelInitialized) return;
+    forceWheelInitialized = true;
     
-    // Add Ctrl/Cmd+scroll to adjust force (use native event listener for better Mac support)
-    currentSvg.node().addEventListener('wheel', function(event) {
+    graphElement.addEventListener('wheel', function(event) {
         if (event.ctrlKey || event.metaKey) { // Support both Ctrl and Cmd (Mac)
             event.preventDefault();
             event.stopPropagation();
@@ -382,169 +676,232 @@ function renderGraph(data) {
             }
             
             if (currentSimulation) {
-                currentSimulation.force("charge").strength(currentForceStrength);
-                currentSimulation.alpha(0.3).restart(); // Restart simulation with new force
+                currentSimulation.setChargeStrength(currentForceStrength);
             }
         }
     }, { passive: false });
-    
-    // Setup filter controls
-    setupFilters(currentForceStrength);
 }
 
-function rebuildGraphWithFilters(data, container, svg, forceStrength) {
-    // Stop existing simulation if any
-    if (currentSimulation) {
-        currentSimulation.stop();
-    }
+// Lookup structures over the whole loaded graph, built once per load. Node and
+// link objects are kept across filter changes, so classes keep their positions.
+function createGraphIndex(data) {
+    const graph = {
+        data,
+        classNodes: [],
+        callsLinks: [],
+        classMethodsMap: {},
+        outgoing: new Map(),
+        // Largest value per colour metric, which its colour scale is relative to
+        maxLinkValue: { total: 0, self: 0, alloc: 0, alloc_self: 0 },
+        maxMethodValue: { total: 0, self: 0, alloc: 0, alloc_self: 0 },
+        nodeById: new Map(),
+        // Number of classes per strongly connected component; more than one is a cycle
+        componentSizes: new Map(),
+        // Box of every collapsed cycle, kept while it stays collapsed so it keeps its position
+        cycleBoxes: new Map(),
+        // Simulation bounds: the server layout grows them for large graphs
+        simWidth: data.layout?.bounds?.width || 2000,
+        simHeight: data.layout?.bounds?.height || 1500
+    };
+    extendGraphIndex(graph, data.nodes, data.links);
+    return graph;
+}
+
+// Add nodes and links to a graph index, e.g. a streamed chunk. Links may only
+// refer to nodes that are already indexed or come with them.
+function extendGraphIndex(graph, nodes, links) {
+    const updateMax = (max, item) => {
+        for (const [metric, field] of Object.entries(COLOUR_METRICS)) {
+            max[metric] = Math.max(max[metric], item[field] || 0);
+        }
+    };
     
-    // Clear existing elements
-    container.selectAll(".calls-links").remove();
-    container.selectAll(".class-groups").remove();
-    container.selectAll("defs").selectAll("linearGradient").remove(); // Remove old gradients
+    nodes.forEach(node => {
+        graph.nodeById.set(node.id, node);
+        if (node.type === 'class') {
+            graph.classNodes.push(node);
+            if (node.component !== undefined) {
+                graph.componentSizes.set(node.component, (graph.componentSizes.get(node.component) || 0) + 1);
+            }
+        } else if (node.type === 'method') {
+            updateMax(graph.maxMethodValue, node);
+        }
+    });
     
-    const defs = container.select("defs");
-    if (defs.empty()) {
-        container.append("defs");
-        const newDefs = container.select("defs");
-        // Add arrow marker for method calls
-        newDefs.append("marker")
-            .attrs(arrowhead_marker_attrs)
-            .append("path")
-            .attrs(arrowhead_path_attrs);
+    links.forEach(link => {
+        if (link.type === 'contains') {
+            if (!graph.classMethodsMap[link.source]) {
+                graph.classMethodsMap[link.source] = [];
+            }
+            graph.classMethodsMap[link.source].push(link.target);
+        } else if (link.type === 'calls') {
+            graph.callsLinks.push(link);
+            if (!graph.outgoing.has(link.source)) graph.outgoing.set(link.source, []);
+            graph.outgoing.get(link.source).push(link);
+            updateMax(graph.maxLinkValue, link);
+        }
+    });
+}
+
+// The box standing for the visible classes of a collapsed cycle. A new box starts
+// where its classes are.
+function cycleBox(graph, component, members) {
+    let box = graph.cycleBoxes.get(component);
+    if (!box) {
+        const placed = members.filter(node => node.x !== undefined);
+        box = { id: `cycle:${component}`, type: 'class', component };
+        if (placed.length) {
+            box.x = d3.mean(placed, node => node.x);
+            box.y = d3.mean(placed, node => node.y);
+        }
+        graph.cycleBoxes.set(component, box);
     }
+    const names = members.map(node => node.name);
+    box.name = `⟳ ${names.slice(0, 3).join(', ')}${names.length > 3 ? ` +${names.length - 3}` : ''}`;
+    box.members = members;
+    box.layer = members[0].layer;
+    box.was_used = members.some(node => node.was_used !== false);
+    return box;
+}
+
+// Select the visible classes and methods from the graph index and build the
+// lists and lookup maps that both renderers and the simulation work from.
+// Classes of a component in collapsedComponents are drawn as one cycle box.
+// Costs O(visible nodes + visible links), independent of what is hidden.
+function buildVisibleModel(graph, isClassVisible, isMethodVisible, collapsedComponents = new Set()) {
+    const { nodeById } = graph;
+    const visibleClasses = graph.classNodes.filter(isClassVisible);
     
-    const tooltip = d3.select("#tooltip");
-    
-    // Separate class and method nodes
-    let classNodes = data.nodes.filter(d => d.type === 'class');
-    let methodNodes = data.nodes.filter(d => d.type === 'method');
-    let containsLinks = data.links.filter(d => d.type === 'contains');
-    let callsLinks = data.links.filter(d => d.type === 'calls');
-    
-    // Build map of class to methods
-    const classMethodsMap = {};
-    containsLinks.forEach(link => {
-        if (!classMethodsMap[link.source]) {
-            classMethodsMap[link.source] = [];
+    // Visible classes of each collapsed cycle; a single visible class stays as it is
+    const cycleMembers = new Map();
+    visibleClasses.forEach(node => {
+        if (!collapsedComponents.has(node.component)) return;
+        if (!cycleMembers.has(node.component)) cycleMembers.set(node.component, []);
+        cycleMembers.get(node.component).push(node);
+    });
+    const boxOfComponent = new Map();
+    cycleMembers.forEach((members, component) => {
+        if (members.length > 1) boxOfComponent.set(component, cycleBox(graph, component, members));
+    });
+    const classNodes = [];
+    visibleClasses.forEach(node => {
+        const box = boxOfComponent.get(node.component);
+        if (!box) {
+            classNodes.push(node);
+        } else if (box.members[0] === node) {
+            classNodes.push(box);
         }
-        classMethodsMap[link.source].push(link.target);
     });
     
-    // Build map of outgoing links per method (for staggering exit points)
-    const methodOutgoingLinksMap = {};
-    callsLinks.forEach(link => {
-        const sourceMethodId = link.source;
-        if (!methodOutgoingLinksMap[sourceMethodId]) {
-            methodOutgoingLinksMap[sourceMethodId] = [];
+    // Visible methods per class, and method id -> its class node, row index and box width.
+    // Methods of a collapsed cycle get no row; they sit on the cycle box's name row.
+    const classMethodsMap = {};
+    const cycleMethods = new Map();
+    const methodSlots = new Map();
+    visibleClasses.forEach(classNode => {
+        const methods = (graph.classMethodsMap[classNode.id] || []).filter(methodId => {
+            const method = nodeById.get(methodId);
+            return method && isMethodVisible(method);
+        });
+        const box = boxOfComponent.get(classNode.component);
+        if (box) {
+            if (!cycleMethods.has(box.id)) cycleMethods.set(box.id, []);
+            const width = classNameBoxWidth(box.name);
+            methods.forEach(methodId => {
+                cycleMethods.get(box.id).push(methodId);
+                methodSlots.set(methodId, { classNode: box, index: CLASS_NAME_ROW, width });
+            });
+            return;
         }
-        methodOutgoingLinksMap[sourceMethodId].push(link);
+        classMethodsMap[classNode.id] = methods;
+        methods.forEach((methodId, index) => {
+            methodSlots.set(methodId, { classNode, index, width: methodBoxWidth(nodeById.get(methodId).name) });
+        });
     });
+    boxOfComponent.forEach(box => { classMethodsMap[box.id] = []; });
     
-    // Function to assign exit indices based on relative target positions
-    const updateExitIndices = () => {
-        Object.keys(methodOutgoingLinksMap).forEach(sourceMethodId => {
-            const links = methodOutgoingLinksMap[sourceMethodId];
-            const sourceMethod = methodNodes.find(m => m.id === sourceMethodId);
-            if (!sourceMethod) return;
-            
-            const sourceClass = classNodes.find(c => c.id === sourceMethod.class);
-            if (!sourceClass) return;
-            
-            const sourceMethods = classMethodsMap[sourceClass.id] || [];
-            const sourceMethodIndex = sourceMethods.indexOf(sourceMethodId);
-            const sourceY = sourceClass.y + 30 + (sourceMethodIndex * 40) + 15;
-            
-            // Sort links by target position: primarily by Y (vertical), then by X (horizontal)
-            links.sort((linkA, linkB) => {
-                const targetNodeA = data.nodes.find(n => n.id === linkA.target);
-                const targetNodeB = data.nodes.find(n => n.id === linkB.target);
-                const targetClassA = classNodes.find(c => c.id === targetNodeA?.class);
-                const targetClassB = classNodes.find(c => c.id === targetNodeB?.class);
-                
-                if (!targetClassA || !targetClassB) return 0;
-                
-                const targetMethodsA = classMethodsMap[targetClassA.id] || [];
-                const targetMethodsB = classMethodsMap[targetClassB.id] || [];
-                const targetMethodIndexA = targetMethodsA.indexOf(linkA.target);
-                const targetMethodIndexB = targetMethodsB.indexOf(linkB.target);
-                
-                const targetYA = targetClassA.y + 30 + (targetMethodIndexA * 40) + 15;
-                const targetYB = targetClassB.y + 30 + (targetMethodIndexB * 40) + 15;
-                
-                // Primary sort: by Y position relative to source
-                const relativeYA = targetYA - sourceY;
-                const relativeYB = targetYB - sourceY;
-                
-                if (Math.abs(relativeYA - relativeYB) > 10) {
-                    // Significant vertical difference - sort by Y
-                    return relativeYA - relativeYB;
-                } else {
-                    // Similar vertical position - sort by X (rightmost first gets middle stagger)
-                    const targetXA = targetClassA.x;
-                    const targetXB = targetClassB.x;
-                    return targetXA - targetXB;
-                }
-            });
+    // Calls links between visible methods, with forward/reverse adjacency for highlighting.
+    // Calls within a collapsed cycle are not drawn but still lead through it.
+    const callsLinks = [];
+    const outgoing = new Map();
+    const incoming = new Map();
+    methodSlots.forEach((sourceSlot, methodId) => {
+        (graph.outgoing.get(methodId) || []).forEach(link => {
+            const targetSlot = methodSlots.get(link.target);
+            if (!targetSlot) return;
+            if (!outgoing.has(link.source)) outgoing.set(link.source, []);
+            if (!incoming.has(link.target)) incoming.set(link.target, []);
+            outgoing.get(link.source).push(link);
+            incoming.get(link.target).push(link);
+            if (sourceSlot.classNode.members && sourceSlot.classNode === targetSlot.classNode) return;
+            callsLinks.push(link);
             
-            // Assign exit indices based on sorted order
-            links.forEach((link, index) => {
-                link._exitIndex = index;
-                link._totalExits = links.length;
-            });
+            // Per-link geometry record, read by the path and gradient helpers on every tick
+            link._geometry = {
+                sourceClass: sourceSlot.classNode,
+                targetClass: targetSlot.classNode,
+                sourceIndex: sourceSlot.index,
+                targetIndex: targetSlot.index,
+                sourceWidth: sourceSlot.width,
+                targetWidth: targetSlot.width,
+                sameClass: sourceSlot.classNode === targetSlot.classNode
+            };
+            // Endpoints from an earlier layout frame no longer apply
+            link._endpoints = null;
         });
-    };
+    });
     
-    // Initial assignment
-    updateExitIndices();
+    // Exit order of links leaving the same method, kept in line with class positions
+    const exitIndexer = createExitIndexer(callsLinks, classNodes);
     
     // Build class-to-class links based on method calls (for invisible attraction force)
     const classClassLinks = [];
     const classPairMap = new Set();
-    const classToIncomingCount = {};
-    const classToOutgoingCount = {};
+    // Directed class edges drawn instead of the method links when zoomed out
+    const classEdgeMap = new Map();
+    const classEdgeOfLink = new Map();
     callsLinks.forEach(link => {
-        const sourceClass = data.nodes.find(n => n.id === link.source)?.class;
-        const targetClass = data.nodes.find(n => n.id === link.target)?.class;
-        if (sourceClass && targetClass && sourceClass !== targetClass) {
-            // Track in/out counts for x-positioning
-            classToOutgoingCount[sourceClass] = (classToOutgoingCount[sourceClass] || 0) + 1;
-            classToIncomingCount[targetClass] = (classToIncomingCount[targetClass] || 0) + 1;
-            
+        const sourceClass = link._geometry.sourceClass.id;
+        const targetClass = link._geometry.targetClass.id;
+        if (sourceClass !== targetClass) {
             const pairKey = [sourceClass, targetClass].sort().join('|');
             if (!classPairMap.has(pairKey)) {
                 classPairMap.add(pairKey);
                 classClassLinks.push({source: sourceClass, target: targetClass});
             }
+            
+            const edgeKey = `${sourceClass}->${targetClass}`;
+            if (!classEdgeMap.has(edgeKey)) {
+                classEdgeMap.set(edgeKey, {
+                    key: edgeKey,
+                    source: link._geometry.sourceClass,
+                    target: link._geometry.targetClass,
+                    weight: 0,
+                    links: []
+                });
+            }
+            const edge = classEdgeMap.get(edgeKey);
+            edge.weight += link.call_count || 1;
+            edge.links.push(link);
+            classEdgeOfLink.set(link, edge);
         }
     });
     
-    // Calculate x-positioning force for each node based on in/out ratio
+    // Calculate x-positioning force for each node from its topological layer
+    // (renderer/graph_analysis.py: callers left, callees right, a cycle shares one layer)
     // Also calculate bounding box dimensions for collision detection
+    const layerCount = graph.data.layer_count || 0;
     classNodes.forEach(node => {
-        const outgoing = classToOutgoingCount[node.id] || 0;
-        const incoming = classToIncomingCount[node.id] || 0;
-        const total = outgoing + incoming;
-        if (total > 0) {
-            // Higher x-position for nodes with more incoming (sinks)
-            // Lower x-position for nodes with more outgoing (sources)
-            node._xWeight = incoming / total;
-        } else {
-            node._xWeight = 0.5; // No connections, stay in middle
-        }
+        node._xWeight = layerCount > 1 ? (node.layer || 0) / (layerCount - 1) : 0.5;
         
         // Calculate bounding box for collision detection
-        const classNameWidth = Math.max(node.name.length * 9 + 20, 150);
-        const methods = classMethodsMap[node.id] || [];
+        const classNameWidth = classNameBoxWidth(node.name);
+        const methods = classMethodsMap[node.id];
         
         // Find the maximum method width
         let maxMethodWidth = 80; // Minimum method width
         methods.forEach(methodId => {
-            const method = methodNodes.find(m => m.id === methodId);
-            if (method) {
-                const methodWidth = Math.max(method.name.length * 7 + 10, 80);
-                maxMethodWidth = Math.max(maxMethodWidth, methodWidth);
-            }
+            maxMethodWidth = Math.max(maxMethodWidth, methodSlots.get(methodId).width);
         });
         
         // Bounding box: width is max of class name width and method widths, height includes all methods
@@ -557,312 +914,652 @@ function rebuildGraphWithFilters(data, container, svg, forceStrength) {
         node._bboxHeight += padding * 2;
     });
     
-    // Create force for node repulsion (will be adjusted by slider)
-    let chargeForce = d3.forceManyBody().strength(forceStrength);
-    
-    // Restore saved node positions before creating simulation
-    restoreNodePositions(classNodes);
-
-    // Create simulation with only class nodes
-    currentSimulation = d3.forceSimulation(classNodes)
-        .force("charge", chargeForce)
-        .force("center", d3.forceCenter(700, 500).strength(0.2))
-        .force("classLink", d3.forceLink(classClassLinks)
-            .id(d => d.id)
-            .distance(200)
-            .strength(0.3))
-        .force("collision", rectangularCollision())
-        .force("x", d3.forceX(d => {
-            // Pull sinks right, sources left
-            return 200 + (d._xWeight * 1500);
-        }).strength(0.3));
-    
-    // Helper function to get link start and end points for gradient
-    const getLinkGradientCoords = (d) => {
-        const sourceNode = data.nodes.find(n => n.id === d.source);
-        const targetNode = data.nodes.find(n => n.id === d.target);
-        const sourceClass = classNodes.find(c => c.id === sourceNode?.class);
-        const targetClass = classNodes.find(c => c.id === targetNode?.class);
-        
-        if (!sourceClass || !targetClass || !sourceNode || !targetNode) {
-            return { x1: 0, y1: 0, x2: 0, y2: 0 };
-        }
-        
-        const sourceMethods = classMethodsMap[sourceClass.id] || [];
-        const targetMethods = classMethodsMap[targetClass.id] || [];
-        const sourceMethodIndex = sourceMethods.indexOf(d.source);
-        const targetMethodIndex = targetMethods.indexOf(d.target);
-        
-        const sourceMethod = methodNodes.find(m => m.id === d.source);
-        const targetMethod = methodNodes.find(m => m.id === d.target);
-        
-        if (!sourceMethod || !targetMethod) {
-            return { x1: 0, y1: 0, x2: 0, y2: 0 };
-        }
-        
-        const sourceMethodWidth = Math.max(sourceMethod.name.length * 7 + 10, 80);
-        const targetMethodWidth = Math.max(targetMethod.name.length * 7 + 10, 80);
-        
-        const sourceX = sourceClass.x;
-        const sourceY = sourceClass.y + 30 + (sourceMethodIndex * 40) + 15;
-        const targetX = targetClass.x;
-        const targetY = targetClass.y + 30 + (targetMethodIndex * 40) + 15;
-        
-        const isSameClass = sourceClass.id === targetClass.id;
-        const horizontalOffset = 5;
-        
-        const exitIndex = d._exitIndex || 0;
-        const totalExits = d._totalExits || 1;
-        const staggerAmount = 4;
-        const exitYOffset = (exitIndex - (totalExits - 1) / 2) * staggerAmount;
-        
-        if (isSameClass) {
-            // For same-class calls, always exit from right and enter from right
-            const startX = sourceX + sourceMethodWidth / 2;
-            const startY = sourceY + exitYOffset;
-            const endX = targetX + targetMethodWidth / 2;
-            const endY = targetY;
-            
-            return { x1: startX, y1: startY, x2: endX, y2: endY };
-        } else {
-            const sourceRightX = sourceX + sourceMethodWidth / 2;
-            const sourceRightY = sourceY + exitYOffset;
-            const targetLeftX = targetX - targetMethodWidth / 2;
-            const targetLeftY = targetY;
-            
-            return { x1: sourceRightX, y1: sourceRightY, x2: targetLeftX, y2: targetLeftY };
-        }
+    return {
+        graph,
+        data: graph.data,
+        classNodes,
+        callsLinks,
+        classMethodsMap,
+        cycleMethods,
+        nodeById,
+        methodSlots,
+        outgoing,
+        incoming,
+        classClassLinks,
+        classEdges: Array.from(classEdgeMap.values()),
+        classEdgeOfLink,
+        exitIndexer,
+        simWidth: graph.simWidth,
+        simHeight: graph.simHeight
     };
+}
+
+// Whether two visible models show exactly the same classes, methods and links
+function isSameVisibleSet(modelA, modelB) {
+    const sameList = (a, b) => a.length === b.length && a.every((item, i) => item === b[i]);
+    if (!sameList(modelA.classNodes, modelB.classNodes) || !sameList(modelA.callsLinks, modelB.callsLinks)) {
+        return false;
+    }
+    if (modelA.methodSlots.size !== modelB.methodSlots.size) return false;
+    for (const methodId of modelA.methodSlots.keys()) {
+        if (!modelB.methodSlots.has(methodId)) return false;
+    }
+    return true;
+}
+
+// Show a visible model: pick the renderer, update its elements and move the
+// running layout to the new node set with a short reheat
+function showVisibleGraph(model) {
+    if (currentModel && isSameVisibleSet(currentModel, model)) return;
+    currentModel = model;
     
-    // Wrapper to call the extracted link path generator function with required dependencies
-    const generateLinkPath = (d) => {
-        return window.generateLinkPath(d, data, classNodes, methodNodes, classMethodsMap);
-    };
+    // Starting from a settled layout only needs a little fine-tuning
+    const allPositioned = model.classNodes.every(node => node.x !== undefined);
     
-    // Draw calls links (method->method) - curved paths with arrows
-    const callsLink = container.append("g")
-        .attr("class", "calls-links")
-        .selectAll("path")
-        .data(callsLinks)
-        .enter()
-        .each(function(d, i) {
-            // Create unique gradient for each link based on its path
-            const coords = getLinkGradientCoords(d);
-            const gradientId = `linkGradient-${i}`;
-            
-            const gradient = defs.append("linearGradient")
-                .attr("id", gradientId)
-                .attr("gradientUnits", "userSpaceOnUse")
-                .attr("x1", coords.x1)
-                .attr("y1", coords.y1)
-                .attr("x2", coords.x2)
-                .attr("y2", coords.y2);
-            
-            gradient.append("stop")
-                .attr("offset", "0%")
-                .attr("stop-color", "#3498db") // Blue at start (source)
-                .attr("stop-opacity", 1);
-            
-            gradient.append("stop")
-                .attr("offset", "100%")
-                .attr("stop-color", "#e74c3c") // Red at end (target)
-                .attr("stop-opacity", 1);
-            
-            d._gradientId = gradientId;
-        })
-        .append("path")
-        .attr("class", "link")
-        .attr("stroke", d => `url(#${d._gradientId})`)
-        .attr("stroke-width", calls_link_attrs["stroke-width"])
-        .attr("stroke-dasharray", calls_link_attrs["stroke-dasharray"])
-        .attr("marker-end", calls_link_attrs["marker-end"])
-        .attr("fill", "none") // Paths need fill:none for stroke to show
-        .on("mouseover", function(event, d) {
-            // Get source and target method IDs
-            const sourceId = typeof d.source === 'string' ? d.source : (d.source?.id || d.source);
-            const targetId = typeof d.target === 'string' ? d.target : (d.target?.id || d.target);
-
-            // Highlight this link
-            d3.select(this).attr("class", "link hover");
-
-            // For links, highlight all paths from the source (comprehensive traversal)
-            highlightAllPathsFromNode(sourceId, callsLink, classNode, data, methodNodes, classMethodsMap);
-
-            // Show tooltip
-            const srcMethod = d.source.name || data.nodes.find(n => n.id === sourceId)?.name;
-            const tgtMethod = d.target.name || data.nodes.find(n => n.id === targetId)?.name;
-            const srcClass = d.source.class || data.nodes.find(n => n.id === sourceId)?.class || '';
-            const tgtClass = d.target.class || data.nodes.find(n => n.id === targetId)?.class || '';
-            tooltip.style("display", "block")
-                .html(`<strong>${srcClass}</strong>.${srcMethod}<br>→<br><strong>${tgtClass}</strong>.${tgtMethod}`)
-                .style("left", (event.pageX + 10) + "px")
-                .style("top", (event.pageY - 10) + "px");
-        })
-        .on("mouseout", function(d) {
-            // Clear all highlighting
-            clearHighlights(callsLink, classNode);
-            tooltip.style("display", "none");
-        });
+    // Classes that never had a position start near the centre
+    model.classNodes.forEach(node => {
+        if (node.x === undefined || node.y === undefined) {
+            node.x = model.simWidth / 2 + (Math.random() - 0.5) * 200;
+            node.y = model.simHeight / 2 + (Math.random() - 0.5) * 200;
+        }
+    });
     
-    // Draw class groups with methods inside
-    const classNode = container.append("g")
-        .attr("class", "class-groups")
-        .selectAll("g")
-        .data(classNodes)
-        .enter().append("g")
-        .attr("class", "class-group")
-        .call(d3.drag()
-            .on("start", function(event, d) {
-                if (!event.active) currentSimulation.alphaTarget(0.3).restart();
-                d.fx = d.x;
-                d.fy = d.y;
-            })
-            .on("drag", function(event, d) {
-                d.fx = event.x;
-                d.fy = event.y;
-            })
-            .on("end", function(event, d) {
-                if (!event.active) currentSimulation.alphaTarget(0);
-                d.fx = null;
-                d.fy = null;
-                // Save positions immediately after dragging
-                saveNodePositions(classNodes);
-            }));
-    
-    // Class name box - dynamic width based on text
-    classNode.each(function(d) {
-        const classNameWidth = Math.max(d.name.length * 9 + 20, 150); // Slightly wider than methods
-        const classGroup = d3.select(this);
-        
-        classGroup.append("rect")
-            .attr("class", "class-box")
-            .attr("width", classNameWidth)
-            .attr("x", -classNameWidth / 2)
-            .attr("y", class_box_attrs.y)
-            .attr("height", class_box_attrs.height)
-            .attr("rx", class_box_attrs.rx)
-            .attr("fill", d => d.was_used !== false ? class_box_attrs.fill : "rgba(149, 165, 166, 0.1)") // Gray if unused
-            .attr("stroke", d => d.was_used !== false ? class_box_attrs.stroke : "#95a5a6") // Gray border if unused
-            .attr("stroke-width", class_box_attrs["stroke-width"])
-            .attr("stroke-dasharray", d => d.was_used === false ? "5,5" : null); // Dashed border if unused
-        
-        classGroup.append("text")
-            .attr("class", "class-name")
-            .attrs(class_name_attrs)
-            .text(d => d.name);
+    // Large graphs go to the canvas renderer; DOM elements per box and link would not keep up
+    const visibleNodeCount = model.classNodes.length + model.methodSlots.size;
+    const view = shouldUseCanvasRenderer(visibleNodeCount, model.callsLinks.length)
+        ? currentCanvasRenderer
+        : currentSvgView;
+    if (view !== currentView) {
+        if (currentView) currentView.hide();
+        view.show();
+        currentView = view;
+    }
+    view.setModel(model);
+    
+    if (currentSimulation) {
+        currentSimulation.update(model, FILTER_REHEAT_ALPHA);
+        return;
+    }
+    
+    const layoutSimulation = createLayoutSimulation(model, currentForceStrength, allPositioned ? 0.1 : 1);
+    currentSimulation = layoutSimulation;
+    
+    // Redraw whenever the simulation moves the classes
+    layoutSimulation.on("tick", () => currentView.update());
+    
+    // Zoom to fit when simulation ends
+    layoutSimulation.on("end", () => {
+        currentView.zoomToFit();
+        postSettledLayout(currentModel);
+
+        // After simulation ends, allow nodes to be dragged and save positions periodically
+        setTimeout(() => layoutSimulation.releaseAll(), 1000); // Wait 1 second after zoom animation
     });
+}
+
+// Runs the class simulation in a Web Worker (layoutWorker.js), which sends back
+// class positions and link endpoints every frame, so layout never blocks input.
+// Falls back to running it on the main thread if workers are unavailable or the
+// worker fails to load. Either way the caller gets the same small interface.
+function createLayoutSimulation(initialModel, forceStrength, alpha) {
+    const callbacks = { tick: () => {}, end: () => {} };
+    let model = initialModel;
+    let nodeIndex = new Map(model.classNodes.map((node, i) => [node, i]));
+    let worker = null;
+    let simulation = null;
+    // Bumped on every node set change, so frames computed for an older set are dropped
+    let version = 0;
     
-    // Method boxes inside each class group
-    classNode.each(function(classD) {
-        const methods = classMethodsMap[classD.id] || [];
-        const methodGroup = d3.select(this).append("g").attr("class", "methods");
-        
-        methods.forEach((methodId, i) => {
-            const method = methodNodes.find(m => m.id === methodId);
-            if (method) {
-                const methodBox = methodGroup.append("g")
-                    .attr("class", "method-box")
-                    .attr("data-method-id", method.id)
-                    .datum(method)
-                    .style("cursor", "pointer")
-                    .style("pointer-events", "all");
+    function startOnMainThread() {
+        model.callsLinks.forEach(link => { link._endpoints = null; });
+        simulation = createClassSimulation(model.classNodes, model.classClassLinks, forceStrength, model.simWidth, model.simHeight)
+            .alpha(alpha)
+            .on("tick", () => {
+                clampToBounds(model.classNodes, model.simWidth, model.simHeight);
                 
-                const methodRect = methodBox.append("rect")
-                    .attr("width", d => Math.max(d.name.length * 7 + 10, 80))
-                    .attr("x", d => -Math.max(d.name.length * 7 + 10, 80) / 2)
-                    .attr("y", 30 + (i * 40))
-                    .attr("height", method_box_attrs.height)
-                    .attr("rx", method_box_attrs.rx)
-                    .attr("fill", d => d.was_called !== false ? method_box_attrs.fill : "rgba(149, 165, 166, 0.15)") // Gray if unused
-                    .attr("stroke", d => d.was_called !== false ? method_box_attrs.stroke : "#95a5a6") // Gray border if unused
-                    .attr("stroke-width", method_box_attrs["stroke-width"])
-                    .attr("stroke-dasharray", d => d.was_called === false ? "3,3" : null) // Dashed border if unused
-                    .style("pointer-events", "all");
+                // Update exit indices if classes changed their relative order
+                model.exitIndexer.updateIfOrderChanged();
                 
-                methodBox.append("text")
-                    .attrs(method_text_attrs)
-                    .attr("x", 0)
-                    .attr("y", 47 + (i * 40))
-                    .text(d => d.name)
-                    .style("pointer-events", "none"); // Text doesn't capture events
-                
-                // Add hover handlers to both the group and the rect
-                const hoverHandler = function(event, d) {
-                    event.stopPropagation(); // Prevent class node hover from firing
-
-                    // Use the new comprehensive traversal function to highlight all paths from this method
-                    highlightAllPathsFromNode(d.id, callsLink, classNode, data, methodNodes, classMethodsMap);
-                };
-                
-                const mouseoutHandler = function(event, d) {
-                    event.stopPropagation();
-                    clearHighlights(callsLink, classNode);
+                callbacks.tick();
+            })
+            .on("end", () => callbacks.end());
+    }
+    
+    function applyFrame(positions, endpoints) {
+        model.classNodes.forEach((node, i) => {
+            node.x = positions[i * 2];
+            node.y = positions[i * 2 + 1];
+        });
+        model.callsLinks.forEach((link, i) => {
+            link._endpoints = {
+                x1: endpoints[i * 4],
+                y1: endpoints[i * 4 + 1],
+                x2: endpoints[i * 4 + 2],
+                y2: endpoints[i * 4 + 3]
+            };
+        });
+    }
+    
+    // Plain-data copy of the visible graph for the worker
+    function graphMessage() {
+        return {
+            version,
+            nodes: model.classNodes.map(node => ({
+                id: node.id,
+                x: node.x,
+                y: node.y,
+                fx: node.fx,
+                fy: node.fy,
+                _xWeight: node._xWeight,
+                _bboxWidth: node._bboxWidth,
+                _bboxHeight: node._bboxHeight
+            })),
+            classLinks: model.classClassLinks.map(link => ({
+                source: linkEndpointId(link.source),
+                target: linkEndpointId(link.target)
+            })),
+            calls: model.callsLinks.map(link => {
+                const geometry = link._geometry;
+                return {
+                    source: link.source,
+                    sourceClass: nodeIndex.get(geometry.sourceClass),
+                    sourceIndex: geometry.sourceIndex,
+                    sourceWidth: geometry.sourceWidth,
+                    targetClass: nodeIndex.get(geometry.targetClass),
+                    targetIndex: geometry.targetIndex,
+                    targetWidth: geometry.targetWidth
                 };
-                
-                methodBox.on("mouseover", hoverHandler)
-                         .on("mouseout", mouseoutHandler);
-                methodRect.on("mouseover", hoverHandler)
-                          .on("mouseout", mouseoutHandler);
+            })
+        };
+    }
+    
+    function startWorker() {
+        worker = new Worker('/static/layoutWorker.js');
+        worker.onmessage = (event) => {
+            const message = event.data;
+            if (message.version !== version) return;
+            if (message.type === 'tick') {
+                applyFrame(message.positions, message.endpoints);
+                callbacks.tick();
+            } else if (message.type === 'end') {
+                callbacks.end();
             }
+        };
+        worker.onerror = (event) => {
+            console.error('Layout worker failed, running the simulation on the main thread:', event.message);
+            worker.terminate();
+            worker = null;
+            startOnMainThread();
+        };
+        
+        worker.postMessage({
+            type: 'init',
+            ...graphMessage(),
+            forceStrength,
+            alpha,
+            simWidth: model.simWidth,
+            simHeight: model.simHeight
         });
-    });
+    }
     
-    // Add hover handlers to class nodes
-    classNode.on("mouseover", function(event, d) {
-        // Find all methods in this class
-        const methods = classMethodsMap[d.id] || [];
+    if (typeof Worker !== 'undefined') {
+        startWorker();
+    } else {
+        startOnMainThread();
+    }
+    
+    return {
+        on(event, callback) {
+            callbacks[event] = callback;
+            return this;
+        },
+        // Move the running simulation to a new visible node set and reheat it,
+        // keeping the positions and velocities of classes that stay visible
+        update(newModel, reheatAlpha) {
+            model = newModel;
+            nodeIndex = new Map(model.classNodes.map((node, i) => [node, i]));
+            version++;
+            if (worker) {
+                worker.postMessage({ type: 'update', ...graphMessage(), alpha: reheatAlpha });
+            } else if (simulation) {
+                simulation.nodes(model.classNodes);
+                simulation.force("classLink").links(model.classClassLinks);
+                simulation.alpha(Math.max(simulation.alpha(), reheatAlpha)).restart();
+            }
+        },
+        setChargeStrength(strength) {
+            forceStrength = strength;
+            if (worker) {
+                worker.postMessage({ type: 'charge', strength });
+            } else if (simulation) {
+                simulation.force("charge").strength(strength);
+                simulation.alpha(0.3).restart(); // Restart simulation with new force
+            }
+        },
+        setAlphaTarget(value) {
+            if (worker) {
+                worker.postMessage({ type: 'alphaTarget', value });
+            } else if (simulation) {
+                simulation.alphaTarget(value).restart();
+            }
+        },
+        // Pin a class at (x, y); null releases it
+        fixNode(node, x, y) {
+            node.fx = x;
+            node.fy = y;
+            if (worker && nodeIndex.has(node)) {
+                worker.postMessage({ type: 'fix', index: nodeIndex.get(node), x, y });
+            }
+        },
+        releaseAll() {
+            model.classNodes.forEach(node => {
+                node.fx = null;
+                node.fy = null;
+            });
+            if (worker) {
+                worker.postMessage({ type: 'releaseAll' });
+            }
+        },
+        stop() {
+            if (worker) {
+                worker.terminate();
+                worker = null;
+            }
+            if (simulation) {
+                simulation.stop();
+            }
+        }
+    };
+}
 
-        // For each method, highlight all paths from that method using comprehensive traversal
-        methods.forEach(methodId => {
-            highlightAllPathsFromNode(methodId, callsLink, classNode, data, methodNodes, classMethodsMap);
-        });
-    })
-    .on("mouseout", function(d) {
-        clearHighlights(callsLink, classNode);
+// Send settled class positions to the server, so the next page load of the
+// same graph starts from them. A pending layout is still being computed there.
+function postSettledLayout(model) {
+    const layoutHash = model.data.layout?.hash;
+    if (!layoutHash || model.data.layout.source === 'pending' || !model.classNodes.length) return;
+    
+    const positions = {};
+    model.classNodes.forEach(node => {
+        positions[node.id] = { x: node.x, y: node.y };
     });
     
-    // Update positions on simulation tick
-    currentSimulation.on("tick", () => {
-        // Constrain nodes within larger simulation bounds (extends past visible SVG area)
-        const margin = 50;
-        const simWidth = 2000;  // Larger than SVG width (1400)
-        const simHeight = 1500; // Larger than SVG height (1000)
-        const centerX = simWidth / 2;
-        const centerY = simHeight / 2;
+    fetch(`/api/layout/${layoutHash}`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ positions })
+    }).catch(error => console.error('Error saving layout:', error));
+}
+
+// Drag handlers for class nodes, shared by the SVG and canvas renderers
+function createNodeDragHandlers(classNodes) {
+    return {
+        start(event, d) {
+            if (!event.active) currentSimulation.setAlphaTarget(0.3);
+            currentSimulation.fixNode(d, d.x, d.y);
+        },
+        drag(event, d) {
+            currentSimulation.fixNode(d, event.x, event.y);
+        },
+        end(event, d) {
+            if (!event.active) currentSimulation.setAlphaTarget(0);
+            currentSimulation.fixNode(d, null, null);
+            // Save positions immediately after dragging
+            saveNodePositions(classNodes);
+        }
+    };
+}
+
+function linkKey(link) {
+    return `${linkEndpointId(link.source)}->${linkEndpointId(link.target)}`;
+}
+
+// SVG renderer: one element per class, method box and call link. Elements are
+// joined by id, so a filter change only adds and removes what changed.
+// Has the same { setModel, update, restyle, zoomToFit, show, hide } interface as the canvas renderer.
+// Below LOD_METHOD_MIN_SCALE the method rows and calls links are hidden and
+// one edge per class pair is drawn instead.
+function createSvgView(container, svg, dragHandlers) {
+    const defs = container.select("defs");
+    const tooltip = d3.select("#tooltip");
+    const classEdgeLayer = container.append("g").attr("class", "class-edges");
+    const linkLayer = container.append("g").attr("class", "calls-links");
+    const classLayer = container.append("g").attr("class", "class-groups");
+    
+    let model = null;
+    let classEdge = classEdgeLayer.selectAll("path.class-edge");
+    let callsLink = linkLayer.selectAll("path.link");
+    let classNode = classLayer.selectAll("g.class-group");
+    let nextGradientId = 0;
+    let collapsed = false;
+    
+    // Adjacency index for hover highlighting, rebuilt after every join
+    let highlightIndex = null;
+    
+    function createGradient(d) {
+        // Create unique gradient for each link based on its path
+        const coords = getLinkEndpoints(d) || { x1: 0, y1: 0, x2: 0, y2: 0 };
+        const gradientId = `linkGradient-${nextGradientId++}`;
         
-        classNodes.forEach(node => {
-            node.x = Math.max(margin, Math.min(simWidth - margin, node.x));
-            node.y = Math.max(margin, Math.min(simHeight - margin, node.y));
-        });
+        const gradient = defs.append("linearGradient")
+            .attr("id", gradientId)
+            .attr("gradientUnits", "userSpaceOnUse")
+            .attr("x1", coords.x1)
+            .attr("y1", coords.y1)
+            .attr("x2", coords.x2)
+            .attr("y2", coords.y2);
         
-        // Update center force to match simulation bounds
-        currentSimulation.force("center", d3.forceCenter(centerX, centerY).strength(0.2));
+        gradient.append("stop")
+            .attr("offset", "0%")
+            .attr("stop-color", "#3498db") // Blue at start (source)
+            .attr("stop-opacity", 1);
         
-        // Update exit indices based on current positions
-        updateExitIndices();
+        gradient.append("stop")
+            .attr("offset", "100%")
+            .attr("stop-color", "#e74c3c") // Red at end (target)
+            .attr("stop-opacity", 1);
         
-        callsLink
-            .attr("d", d => generateLinkPath(d))
-            .each(function(d) {
-                // Update gradient coordinates as nodes move
-                if (d._gradientId) {
-                    const coords = getLinkGradientCoords(d);
-                    const gradient = defs.select(`#${d._gradientId}`);
-                    if (!gradient.empty()) {
-                        gradient
-                            .attr("x1", coords.x1)
-                            .attr("y1", coords.y1)
-                            .attr("x2", coords.x2)
-                            .attr("y2", coords.y2);
-                    }
+        d._gradientId = gradientId;
+        // Keep the element so ticks can update it without an id lookup
+        d._gradient = gradient.node();
+    }
+    
+    function enterLinks(enter) {
+        return enter.append("path")
+            .each(createGradient)
+            .attr("class", callsLinkClass)
+            .attr("stroke", d => `url(#${d._gradientId})`)
+            .attr("stroke-width", calls_link_attrs["stroke-width"])
+            .attr("stroke-dasharray", calls_link_attrs["stroke-dasharray"])
+            .attr("marker-end", calls_link_attrs["marker-end"])
+            .attr("fill", "none") // Paths need fill:none for stroke to show
+            .on("mouseover", function(event, d) {
+                // Get source and target method IDs
+                const sourceId = linkEndpointId(d.source);
+                const targetId = linkEndpointId(d.target);
+
+                // Highlight this link
+                markHighlighted(highlightIndex, this, "hover");
+
+                // For links, highlight all paths from the source (comprehensive traversal)
+                highlightAllPathsFromNode(sourceId, [sourceId], highlightIndex, model);
+
+                // Show tooltip
+                const srcMethod = d.source.name || model.nodeById.get(sourceId)?.name;
+                const tgtMethod = d.target.name || model.nodeById.get(targetId)?.name;
+                const srcClass = d.source.class || model.nodeById.get(sourceId)?.class || '';
+                const tgtClass = d.target.class || model.nodeById.get(targetId)?.class || '';
+                let countInfo = d.call_count ? `<br>Calls: ${d.call_count}` : '';
+                if (d.diff_status) {
+                    countInfo = `<br>${d.diff_status}: ${d.base_count} → ${d.head_count} calls`;
                 }
+                tooltip.style("display", "block")
+                    .html(`<strong>${srcClass}</strong>.${srcMethod}<br>→<br><strong>${tgtClass}</strong>.${tgtMethod}${countInfo}${linkTimeInfo(d)}${allocInfo(d)}${importInfo(d)}${typeInfo(d)}${scopeInfo(d)}${chattyInfo(d)}`)
+                    .style("left", (event.pageX + 10) + "px")
+                    .style("top", (event.pageY - 10) + "px");
+            })
+            .on("mouseout", function(d) {
+                // Clear all highlighting
+                clearHighlights(highlightIndex);
+                tooltip.style("display", "none");
             });
+    }
+    
+    function enterClassEdges(enter) {
+        return enter.append("path")
+            .attr("class", "link class-edge")
+            .attr("stroke", "#7f8c8d")
+            .attr("marker-end", calls_link_attrs["marker-end"])
+            .attr("fill", "none")
+            .on("mouseover", function(event, d) {
+                markHighlighted(highlightIndex, this, "hover");
+                highlightNodes(highlightIndex, [d.source.id, d.target.id]);
+                tooltip.style("display", "block")
+                    .html(`<strong>${d.source.name}</strong><br>→<br><strong>${d.target.name}</strong><br>Method calls: ${d.links.length}<br>Calls: ${d.weight}`)
+                    .style("left", (event.pageX + 10) + "px")
+                    .style("top", (event.pageY - 10) + "px");
+            })
+            .on("mouseout", function() {
+                clearHighlights(highlightIndex);
+                tooltip.style("display", "none");
+            });
+    }
+    
+    function exitLinks(exit) {
+        exit.each(d => {
+            if (d._gradient) d._gradient.remove();
+            d._gradient = null;
+        }).remove();
+    }
+    
+    function enterClasses(enter) {
+        // Draw class groups with methods inside
+        const group = enter.append("g")
+            .attr("class", "class-group")
+            .call(d3.drag()
+                .on("start", dragHandlers.start)
+                .on("drag", dragHandlers.drag)
+                .on("end", dragHandlers.end));
+        
+        // Class name box - dynamic width based on text
+        group.each(function(d) {
+            const classNameWidth = classNameBoxWidth(d.name); // Slightly wider than methods
+            const classGroup = d3.select(this);
+            
+            const boxAttrs = d.members ? cycle_box_attrs : class_box_attrs;
+            
+            classGroup.append("rect")
+                .attr("class", "class-box")
+                .attr("width", classNameWidth)
+                .attr("x", -classNameWidth / 2)
+                .attr("y", class_box_attrs.y)
+                .attr("height", class_box_attrs.height)
+                .attr("rx", class_box_attrs.rx)
+                .attr("fill", d => d.was_used !== false ? boxAttrs.fill : "rgba(149, 165, 166, 0.1)") // Gray if unused
+                .attr("stroke", d => d.was_used !== false ? boxAttrs.stroke : "#95a5a6") // Gray border if unused
+                .attr("stroke-width", class_box_attrs["stroke-width"])
+                .attr("stroke-dasharray", d => d.was_used === false ? "5,5" : null); // Dashed border if unused
+            
+            classGroup.append("text")
+                .attr("class", "class-name")
+                .attrs(class_name_attrs)
+                .text(d => d.name);
+            
+            // A cycle box lists the classes it stands for
+            if (d.members) {
+                classGroup.append("title")
+                    .text(`Cycle of ${d.members.length} classes (double-click to expand):\n${d.members.map(node => node.name).join('\n')}`);
+            }
+            
+            // Instance count badge, shown when several objects of the class were seen
+            if (d.instance_count > 1) {
+                classGroup.append("text")
+                    .attr("class", "instance-count")
+                    .attrs(instance_count_attrs)
+                    .attr("x", classNameWidth / 2 - 6)
+                    .attr("y", class_box_attrs.y + 13)
+                    .text(`×${d.instance_count}`)
+                    .append("title")
+                    .text(`${d.instance_count} instances`);
+            }
+            
+            classGroup.append("g").attr("class", "methods");
+        });
+        
+        // Add hover handlers to class nodes
+        group.on("mouseover", function(event, d) {
+            // Highlight all paths from every method in this class (or cycle) in one traversal
+            highlightAllPathsFromNode(d.id, boxMethodIds(model, d.id), highlightIndex, model);
+        })
+        .on("mouseout", function(d) {
+            clearHighlights(highlightIndex);
+        })
+        .on("dblclick", function(event, d) {
+            // Collapse or expand the cycle instead of zooming in
+            event.stopPropagation();
+            toggleCycle(d);
+        });
+        
+        return group;
+    }
+    
+    // Method boxes inside a class group; redrawn only when its visible methods change
+    function renderMethodRows(classGroup, classD) {
+        const methods = model.classMethodsMap[classD.id] || [];
+        const methodsKey = methods.join('\n');
+        if (classGroup.__methodsKey === methodsKey) return;
+        classGroup.__methodsKey = methodsKey;
+        
+        const methodGroup = d3.select(classGroup).select("g.methods");
+        methodGroup.selectAll("*").remove();
         
+        methods.forEach((methodId, i) => {
+            const method = model.nodeById.get(methodId);
+            const methodBox = methodGroup.append("g")
+                .attr("class", "method-box")
+                .attr("data-method-id", method.id)
+                .datum(method)
+                .style("cursor", "pointer")
+                .style("pointer-events", "all");
+            
+            const methodRect = methodBox.append("rect")
+                .attr("width", d => Math.max(d.name.length * 7 + 10, 80))
+                .attr("x", d => -Math.max(d.name.length * 7 + 10, 80) / 2)
+                .attr("y", 30 + (i * 40))
+                .attr("height", method_box_attrs.height)
+                .attr("rx", method_box_attrs.rx)
+                .attr("fill", d => d.was_called !== false ? method_box_attrs.fill : "rgba(149, 165, 166, 0.15)") // Gray if unused
+                .attr("stroke", d => d.was_called !== false ? method_box_attrs.stroke : "#95a5a6") // Gray border if unused
+                .attr("stroke-width", method_box_attrs["stroke-width"])
+                .attr("stroke-dasharray", d => d.was_called === false ? "3,3" : null) // Dashed border if unused
+                .style("pointer-events", "all");
+            
+            methodBox.append("text")
+                .attrs(method_text_attrs)
+                .attr("x", 0)
+                .attr("y", 47 + (i * 40))
+                .text(d => d.name)
+                .style("pointer-events", "none"); // Text doesn't capture events
+            
+            // Add hover handlers to both the group and the rect
+            const hoverHandler = function(event, d) {
+                event.stopPropagation(); // Prevent class node hover from firing
+
+                // Highlight all paths from this method
+                highlightAllPathsFromNode(d.id, [d.id], highlightIndex, model);
+            };
+            
+            const mouseoutHandler = function(event, d) {
+                event.stopPropagation();
+                clearHighlights(highlightIndex);
+            };
+            
+            methodBox.on("mouseover", hoverHandler)
+                     .on("mouseout", mouseoutHandler)
+                     .on("click", function(event, d) {
+                         if (event.defaultPrevented) return; // End of a drag
+                         if (event.shiftKey) {
+                             selectPathEndpoint(d.id);
+                         } else {
+                             showCallPaths(d.id);
+                         }
+                     });
+            methodRect.on("mouseover", hoverHandler)
+                      .on("mouseout", mouseoutHandler);
+        });
+    }
+    
+    // Highlight one call path (method ids in call order), e.g. while it is hovered in the path list
+    function highlightPath(methodIds) {
+        if (!highlightIndex) return;
+        clearHighlights(highlightIndex);
+        const pairs = methodIds.slice(1).map((target, i) => ({ source: methodIds[i], target }));
+        modelLinks(model, pairs).forEach(link => highlightLink(highlightIndex, link, "source-path"));
+        highlightNodes(highlightIndex, methodIds);
+    }
+    
+    function clearHighlight() {
+        if (highlightIndex) clearHighlights(highlightIndex);
+    }
+    
+    function setModel(newModel) {
+        model = newModel;
+        if (highlightIndex) clearHighlights(highlightIndex);
+        
+        // Draw calls links (method->method) - curved paths with arrows
+        callsLink = linkLayer.selectAll("path.link")
+            .data(model.callsLinks, linkKey)
+            .join(enterLinks, update => update, exitLinks);
+        
+        // Weights change with the visible set, so widths are set on every join
+        classEdge = classEdgeLayer.selectAll("path.class-edge")
+            .data(model.classEdges, d => d.key)
+            .join(enterClassEdges)
+            .attr("stroke-width", classEdgeWidth);
+        
+        classNode = classLayer.selectAll("g.class-group")
+            .data(model.classNodes, d => d.id)
+            .join(enterClasses, update => update, exit => exit.remove());
+        classNode.each(function(d) {
+            renderMethodRows(this, d);
+        });
+        
+        // Index links and elements once so hover highlighting only touches what it reaches
+        highlightIndex = buildHighlightIndex(model, callsLink, classNode, classEdge);
+        
+        restyle();
+        // Place entering elements right away instead of waiting for the next tick
+        update();
+    }
+    
+    // Colour links and method boxes by time, or restore their normal look
+    function restyle() {
+        callsLink.each(function(d) {
+            const style = linkTimeStyle(d);
+            this.setAttribute("stroke", style ? style.stroke : `url(#${d._gradientId})`);
+            this.setAttribute("stroke-width", style ? style.width : calls_link_attrs["stroke-width"]);
+        });
+        classNode.selectAll(".method-box rect").attr("fill", d => {
+            const fill = methodTimeFill(d);
+            return fill || (d.was_called !== false ? method_box_attrs.fill : "rgba(149, 165, 166, 0.15)");
+        });
+    }
+    
+    // Only the level of detail on screen is kept up to date; switching levels redraws it
+    function update() {
+        if (collapsed) {
+            classEdge.attr("d", d => segmentsToPath(classEdgeSegments(d)));
+        } else {
+            updateLinks();
+        }
         classNode.attr("transform", d => `translate(${d.x},${d.y})`);
-    });
+    }
     
-    // Zoom to fit when simulation ends
-    currentSimulation.on("end", () => {
+    function updateLinks() {
+        callsLink.attr("d", d => {
+            const endpoints = getLinkEndpoints(d);
+            // Update gradient coordinates as nodes move
+            const gradient = d._gradient;
+            if (gradient && endpoints) {
+                gradient.setAttribute("x1", endpoints.x1);
+                gradient.setAttribute("y1", endpoints.y1);
+                gradient.setAttribute("x2", endpoints.x2);
+                gradient.setAttribute("y2", endpoints.y2);
+            }
+            return generateLinkPath(d, endpoints);
+        });
+    }
+    
+    function setScale(scale) {
+        const shouldCollapse = scale < LOD_METHOD_MIN_SCALE;
+        if (shouldCollapse === collapsed) return;
+        collapsed = shouldCollapse;
+        container.classed("lod-collapsed", collapsed);
+        if (model) update();
+    }
+    
+    function zoomToFit() {
         const bounds = container.node().getBBox();
         const fullWidth = +svg.attr("width");
         const fullHeight = +svg.attr("height");
@@ -879,129 +1576,163 @@ function rebuildGraphWithFilters(data, container, svg, forceStrength) {
                 .duration(750)
                 .call(currentZoom.transform, d3.zoomIdentity.translate(translate[0], translate[1]).scale(scale));
         }
+    }
+    
+    function show() {
+        svg.style("display", null);
+    }
+    
+    function hide() {
+        svg.style("display", "none");
+        tooltip.style("display", "none");
+        // Drop the elements; they are recreated if the SVG is shown again
+        model = { ...model, callsLinks: [], classNodes: [], classEdges: [] };
+        linkLayer.selectAll("path.link").each(d => {
+            if (d._gradient) d._gradient.remove();
+            d._gradient = null;
+        }).remove();
+        classLayer.selectAll("g.class-group").remove();
+        classEdgeLayer.selectAll("path.class-edge").remove();
+        classEdge = classEdgeLayer.selectAll("path.class-edge");
+        callsLink = linkLayer.selectAll("path.link");
+        classNode = classLayer.selectAll("g.class-group");
+    }
+    
+    return { setModel, update, setScale, restyle, zoomToFit, show, hide, highlightPath, clearHighlight };
+}
 
-        // After simulation ends, allow nodes to be dragged and save positions periodically
-        setTimeout(() => {
-            classNodes.forEach(node => {
-                node.fx = null; // Unfix positions to allow dragging
-                node.fy = null;
+// Run `callback` once `wait` ms have passed without another call; flush() runs it now
+function debounce(callback, wait) {
+    let timer = null;
+    const debounced = () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => {
+            timer = null;
+            callback();
+        }, wait);
+    };
+    debounced.flush = () => {
+        clearTimeout(timer);
+        timer = null;
+        callback();
+    };
+    return debounced;
+}
+
+// Cycles double-clicked into the other state than the "Collapse cycles" toggle puts them in
+let toggledCycles = new Set();
+
+// Components drawn as one cycle box: every cycle while "Collapse cycles" is on,
+// except those double-clicked open, and those double-clicked shut while it is off
+function collapsedCycles(graph) {
+    const collapseAll = document.getElementById('collapse-cycles-toggle').checked;
+    const collapsed = new Set();
+    graph.componentSizes.forEach((size, component) => {
+        if (size > 1 && collapseAll !== toggledCycles.has(component)) collapsed.add(component);
+    });
+    
+    // The classes of a cycle that opens again gather where its box was moved to
+    graph.cycleBoxes.forEach((box, component) => {
+        if (collapsed.has(component)) return;
+        const placed = box.members.filter(node => node.x !== undefined);
+        if (placed.length && box.x !== undefined) {
+            const dx = box.x - d3.mean(placed, node => node.x);
+            const dy = box.y - d3.mean(placed, node => node.y);
+            placed.forEach(node => {
+                node.x += dx;
+                node.y += dy;
+                if (node.fx != null) node.fx += dx;
+                if (node.fy != null) node.fy += dy;
             });
-        }, 1000); // Wait 1 second after zoom animation
+        }
+        graph.cycleBoxes.delete(component);
     });
+    return collapsed;
+}
 
-    // Set up periodic saving of node positions every 10 seconds
-    if (window.positionSaveInterval) {
-        clearInterval(window.positionSaveInterval);
+// Double-clicking a class of a cycle collapses the cycle into one box; double-clicking the box expands it
+function toggleCycle(node) {
+    if (!currentGraph || !(currentGraph.componentSizes.get(node.component) > 1)) return;
+    if (toggledCycles.has(node.component)) {
+        toggledCycles.delete(node.component);
+    } else {
+        toggledCycles.add(node.component);
     }
-    window.positionSaveInterval = setInterval(() => {
-        saveNodePositions(classNodes);
-    }, 10000); // Save every 10 seconds
+    applyFilters();
 }
 
-function setupFilters(initialForceStrength) {
-    // Filter functionality
+// Filter listeners are attached once; later renders just re-apply the filters
+let filtersInitialized = false;
+
+function applyFilters() {
+    const filterInput = document.getElementById('class-filter');
+    const filterValue = filterInput.value.trim();
+    
+    // Compile regex or set to null if empty
     let filterRegex = null;
-    let showUnused = false; // Default to hiding unused classes/methods
-    let currentForceStrength = initialForceStrength;
+    try {
+        filterRegex = filterValue ? new RegExp(filterValue, 'i') : null;
+    } catch (e) {
+        // Invalid regex - don't filter
+        filterInput.style.borderColor = '#e74c3c';
+        return;
+    }
     
-    function applyFilters() {
-        const filterInput = document.getElementById('class-filter');
-        const filterValue = filterInput.value.trim();
-        
-        // Compile regex or set to null if empty
-        try {
-            filterRegex = filterValue ? new RegExp(filterValue, 'i') : null;
-        } catch (e) {
-            // Invalid regex - don't filter
-            filterRegex = null;
-            filterInput.style.borderColor = '#e74c3c';
-            return;
-        }
-        
-        filterInput.style.borderColor = '';
-        
-        // Get show unused toggle state
-        const showUnusedToggle = document.getElementById('show-unused-toggle');
-        showUnused = showUnusedToggle.checked;
-        
-        if (!originalData) return;
-        
-        // Create filtered copy of data
-        const filteredData = JSON.parse(JSON.stringify(originalData));
-        
-        // Helper function to check if a class name matches the filter
-        const isFiltered = (className) => {
-            if (!filterRegex || !className) return false;
-            return filterRegex.test(className);
-        };
-        
-        // Helper to get class name from a method node ID (format: "ClassName::methodName")
-        const getClassFromMethodId = (methodId) => {
-            if (!methodId) return null;
-            const match = methodId.match(/^(.+?)::/);
-            return match ? match[1] : null;
-        };
-        
-        // Filter class nodes
-        const filteredClassNodes = filteredData.nodes
-            .filter(d => d.type === 'class')
-            .filter(d => {
-                if (isFiltered(d.id)) return false;
-                if (!showUnused && d.was_used === false) return false;
-                return true;
-            });
-        
-        const filteredClassIds = new Set(filteredClassNodes.map(d => d.id));
-        
-        // Filter method nodes (only keep methods from visible classes)
-        let filteredMethodNodes = filteredData.nodes
-            .filter(d => d.type === 'method')
-            .filter(d => {
-                const className = getClassFromMethodId(d.id);
-                if (!className || !filteredClassIds.has(className)) return false;
-                
-                // If class is visible, check if we should show unused methods
-                if (!showUnused && d.was_called === false) return false;
-                return true;
-            });
-        
-        // Filter contains links (only keep links for visible classes/methods)
-        const filteredContainsLinks = filteredData.links
-            .filter(d => d.type === 'contains')
-            .filter(d => filteredClassIds.has(d.source) && filteredMethodNodes.some(m => m.id === d.target));
-        
-        // Filter calls links (only keep links between visible methods)
-        const filteredMethodIds = new Set(filteredMethodNodes.map(d => d.id));
-        const filteredCallsLinks = filteredData.links
-            .filter(d => d.type === 'calls')
-            .filter(d => {
-                const sourceId = typeof d.source === 'string' ? d.source : (d.source?.id || d.source);
-                const targetId = typeof d.target === 'string' ? d.target : (d.target?.id || d.target);
-                return filteredMethodIds.has(sourceId) && filteredMethodIds.has(targetId);
-            });
-        
-        // Rebuild filtered data structure
-        const rebuildData = {
-            nodes: [...filteredClassNodes, ...filteredMethodNodes],
-            links: [...filteredContainsLinks, ...filteredCallsLinks]
-        };
-        
-        // Rebuild graph with filtered data
-        rebuildGraphWithFilters(rebuildData, currentContainer, currentSvg, currentForceStrength);
+    filterInput.style.borderColor = '';
+    
+    // Get show unused toggle state (default is to hide unused classes/methods)
+    const showUnused = document.getElementById('show-unused-toggle').checked;
+    
+    if (!currentGraph) return;
+    
+    // Helper function to check if a class name matches the filter
+    const isFiltered = (className) => {
+        if (!filterRegex || !className) return false;
+        return filterRegex.test(className);
+    };
+    
+    const model = buildVisibleModel(
+        currentGraph,
+        classNode => !isFiltered(classNode.id) && (showUnused || classNode.was_used !== false),
+        method => showUnused || method.was_called !== false,
+        collapsedCycles(currentGraph)
+    );
+    showVisibleGraph(model);
+}
+
+function setupFilters() {
+    if (filtersInitialized) {
+        applyFilters();
+        return;
     }
+    filtersInitialized = true;
     
-    // Add event listener to filter input
+    // Typing only re-filters once the user pauses; Enter applies right away
+    const debouncedApplyFilters = debounce(applyFilters, FILTER_DEBOUNCE_MS);
     const filterInput = document.getElementById('class-filter');
-    filterInput.addEventListener('input', applyFilters);
+    filterInput.addEventListener('input', debouncedApplyFilters);
     filterInput.addEventListener('keypress', function(e) {
         if (e.key === 'Enter') {
-            applyFilters();
+            debouncedApplyFilters.flush();
         }
     });
     
     // Add event listener to show unused toggle
     const showUnusedToggle = document.getElementById('show-unused-toggle');
     showUnusedToggle.addEventListener('change', applyFilters);
+    
+    // Collapsing all cycles drops the ones opened or closed by hand
+    document.getElementById('collapse-cycles-toggle').addEventListener('change', function() {
+        toggledCycles.clear();
+        applyFilters();
+    });
+    
+    // Colouring by time or memory only changes styles, not the visible set
+    const timeMetricSelect = document.getElementById('time-metric-select');
+    timeMetricSelect.addEventListener('change', function() {
+        currentTimeMetric = timeMetricSelect.value;
+        if (currentView) currentView.restyle();
+    });
 
     // Add event listener to clear trace data button
     const clearTraceBtn = document.getElementById('clear-trace-btn');
@@ -1017,6 +1748,10 @@ function setupFilters(initialForceStrength) {
 
                 if (response.ok) {
                     // Clear the current visualization
+                    if (currentSimulation) {
+                        currentSimulation.stop();
+                        currentSimulation = null;
+                    }
                     const graphContainer = document.getElementById('graph');
                     graphContainer.innerHTML = '<div class="loading">Trace data cleared. Run generate_trace_data.py to create new trace data.</div>';
                     alert('Trace data cleared successfully!');
@@ -1034,6 +1769,261 @@ function setupFilters(initialForceStrength) {
     applyFilters();
 }
 
+function setupLayerSelect() {
+    const layerSelect = document.getElementById('layer-select');
+    layerSelect.addEventListener('change', function() {
+        currentLayer = layerSelect.value;
+        document.getElementById('graph').innerHTML = '<div class="loading">Loading graph data...</div>';
+        loadGraph();
+    });
+}
+
+// Stored run comparison
+function formatRunLabel(run) {
+    const parts = [run.scenario || 'run'];
+    if (run.branch || run.commit) {
+        parts.push(`${run.branch || '?'}@${(run.commit || '').slice(0, 7)}`);
+    }
+    parts.push(new Date(run.created_at).toLocaleString());
+    return parts.join(' · ');
+}
+
+async function setupRunComparison() {
+    const baseSelect = document.getElementById('run-base-select');
+    const headSelect = document.getElementById('run-head-select');
+    const diffBtn = document.getElementById('diff-btn');
+
+    try {
+        const response = await fetch('/api/runs');
+        const { runs } = await response.json();
+
+        runs.forEach(run => {
+            [baseSelect, headSelect].forEach(select => {
+                const option = document.createElement('option');
+                option.value = run.run_id;
+                option.textContent = formatRunLabel(run);
+                select.appendChild(option);
+            });
+        });
+
+        // Default to comparing the previous run against the latest one
+        if (runs.length > 1) {
+            baseSelect.value = runs[1].run_id;
+            headSelect.value = runs[0].run_id;
+        }
+        diffBtn.disabled = runs.length < 2;
+    } catch (error) {
+        console.error('Error loading stored runs:', error);
+        diffBtn.disabled = true;
+    }
+
+    diffBtn.addEventListener('click', async function() {
+        const threshold = document.getElementById('diff-threshold').value || '0.5';
+        const query = new URLSearchParams({
+            base: baseSelect.value,
+            head: headSelect.value,
+            threshold: threshold
+        });
+
+        try {
+            const response = await fetch('/api/diff?' + query.toString());
+            const diff = await response.json();
+            if (!response.ok) {
+                throw new Error(diff.message || diff.error);
+            }
+            useServerQueries(false);
+            renderGraph(diff.graph);
+            renderDiffSummary(diff);
+        } catch (error) {
+            alert('Failed to diff runs: ' + error.message);
+        }
+    });
+}
+
+function renderDiffSummary(diff) {
+    const summary = document.getElementById('diff-summary');
+    const edgeLabel = edge => `${edge.source} → ${edge.target}`;
+
+    const sections = [
+        ['New edges', diff.added, edge => `${edgeLabel(edge)} (${edge.head_count} calls)`],
+        ['Removed edges', diff.removed, edge => `${edgeLabel(edge)} (${edge.base_count} calls)`],
+        ['Call count changed', diff.changed, edge => `${edgeLabel(edge)}: ${edge.base_count} → ${edge.head_count}`]
+    ];
+
+    summary.innerHTML = '';
+    const title = document.createElement('h3');
+    title.textContent = `Run diff: ${diff.summary.added} new, ${diff.summary.removed} removed, ` +
+        `${diff.summary.changed} changed by more than ${Math.round(diff.threshold * 100)}%`;
+    summary.appendChild(title);
+
+    sections.forEach(([heading, edges, format]) => {
+        if (!edges.length) return;
+        const label = document.createElement('strong');
+        label.textContent = heading;
+        const list = document.createElement('ul');
+        edges.forEach(edge => {
+            const item = document.createElement('li');
+            item.textContent = format(edge);
+            list.appendChild(item);
+        });
+        summary.appendChild(label);
+        summary.appendChild(list);
+    });
+
+    summary.style.display = 'block';
+}
+
+// List of N+1 / chatty call findings shipped with the trace
+function renderChattySummary(findings) {
+    const summary = document.getElementById('chatty-summary');
+    summary.innerHTML = '';
+    if (!findings.length) {
+        summary.style.display = 'none';
+        return;
+    }
+
+    const title = document.createElement('h3');
+    title.textContent = `Repeated calls (N+1): ${findings.length} caller → callee pair${findings.length === 1 ? '' : 's'}`;
+    summary.appendChild(title);
+
+    const list = document.createElement('ul');
+    findings.forEach(finding => {
+        const item = document.createElement('li');
+        const sites = finding.call_sites.map(site => `${site.file.split('/').pop()}:${site.line}`).join(', ');
+        item.textContent = `${finding.source} → ${finding.target}` +
+            `${finding.infrastructure ? ' [infrastructure]' : ''}: ` +
+            `up to ${finding.max_per_invocation} calls per invocation, mean ${finding.mean_per_invocation}, ` +
+            `${finding.chatty_invocations}/${finding.parent_invocations} invocations over ${finding.threshold}` +
+            (sites ? ` (at ${sites})` : '');
+        list.appendChild(item);
+    });
+    summary.appendChild(list);
+    summary.style.display = 'block';
+}
+
+// Distinct call paths that reach a method, from the trace's calling context tree
+async function showCallPaths(methodId) {
+    if (currentLayer !== 'calls') return;
+    const summary = document.getElementById('call-paths');
+    try {
+        const response = await fetch('/api/call-paths?' + new URLSearchParams({ method: methodId }).toString());
+        const result = await response.json();
+        if (!response.ok) {
+            throw new Error(result.message || result.error);
+        }
+        renderCallPaths(result);
+    } catch (error) {
+        summary.innerHTML = '';
+        const message = document.createElement('p');
+        message.textContent = `Call paths to ${methodId}: ${error.message}`;
+        summary.appendChild(message);
+        summary.style.display = 'block';
+    }
+}
+
+// Method picked with shift-click as the start of a path query, until its end is picked
+let pathStart = null;
+
+// Shift-click two methods to list the call paths from the first to the second,
+// answered from the server's precomputed reachability index (/api/graph/paths)
+async function selectPathEndpoint(methodId) {
+    const summary = document.getElementById('method-paths');
+    summary.innerHTML = '';
+    const title = document.createElement('h3');
+    summary.appendChild(title);
+    summary.style.display = 'block';
+
+    if (!serverReachable) {
+        pathStart = null;
+        title.textContent = "Paths between methods are only available on the current trace's call graph";
+        return;
+    }
+    if (pathStart === null) {
+        pathStart = methodId;
+        title.textContent = `Paths from ${methodId}: shift-click the method they should lead to`;
+        return;
+    }
+
+    const from = pathStart;
+    pathStart = null;
+    try {
+        const query = new URLSearchParams({ from, to: methodId, k: 5 });
+        const response = await fetch('/api/graph/paths?' + query.toString());
+        const result = await response.json();
+        if (!response.ok) {
+            throw new Error(result.message || result.error);
+        }
+        renderMethodPaths(result);
+    } catch (error) {
+        title.textContent = `Paths from ${from} to ${methodId}: ${error.message}`;
+    }
+}
+
+function renderMethodPaths(result) {
+    const summary = document.getElementById('method-paths');
+    summary.innerHTML = '';
+
+    const title = document.createElement('h3');
+    title.textContent = result.reachable
+        ? `Shortest call paths from ${result.from} to ${result.to} (hover one to highlight it)`
+        : `No call path leads from ${result.from} to ${result.to}`;
+    summary.appendChild(title);
+
+    const list = document.createElement('ol');
+    result.paths.forEach(path => {
+        const item = document.createElement('li');
+        item.textContent = path.join(' → ');
+        item.addEventListener('mouseenter', () => currentView && currentView.highlightPath(path));
+        item.addEventListener('mouseleave', () => currentView && currentView.clearHighlight());
+        list.appendChild(item);
+    });
+    summary.appendChild(list);
+    summary.style.display = 'block';
+}
+
+function renderCallPaths(result) {
+    const summary = document.getElementById('call-paths');
+    summary.innerHTML = '';
+
+    const title = document.createElement('h3');
+    const timeInfo = result.total_time_ns !== undefined ? `, ${formatDuration(result.total_time_ns)}` : '';
+    title.textContent = `Call paths to ${result.method}: ${result.path_count} distinct, ` +
+        `${result.calls} calls${timeInfo}`;
+    summary.appendChild(title);
+
+    const method = currentGraph && currentGraph.nodeById.get(result.method);
+    if (method && method.types) {
+        const types = document.createElement('p');
+        types.textContent = `Sampled types: ${formatTypes(method.types)}`;
+        summary.appendChild(types);
+    }
+
+    const list = document.createElement('ol');
+    result.paths.forEach(entry => {
+        const item = document.createElement('li');
+        const weight = document.createElement('strong');
+        const time = entry.total_time_ns !== undefined
+            ? `, ${formatDuration(entry.total_time_ns)} total, ${formatDuration(entry.self_time_ns)} self` : '';
+        weight.textContent = `${entry.calls} calls (${Math.round(entry.share * 100)}%${time})`;
+        item.appendChild(weight);
+        item.appendChild(document.createTextNode(': ' + entry.path.join(' → ')));
+        list.appendChild(item);
+    });
+    summary.appendChild(list);
+
+    if (result.path_count > result.paths.length) {
+        const more = document.createElement('p');
+        more.textContent = `${result.path_count - result.paths.length} lighter paths not shown`;
+        summary.appendChild(more);
+    }
+    if (result.truncated_calls) {
+        const truncated = document.createElement('p');
+        truncated.textContent = `${result.truncated_calls} calls in the trace were beyond the context depth or size limits`;
+        summary.appendChild(truncated);
+    }
+    summary.style.display = 'block';
+}
+
 // Node position persistence functions
 function saveNodePositions(nodes) {
     const positions = {};
@@ -1053,17 +2043,29 @@ function loadNodePositions() {
     return saved ? JSON.parse(saved) : {};
 }
 
-function restoreNodePositions(nodes) {
+// Positions saved in this browser win; otherwise start from the server layout.
+// Returns how many nodes got a position.
+function restoreNodePositions(nodes, layout) {
     const savedPositions = loadNodePositions();
+    const serverPositions = (layout && layout.positions) || {};
+    let restoredCount = 0;
     nodes.forEach(node => {
         if (savedPositions[node.id]) {
             node.x = savedPositions[node.id].x;
             node.y = savedPositions[node.id].y;
             node.fx = node.x; // Fix position initially
             node.fy = node.y;
+            restoredCount++;
+        } else if (serverPositions[node.id]) {
+            node.x = serverPositions[node.id].x;
+            node.y = serverPositions[node.id].y;
+            restoredCount++;
         }
     });
+    return restoredCount;
 }
 
 // Load graph on page load
 loadGraph();
+setupLayerSelect();
+setupRunComparison();
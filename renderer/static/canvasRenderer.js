@@ -0,0 +1,789 @@
+// Canvas renderer for large call graphs.
+//
+// Draws the same class boxes, method rows and call links as the SVG renderer,
+// but into a single <canvas>, so the page does not hold one DOM element per
+// box, link and gradient. Hit-testing for hover, tooltips and drag goes
+// through spatial indexes instead of DOM events.
+//
+// Only what lies in the viewport is drawn: classes are looked up in a d3
+// quadtree and links in a uniform grid over their bounding boxes. Below
+// LOD_METHOD_MIN_SCALE classes collapse to their name box and call links are
+// replaced by one aggregated edge per class pair.
+
+// Above either threshold the graph is drawn on canvas instead of SVG.
+// ?renderer=canvas or ?renderer=svg in the page URL overrides the choice.
+const CANVAS_NODE_THRESHOLD = 1500;
+const CANVAS_LINK_THRESHOLD = 2000;
+
+// Zoom scale below which classes are drawn collapsed (shared with the SVG view)
+const LOD_METHOD_MIN_SCALE = 0.6;
+
+// Cell size (world units) of the link culling grid
+const CULL_GRID_CELL_SIZE = 400;
+
+// Link styles by highlight/diff state, mirroring the .link CSS rules
+const canvas_link_styles = {
+    default: { stroke: "#7f8c8d", width: 2, alpha: 0.9 },
+    "diff-added": { stroke: "#27ae60", width: 3, alpha: 1 },
+    "diff-removed": { stroke: "#95a5a6", width: 2, alpha: 0.6 },
+    "diff-changed": { stroke: "#f39c12", width: 3, alpha: 1 },
+    chatty: { stroke: "#8e44ad", width: 3, alpha: 1 },
+    "source-path": { stroke: "#3498db", width: 3, alpha: 0.8 },
+    "target-path": { stroke: "#e74c3c", width: 3, alpha: 0.8 },
+    hover: { stroke: "#2c3e50", width: 4, alpha: 1 }
+};
+
+// Highlighted links are drawn last so they sit on top
+const canvas_link_style_order = ["default", "chatty", "diff-removed", "diff-added", "diff-changed", "source-path", "target-path", "hover"];
+
+const canvas_highlight_style = {
+    stroke: "#f39c12",
+    width: 3,
+    classFill: "rgba(243, 156, 18, 0.2)",
+    methodFill: "rgba(243, 156, 18, 0.3)"
+};
+
+// Below this zoom scale labels are unreadable, so they are not drawn
+const CANVAS_TEXT_MIN_SCALE = 0.35;
+
+// Hover distance for links, in screen pixels
+const CANVAS_LINK_HIT_RADIUS = 6;
+
+function shouldUseCanvasRenderer(nodeCount, linkCount) {
+    const override = new URLSearchParams(window.location.search).get('renderer');
+    if (override === 'canvas') return true;
+    if (override === 'svg') return false;
+    return nodeCount > CANVAS_NODE_THRESHOLD || linkCount > CANVAS_LINK_THRESHOLD;
+}
+
+// Stroke width of an aggregated class edge, growing with its total call count
+function classEdgeWidth(edge) {
+    return Math.min(8, 1.5 + Math.log2(edge.weight));
+}
+
+function traceRoundedRect(context, x, y, width, height, radius) {
+    context.moveTo(x + radius, y);
+    context.arcTo(x + width, y, x + width, y + height, radius);
+    context.arcTo(x + width, y + height, x, y + height, radius);
+    context.arcTo(x, y + height, x, y, radius);
+    context.arcTo(x, y, x + width, y, radius);
+    context.closePath();
+}
+
+function traceLinkPath(context, segments) {
+    context.moveTo(segments.start[0], segments.start[1]);
+    segments.curves.forEach(c => context.bezierCurveTo(c[0], c[1], c[2], c[3], c[4], c[5]));
+}
+
+function traceArrowhead(context, segments) {
+    const last = segments.curves[segments.curves.length - 1];
+    const tipX = last[4];
+    const tipY = last[5];
+    let angle = Math.atan2(tipY - last[3], tipX - last[2]);
+    if (!isFinite(angle) || (tipX === last[2] && tipY === last[3])) angle = 0;
+    const length = 10;
+    const halfWidth = 5;
+    const cos = Math.cos(angle);
+    const sin = Math.sin(angle);
+    context.moveTo(tipX, tipY);
+    context.lineTo(tipX - length * cos + halfWidth * sin, tipY - length * sin - halfWidth * cos);
+    context.lineTo(tipX - length * cos - halfWidth * sin, tipY - length * sin + halfWidth * cos);
+    context.closePath();
+}
+
+// Points along a bezier curve, spaced so no gap is wider than the hover radius
+function sampleCurve(x0, y0, c, points) {
+    const chord = Math.hypot(c[4] - x0, c[5] - y0) + Math.hypot(c[2] - c[0], c[3] - c[1]);
+    const steps = Math.max(2, Math.min(64, Math.ceil(chord / 10)));
+    for (let i = 1; i <= steps; i++) {
+        const t = i / steps;
+        const mt = 1 - t;
+        const a = mt * mt * mt, b = 3 * mt * mt * t, d = 3 * mt * t * t, e = t * t * t;
+        points.push([
+            a * x0 + b * c[0] + d * c[2] + e * c[4],
+            a * y0 + b * c[1] + d * c[3] + e * c[5]
+        ]);
+    }
+}
+
+// Distance from a point to a link path, measured on sampled points
+function distanceToSegments(segments, x, y) {
+    const points = [segments.start];
+    let [x0, y0] = segments.start;
+    segments.curves.forEach(c => {
+        sampleCurve(x0, y0, c, points);
+        x0 = c[4];
+        y0 = c[5];
+    });
+    let best = Infinity;
+    points.forEach(point => {
+        best = Math.min(best, Math.hypot(point[0] - x, point[1] - y));
+    });
+    return best;
+}
+
+// Bezier curves stay inside the hull of their control points, so the control
+// points give a bounding box
+function segmentsBounds(segments) {
+    let minX = segments.start[0], maxX = minX;
+    let minY = segments.start[1], maxY = minY;
+    segments.curves.forEach(c => {
+        for (let i = 0; i < 6; i += 2) {
+            minX = Math.min(minX, c[i]);
+            maxX = Math.max(maxX, c[i]);
+            minY = Math.min(minY, c[i + 1]);
+            maxY = Math.max(maxY, c[i + 1]);
+        }
+    });
+    return { minX, minY, maxX, maxY };
+}
+
+// Uniform grid over item bounding boxes. Items spanning more than
+// `maxCells` cells go to a short list that every query returns.
+function createGridIndex(cellSize, maxCells = 64) {
+    const cells = new Map();
+    const large = [];
+
+    function insert(item, bounds) {
+        const x0 = Math.floor(bounds.minX / cellSize);
+        const x1 = Math.floor(bounds.maxX / cellSize);
+        const y0 = Math.floor(bounds.minY / cellSize);
+        const y1 = Math.floor(bounds.maxY / cellSize);
+        if ((x1 - x0 + 1) * (y1 - y0 + 1) > maxCells) {
+            large.push(item);
+            return;
+        }
+        for (let cx = x0; cx <= x1; cx++) {
+            for (let cy = y0; cy <= y1; cy++) {
+                const key = cx + ',' + cy;
+                if (!cells.has(key)) cells.set(key, []);
+                cells.get(key).push(item);
+            }
+        }
+    }
+
+    // Items whose cells overlap the rectangle (a superset of the items inside it)
+    function query(minX, minY, maxX, maxY) {
+        const found = new Set(large);
+        const x0 = Math.floor(minX / cellSize);
+        const x1 = Math.floor(maxX / cellSize);
+        const y0 = Math.floor(minY / cellSize);
+        const y1 = Math.floor(maxY / cellSize);
+        for (let cx = x0; cx <= x1; cx++) {
+            for (let cy = y0; cy <= y1; cy++) {
+                const items = cells.get(cx + ',' + cy);
+                if (items) items.forEach(item => found.add(item));
+            }
+        }
+        return found;
+    }
+
+    return { insert, query };
+}
+
+// Path segments of every item plus a grid over their bounds, for culling and hit-testing
+function buildLinkLayer(items, segmentsOf) {
+    const segments = new Map();
+    const grid = createGridIndex(CULL_GRID_CELL_SIZE);
+    items.forEach(item => {
+        const itemSegments = segmentsOf(item);
+        if (!itemSegments) return;
+        segments.set(item, itemSegments);
+        grid.insert(item, segmentsBounds(itemSegments));
+    });
+    return { segments, grid };
+}
+
+function createCanvasRenderer(graphElement, width, height, dragHandlers) {
+    const pixelRatio = window.devicePixelRatio || 1;
+    const canvas = d3.select(graphElement)
+        .append("canvas")
+        .attr("class", "graph-canvas")
+        .attr("width", width * pixelRatio)
+        .attr("height", height * pixelRatio)
+        .style("width", width + "px")
+        .style("height", height + "px")
+        .style("display", "none");
+    const context = canvas.node().getContext("2d");
+    const tooltip = d3.select("#tooltip");
+
+    let model = null;
+    let transform = d3.zoomIdentity;
+    let frameRequested = false;
+
+    // Per-class drawing boxes, built once per model
+    let classBoxes = new Map();
+    let maxHalfWidth = 0;
+    let maxHeight = 0;
+
+    // Spatial indexes, rebuilt lazily after nodes move
+    let classTree = null;
+    let linkLayer = null;
+    let edgeLayer = null;
+    let indexesDirty = true;
+
+    // Current highlight: link/class edge -> style name, plus highlighted method/class ids
+    let highlight = { links: new Map(), edges: new Map(), methods: new Set(), classes: new Set() };
+    let hoverTarget = null;
+    let dragging = false;
+
+    const zoom = d3.zoom()
+        .scaleExtent([0.1, 4])
+        .filter(function(event) {
+            // Ctrl/Cmd+wheel adjusts the force instead of zooming
+            if (event.type === 'wheel') {
+                return !event.ctrlKey && !event.metaKey;
+            }
+            return !event.button;
+        })
+        .on("zoom", (event) => {
+            transform = event.transform;
+            requestDraw();
+        });
+
+    const drag = d3.drag()
+        .container(function() { return this; })
+        .subject(function(event) {
+            const [x, y] = transform.invert([event.x, event.y]);
+            const node = findClassAt(x, y);
+            return node ? { node, x: transform.applyX(node.x), y: transform.applyY(node.y) } : null;
+        })
+        .on("start", function(event) {
+            dragging = true;
+            hideTooltip();
+            dragHandlers.start(event, event.subject.node);
+        })
+        .on("drag", function(event) {
+            const node = event.subject.node;
+            const dragEvent = { active: event.active, x: transform.invertX(event.x), y: transform.invertY(event.y) };
+            dragHandlers.drag(dragEvent, node);
+            requestDraw();
+        })
+        .on("end", function(event) {
+            dragging = false;
+            dragHandlers.end(event, event.subject.node);
+        });
+
+    // Drag is registered first so it claims presses on a class before zoom pans
+    canvas.call(drag).call(zoom);
+
+    // Double-clicking a class collapses or expands its cycle; elsewhere it zooms in as usual
+    const zoomOnDoubleClick = canvas.on("dblclick.zoom");
+    canvas.on("dblclick.zoom", function(event, ...args) {
+        if (model) {
+            const [px, py] = d3.pointer(event, this);
+            const [x, y] = transform.invert([px, py]);
+            const node = findClassAt(x, y);
+            if (node) {
+                toggleCycle(node);
+                return;
+            }
+        }
+        zoomOnDoubleClick.call(this, event, ...args);
+    });
+
+    canvas.on("mousemove", function(event) {
+        if (dragging || !model) return;
+        const [px, py] = d3.pointer(event, this);
+        const [x, y] = transform.invert([px, py]);
+        updateHover(hitTest(x, y), event);
+    });
+
+    canvas.on("mouseleave", function() {
+        updateHover(null, null);
+    });
+
+    // Clicking a method lists the call paths that reach it; shift-clicking two lists the paths between them
+    canvas.on("click", function(event) {
+        if (event.defaultPrevented || !model) return;
+        const [px, py] = d3.pointer(event, this);
+        const [x, y] = transform.invert([px, py]);
+        const target = hitTest(x, y);
+        if (!target || target.type !== 'method') return;
+        if (event.shiftKey) {
+            selectPathEndpoint(target.id);
+        } else {
+            showCallPaths(target.id);
+        }
+    });
+
+    function isCollapsed() {
+        return transform.k < LOD_METHOD_MIN_SCALE;
+    }
+
+    function setModel(newModel) {
+        model = newModel;
+        hoverTarget = null;
+        clearHighlight();
+
+        classBoxes = new Map();
+        maxHalfWidth = 0;
+        maxHeight = 0;
+        model.classNodes.forEach(node => {
+            const methods = (model.classMethodsMap[node.id] || [])
+                .map(methodId => model.nodeById.get(methodId))
+                .filter(Boolean);
+            const nameWidth = classNameBoxWidth(node.name);
+            const methodWidths = methods.map(method => methodBoxWidth(method.name));
+            const halfWidth = Math.max(nameWidth, ...methodWidths) / 2;
+            const boxHeight = 40 + methods.length * 40;
+            classBoxes.set(node.id, { methods, methodWidths, nameWidth, halfWidth, boxHeight });
+            maxHalfWidth = Math.max(maxHalfWidth, halfWidth);
+            maxHeight = Math.max(maxHeight, boxHeight);
+        });
+
+        indexesDirty = true;
+        requestDraw();
+    }
+
+    // Called whenever node positions change
+    function update() {
+        indexesDirty = true;
+        requestDraw();
+    }
+
+    function requestDraw() {
+        if (frameRequested) return;
+        frameRequested = true;
+        window.requestAnimationFrame(() => {
+            frameRequested = false;
+            draw();
+        });
+    }
+
+    function rebuildIndexes() {
+        classTree = d3.quadtree()
+            .x(d => d.x)
+            .y(d => d.y)
+            .addAll(model.classNodes);
+        // Link layers are rebuilt on first use, so only the level being drawn is paid for
+        linkLayer = null;
+        edgeLayer = null;
+        indexesDirty = false;
+    }
+
+    function getLinkLayer() {
+        if (indexesDirty) rebuildIndexes();
+        if (!linkLayer) {
+            linkLayer = buildLinkLayer(model.callsLinks, link => {
+                const endpoints = getLinkEndpoints(link);
+                return endpoints ? linkPathSegments(endpoints, link._geometry.sameClass) : null;
+            });
+        }
+        return linkLayer;
+    }
+
+    function getEdgeLayer() {
+        if (indexesDirty) rebuildIndexes();
+        if (!edgeLayer) {
+            edgeLayer = buildLinkLayer(model.classEdges, classEdgeSegments);
+        }
+        return edgeLayer;
+    }
+
+    // Visible world rectangle
+    function viewport() {
+        const [minX, minY] = transform.invert([0, 0]);
+        const [maxX, maxY] = transform.invert([width, height]);
+        return { minX, minY, maxX, maxY };
+    }
+
+    // Classes whose box may overlap a world rectangle
+    function classesIn(view) {
+        if (indexesDirty) rebuildIndexes();
+        // Boxes reach maxHalfWidth sideways, 20 above and up to maxHeight - 20 below their centre
+        const minX = view.minX - maxHalfWidth;
+        const maxX = view.maxX + maxHalfWidth;
+        const minY = view.minY - maxHeight;
+        const maxY = view.maxY + 20;
+        const found = [];
+        classTree.visit((quad, x0, y0, x1, y1) => {
+            if (!quad.length) {
+                let leaf = quad;
+                do {
+                    const node = leaf.data;
+                    if (node.x >= minX && node.x <= maxX && node.y >= minY && node.y <= maxY) {
+                        found.push(node);
+                    }
+                } while ((leaf = leaf.next));
+            }
+            return x0 > maxX || x1 < minX || y0 > maxY || y1 < minY;
+        });
+        return found;
+    }
+
+    function linkStyleName(link) {
+        if (highlight.links.has(link)) return highlight.links.get(link);
+        if (link.diff_status) return `diff-${link.diff_status}`;
+        return link.chatty ? "chatty" : "default";
+    }
+
+    function draw() {
+        context.save();
+        context.setTransform(pixelRatio, 0, 0, pixelRatio, 0, 0);
+        context.clearRect(0, 0, width, height);
+        if (!model) {
+            context.restore();
+            return;
+        }
+        context.translate(transform.x, transform.y);
+        context.scale(transform.k, transform.k);
+
+        const view = viewport();
+        const collapsed = isCollapsed();
+        if (collapsed) {
+            drawClassEdges(view);
+        } else {
+            drawLinks(view);
+        }
+        drawClasses(view, collapsed);
+
+        context.restore();
+    }
+
+    // Links are grouped by style so each group is a single stroke and fill call
+    function drawLinks(view) {
+        const layer = getLinkLayer();
+        const buckets = new Map();
+        const timeBuckets = [];
+        layer.grid.query(view.minX, view.minY, view.maxX, view.maxY).forEach(link => {
+            const styleName = linkStyleName(link);
+            const timeStyle = styleName === "default" ? linkTimeStyle(link) : null;
+            if (timeStyle) {
+                // Coloured by time: one group per time step
+                if (!timeBuckets[timeStyle.level]) timeBuckets[timeStyle.level] = { style: timeStyle, segmentsList: [] };
+                timeBuckets[timeStyle.level].segmentsList.push(layer.segments.get(link));
+                return;
+            }
+            if (!buckets.has(styleName)) buckets.set(styleName, []);
+            buckets.get(styleName).push(layer.segments.get(link));
+        });
+
+        timeBuckets.forEach(bucket => {
+            if (!bucket) return;
+            strokeLinks(bucket.segmentsList, { stroke: bucket.style.stroke, alpha: 0.9 }, bucket.style.width, [3, 3]);
+        });
+        canvas_link_style_order.forEach(styleName => {
+            const segmentsList = buckets.get(styleName);
+            if (!segmentsList) return;
+            const style = canvas_link_styles[styleName];
+            strokeLinks(segmentsList, style, style.width, [3, 3]);
+        });
+        context.globalAlpha = 1;
+    }
+
+    // Class edges are grouped by style and rounded width
+    function drawClassEdges(view) {
+        const layer = getEdgeLayer();
+        const buckets = new Map();
+        layer.grid.query(view.minX, view.minY, view.maxX, view.maxY).forEach(edge => {
+            const styleName = highlight.edges.get(edge) || "default";
+            const lineWidth = Math.round(classEdgeWidth(edge)) + (styleName === "default" ? 0 : 1);
+            const key = `${styleName}|${lineWidth}`;
+            if (!buckets.has(key)) buckets.set(key, { styleName, lineWidth, segmentsList: [] });
+            buckets.get(key).segmentsList.push(layer.segments.get(edge));
+        });
+
+        Array.from(buckets.values())
+            .sort((a, b) => canvas_link_style_order.indexOf(a.styleName) - canvas_link_style_order.indexOf(b.styleName))
+            .forEach(bucket => {
+                strokeLinks(bucket.segmentsList, canvas_link_styles[bucket.styleName], bucket.lineWidth, []);
+            });
+        context.globalAlpha = 1;
+    }
+
+    function strokeLinks(segmentsList, style, lineWidth, lineDash) {
+        context.globalAlpha = style.alpha;
+        context.strokeStyle = style.stroke;
+        context.fillStyle = style.stroke;
+        context.lineWidth = lineWidth;
+        context.setLineDash(lineDash);
+        context.beginPath();
+        segmentsList.forEach(segments => traceLinkPath(context, segments));
+        context.stroke();
+
+        context.setLineDash([]);
+        context.beginPath();
+        segmentsList.forEach(segments => traceArrowhead(context, segments));
+        context.fill();
+    }
+
+    function drawClasses(view, collapsed) {
+        const showText = transform.k >= CANVAS_TEXT_MIN_SCALE;
+        const classes = classesIn(view);
+
+        classes.forEach(node => {
+            const box = classBoxes.get(node.id);
+            if (!box) return;
+            const used = node.was_used !== false;
+            const highlighted = highlight.classes.has(node.id);
+            const boxAttrs = node.members ? cycle_box_attrs : class_box_attrs;
+
+            context.beginPath();
+            traceRoundedRect(context, node.x - box.nameWidth / 2, node.y - 20, box.nameWidth, 40, 8);
+            context.fillStyle = highlighted ? canvas_highlight_style.classFill : (used ? boxAttrs.fill : "rgba(149, 165, 166, 0.1)");
+            context.fill();
+            context.lineWidth = highlighted ? canvas_highlight_style.width : class_box_attrs["stroke-width"];
+            context.strokeStyle = highlighted ? canvas_highlight_style.stroke : (used ? boxAttrs.stroke : "#95a5a6");
+            context.setLineDash(used ? [] : [5, 5]);
+            context.stroke();
+
+            if (collapsed) return;
+            box.methods.forEach((method, i) => {
+                const methodWidth = box.methodWidths[i];
+                const called = method.was_called !== false;
+                const methodHighlighted = highlight.methods.has(method.id);
+                const timeFill = methodTimeFill(method);
+
+                context.beginPath();
+                traceRoundedRect(context, node.x - methodWidth / 2, node.y + 30 + i * 40, methodWidth, method_box_attrs.height, method_box_attrs.rx);
+                context.fillStyle = methodHighlighted ? canvas_highlight_style.methodFill : (timeFill || (called ? method_box_attrs.fill : "rgba(149, 165, 166, 0.15)"));
+                context.fill();
+                context.lineWidth = methodHighlighted ? canvas_highlight_style.width : method_box_attrs["stroke-width"];
+                context.strokeStyle = methodHighlighted ? canvas_highlight_style.stroke : (called ? method_box_attrs.stroke : "#95a5a6");
+                context.setLineDash(called ? [] : [3, 3]);
+                context.stroke();
+            });
+        });
+        context.setLineDash([]);
+
+        if (!showText) return;
+        context.textAlign = "center";
+        classes.forEach(node => {
+            const box = classBoxes.get(node.id);
+            if (!box) return;
+            context.fillStyle = class_name_attrs.fill;
+            context.font = `bold ${class_name_attrs["font-size"]} 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif`;
+            context.fillText(node.name, node.x, node.y);
+
+            if (node.instance_count > 1) {
+                context.textAlign = "end";
+                context.fillStyle = instance_count_attrs.fill;
+                context.font = `bold ${instance_count_attrs["font-size"]} 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif`;
+                context.fillText(`×${node.instance_count}`, node.x + box.nameWidth / 2 - 6, node.y - 7);
+                context.textAlign = "center";
+            }
+
+            context.fillStyle = method_text_attrs.fill;
+            context.font = `${method_text_attrs["font-weight"]} ${method_text_attrs["font-size"]} 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif`;
+            if (collapsed) {
+                // A collapsed class shows how many methods it holds
+                if (box.methods.length) {
+                    context.fillText(box.methods.length === 1 ? "1 method" : `${box.methods.length} methods`, node.x, node.y + 34);
+                }
+                return;
+            }
+            box.methods.forEach((method, i) => {
+                context.fillText(method.name, node.x, node.y + 47 + i * 40);
+            });
+        });
+    }
+
+    function isInsideClass(node, x, y, collapsed) {
+        const box = classBoxes.get(node.id);
+        if (!box) return false;
+        const halfWidth = collapsed ? box.nameWidth / 2 : box.halfWidth;
+        const boxHeight = collapsed ? 40 : box.boxHeight;
+        return Math.abs(x - node.x) <= halfWidth && y >= node.y - 20 && y <= node.y - 20 + boxHeight;
+    }
+
+    function findClassAt(x, y) {
+        if (!model) return null;
+        const collapsed = isCollapsed();
+        return classesIn({ minX: x, minY: y, maxX: x, maxY: y })
+            .find(node => isInsideClass(node, x, y, collapsed)) || null;
+    }
+
+    function findMethodAt(node, x, y) {
+        const box = classBoxes.get(node.id);
+        const offset = y - node.y - 30;
+        const row = Math.floor(offset / 40);
+        if (row < 0 || row >= box.methods.length || offset - row * 40 > method_box_attrs.height) return null;
+        return Math.abs(x - node.x) <= box.methodWidths[row] / 2 ? box.methods[row] : null;
+    }
+
+    // Nearest link or class edge of a layer within the hover radius
+    function findNearest(layer, x, y) {
+        const radius = CANVAS_LINK_HIT_RADIUS / transform.k;
+        let nearest = null;
+        let nearestDistance = radius;
+        layer.grid.query(x - radius, y - radius, x + radius, y + radius).forEach(item => {
+            const distance = distanceToSegments(layer.segments.get(item), x, y);
+            if (distance <= nearestDistance) {
+                nearest = item;
+                nearestDistance = distance;
+            }
+        });
+        return nearest;
+    }
+
+    // Returns { type: 'class' | 'method' | 'link' | 'edge', ... } or null
+    function hitTest(x, y) {
+        const collapsed = isCollapsed();
+        const node = findClassAt(x, y);
+        if (node) {
+            const method = collapsed ? null : findMethodAt(node, x, y);
+            return method ? { type: 'method', id: method.id, method } : { type: 'class', id: node.id, node };
+        }
+        if (collapsed) {
+            const edge = findNearest(getEdgeLayer(), x, y);
+            return edge ? { type: 'edge', id: edge, edge } : null;
+        }
+        const link = findNearest(getLinkLayer(), x, y);
+        return link ? { type: 'link', id: link, link } : null;
+    }
+
+    function clearHighlight() {
+        highlight = { links: new Map(), edges: new Map(), methods: new Set(), classes: new Set() };
+    }
+
+    // Highlight all paths from a node once they are known, if it is still hovered
+    function highlightFrom(nodeId, startIds) {
+        const target = hoverTarget;
+        reachableFrom(nodeId, startIds, model).then(reached => {
+            if (hoverTarget !== target) return;
+            reached.links.forEach(link => {
+                // The hovered link keeps its own style
+                if (!highlight.links.has(link)) highlight.links.set(link, "target-path");
+                const edge = model.classEdgeOfLink.get(link);
+                if (edge) highlight.edges.set(edge, "target-path");
+            });
+            reached.nodes.forEach(nodeId => {
+                const method = model.nodeById.get(nodeId);
+                if (method && method.type === 'method') {
+                    highlight.methods.add(nodeId);
+                    highlight.classes.add(boxIdOfMethod(model, nodeId));
+                } else {
+                    highlight.classes.add(nodeId);
+                }
+            });
+            requestDraw();
+        });
+    }
+
+    // Highlight one call path (method ids in call order), e.g. while it is hovered in the path list
+    function highlightPath(methodIds) {
+        hoverTarget = null;
+        clearHighlight();
+        const pairs = methodIds.slice(1).map((target, i) => ({ source: methodIds[i], target }));
+        modelLinks(model, pairs).forEach(link => {
+            highlight.links.set(link, "source-path");
+            const edge = model.classEdgeOfLink.get(link);
+            if (edge) highlight.edges.set(edge, "source-path");
+        });
+        methodIds.forEach(methodId => {
+            if (model.nodeById.has(methodId)) {
+                highlight.methods.add(methodId);
+                highlight.classes.add(boxIdOfMethod(model, methodId));
+            }
+        });
+        requestDraw();
+    }
+
+    function updateHover(target, event) {
+        if ((target && target.id) === (hoverTarget && hoverTarget.id)) {
+            if (target && (target.type === 'link' || target.type === 'edge')) moveTooltip(event);
+            return;
+        }
+        hoverTarget = target;
+        clearHighlight();
+        hideTooltip();
+
+        if (target && target.type === 'method') {
+            highlightFrom(target.id, [target.id]);
+        } else if (target && target.type === 'class') {
+            highlightFrom(target.id, boxMethodIds(model, target.id));
+        } else if (target && target.type === 'link') {
+            const sourceId = linkEndpointId(target.link.source);
+            highlightFrom(sourceId, [sourceId]);
+            highlight.links.set(target.link, "hover");
+            showLinkTooltip(target.link, event);
+        } else if (target && target.type === 'edge') {
+            highlight.edges.set(target.edge, "hover");
+            highlight.classes.add(target.edge.source.id);
+            highlight.classes.add(target.edge.target.id);
+            showEdgeTooltip(target.edge, event);
+        }
+
+        canvas.style("cursor", target && (target.type === 'class' || target.type === 'method') ? "pointer" : null);
+        requestDraw();
+    }
+
+    function showLinkTooltip(link, event) {
+        const source = model.nodeById.get(linkEndpointId(link.source)) || {};
+        const target = model.nodeById.get(linkEndpointId(link.target)) || {};
+        let countInfo = link.call_count ? `<br>Calls: ${link.call_count}` : '';
+        if (link.diff_status) {
+            countInfo = `<br>${link.diff_status}: ${link.base_count} → ${link.head_count} calls`;
+        }
+        tooltip.style("display", "block")
+            .html(`<strong>${source.class || ''}</strong>.${source.name}<br>→<br><strong>${target.class || ''}</strong>.${target.name}${countInfo}${linkTimeInfo(link)}${allocInfo(link)}${importInfo(link)}${typeInfo(link)}${scopeInfo(link)}${chattyInfo(link)}`);
+        moveTooltip(event);
+    }
+
+    function showEdgeTooltip(edge, event) {
+        tooltip.style("display", "block")
+            .html(`<strong>${edge.source.name}</strong><br>→<br><strong>${edge.target.name}</strong><br>Method calls: ${edge.links.length}<br>Calls: ${edge.weight}`);
+        moveTooltip(event);
+    }
+
+    function moveTooltip(event) {
+        tooltip.style("left", (event.pageX + 10) + "px")
+            .style("top", (event.pageY - 10) + "px");
+    }
+
+    function hideTooltip() {
+        tooltip.style("display", "none");
+    }
+
+    function zoomToFit() {
+        if (!model || !model.classNodes.length) return;
+        let minX = Infinity, minY = Infinity, maxX = -Infinity, maxY = -Infinity;
+        model.classNodes.forEach(node => {
+            const box = classBoxes.get(node.id);
+            if (!box) return;
+            minX = Math.min(minX, node.x - box.halfWidth);
+            maxX = Math.max(maxX, node.x + box.halfWidth);
+            minY = Math.min(minY, node.y - 20);
+            maxY = Math.max(maxY, node.y - 20 + box.boxHeight);
+        });
+        const boundsWidth = maxX - minX;
+        const boundsHeight = maxY - minY;
+        if (!(boundsWidth > 0 && boundsHeight > 0)) return;
+
+        const scale = Math.min(width / boundsWidth, height / boundsHeight) * 0.9; // 90% scale for padding
+        const midX = minX + boundsWidth / 2;
+        const midY = minY + boundsHeight / 2;
+        canvas.transition()
+            .duration(750)
+            .call(zoom.transform, d3.zoomIdentity.translate(width / 2 - scale * midX, height / 2 - scale * midY).scale(scale));
+    }
+
+    function show() {
+        canvas.style("display", null);
+        requestDraw();
+    }
+
+    function hide() {
+        canvas.style("display", "none");
+        hideTooltip();
+        model = null;
+    }
+
+    return {
+        setModel,
+        update,
+        restyle: requestDraw,
+        requestDraw,
+        zoomToFit,
+        show,
+        hide,
+        hitTest,
+        highlightPath,
+        clearHighlight: () => {
+            clearHighlight();
+            requestDraw();
+        },
+        node: () => canvas.node()
+    };
+}
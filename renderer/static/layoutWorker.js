@@ -0,0 +1,154 @@
+// Web Worker that runs the class force simulation and the per-tick link
+// geometry off the main thread. Every tick it posts the class positions and
+// call link endpoints back as transferable Float64Arrays:
+//   positions: [x0, y0, x1, y1, ...] in class node order
+//   endpoints: [x1, y1, x2, y2, ...] in call link order
+//
+// Messages from the page:
+//   { type: 'init', version, nodes, classLinks, calls, forceStrength, alpha, simWidth, simHeight }
+//   { type: 'update', version, nodes, classLinks, calls, alpha }
+//                                      - switch to a new visible node set and reheat,
+//                                        keeping the state of classes that stay visible
+//   { type: 'charge', strength }       - change the repulsion and reheat
+//   { type: 'alphaTarget', value }     - drag start (0.3) / end (0)
+//   { type: 'reheat', alpha }          - restart from the current positions
+//   { type: 'fix', index, x, y }       - pin a class (x/y null releases it)
+//   { type: 'releaseAll' }             - unpin every class
+//   { type: 'stop' }
+
+importScripts(
+    'https://d3js.org/d3.v7.min.js',
+    'linkPathGenerator.js',
+    'simulationForces.js'
+);
+
+let simulation = null;
+let nodes = [];
+let links = [];
+let exitIndexer = null;
+let simWidth = 2000;
+let simHeight = 1500;
+// Echoed with every frame so the page can drop frames for an older node set
+let version = 0;
+
+// Adopt the node set and link geometry of a message. Classes the worker
+// already simulates keep their position and velocity.
+function setGraph(message) {
+    const previous = new Map(nodes.map(node => [node.id, node]));
+    nodes = message.nodes.map(node => {
+        const existing = previous.get(node.id);
+        if (!existing) return node;
+        existing.fx = node.fx;
+        existing.fy = node.fy;
+        existing._xWeight = node._xWeight;
+        existing._bboxWidth = node._bboxWidth;
+        existing._bboxHeight = node._bboxHeight;
+        return existing;
+    });
+    version = message.version;
+
+    // Rebuild the per-link geometry records against the worker's node objects
+    links = message.calls.map(call => {
+        const sourceClass = nodes[call.sourceClass];
+        const targetClass = nodes[call.targetClass];
+        return {
+            source: call.source,
+            _geometry: {
+                sourceClass,
+                targetClass,
+                sourceIndex: call.sourceIndex,
+                targetIndex: call.targetIndex,
+                sourceWidth: call.sourceWidth,
+                targetWidth: call.targetWidth,
+                sameClass: sourceClass === targetClass
+            }
+        };
+    });
+    exitIndexer = createExitIndexer(links, nodes);
+}
+
+function init(message) {
+    if (simulation) simulation.stop();
+
+    nodes = [];
+    simWidth = message.simWidth;
+    simHeight = message.simHeight;
+    setGraph(message);
+
+    simulation = createClassSimulation(nodes, message.classLinks, message.forceStrength, simWidth, simHeight)
+        .alpha(message.alpha)
+        .on("tick", postFrame)
+        .on("end", () => self.postMessage({ type: 'end', version }));
+}
+
+function postFrame() {
+    clampToBounds(nodes, simWidth, simHeight);
+
+    // Update exit indices if classes changed their relative order
+    exitIndexer.updateIfOrderChanged();
+
+    const positions = new Float64Array(nodes.length * 2);
+    nodes.forEach((node, i) => {
+        positions[i * 2] = node.x;
+        positions[i * 2 + 1] = node.y;
+    });
+
+    const endpoints = new Float64Array(links.length * 4);
+    links.forEach((link, i) => {
+        const linkEndpoints = computeLinkEndpoints(link);
+        endpoints[i * 4] = linkEndpoints.x1;
+        endpoints[i * 4 + 1] = linkEndpoints.y1;
+        endpoints[i * 4 + 2] = linkEndpoints.x2;
+        endpoints[i * 4 + 3] = linkEndpoints.y2;
+    });
+
+    self.postMessage(
+        { type: 'tick', version, positions, endpoints, alpha: simulation.alpha() },
+        [positions.buffer, endpoints.buffer]
+    );
+}
+
+self.onmessage = function(event) {
+    const message = event.data;
+    if (message.type === 'init') {
+        init(message);
+        return;
+    }
+    if (!simulation) return;
+
+    switch (message.type) {
+        case 'update':
+            setGraph(message);
+            simulation.nodes(nodes);
+            simulation.force("classLink").links(message.classLinks);
+            simulation.alpha(Math.max(simulation.alpha(), message.alpha)).restart();
+            break;
+        case 'charge':
+            simulation.force("charge").strength(message.strength);
+            simulation.alpha(0.3).restart();
+            break;
+        case 'alphaTarget':
+            simulation.alphaTarget(message.value).restart();
+            break;
+        case 'reheat':
+            simulation.alpha(message.alpha).restart();
+            break;
+        case 'fix': {
+            const node = nodes[message.index];
+            if (node) {
+                node.fx = message.x;
+                node.fy = message.y;
+            }
+            break;
+        }
+        case 'releaseAll':
+            nodes.forEach(node => {
+                node.fx = null;
+                node.fy = null;
+            });
+            break;
+        case 'stop':
+            simulation.stop();
+            break;
+    }
+};
@@ -1,40 +1,45 @@
-// Helper function to generate link paths for the call graph visualization
+// Helper functions to generate link paths for the call graph visualization.
+// They read a per-link geometry record (link._geometry) built once per render:
+// { sourceClass, targetClass, sourceIndex, targetIndex, sourceWidth, targetWidth, sameClass }
+// so each tick is O(1) per link instead of searching the node lists.
+// The file is also loaded by the layout worker, so it must not touch the DOM.
 
-function generateLinkPath(d, data, classNodes, methodNodes, classMethodsMap) {
-    const sourceNode = data.nodes.find(n => n.id === d.source);
-    const targetNode = data.nodes.find(n => n.id === d.target);
-    const sourceClass = classNodes.find(c => c.id === sourceNode?.class);
-    const targetClass = classNodes.find(c => c.id === targetNode?.class);
-    
-    if (!sourceClass || !targetClass || !sourceNode || !targetNode) {
-        return "M 0,0";
-    }
-    
-    const sourceMethods = classMethodsMap[sourceClass.id] || [];
-    const targetMethods = classMethodsMap[targetClass.id] || [];
-    const sourceMethodIndex = sourceMethods.indexOf(d.source);
-    const targetMethodIndex = targetMethods.indexOf(d.target);
-    
-    const sourceMethod = methodNodes.find(m => m.id === d.source);
-    const targetMethod = methodNodes.find(m => m.id === d.target);
-    
-    if (!sourceMethod || !targetMethod) {
-        return "M 0,0";
+function methodBoxWidth(name) {
+    return Math.max(name.length * 7 + 10, 80);
+}
+
+function classNameBoxWidth(name) {
+    return Math.max(name.length * 9 + 20, 150);
+}
+
+// Row index that methodCenterY maps to the middle of the class name box. Methods
+// of a collapsed cycle have no row of their own, so their links attach there.
+const CLASS_NAME_ROW = -45 / 40;
+
+// Vertical center of the method box at `index` inside a class box
+function methodCenterY(classNode, index) {
+    return classNode.y + 30 + (index * 40) + 15;
+}
+
+// Start and end points of a link; also used for the link's gradient.
+// While the layout worker runs, it sends the endpoints with every frame.
+function getLinkEndpoints(d) {
+    return d._endpoints || computeLinkEndpoints(d);
+}
+
+function computeLinkEndpoints(d) {
+    const geometry = d._geometry;
+    if (!geometry) {
+        return null;
     }
     
-    const sourceMethodWidth = Math.max(sourceMethod.name.length * 7 + 10, 80);
-    const targetMethodWidth = Math.max(targetMethod.name.length * 7 + 10, 80);
-    
     // Source method center position
-    const sourceX = sourceClass.x;
-    const sourceY = sourceClass.y + 30 + (sourceMethodIndex * 40) + 15;
+    const sourceX = geometry.sourceClass.x;
+    const sourceY = methodCenterY(geometry.sourceClass, geometry.sourceIndex);
     
     // Target method center position
-    const targetX = targetClass.x;
-    const targetY = targetClass.y + 30 + (targetMethodIndex * 40) + 15;
-    
-    const isSameClass = sourceClass.id === targetClass.id;
-    const horizontalOffset = 5; // Small horizontal extension (just a few pixels)
+    const targetX = geometry.targetClass.x;
+    const targetY = methodCenterY(geometry.targetClass, geometry.targetIndex);
     
     // Stagger exit points vertically when multiple links from same method
     const exitIndex = d._exitIndex || 0;
@@ -42,61 +47,167 @@ function generateLinkPath(d, data, classNodes, methodNodes, classMethodsMap) {
     const staggerAmount = 4; // Pixels to stagger each link
     const exitYOffset = (exitIndex - (totalExits - 1) / 2) * staggerAmount;
     
-    if (isSameClass) {
+    if (geometry.sameClass) {
         // For same-class calls, always exit from right and enter from right
-        const startX = sourceX + sourceMethodWidth / 2;
-        const startY = sourceY + exitYOffset;
-        const endX = targetX + targetMethodWidth / 2;
-        const endY = targetY;
+        return {
+            x1: sourceX + geometry.sourceWidth / 2,
+            y1: sourceY + exitYOffset,
+            x2: targetX + geometry.targetWidth / 2,
+            y2: targetY
+        };
+    }
+    
+    // Different classes: exit from the right of the source, enter at the left of the target
+    return {
+        x1: sourceX + geometry.sourceWidth / 2,
+        y1: sourceY + exitYOffset,
+        x2: targetX - geometry.targetWidth / 2,
+        y2: targetY
+    };
+}
+
+// Keeps the exit order of links that leave the same method in line with where
+// their targets sit, so staggered exits do not cross. Exit order only depends on
+// where classes sit relative to each other, so the classes are kept sorted by x
+// and by y and exits are re-sorted only when either order changes.
+function createExitIndexer(callsLinks, classNodes) {
+    // Outgoing links per source method (for staggering exit points)
+    const outgoingBySource = new Map();
+    callsLinks.forEach(link => {
+        if (!link._geometry) return;
+        if (!outgoingBySource.has(link.source)) {
+            outgoingBySource.set(link.source, []);
+        }
+        outgoingBySource.get(link.source).push(link);
+    });
+    
+    // Assign exit indices based on relative target positions
+    const update = () => {
+        outgoingBySource.forEach(links => {
+            const sourceGeometry = links[0]._geometry;
+            const sourceY = methodCenterY(sourceGeometry.sourceClass, sourceGeometry.sourceIndex);
+            
+            // Sort links by target position: primarily by Y (vertical), then by X (horizontal)
+            links.sort((linkA, linkB) => {
+                const geometryA = linkA._geometry;
+                const geometryB = linkB._geometry;
+                
+                // Primary sort: by Y position relative to source
+                const relativeYA = methodCenterY(geometryA.targetClass, geometryA.targetIndex) - sourceY;
+                const relativeYB = methodCenterY(geometryB.targetClass, geometryB.targetIndex) - sourceY;
+                
+                if (Math.abs(relativeYA - relativeYB) > 10) {
+                    // Significant vertical difference - sort by Y
+                    return relativeYA - relativeYB;
+                } else {
+                    // Similar vertical position - sort by X (rightmost first gets middle stagger)
+                    return geometryA.targetClass.x - geometryB.targetClass.x;
+                }
+            });
+            
+            // Assign exit indices based on sorted order
+            links.forEach((link, index) => {
+                link._exitIndex = index;
+                link._totalExits = links.length;
+            });
+        });
+    };
+    
+    const classOrderX = classNodes.slice();
+    const classOrderY = classNodes.slice();
+    const isSortedBy = (nodes, key) => {
+        for (let i = 1; i < nodes.length; i++) {
+            if (nodes[i - 1][key] > nodes[i][key]) return false;
+        }
+        return true;
+    };
+    const updateIfOrderChanged = () => {
+        const xChanged = !isSortedBy(classOrderX, 'x');
+        const yChanged = !isSortedBy(classOrderY, 'y');
+        if (!xChanged && !yChanged) return;
+        if (xChanged) classOrderX.sort((a, b) => a.x - b.x);
+        if (yChanged) classOrderY.sort((a, b) => a.y - b.y);
+        update();
+    };
+    
+    // Initial assignment
+    update();
+    
+    return { update, updateIfOrderChanged };
+}
+
+// Cubic bezier segments of a link: a start point and a list of
+// [ctrl1X, ctrl1Y, ctrl2X, ctrl2Y, endX, endY] curves. Shared by the SVG path
+// string and the canvas renderer so both draw the same shape.
+function linkPathSegments(endpoints, sameClass) {
+    const horizontalOffset = 5; // Small horizontal extension (just a few pixels)
+    
+    if (sameClass) {
+        const startX = endpoints.x1;
+        const startY = endpoints.y1;
+        const endX = endpoints.x2;
+        const endY = endpoints.y2;
         const loopSize = 40;
         
-        return `
-            M ${startX},${startY} 
-            C ${startX+loopSize},${startY} ${endX+loopSize},${endY} ${endX},${endY}
-            `;
-    } else {
-        // Different classes: horizontal exit, simple curve, horizontal entry
-        const sourceRightX = sourceX + sourceMethodWidth / 2;
-        const sourceRightY = sourceY + exitYOffset;
-        const targetLeftX = targetX - targetMethodWidth / 2;
-        const targetLeftY = targetY;
-        
-        // Exit point (horizontal offset from source)
-        const exitX = sourceRightX + horizontalOffset;
-        const exitY = sourceRightY;
-        
-        // Entry point (horizontal offset from target)
-        const entryX = targetLeftX - horizontalOffset;
-        const entryY = targetLeftY;
-        
-        // Smooth curve with small horizontal extensions
-        const dx = entryX - exitX;
-        const dy = entryY - exitY;
-        
-        // Exit curve: small horizontal extension from source to exit point
-        const exitCtrl1X = sourceRightX + (exitX - sourceRightX) * 0.6;
-        const exitCtrl1Y = sourceRightY;
-        const exitCtrl2X = exitX - 5;
-        const exitCtrl2Y = exitY;
-        
-        // Main curve: from exit to entry
-        const mainCtrl1X = exitX + dx * 0.2;
-        const mainCtrl1Y = exitY;
-        const mainCtrl2X = entryX - dx * 0.2;
-        const mainCtrl2Y = entryY;
-        
-        // Entry curve: small horizontal extension from entry point to target
-        const entryCtrl1X = entryX + 5;
-        const entryCtrl1Y = entryY;
-        const entryCtrl2X = entryX + (targetLeftX - entryX) * 0.6;
-        const entryCtrl2Y = entryY;
-        
-        return `
-            M ${sourceRightX},${sourceRightY} 
-            C ${exitCtrl1X},${exitCtrl1Y} ${exitCtrl2X},${exitCtrl2Y} ${exitX},${exitY} 
-            C ${mainCtrl1X},${mainCtrl1Y} ${mainCtrl2X},${mainCtrl2Y} ${entryX},${entryY} 
-            C ${entryCtrl1X},${entryCtrl1Y} ${entryCtrl2X},${entryCtrl2Y} ${targetLeftX},${targetLeftY}
-            `;
+        return {
+            start: [startX, startY],
+            curves: [[startX + loopSize, startY, endX + loopSize, endY, endX, endY]]
+        };
     }
+    
+    // Different classes: horizontal exit, simple curve, horizontal entry
+    const sourceRightX = endpoints.x1;
+    const sourceRightY = endpoints.y1;
+    const targetLeftX = endpoints.x2;
+    const targetLeftY = endpoints.y2;
+    
+    // Exit point (horizontal offset from source)
+    const exitX = sourceRightX + horizontalOffset;
+    const exitY = sourceRightY;
+    
+    // Entry point (horizontal offset from target)
+    const entryX = targetLeftX - horizontalOffset;
+    const entryY = targetLeftY;
+    
+    // Smooth curve with small horizontal extensions
+    const dx = entryX - exitX;
+    
+    return {
+        start: [sourceRightX, sourceRightY],
+        curves: [
+            // Exit curve: small horizontal extension from source to exit point
+            [sourceRightX + (exitX - sourceRightX) * 0.6, sourceRightY, exitX - 5, exitY, exitX, exitY],
+            // Main curve: from exit to entry
+            [exitX + dx * 0.2, exitY, entryX - dx * 0.2, entryY, entryX, entryY],
+            // Entry curve: small horizontal extension from entry point to target
+            [entryX + 5, entryY, entryX + (targetLeftX - entryX) * 0.6, entryY, targetLeftX, targetLeftY]
+        ]
+    };
+}
+
+function generateLinkPath(d, endpoints) {
+    if (!endpoints) {
+        return "M 0,0";
+    }
+    
+    return segmentsToPath(linkPathSegments(endpoints, d._geometry.sameClass));
 }
 
+function segmentsToPath(segments) {
+    let path = `M ${segments.start[0]},${segments.start[1]}`;
+    segments.curves.forEach(c => {
+        path += ` C ${c[0]},${c[1]} ${c[2]},${c[3]} ${c[4]},${c[5]}`;
+    });
+    return path;
+}
+
+// Collapsed view: an aggregated class-to-class edge runs from the right of the
+// source class name box to the left of the target's
+function classEdgeSegments(edge) {
+    return linkPathSegments({
+        x1: edge.source.x + classNameBoxWidth(edge.source.name) / 2,
+        y1: edge.source.y,
+        x2: edge.target.x - classNameBoxWidth(edge.target.name) / 2,
+        y2: edge.target.y
+    }, false);
+}
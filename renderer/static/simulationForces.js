@@ -0,0 +1,114 @@
+// Force simulation setup shared by the page and the layout worker.
+// Loaded with importScripts in layoutWorker.js, so it must not touch the DOM.
+
+// Class boxes are kept this far inside the simulation bounds
+const SIMULATION_MARGIN = 50;
+
+// Custom force for rectangular collision detection
+function rectangularCollision() {
+    let nodes;
+    let strength = 0.7;
+    let iterations = 1;
+    
+    function force(alpha) {
+        const quadtree = d3.quadtree()
+            .x(d => d.x)
+            .y(d => d.y)
+            .addAll(nodes);
+        
+        for (let iteration = 0; iteration < iterations; ++iteration) {
+            for (let i = 0; i < nodes.length; ++i) {
+                const node = nodes[i];
+                const w = (node._bboxWidth || 100) / 2;
+                const h = (node._bboxHeight || 100) / 2;
+                
+                // Check for collisions with other nodes
+                quadtree.visit((quad, x0, y0, x1, y1) => {
+                    if (quad.data && quad.data !== node) {
+                        const other = quad.data;
+                        const ow = (other._bboxWidth || 100) / 2;
+                        const oh = (other._bboxHeight || 100) / 2;
+                        
+                        // Calculate distance between centers
+                        const dx = node.x - other.x;
+                        const dy = node.y - other.y;
+                        
+                        // Calculate minimum separation (rectangle collision)
+                        const minDx = w + ow;
+                        const minDy = h + oh;
+                        
+                        // Check for collision
+                        if (Math.abs(dx) < minDx && Math.abs(dy) < minDy) {
+                            // Collision detected - push nodes apart
+                            const overlapX = minDx - Math.abs(dx);
+                            const overlapY = minDy - Math.abs(dy);
+                            
+                            // Use the dimension with less overlap for separation
+                            let fx = 0;
+                            let fy = 0;
+                            
+                            if (overlapX < overlapY) {
+                                // Separate horizontally (less overlap in X)
+                                fx = (dx > 0 ? 1 : -1) * overlapX * strength * alpha;
+                            } else {
+                                // Separate vertically (less overlap in Y)
+                                fy = (dy > 0 ? 1 : -1) * overlapY * strength * alpha;
+                            }
+                            
+                            node.vx += fx;
+                            node.vy += fy;
+                            other.vx -= fx;
+                            other.vy -= fy;
+                            
+                            return true; // Don't descend further
+                        }
+                        
+                        return false; // Continue searching
+                    }
+                    return false;
+                });
+            }
+        }
+    }
+    
+    force.initialize = function(_) {
+        nodes = _;
+    };
+    
+    force.strength = function(_) {
+        return arguments.length ? (strength = +_, force) : strength;
+    };
+    
+    force.iterations = function(_) {
+        return arguments.length ? (iterations = +_, force) : iterations;
+    };
+    
+    return force;
+}
+
+function createClassSimulation(classNodes, classClassLinks, forceStrength, simWidth, simHeight) {
+    // Create force for node repulsion (will be adjusted by Ctrl+scroll)
+    const chargeForce = d3.forceManyBody().strength(forceStrength);
+    
+    // Create simulation with only class nodes
+    return d3.forceSimulation(classNodes)
+        .force("charge", chargeForce)
+        .force("center", d3.forceCenter(simWidth / 2, simHeight / 2).strength(0.2))
+        .force("classLink", d3.forceLink(classClassLinks)
+            .id(d => d.id)
+            .distance(200)
+            .strength(0.3))
+        .force("collision", rectangularCollision())
+        .force("x", d3.forceX(d => {
+            // Pull each class towards the x of its topological layer
+            return 200 + (d._xWeight * (simWidth - 500));
+        }).strength(0.3));
+}
+
+// Constrain nodes within the simulation bounds (extends past the visible area)
+function clampToBounds(nodes, simWidth, simHeight) {
+    nodes.forEach(node => {
+        node.x = Math.max(SIMULATION_MARGIN, Math.min(simWidth - SIMULATION_MARGIN, node.x));
+        node.y = Math.max(SIMULATION_MARGIN, Math.min(simHeight - SIMULATION_MARGIN, node.y));
+    });
+}
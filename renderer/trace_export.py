@@ -0,0 +1,294 @@
+"""Export timed tracer events to flame graph and timeline formats.
+
+Supported formats:
+
+- ``chrome``: Chrome Trace Event JSON (one ``X`` event per call), for
+  chrome://tracing and Perfetto
+- ``speedscope``: speedscope's evented profile format
+- ``pprof``: a gzipped pprof protobuf profile, for ``go tool pprof``
+
+The writers walk the events once, in the order CallTracer recorded them
+(call order), and write as they go. Chrome output needs constant memory,
+speedscope memory grows with stack depth and the number of distinct methods,
+and pprof memory with the number of distinct call stacks; none of them grows
+with the number of calls.
+
+Events must carry timings (``start_ns``, ``wall_ns`` and ``self_ns``), so the
+tracer has to run with ``timing=True``.
+"""
+
+import gzip
+import json
+import os
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, TextIO, Tuple
+
+
+EXPORT_FORMATS = ('chrome', 'speedscope', 'pprof')
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+
+def _frame_name(event: Dict[str, Any]) -> str:
+    if event.get('class'):
+        return f"{event['class']}.{event['function']}"
+    return event['function']
+
+
+def _timed(event: Dict[str, Any]) -> Dict[str, Any]:
+    if 'start_ns' not in event:
+        raise ValueError("Trace events have no timings; run CallTracer with timing=True to export them")
+    return event
+
+
+def _iter_nested(events: Iterable[Dict[str, Any]]):
+    """Yield (event, ancestors) pairs, with ancestors the recorded calls the event runs inside.
+
+    Events arrive in call order, so the recorded calls still open form a stack
+    that is popped back to the event's caller by call depth. `ancestors` is that
+    stack (root first) and is only valid until the next iteration.
+    """
+    open_calls: List[Dict[str, Any]] = []
+    for event in events:
+        _timed(event)
+        while open_calls and open_calls[-1]['depth'] >= event['depth']:
+            open_calls.pop()
+        yield event, open_calls
+        open_calls.append(event)
+
+
+def write_chrome_trace(events: Iterable[Dict[str, Any]], fp: TextIO,
+                       pid: Optional[int] = None, tid: int = 1) -> int:
+    """
+    Write events as Chrome Trace Event JSON, one complete (``X``) event per call.
+
+    Args:
+        events: Timed tracer events in call order
+        fp: Text file to write to
+        pid: Process id to tag the events with (defaults to this process)
+        tid: Thread id to tag the events with; the tracer follows a single thread
+
+    Returns:
+        Number of trace events written
+    """
+    pid = os.getpid() if pid is None else pid
+    fp.write('{"displayTimeUnit": "ns", "traceEvents": [\n')
+    count = 0
+    for event in events:
+        _timed(event)
+        record = {
+            'name': _frame_name(event),
+            'cat': event.get('class') or 'module',
+            'ph': 'X',
+            # Trace Event timestamps are in microseconds
+            'ts': event['start_ns'] / 1000,
+            'dur': event['wall_ns'] / 1000,
+            'pid': pid,
+            'tid': tid,
+            'args': {
+                'file': event['filename'],
+                'line': event['line'],
+                'self_us': event['self_ns'] / 1000,
+            },
+        }
+        if count:
+            fp.write(',\n')
+        fp.write(json.dumps(record))
+        count += 1
+    fp.write('\n]}\n')
+    return count
+
+
+def write_speedscope(events: Iterable[Dict[str, Any]], fp: TextIO, name: str = 'callpath') -> int:
+    """
+    Write events as a speedscope evented profile (open/close frame events).
+
+    Args:
+        events: Timed tracer events in call order
+        fp: Text file to write to
+        name: Profile name shown in speedscope
+
+    Returns:
+        Number of calls written
+    """
+    frames: Dict[Tuple[str, str, int], int] = {}
+    frame_list: List[Dict[str, Any]] = []
+    # Open calls as (frame index, end time)
+    open_frames: List[Tuple[int, int]] = []
+    last_at = 0
+    first = True
+    count = 0
+
+    def emit(kind: str, frame: int, at: int):
+        nonlocal first, last_at
+        # Speedscope rejects events that go back in time
+        at = max(at, last_at)
+        last_at = at
+        if not first:
+            fp.write(',\n')
+        first = False
+        fp.write(json.dumps({'type': kind, 'frame': frame, 'at': at}))
+
+    def close_until(depth: int, before: int):
+        while len(open_frames) > depth:
+            frame, end = open_frames.pop()
+            emit('C', frame, min(end, before))
+
+    fp.write('{"$schema": %s, "name": %s, "exporter": "callpath", "activeProfileIndex": 0, '
+             '"profiles": [{"type": "evented", "name": %s, "unit": "nanoseconds", "startValue": 0, '
+             '"events": [\n' % (json.dumps(SPEEDSCOPE_SCHEMA), json.dumps(name), json.dumps(name)))
+
+    for event, ancestors in _iter_nested(events):
+        start = event['start_ns']
+        close_until(len(ancestors), start)
+        key = (_frame_name(event), event['filename'], event['line'])
+        frame = frames.get(key)
+        if frame is None:
+            frame = frames[key] = len(frame_list)
+            frame_list.append({'name': key[0], 'file': key[1], 'line': key[2]})
+        emit('O', frame, start)
+        # A call cannot outlast the call it runs in
+        end = start + event['wall_ns']
+        if open_frames:
+            end = min(end, open_frames[-1][1])
+        open_frames.append((frame, end))
+        count += 1
+
+    end_value = max([last_at] + [end for _, end in open_frames])
+    close_until(0, end_value)
+
+    fp.write('\n], "endValue": %d}], "shared": {"frames": %s}}\n' % (last_at, json.dumps(frame_list)))
+    return count
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        bits = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+
+def _field_varint(number: int, value: int) -> bytes:
+    return _varint(number << 3) + _varint(value)
+
+
+def _field_bytes(number: int, value: bytes) -> bytes:
+    return _varint((number << 3) | 2) + _varint(len(value)) + value
+
+
+def _field_packed(number: int, values: Iterable[int]) -> bytes:
+    return _field_bytes(number, b''.join(_varint(value) for value in values))
+
+
+def write_pprof(events: Iterable[Dict[str, Any]], fp: BinaryIO) -> int:
+    """
+    Write events as a gzipped pprof profile.
+
+    Every distinct call stack becomes one sample with two values: the number
+    of calls and their self time in nanoseconds. Each traced method is one
+    function and one location (its definition line).
+
+    Args:
+        events: Timed tracer events in call order
+        fp: Binary file to write to
+
+    Returns:
+        Number of calls written
+    """
+    strings: Dict[str, int] = {'': 0}
+
+    def string_id(value: str) -> int:
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    # (name, file, line) -> function/location id (pprof ids start at 1)
+    functions: Dict[Tuple[str, str, int], int] = {}
+    # Location ids leaf first -> [calls, self ns]
+    samples: Dict[Tuple[int, ...], List[int]] = {}
+    # Location stacks of the open calls, parallel to the ancestors of _iter_nested
+    open_stacks: List[Tuple[int, ...]] = []
+    first_start = None
+    last_end = 0
+    count = 0
+
+    for event, ancestors in _iter_nested(events):
+        key = (_frame_name(event), event['filename'], event['line'])
+        location = functions.get(key)
+        if location is None:
+            location = functions[key] = len(functions) + 1
+        del open_stacks[len(ancestors):]
+        stack = (location,) + (open_stacks[-1] if open_stacks else ())
+        open_stacks.append(stack)
+
+        values = samples.get(stack)
+        if values is None:
+            values = samples[stack] = [0, 0]
+        values[0] += 1
+        values[1] += event['self_ns']
+
+        if first_start is None:
+            first_start = event['start_ns']
+        last_end = max(last_end, event['start_ns'] + event['wall_ns'])
+        count += 1
+
+    profile = bytearray()
+    for value_type, unit in (('calls', 'count'), ('wall', 'nanoseconds')):
+        profile += _field_bytes(1, _field_varint(1, string_id(value_type)) + _field_varint(2, string_id(unit)))
+    for stack, values in samples.items():
+        profile += _field_bytes(2, _field_packed(1, stack) + _field_packed(2, values))
+    for (name, filename, line), function_id in functions.items():
+        line_message = _field_varint(1, function_id) + _field_varint(2, line)
+        profile += _field_bytes(4, _field_varint(1, function_id) + _field_bytes(4, line_message))
+        profile += _field_bytes(5, _field_varint(1, function_id)
+                                + _field_varint(2, string_id(name))
+                                + _field_varint(3, string_id(name))
+                                + _field_varint(4, string_id(filename))
+                                + _field_varint(5, line))
+    period_type = _field_varint(1, string_id('wall')) + _field_varint(2, string_id('nanoseconds'))
+    # The string table has to be complete, so it is written last
+    for value in strings:
+        profile += _field_bytes(6, value.encode('utf-8'))
+    profile += _field_varint(10, max(0, last_end - (first_start or 0)))
+    profile += _field_bytes(11, period_type)
+    profile += _field_varint(12, 1)
+
+    with gzip.GzipFile(fileobj=fp, mode='wb') as gz:
+        gz.write(bytes(profile))
+    return count
+
+
+def export_events(events: Iterable[Dict[str, Any]], output_file: str, fmt: str,
+                  name: Optional[str] = None) -> int:
+    """
+    Export tracer events to a file in one of EXPORT_FORMATS.
+
+    Args:
+        events: Timed tracer events in call order
+        output_file: Path to write
+        fmt: 'chrome', 'speedscope' or 'pprof'
+        name: Profile name (speedscope only; defaults to the file name)
+
+    Returns:
+        Number of calls written
+
+    Raises:
+        ValueError: If the format is unknown or the events have no timings
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}', expected one of: {', '.join(EXPORT_FORMATS)}")
+
+    path = Path(output_file)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == 'pprof':
+        with open(path, 'wb') as f:
+            return write_pprof(events, f)
+    with open(path, 'w') as f:
+        if fmt == 'chrome':
+            return write_chrome_trace(events, f)
+        return write_speedscope(events, f, name=name or path.stem)
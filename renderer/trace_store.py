@@ -0,0 +1,265 @@
+"""Directory-backed store of trace runs, with retention and run-to-run diffs."""
+
+import json
+import shutil
+import subprocess
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_STORE_DIR = Path(__file__).parent / "runs"
+
+
+def detect_git_info(path: Optional[str] = None) -> Dict[str, Optional[str]]:
+    """
+    Look up the current git branch and commit for a directory.
+
+    Args:
+        path: Directory inside the repository (defaults to the current directory)
+
+    Returns:
+        Dictionary with 'branch' and 'commit', either of which may be None
+        when git is unavailable or the directory is not a repository
+    """
+    info = {'branch': None, 'commit': None}
+    commands = {
+        'branch': ['git', 'rev-parse', '--abbrev-ref', 'HEAD'],
+        'commit': ['git', 'rev-parse', 'HEAD'],
+    }
+    for key, command in commands.items():
+        try:
+            result = subprocess.run(
+                command,
+                capture_output=True,
+                text=True,
+                cwd=path,
+                timeout=5
+            )
+        except (OSError, subprocess.SubprocessError):
+            return info
+        if result.returncode == 0:
+            info[key] = result.stdout.strip() or None
+    return info
+
+
+class TraceStore:
+    """Keeps one directory per trace run: <root>/<run_id>/{trace.json, meta.json}.
+
+    Runs are tagged with scenario, branch and commit so they can be listed and
+    compared. Old runs are evicted once the store exceeds `max_runs` or a run
+    is older than `max_age_days`.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_runs: int = 50,
+                 max_age_days: Optional[float] = None):
+        self.root = Path(root) if root else DEFAULT_STORE_DIR
+        self.max_runs = max_runs
+        self.max_age_days = max_age_days
+
+    def _run_dir(self, run_id: str) -> Path:
+        """Resolve a run directory, rejecting ids that would escape the store."""
+        run_dir = (self.root / run_id).resolve()
+        if run_dir.parent != self.root.resolve():
+            raise KeyError(run_id)
+        return run_dir
+
+    def save(self, graph_data: Dict[str, Any], scenario: Optional[str] = None,
+             branch: Optional[str] = None, commit: Optional[str] = None,
+             metadata: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Store a trace run and apply retention.
+
+        Args:
+            graph_data: Graph data from generate_d3_data
+            scenario: Name of the traced scenario (e.g. the entry script)
+            branch: Git branch the run was traced on
+            commit: Git commit the run was traced on
+            metadata: Any extra metadata to keep with the run
+
+        Returns:
+            The new run id
+        """
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        run_dir = self.root / run_id
+        run_dir.mkdir(parents=True, exist_ok=True)
+
+        meta = {
+            'run_id': run_id,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'created_ts': time.time(),
+            'scenario': scenario,
+            'branch': branch,
+            'commit': commit,
+            'node_count': len(graph_data.get('nodes', [])),
+            'link_count': len(graph_data.get('links', [])),
+            'metadata': metadata or {}
+        }
+
+        with open(run_dir / 'trace.json', 'w') as f:
+            json.dump(graph_data, f)
+        with open(run_dir / 'meta.json', 'w') as f:
+            json.dump(meta, f, indent=2)
+
+        self.evict()
+        return run_id
+
+    def list_runs(self, scenario: Optional[str] = None, branch: Optional[str] = None,
+                  commit: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return run metadata, newest first, optionally filtered by tag."""
+        if not self.root.exists():
+            return []
+
+        runs = []
+        for meta_file in self.root.glob('*/meta.json'):
+            try:
+                with open(meta_file, 'r') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                # Skip runs that are half-written or corrupted
+                continue
+            if scenario is not None and meta.get('scenario') != scenario:
+                continue
+            if branch is not None and meta.get('branch') != branch:
+                continue
+            if commit is not None and not (meta.get('commit') or '').startswith(commit):
+                continue
+            runs.append(meta)
+
+        runs.sort(key=lambda meta: meta.get('created_ts', 0), reverse=True)
+        return runs
+
+    def load(self, run_id: str) -> Dict[str, Any]:
+        """Load the graph data of a run. Raises KeyError for unknown runs."""
+        trace_file = self._run_dir(run_id) / 'trace.json'
+        if not trace_file.exists():
+            raise KeyError(run_id)
+        with open(trace_file, 'r') as f:
+            return json.load(f)
+
+    def delete(self, run_id: str) -> None:
+        """Delete a run. Raises KeyError for unknown runs."""
+        run_dir = self._run_dir(run_id)
+        if not run_dir.exists():
+            raise KeyError(run_id)
+        shutil.rmtree(run_dir)
+
+    def evict(self) -> List[str]:
+        """Remove runs beyond the retention limits and return their ids."""
+        runs = self.list_runs()
+        evicted = []
+
+        if self.max_age_days is not None:
+            cutoff = time.time() - self.max_age_days * 86400
+            for meta in runs:
+                if meta.get('created_ts', 0) < cutoff:
+                    evicted.append(meta['run_id'])
+
+        if self.max_runs is not None:
+            kept = [meta for meta in runs if meta['run_id'] not in evicted]
+            evicted.extend(meta['run_id'] for meta in kept[self.max_runs:])
+
+        for run_id in evicted:
+            shutil.rmtree(self.root / run_id, ignore_errors=True)
+        return evicted
+
+
+def _call_counts(graph_data: Dict[str, Any]) -> Dict[tuple, int]:
+    """Map (source, target) of every calls link to its call count."""
+    counts = {}
+    for link in graph_data.get('links', []):
+        if link['type'] == 'calls':
+            counts[(link['source'], link['target'])] = link.get('call_count', 1)
+    return counts
+
+
+def diff_graphs(base: Dict[str, Any], head: Dict[str, Any], threshold: float = 0.5) -> Dict[str, Any]:
+    """
+    Compare the call edges of two traces.
+
+    Args:
+        base: Graph data of the older run
+        head: Graph data of the newer run
+        threshold: Relative call count change (0.5 = 50%) above which an edge
+                   present in both runs is reported as changed
+
+    Returns:
+        Dictionary with 'added', 'removed' and 'changed' edges, a 'summary' of
+        their counts, and a merged 'graph' whose calls links carry a
+        'diff_status' of 'added', 'removed', 'changed' or 'unchanged'
+    """
+    base_counts = _call_counts(base)
+    head_counts = _call_counts(head)
+
+    added = []
+    removed = []
+    changed = []
+    status = {}
+
+    for edge, head_count in head_counts.items():
+        if edge not in base_counts:
+            added.append({'source': edge[0], 'target': edge[1], 'head_count': head_count})
+            status[edge] = 'added'
+            continue
+        base_count = base_counts[edge]
+        delta = head_count - base_count
+        ratio = delta / base_count if base_count else None
+        if ratio is None or abs(ratio) > threshold:
+            changed.append({
+                'source': edge[0],
+                'target': edge[1],
+                'base_count': base_count,
+                'head_count': head_count,
+                'delta': delta,
+                'ratio': ratio
+            })
+            status[edge] = 'changed'
+        else:
+            status[edge] = 'unchanged'
+
+    for edge, base_count in base_counts.items():
+        if edge not in head_counts:
+            removed.append({'source': edge[0], 'target': edge[1], 'base_count': base_count})
+            status[edge] = 'removed'
+
+    changed.sort(key=lambda edge: abs(edge['delta']), reverse=True)
+
+    # Merge both graphs so removed edges can still be drawn
+    nodes = {node['id']: node for node in base.get('nodes', [])}
+    nodes.update((node['id'], node) for node in head.get('nodes', []))
+
+    links = []
+    seen_contains = set()
+    for graph in (head, base):
+        for link in graph.get('links', []):
+            if link['type'] == 'contains':
+                key = (link['source'], link['target'])
+                if key not in seen_contains:
+                    seen_contains.add(key)
+                    links.append(link)
+
+    for graph in (head, base):
+        for link in graph.get('links', []):
+            edge = (link['source'], link['target'])
+            if link['type'] != 'calls' or edge not in status:
+                continue
+            merged = dict(link)
+            merged['diff_status'] = status.pop(edge)
+            merged['base_count'] = base_counts.get(edge, 0)
+            merged['head_count'] = head_counts.get(edge, 0)
+            links.append(merged)
+
+    return {
+        'threshold': threshold,
+        'summary': {
+            'added': len(added),
+            'removed': len(removed),
+            'changed': len(changed)
+        },
+        'added': added,
+        'removed': removed,
+        'changed': changed,
+        'graph': {'nodes': list(nodes.values()), 'links': links}
+    }
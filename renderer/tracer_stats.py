@@ -0,0 +1,95 @@
+"""Counters CallTracer keeps about its own work.
+
+They answer how much the tracer costs and where it goes: how many callbacks
+it handled, how many calls it recorded and why it skipped the others, how
+often the per-file filter decision came from its cache, how deep the stack
+got, and how long a callback takes. Callback time is sampled (one callback in
+``CALLBACK_SAMPLE_EVERY`` is timed) so measuring it does not add a clock read
+to every event.
+
+``CallTracer.stats()`` adds what only the tracer knows (buffered bytes,
+dropped calls) and ``end`` writes the result under ``tracer_stats`` in the
+graph data.
+"""
+
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+
+# Time one callback in this many; a power of two, so the check is a bit mask
+CALLBACK_SAMPLE_EVERY = 64
+CALLBACK_SAMPLE_MASK = CALLBACK_SAMPLE_EVERY - 1
+
+# Reasons a call is not recorded
+SKIP_REASONS = (
+    'generated',    # <string>, <frozen ...> and other code without a source file
+    'tracer',       # the tracer's own modules (trace_runner.TRACER_FILES)
+    'external',     # outside the project root, after the first external call
+    'system',       # /System and /usr, without a project root
+    'stdlib',       # the standard library, without a project root
+    'build_tools',  # distutils and setuptools, without a project root
+    'importlib',    # importlib bootstrap, without a project root
+    'class',        # internal or underscore-prefixed receiver class
+)
+
+
+class TracerStats:
+    """Event, skip, filter-cache, depth and sampled callback time counters."""
+
+    def __init__(self):
+        self.events = 0  # Callbacks of any kind (call, return, exception, ...)
+        self.calls_recorded = 0
+        self.calls_skipped = Counter()  # Reason -> calls
+        self.filter_cache_hits = 0
+        self.filter_cache_misses = 0
+        self.peak_depth = 0
+        self.sampled_callbacks = 0
+        self.sampled_callback_ns = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable counters, with the callback time extrapolated from the samples."""
+        mean_ns = self.sampled_callback_ns / self.sampled_callbacks if self.sampled_callbacks else 0
+        return {
+            'events': self.events,
+            'calls_seen': self.calls_recorded + sum(self.calls_skipped.values()),
+            'calls_recorded': self.calls_recorded,
+            'calls_skipped': dict(self.calls_skipped),
+            'filter_cache_hits': self.filter_cache_hits,
+            'filter_cache_misses': self.filter_cache_misses,
+            'peak_depth': self.peak_depth,
+            'callback_samples': self.sampled_callbacks,
+            'callback_mean_ns': round(mean_ns),
+            'callback_time_ns': round(mean_ns * self.events),
+        }
+
+
+# Keys combine_tracer_stats takes the largest value of instead of the sum
+_MAX_KEYS = ('peak_depth',)
+
+
+def combine_tracer_stats(stats: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Add up the tracer stats of several processes, e.g. a collector's producers.
+
+    Args:
+        stats: CallTracer.stats() outputs
+
+    Returns:
+        Summed counters (largest peak depth, call-weighted mean callback
+        time), or None if the list is empty
+    """
+    if not stats:
+        return None
+    combined: Dict[str, Any] = {}
+    skipped = Counter()
+    for entry in stats:
+        for key, value in entry.items():
+            if key == 'calls_skipped':
+                skipped.update(value)
+            elif key in _MAX_KEYS:
+                combined[key] = max(combined.get(key, 0), value)
+            elif isinstance(value, (int, float)):
+                combined[key] = combined.get(key, 0) + value
+    combined['calls_skipped'] = dict(skipped)
+    combined['callback_mean_ns'] = round(combined['callback_time_ns'] / combined['events']) if combined.get('events') else 0
+    return combined
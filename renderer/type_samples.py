@@ -0,0 +1,148 @@
+"""Sampled argument and return types of traced methods.
+
+Knowing which concrete types flow along a call edge is as useful in
+duck-typed code as the edge itself, but recording them for every call would
+cost a lookup per argument and grow with the run. The TypeSampler keeps the
+cost per call bounded instead:
+
+- each code object has its own countdown: its first call is sampled, then
+  one call in ``sample_every``, so rarely called methods still get samples
+  while hot ones do not dominate the cost
+- a sampled call records only type qualnames (``type(value).__qualname__``),
+  never values
+- each method and each caller/callee edge keeps a fixed-size reservoir of
+  call signatures (algorithm R), so memory stays bounded however long the
+  run is and every sampled call has the same chance of being kept
+
+``histograms()`` turns the reservoirs into per-parameter and return type
+counts, which generate_d3_data attaches to method nodes and calls links.
+"""
+
+import random
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+
+DEFAULT_SAMPLE_EVERY = 16
+DEFAULT_RESERVOIR_SIZE = 32
+
+# Flags of code objects taking *args / **kwargs (inspect.CO_VARARGS / CO_VARKEYWORDS)
+CO_VARARGS = 0x04
+CO_VARKEYWORDS = 0x08
+
+# ((parameter name, type qualname), ...), return type qualname
+Signature = Tuple[Tuple[Tuple[str, str], ...], str]
+
+
+def argument_types(frame) -> Tuple[Tuple[str, str], ...]:
+    """(parameter name, type qualname) of a frame's arguments, without self/cls.
+
+    Call it from a 'call' trace event, before the function body has changed
+    its parameters.
+    """
+    code = frame.f_code
+    count = code.co_argcount + code.co_kwonlyargcount
+    if code.co_flags & CO_VARARGS:
+        count += 1
+    if code.co_flags & CO_VARKEYWORDS:
+        count += 1
+    names = code.co_varnames[:count]
+    if names and names[0] in ('self', 'cls'):
+        names = names[1:]
+    local_vars = frame.f_locals
+    return tuple((name, type(local_vars[name]).__qualname__) for name in names if name in local_vars)
+
+
+class TypeReservoir:
+    """Fixed-size uniform sample of the signatures seen (algorithm R)."""
+
+    __slots__ = ('size', 'seen', 'samples')
+
+    def __init__(self, size: int):
+        self.size = size
+        self.seen = 0
+        self.samples: List[Signature] = []
+
+    def add(self, signature: Signature, rng: random.Random):
+        self.seen += 1
+        if len(self.samples) < self.size:
+            self.samples.append(signature)
+            return
+        slot = rng.randrange(self.seen)
+        if slot < self.size:
+            self.samples[slot] = signature
+
+    def histogram(self) -> Dict[str, Any]:
+        """Type counts over the kept samples, per parameter and for the return value."""
+        args: Dict[str, Counter] = {}
+        returns = Counter()
+        for arg_types, return_type in self.samples:
+            for name, type_name in arg_types:
+                args.setdefault(name, Counter())[type_name] += 1
+            returns[return_type] += 1
+        return {
+            'sampled_calls': self.seen,
+            'kept_samples': len(self.samples),
+            'args': {name: dict(counts.most_common()) for name, counts in args.items()},
+            'returns': dict(returns.most_common()),
+        }
+
+
+class TypeSampler:
+    """Decides which calls to sample and keeps a reservoir per method and per edge."""
+
+    def __init__(self, sample_every: int = DEFAULT_SAMPLE_EVERY,
+                 reservoir_size: int = DEFAULT_RESERVOIR_SIZE, seed: Optional[int] = None):
+        """
+        Args:
+            sample_every: Sample one call in this many per code object (its first call always)
+            reservoir_size: Signatures kept per method and per call edge
+            seed: Seed of the reservoir's random choices, for repeatable samples
+        """
+        self.sample_every = max(1, sample_every)
+        self.reservoir_size = reservoir_size
+        self._rng = random.Random(seed)
+        # Code object -> calls left until its next sample
+        self._countdown: Dict[Any, int] = {}
+        self._methods: Dict[str, TypeReservoir] = {}
+        self._edges: Dict[Tuple[str, str], TypeReservoir] = {}
+
+    def should_sample(self, code) -> bool:
+        """Count a call of `code`; True if this call is to be sampled."""
+        left = self._countdown.get(code, 0)
+        if left:
+            self._countdown[code] = left - 1
+            return False
+        self._countdown[code] = self.sample_every - 1
+        return True
+
+    def record(self, method: str, edge: Optional[Tuple[str, str]], signature: Signature):
+        """
+        Add a sampled call's signature to its method's and its edge's reservoir.
+
+        Args:
+            method: Callee method id ("Class::method")
+            edge: (caller method id, callee method id), or None without an attributable caller
+            signature: (argument types, return type) from argument_types and the return value
+        """
+        reservoir = self._methods.get(method)
+        if reservoir is None:
+            reservoir = self._methods[method] = TypeReservoir(self.reservoir_size)
+        reservoir.add(signature, self._rng)
+        if edge is not None:
+            reservoir = self._edges.get(edge)
+            if reservoir is None:
+                reservoir = self._edges[edge] = TypeReservoir(self.reservoir_size)
+            reservoir.add(signature, self._rng)
+
+    def histograms(self) -> Dict[str, Any]:
+        """
+        Type histograms of all methods and edges, the type_samples argument of generate_d3_data.
+
+        Returns:
+            {'methods': {method id: histogram}, 'edges': {(caller id, callee id): histogram}}
+        """
+        return {
+            'methods': {method: reservoir.histogram() for method, reservoir in self._methods.items()},
+            'edges': {edge: reservoir.histogram() for edge, reservoir in self._edges.items()},
+        }
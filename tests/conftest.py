@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The tests import the tracer modules and the renderer package from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def build_graph(calls, classes=None):
+    """
+    Graph data in the generate_d3_data shape from a few method calls.
+
+    Args:
+        calls: (caller id, callee id) or (caller id, callee id, call count)
+               tuples, ids named "Class::method"
+        classes: Optional extra {class: [methods]} that nothing calls
+
+    Returns:
+        Graph data with class and method nodes, contains links and calls links
+    """
+    methods = {}
+    for class_name, names in (classes or {}).items():
+        for name in names:
+            methods[f"{class_name}::{name}"] = False
+    links = []
+    for call in calls:
+        source, target, count = call if len(call) == 3 else (*call, 1)
+        methods.setdefault(source, False)
+        methods[target] = True
+        links.append({'source': source, 'target': target, 'type': 'calls',
+                      'source_method': source.split('::')[1], 'target_method': target.split('::')[1],
+                      'call_count': count})
+
+    nodes = []
+    class_names = sorted({method_id.split('::')[0] for method_id in methods})
+    for class_name in class_names:
+        nodes.append({'id': class_name, 'name': class_name, 'type': 'class'})
+    for method_id, was_called in sorted(methods.items()):
+        class_name, name = method_id.split('::')
+        nodes.append({'id': method_id, 'name': name, 'type': 'method', 'class': class_name,
+                      'was_called': was_called})
+        links.append({'source': class_name, 'target': method_id, 'type': 'contains'})
+    return {'nodes': nodes, 'links': links}
+
+
+@pytest.fixture
+def make_graph():
+    return build_graph
@@ -0,0 +1,25 @@
+from fastapi.testclient import TestClient
+
+from renderer.api import app
+
+client = TestClient(app)
+
+
+def test_invalid_query_parameters_are_bad_requests():
+    response = client.get('/api/graph/neighbors', params={'node': 'A', 'depth': 0})
+    assert response.status_code == 400
+    body = response.json()
+    assert body['error'] == 'Invalid query'
+    assert body['message'].startswith('depth: ')
+
+
+def test_missing_query_parameters_are_bad_requests():
+    response = client.get('/api/graph/paths', params={'to': 'A::run'})
+    assert response.status_code == 400
+    assert response.json()['message'].startswith('from: ')
+
+
+def test_invalid_request_bodies_keep_fastapi_validation_errors():
+    response = client.post('/api/layout/abc', content='not json', headers={'Content-Type': 'application/json'})
+    assert response.status_code == 422
+    assert 'detail' in response.json()
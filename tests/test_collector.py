@@ -0,0 +1,152 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import pytest
+
+from renderer.collector import (DROPS_RECORD, EDGE_RECORD, FRAME_DROPS, FRAME_EDGES, FRAME_END,
+                                FRAME_HELLO, FRAME_STRINGS, NO_TIME, STRING_HEADER, CollectorClient,
+                                TraceCollector, _frame)
+
+
+@pytest.fixture
+def collector():
+    # Unix socket paths are limited to about 100 characters, so keep the directory short
+    directory = tempfile.mkdtemp(prefix='cp-')
+    collector = TraceCollector(os.path.join(directory, 'c.sock'),
+                               output_file=os.path.join(directory, 'trace_data.json'), store_runs=False)
+    server = threading.Thread(target=collector.serve_forever, daemon=True)
+    server.start()
+    deadline = time.monotonic() + 5
+    while not os.path.exists(collector.socket_path):
+        assert time.monotonic() < deadline, "collector did not start listening"
+        time.sleep(0.01)
+    yield collector
+    collector.shutdown()
+    server.join(5)
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def wait_for_producers(collector, count):
+    deadline = time.monotonic() + 5
+    while True:
+        producers = collector.stats()['producers']
+        if len(producers) == count and all(p['status'] != 'connected' for p in producers):
+            return producers
+        assert time.monotonic() < deadline, f"producers still connected: {producers}"
+        time.sleep(0.01)
+
+
+def calls_links(graph_data):
+    return {(link['source'], link['target']): link for link in graph_data['links'] if link['type'] == 'calls'}
+
+
+def encode_producer(*frames):
+    hello = json.dumps({'pid': 1, 'name': 'test', 'project_root': None, 'timing': True}).encode('utf-8')
+    return _frame(FRAME_HELLO, hello) + b''.join(frames)
+
+
+def strings_frame(*values):
+    payload = b''
+    for sid, value in enumerate(values, 1):
+        encoded = value.encode('utf-8')
+        payload += STRING_HEADER.pack(sid, len(encoded)) + encoded
+    return _frame(FRAME_STRINGS, payload)
+
+
+def test_edges_round_trip_through_the_socket(collector):
+    client = CollectorClient(collector.socket_path, name='worker')
+    client.record_call(('Café::run', 'Über::load'))
+    client.add_time(('Café::run', 'Über::load'), 300, 100, reentrant=False, edge_reentrant=False)
+    client.flush()
+    client.record_call(('Café::run', 'Über::load'))
+    client.add_time(('Café::run', 'Über::load'), 200, 50, reentrant=False, edge_reentrant=True)
+    client.record_call((None, 'Café::run'))
+    client.add_time((None, 'Café::run'), 900, 400, reentrant=False, edge_reentrant=False)
+    client.close()
+
+    producer, = wait_for_producers(collector, 1)
+    assert producer['status'] == 'ended'
+    assert producer['name'] == 'worker'
+    assert producer['calls'] == 3
+    assert producer['batches'] == 2
+    assert producer['dropped_calls'] == 0
+
+    graph_data = collector.snapshot()
+    links = calls_links(graph_data)
+    assert list(links) == [('Café::run', 'Über::load')]
+    link = links[('Café::run', 'Über::load')]
+    assert link['call_count'] == 2
+    # The reentrant call on the same edge is already inside the outer one's time
+    assert link['total_time_ns'] == 300
+    methods = {node['id']: node for node in graph_data['nodes'] if node['type'] == 'method'}
+    assert methods['Café::run']['was_called'] and methods['Über::load']['was_called']
+    assert methods['Über::load']['total_time_ns'] == 500
+    with open(collector.output_file) as f:
+        assert calls_links(json.load(f))[('Café::run', 'Über::load')]['call_count'] == 2
+
+
+def test_producer_without_timings_sends_no_times(collector):
+    client = CollectorClient(collector.socket_path, timing=False)
+    client.record_call(('A::run', 'B::load'))
+    client.close()
+    wait_for_producers(collector, 1)
+
+    assert collector._edges[('A::run', 'B::load')] == [1, None, None, None, None]
+    assert 'total_time_ns' not in calls_links(collector.snapshot())[('A::run', 'B::load')]
+
+
+def test_full_ring_drops_the_oldest_batches_and_reports_them(collector):
+    client = CollectorClient(collector.socket_path, max_batches=1)
+    # Holding the ring's lock keeps the sender from taking batches off it
+    with client._ready:
+        for caller in ('A::first', 'A::second', 'A::third'):
+            client.record_call((caller, 'B::load'))
+            client.flush()
+        assert client.dropped_batches == 2
+        assert client.dropped_calls == 2
+        assert len(client._ring) == 1
+    client.close()
+
+    producer, = wait_for_producers(collector, 1)
+    assert producer['status'] == 'ended'
+    assert producer['calls'] == 1
+    assert producer['dropped_batches'] == 2
+    assert producer['dropped_calls'] == 2
+    assert list(calls_links(collector.snapshot())) == [('A::third', 'B::load')]
+    assert collector.stats()['dropped_calls'] == 2
+
+
+def test_handle_producer_decodes_frames(tmp_path):
+    collector = TraceCollector('unused.sock', output_file=str(tmp_path / 'trace_data.json'), store_runs=False)
+    edges = (EDGE_RECORD.pack(1, 2, 3, 600, 200, 600, 600)
+             + EDGE_RECORD.pack(0, 1, 1, NO_TIME, NO_TIME, NO_TIME, NO_TIME))
+    stream = encode_producer(
+        strings_frame('A::run', 'B::load'),
+        _frame(FRAME_EDGES, edges),
+        _frame(FRAME_DROPS, DROPS_RECORD.pack(4, 40)),
+        _frame(FRAME_END),
+    )
+
+    collector.handle_producer(io.BytesIO(stream))
+
+    producer, = collector.producers
+    assert producer == {'pid': 1, 'name': 'test', 'status': 'ended', 'batches': 1, 'calls': 4,
+                        'dropped_batches': 4, 'dropped_calls': 40}
+    assert collector._edges == {('A::run', 'B::load'): [3, 600, 200, 600, 600],
+                                (None, 'A::run'): [1, None, None, None, None]}
+
+
+def test_truncated_stream_marks_the_producer_disconnected(tmp_path):
+    collector = TraceCollector('unused.sock', output_file=str(tmp_path / 'trace_data.json'), store_runs=False)
+    stream = encode_producer(strings_frame('A::run', 'B::load'),
+                             _frame(FRAME_EDGES, EDGE_RECORD.pack(1, 2, 1, 10, 10, 10, 10)))
+
+    collector.handle_producer(io.BytesIO(stream[:-5]))
+
+    assert collector.producers[0]['status'] == 'disconnected'
+    assert collector._edges == {}
@@ -0,0 +1,75 @@
+from renderer.graph_analysis import (analyze_graph, annotate_graph, condense, node_layers,
+                                     strongly_connected_components)
+
+
+def components_as_sets(components):
+    return [set(members) for members in components]
+
+
+def test_cycle_is_one_component():
+    # 0 -> 1 -> 2 -> 0, and 2 -> 3
+    successors = [[1], [2], [0, 3], []]
+    components = strongly_connected_components(4, successors)
+    assert sorted(map(sorted, components)) == [[0, 1, 2], [3]]
+
+
+def test_components_come_in_reverse_topological_order():
+    # 0 -> 1 <-> 2 -> 3
+    successors = [[1], [2], [1, 3], []]
+    components = components_as_sets(strongly_connected_components(4, successors))
+    assert components.index({3}) < components.index({1, 2}) < components.index({0})
+
+
+def test_self_loop_is_a_single_component():
+    successors = [[0, 1], []]
+    components = strongly_connected_components(2, successors)
+    assert sorted(map(sorted, components)) == [[0], [1]]
+
+
+def test_condense_drops_calls_inside_a_component():
+    # 0 <-> 1 -> 2, and 2 calls itself
+    successors = [[1], [0, 2], [2]]
+    components = strongly_connected_components(3, successors)
+    component_of, component_successors = condense(successors, components)
+    assert component_of[0] == component_of[1] != component_of[2]
+    assert component_successors[component_of[0]] == [component_of[2]]
+    assert component_successors[component_of[2]] == []
+
+
+def test_node_layers_put_a_cycle_in_one_layer():
+    # 0 -> 1 <-> 2 -> 3
+    layers, layer_count = node_layers(4, [[1], [2], [1, 3], []])
+    assert layers == [0, 1, 1, 2]
+    assert layer_count == 3
+
+
+def test_long_chain_does_not_recurse():
+    count = 20000
+    successors = [[i + 1] for i in range(count - 1)] + [[0]]
+    components = strongly_connected_components(count, successors)
+    assert len(components) == 1 and len(components[0]) == count
+
+
+def test_analyze_graph_reports_class_cycles(make_graph):
+    graph = make_graph([
+        ('A::run', 'B::load', 3),
+        ('B::load', 'C::fetch', 2),
+        ('C::fetch', 'B::cache', 1),
+        ('C::fetch', 'C::parse', 5),  # Inside one class: not a cycle between classes
+    ])
+    analysis = analyze_graph(graph)
+    assert analysis['cycle_count'] == 1
+    cycle = analysis['cycles'][0]
+    assert cycle['classes'] == ['B', 'C']
+    assert cycle['call_count'] == 3
+    assert analysis['layer_count'] == 2
+    layers = {tuple(component['classes']): component['layer'] for component in analysis['components']}
+    assert layers == {('A',): 0, ('B', 'C'): 1}
+
+
+def test_annotate_graph_marks_cycle_members_with_one_component(make_graph):
+    graph = annotate_graph(make_graph([('A::a', 'B::b'), ('B::b', 'A::c'), ('B::b', 'D::d')]))
+    classes = {node['id']: node for node in graph['nodes'] if node['type'] == 'class'}
+    assert classes['A']['component'] == classes['B']['component'] != classes['D']['component']
+    assert classes['D']['layer'] == classes['A']['layer'] + 1
+    assert graph['cycle_count'] == 1
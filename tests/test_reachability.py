@@ -0,0 +1,118 @@
+import pytest
+
+from renderer.graph_index import GraphIndex
+from renderer.reachability import Reachability
+
+
+@pytest.fixture
+def reach(make_graph):
+    # A::run -> B::load <-> C::fetch -> D::save, D::retry calls itself, E::idle is never called
+    return Reachability(GraphIndex(make_graph(
+        [('A::run', 'B::load'), ('B::load', 'C::fetch'), ('C::fetch', 'B::load'),
+         ('C::fetch', 'D::save'), ('D::retry', 'D::retry')],
+        classes={'E': ['idle']},
+    )))
+
+
+@pytest.fixture
+def ladder(make_graph):
+    # Three routes from S::start to T::end: 2, 3 and 4 calls long
+    return Reachability(GraphIndex(make_graph([
+        ('S::start', 'T::end'),
+        ('S::start', 'M::a'), ('M::a', 'T::end'),
+        ('S::start', 'M::b'), ('M::b', 'M::c'), ('M::c', 'T::end'),
+        ('M::a', 'M::b'),
+    ])))
+
+
+def test_acyclic_method_does_not_reach_itself(reach):
+    assert not reach.can_reach('A::run', 'A::run')
+    assert not reach.can_reach('D::save', 'D::save')
+    assert not reach.can_reach('E::idle', 'E::idle')
+
+
+def test_cycle_members_and_self_loops_reach_themselves(reach):
+    assert reach.can_reach('B::load', 'B::load')
+    assert reach.can_reach('C::fetch', 'B::load')
+    assert reach.can_reach('D::retry', 'D::retry')
+
+
+def test_can_reach_follows_call_direction(reach):
+    assert reach.can_reach('A::run', 'D::save')
+    assert not reach.can_reach('D::save', 'A::run')
+    assert not reach.can_reach('A::run', 'D::retry')
+    assert not reach.can_reach('E::idle', 'A::run')
+
+
+def test_reachable_downstream_and_upstream(reach):
+    result = reach.reachable('A::run', 'out')
+    assert result['downstream'] == ['B::load', 'C::fetch', 'D::save']
+    assert result['upstream'] == []
+    assert {(link['source'], link['target']) for link in result['links']} == {
+        ('A::run', 'B::load'), ('B::load', 'C::fetch'), ('C::fetch', 'B::load'), ('C::fetch', 'D::save')}
+
+    result = reach.reachable('D::save', 'in')
+    assert result['upstream'] == ['A::run', 'B::load', 'C::fetch']
+    assert result['downstream'] == []
+
+
+def test_reachable_includes_a_node_only_when_it_is_on_a_cycle(reach):
+    assert reach.reachable('B::load', 'out')['downstream'] == ['B::load', 'C::fetch', 'D::save']
+    assert reach.reachable('D::retry', 'both')['downstream'] == ['D::retry']
+    assert reach.reachable('D::retry', 'both')['upstream'] == ['D::retry']
+    assert reach.reachable('E::idle', 'both') == {
+        'node': 'E::idle', 'downstream': [], 'upstream': [], 'links': []}
+
+
+def test_reachable_from_a_class_starts_at_all_its_methods(reach):
+    assert reach.reachable('D', 'in')['upstream'] == ['A::run', 'B::load', 'C::fetch', 'D::retry']
+
+
+def test_reachable_rejects_unknown_direction(reach):
+    with pytest.raises(ValueError):
+        reach.reachable('A::run', 'sideways')
+
+
+def test_shortest_paths_come_shortest_first_and_are_simple(ladder):
+    result = ladder.paths('S::start', 'T::end', k=10)
+    assert result['reachable']
+    paths = result['paths']
+    assert paths[0] == ['S::start', 'T::end']
+    assert paths[1] == ['S::start', 'M::a', 'T::end']
+    assert [len(path) for path in paths] == sorted(len(path) for path in paths)
+    assert len({tuple(path) for path in paths}) == len(paths)
+    for path in paths:
+        assert len(set(path)) == len(path)
+        assert path[0] == 'S::start' and path[-1] == 'T::end'
+    # Direct, via a, via b and c, via a then b and c
+    assert len(paths) == 4
+
+
+def test_shortest_paths_respect_k(ladder):
+    assert ladder.paths('S::start', 'T::end', k=2)['paths'] == [
+        ['S::start', 'T::end'], ['S::start', 'M::a', 'T::end']]
+
+
+def test_all_paths_mode_finds_the_same_simple_paths(ladder):
+    shortest = ladder.paths('S::start', 'T::end', k=10)['paths']
+    every = ladder.paths('S::start', 'T::end', k=10, mode='all')['paths']
+    assert sorted(map(tuple, every)) == sorted(map(tuple, shortest))
+
+
+def test_paths_from_a_cycle_member_to_itself_are_cycles(reach):
+    assert reach.paths('B::load', 'B::load')['paths'] == [['B::load', 'C::fetch', 'B::load']]
+    assert reach.paths('D::retry', 'D::retry')['paths'] == [['D::retry', 'D::retry']]
+    assert reach.paths('D::save', 'D::save') == {
+        'from': 'D::save', 'to': 'D::save', 'reachable': False, 'paths': []}
+
+
+def test_paths_between_unconnected_methods_are_empty(reach):
+    result = reach.paths('D::save', 'A::run')
+    assert not result['reachable'] and result['paths'] == []
+
+
+def test_paths_rejects_unknown_methods_and_modes(reach):
+    with pytest.raises(KeyError):
+        reach.paths('A::run', 'Z::missing')
+    with pytest.raises(ValueError):
+        reach.paths('A::run', 'D::save', mode='longest')
@@ -0,0 +1,153 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from renderer.trace_export import (SPEEDSCOPE_SCHEMA, export_events, write_chrome_trace, write_pprof,
+                                   write_speedscope)
+
+
+def event(cls, function, depth, start_ns, wall_ns, self_ns, line=1):
+    return {'class': cls, 'function': function, 'filename': f"/src/{(cls or 'main').lower()}.py",
+            'line': line, 'depth': depth, 'start_ns': start_ns, 'wall_ns': wall_ns, 'self_ns': self_ns}
+
+
+@pytest.fixture
+def events():
+    # main() runs Service.handle twice; the first handle calls Store.load
+    return [
+        event(None, 'main', 0, 0, 1000, 300),
+        event('Service', 'handle', 1, 100, 400, 200, line=10),
+        event('Store', 'load', 2, 150, 200, 200, line=20),
+        event('Service', 'handle', 1, 600, 300, 300, line=10),
+    ]
+
+
+def read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, offset
+
+
+def decode_message(data):
+    """Decode protobuf wire format into {field number: [varint or bytes values]}."""
+    fields = {}
+    offset = 0
+    while offset < len(data):
+        key, offset = read_varint(data, offset)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, offset = read_varint(data, offset)
+        elif wire_type == 2:
+            length, offset = read_varint(data, offset)
+            value = bytes(data[offset:offset + length])
+            offset += length
+        else:
+            raise AssertionError(f"unexpected wire type {wire_type}")
+        fields.setdefault(number, []).append(value)
+    return fields
+
+
+def decode_packed(data):
+    values = []
+    offset = 0
+    while offset < len(data):
+        value, offset = read_varint(data, offset)
+        values.append(value)
+    return values
+
+
+def test_chrome_trace_is_json_with_one_complete_event_per_call(events):
+    out = io.StringIO()
+    assert write_chrome_trace(events, out, pid=7) == 4
+
+    trace = json.loads(out.getvalue())
+    records = trace['traceEvents']
+    assert [record['ph'] for record in records] == ['X'] * 4
+    assert [record['name'] for record in records] == ['main', 'Service.handle', 'Store.load', 'Service.handle']
+    assert records[2]['ts'] == 0.15 and records[2]['dur'] == 0.2
+    assert records[0]['cat'] == 'module' and records[0]['pid'] == 7
+    assert records[1]['args'] == {'file': '/src/service.py', 'line': 10, 'self_us': 0.2}
+
+
+def test_chrome_trace_without_events_is_still_json():
+    out = io.StringIO()
+    assert write_chrome_trace([], out) == 0
+    assert json.loads(out.getvalue())['traceEvents'] == []
+
+
+def test_speedscope_profile_opens_and_closes_every_frame_in_order(events):
+    out = io.StringIO()
+    assert write_speedscope(events, out, name='run') == 4
+
+    document = json.loads(out.getvalue())
+    assert document['$schema'] == SPEEDSCOPE_SCHEMA
+    frames = [frame['name'] for frame in document['shared']['frames']]
+    assert frames == ['main', 'Service.handle', 'Store.load']
+
+    profile, = document['profiles']
+    assert profile['type'] == 'evented' and profile['name'] == 'run'
+    stack = []
+    last_at = 0
+    for record in profile['events']:
+        assert record['at'] >= last_at
+        last_at = record['at']
+        if record['type'] == 'O':
+            stack.append(record['frame'])
+        else:
+            assert stack.pop() == record['frame']
+    assert stack == []
+    assert sum(record['type'] == 'O' for record in profile['events']) == 4
+    assert profile['endValue'] == 1000
+
+
+def test_pprof_profile_decodes_to_stacks_with_calls_and_self_time(events):
+    out = io.BytesIO()
+    assert write_pprof(events, out) == 4
+
+    profile = decode_message(gzip.decompress(out.getvalue()))
+    strings = [value.decode('utf-8') for value in profile[6]]
+    assert strings[0] == ''
+
+    sample_types = [decode_message(value) for value in profile[1]]
+    assert [(strings[t[1][0]], strings[t[2][0]]) for t in sample_types] == [
+        ('calls', 'count'), ('wall', 'nanoseconds')]
+
+    function_names = {}
+    for value in profile[5]:
+        function = decode_message(value)
+        function_names[function[1][0]] = strings[function[2][0]]
+    locations = {}
+    for value in profile[4]:
+        location = decode_message(value)
+        line = decode_message(location[4][0])
+        locations[location[1][0]] = function_names[line[1][0]]
+
+    samples = {}
+    for value in profile[2]:
+        sample = decode_message(value)
+        stack = tuple(locations[location_id] for location_id in decode_packed(sample[1][0]))
+        samples[stack] = decode_packed(sample[2][0])
+    # Location ids are leaf first
+    assert samples == {
+        ('main',): [1, 300],
+        ('Service.handle', 'main'): [2, 500],
+        ('Store.load', 'Service.handle', 'main'): [1, 200],
+    }
+    assert profile[10] == [1000]
+
+
+def test_untimed_events_are_rejected(tmp_path, events):
+    untimed = [{key: value for key, value in e.items() if key not in ('start_ns', 'wall_ns', 'self_ns')}
+               for e in events]
+    for fmt in ('chrome', 'speedscope', 'pprof'):
+        with pytest.raises(ValueError):
+            export_events(untimed, str(tmp_path / f'trace.{fmt}'), fmt)
+    with pytest.raises(ValueError):
+        export_events(events, str(tmp_path / 'trace.txt'), 'text')
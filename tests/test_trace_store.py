@@ -0,0 +1,43 @@
+from renderer.trace_store import diff_graphs
+
+
+def test_diff_reports_added_removed_and_changed_edges(make_graph):
+    base = make_graph([('A::run', 'B::load', 10), ('B::load', 'C::parse', 4), ('A::run', 'D::old', 2)])
+    head = make_graph([('A::run', 'B::load', 11), ('B::load', 'C::parse', 12), ('A::run', 'E::new', 3)])
+
+    diff = diff_graphs(base, head, threshold=0.5)
+
+    assert diff['summary'] == {'added': 1, 'removed': 1, 'changed': 1}
+    assert diff['added'] == [{'source': 'A::run', 'target': 'E::new', 'head_count': 3}]
+    assert diff['removed'] == [{'source': 'A::run', 'target': 'D::old', 'base_count': 2}]
+    assert diff['changed'] == [{'source': 'B::load', 'target': 'C::parse', 'base_count': 4,
+                                'head_count': 12, 'delta': 8, 'ratio': 2.0}]
+
+
+def test_diff_graph_keeps_removed_edges_and_marks_every_call(make_graph):
+    base = make_graph([('A::run', 'B::load', 10), ('A::run', 'D::old', 2)])
+    head = make_graph([('A::run', 'B::load', 10), ('A::run', 'E::new', 3)])
+
+    graph = diff_graphs(base, head)['graph']
+
+    status = {(link['source'], link['target']): link['diff_status']
+              for link in graph['links'] if link['type'] == 'calls'}
+    assert status == {('A::run', 'B::load'): 'unchanged', ('A::run', 'D::old'): 'removed',
+                      ('A::run', 'E::new'): 'added'}
+    node_ids = {node['id'] for node in graph['nodes']}
+    assert {'D', 'D::old', 'E', 'E::new'} <= node_ids
+    contains = [(link['source'], link['target']) for link in graph['links'] if link['type'] == 'contains']
+    assert len(contains) == len(set(contains))
+
+
+def test_diff_threshold_decides_what_counts_as_changed(make_graph):
+    base = make_graph([('A::run', 'B::load', 10)])
+    head = make_graph([('A::run', 'B::load', 14)])
+    assert diff_graphs(base, head, threshold=0.5)['summary']['changed'] == 0
+    assert diff_graphs(base, head, threshold=0.3)['changed'][0]['ratio'] == 0.4
+
+
+def test_diff_of_identical_graphs_is_empty(make_graph):
+    graph = make_graph([('A::run', 'B::load', 5)])
+    diff = diff_graphs(graph, graph)
+    assert diff['summary'] == {'added': 0, 'removed': 0, 'changed': 0}
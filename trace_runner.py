@@ -1,22 +1,436 @@
 """Module for running Python code with tracing enabled."""
 
+import builtins
 import sys
 import importlib.util
+import itertools
+import threading
+import weakref
+from collections import Counter, OrderedDict, deque
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from time import perf_counter_ns
+from typing import Callable, List, Dict, Any, Optional, Tuple
+
+
+_dispatch_overhead_ns = None
+
+# Source files whose calls are the tracer's own work, never the traced program's
+TRACER_FILES = frozenset(str((Path(__file__).parent / name).resolve())
+                         for name in ('trace_runner.py', 'flight_recorder.py', 'callpath.py'))
+
+
+def calibrate_dispatch_overhead(calls: int = 20000, repeats: int = 5) -> int:
+    """Estimate the per-event cost of invoking a trace callback, in nanoseconds.
+
+    The tracer measures the time spent inside its own callback, but not the
+    interpreter's work to call it. This times a no-op function with and without
+    a minimal trace function installed and returns the smallest per-call
+    difference. The result is cached for the process.
+
+    Args:
+        calls: Number of calls per measurement
+        repeats: Number of measurements; the minimum is used
+
+    Returns:
+        Estimated dispatch overhead per trace event in nanoseconds
+    """
+    global _dispatch_overhead_ns
+    if _dispatch_overhead_ns is not None:
+        return _dispatch_overhead_ns
+
+    def noop():
+        pass
+
+    def minimal_trace(frame, event, arg):
+        return None
+
+    def time_calls():
+        start = perf_counter_ns()
+        for _ in range(calls):
+            noop()
+        return perf_counter_ns() - start
+
+    previous_trace = sys.gettrace()
+    best = None
+    try:
+        for _ in range(repeats):
+            sys.settrace(None)
+            plain = time_calls()
+            sys.settrace(minimal_trace)
+            traced = time_calls()
+            sys.settrace(None)
+            per_call = max(0, (traced - plain) // calls)
+            best = per_call if best is None else min(best, per_call)
+    finally:
+        sys.settrace(previous_trace)
+
+    _dispatch_overhead_ns = best or 0
+    return _dispatch_overhead_ns
+
+
+class InstanceRegistry:
+    """Compact integer ids for the objects methods are called on.
+
+    Objects are held through weak references, so tracking never keeps them
+    alive. At most `max_size` objects are tracked; the least recently seen one
+    is evicted to make room, and gets a new id if it shows up again. Ids are
+    never reused, so a dead object's id is not handed to a new object that
+    happens to get the same address.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # id(obj) -> (weak reference, instance id)
+        self._next_id = 1
+        self.evicted = 0
+        self.unreferenceable = 0  # Objects that do not support weak references
+
+    def lookup(self, obj) -> Optional[int]:
+        """Return the id of an already tracked object, or None."""
+        entry = self._entries.get(id(obj))
+        if entry is not None and entry[0]() is obj:
+            return entry[1]
+        return None
+
+    def id_for(self, obj) -> Optional[int]:
+        """Return the id of an object, tracking it if needed (None if it cannot be tracked)."""
+        key = id(obj)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0]() is obj:
+                self._entries.move_to_end(key)
+                return entry[1]
+            # The tracked object died and a new one took its address
+            del self._entries[key]
+
+        try:
+            ref = weakref.ref(obj)
+        except TypeError:
+            self.unreferenceable += 1
+            return None
+
+        if len(self._entries) >= self.max_size:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+        instance_id = self._next_id
+        self._next_id += 1
+        self._entries[key] = (ref, instance_id)
+        return instance_id
+
+
+class _TimedLoader:
+    """Loader wrapper that times a module's execution for an ImportTracer.
+
+    It only stands in until ``exec_module`` runs; from then on the module's
+    ``__loader__`` and ``__spec__.loader`` are the real loader again.
+    """
+
+    def __init__(self, loader, tracer: 'ImportTracer', record: Dict[str, Any]):
+        self.loader = loader
+        self.tracer = tracer
+        self.record = record
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def create_module(self, spec):
+        create_module = getattr(self.loader, 'create_module', None)
+        return create_module(spec) if create_module else None
+
+    def exec_module(self, module):
+        module.__loader__ = self.loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self.loader
+        self.tracer._exec_module(self.loader, module, self.record)
+
+
+class ImportTracer:
+    """Records which module imports which, and what each first import costs.
+
+    A meta path finder sees every module that is loaded for the first time. It
+    times finding the module and executing its code, and attributes the load to
+    the module whose code was running at the time. For every loaded module:
+
+    - ``inclusive_ns``: finding plus executing it, nested imports included
+    - ``exclusive_ns``: ``inclusive_ns`` minus the nested first imports
+    - ``code_ns``: executing its module-level code, nested imports excluded
+
+    Imports of modules that are already loaded never reach the finder, so
+    ``builtins.__import__`` is wrapped as well to record their edges; those
+    edges carry no cost. Imports through ``importlib.import_module`` of already
+    loaded modules are not seen.
+
+    Args:
+        project_root: Modules whose file is inside it are marked ``in_project``
+        root: Importer name of imports made outside any module being imported
+        clock: Nanosecond clock the costs are measured with
+    """
+
+    def __init__(self, project_root: Optional[str] = None, root: str = '__main__',
+                 clock: Callable[[], int] = perf_counter_ns):
+        self.project_root = str(Path(project_root).resolve()) if project_root else None
+        self.root = root
+        self.clock = clock
+        self.modules: Dict[str, Dict[str, Any]] = {}
+        # (importer, imported) -> True if this import loaded the module
+        self.edges: Dict[tuple, bool] = {}
+        self.is_tracing = False
+        self._local = threading.local()
+        self._original_import = None
+
+    def _stack(self) -> List[Dict[str, Any]]:
+        """Records of the modules being executed on this thread, innermost last."""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _importer(self, stack: List[Dict[str, Any]]) -> str:
+        return stack[-1]['name'] if stack else self.root
+
+    def find_spec(self, fullname, path=None, target=None):
+        """Meta path hook: find the module with the other finders and time its load."""
+        start_ns = self.clock()
+        spec = None
+        for finder in sys.meta_path:
+            find_spec = getattr(finder, 'find_spec', None)
+            if finder is self or find_spec is None:
+                continue
+            spec = find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        find_ns = self.clock() - start_ns
+        if spec is None:
+            return None
+
+        stack = self._stack()
+        importer = self._importer(stack)
+        origin = spec.origin if spec.has_location else None
+        record = {
+            'name': fullname,
+            'file': origin,
+            'in_project': bool(origin and self.project_root and
+                               str(Path(origin).resolve()).startswith(self.project_root)),
+            'importer': importer,
+            'order': len(self.modules),
+            'find_ns': find_ns,
+            'inclusive_ns': find_ns,
+            'exclusive_ns': find_ns,
+            'code_ns': 0,
+        }
+        self.modules[fullname] = record
+        self.edges[(importer, fullname)] = True
+        if stack:
+            # Finding counts toward the importing module's nested imports
+            stack[-1]['nested_ns'] += find_ns
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = _TimedLoader(spec.loader, self, record)
+        return spec
+
+    def _exec_module(self, loader, module, record: Dict[str, Any]):
+        stack = self._stack()
+        frame = {'name': record['name'], 'nested_ns': 0}
+        stack.append(frame)
+        start_ns = self.clock()
+        try:
+            loader.exec_module(module)
+        except BaseException:
+            record['failed'] = True
+            raise
+        finally:
+            exec_ns = self.clock() - start_ns
+            stack.pop()
+            record['inclusive_ns'] += exec_ns
+            record['code_ns'] = max(0, exec_ns - frame['nested_ns'])
+            record['exclusive_ns'] = record['find_ns'] + record['code_ns']
+            if stack:
+                stack[-1]['nested_ns'] += exec_ns
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        """builtins.__import__ wrapper that records edges to already loaded modules."""
+        module = self._original_import(name, globals, locals, fromlist, level)
+        try:
+            importer = globals.get('__name__') if globals else None
+            if importer and importer.startswith('importlib._bootstrap'):
+                # The import machinery's own imports; the finder sees the loads it causes
+                return module
+            importer = importer or self._importer(self._stack())
+            if level:
+                package = globals.get('__package__') or globals.get('__name__', '').rpartition('.')[0]
+                name = importlib.util.resolve_name('.' * level + name, package) if name else package
+            targets = [name] if name else []
+            for item in fromlist or ():
+                submodule = f"{name}.{item}"
+                if submodule in sys.modules:
+                    targets.append(submodule)
+            for target in targets:
+                if target != importer and target in sys.modules:
+                    self.edges.setdefault((importer, target), False)
+        except Exception:
+            # Recording an edge must never break the import itself
+            pass
+        return module
+
+    def start(self):
+        """Install the meta path finder and the __import__ wrapper."""
+        if self.is_tracing:
+            return
+        sys.meta_path.insert(0, self)
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+        self.is_tracing = True
+
+    def stop(self):
+        """Remove the meta path finder and restore __import__."""
+        if not self.is_tracing:
+            return
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+        if builtins.__import__ == self._import:
+            builtins.__import__ = self._original_import
+        self.is_tracing = False
+
+    def data(self) -> Dict[str, Any]:
+        """The recorded imports, as stored under 'imports' in the graph data.
+
+        Returns:
+            Dictionary with 'root', 'modules' (in load order) and 'edges'
+            (``source``, ``target`` and whether the import ``loaded`` the module)
+        """
+        return {
+            'root': self.root,
+            'modules': sorted((dict(record) for record in self.modules.values()), key=lambda m: m['order']),
+            'edges': [
+                {'source': source, 'target': target, 'loaded': loaded}
+                for (source, target), loaded in self.edges.items()
+            ],
+        }
 
 
 class CallTracer:
-    """Tracer that records all function calls during execution."""
+    """Tracer that records all function calls during execution.
+
+    With ``timing`` enabled every recorded event also gets ``wall_ns`` (time
+    between call and return, children included) and ``self_ns`` (``wall_ns``
+    minus the time of the traced calls it made). Time spent in the tracer
+    itself is measured and subtracted, so the figures stay close to untraced
+    run time. Events whose method was already running further up the stack are
+    marked ``reentrant`` so recursive time is not counted twice, and those
+    whose caller/callee pair was already open further up are also marked
+    ``edge_reentrant``, for the same reason on call edges. ``start_ns``
+    is the call's start on the same overhead-free clock, counted from when
+    tracing started, so timed events can be exported as a timeline (see
+    ``export``).
+
+    With ``track_instances`` enabled every method event also gets ``instance``,
+    the receiver's id in an InstanceRegistry of at most ``max_instances``
+    objects. When an ``__init__`` returns, its event gets ``wiring``: the
+    attributes it set to other tracked objects, as
+    ``(attribute, class name, instance id)`` tuples.
+
+    With ``collector`` set to the socket path of a running trace collector
+    (``python -m renderer.collector``), no events are kept: each call is
+    counted (and timed) on its caller/callee edge and sent to the collector in
+    batches from a background thread, which also builds and stores the graph.
+    Instance tracking and exports need the events, so they are not available
+    in that mode.
 
-    def __init__(self, entry_script: Optional[str] = None, project_root: Optional[str] = None):
+    With ``trace_imports`` enabled an ImportTracer records the module import
+    graph and the cost of every first import while tracing runs; ``end`` stores
+    it under ``imports`` in the graph data. Start tracing before the imports of
+    interest. With timing enabled, the time spent in this tracer is left out
+    of the import costs as well.
+
+    With ``call_context`` enabled the tracer also builds a
+    CallingContextTree of at most ``max_context_depth`` levels and
+    ``max_context_nodes`` contexts, so the distinct call paths to a method
+    and their weights are kept without keeping the events. ``end`` stores it
+    under ``call_context`` in the graph data (or sends it to the collector).
+
+    With ``sample_types`` enabled a TypeSampler samples the argument and
+    return type qualnames of method calls: the first call of every code object
+    and then one in ``type_sample_every``, kept in reservoirs of
+    ``type_reservoir_size`` signatures per method and per call edge. ``end``
+    attaches the type histograms to method nodes and calls links as ``types``.
+    Not available with a collector.
+
+    With ``track_allocations`` enabled an AllocationMeter measures the memory
+    recorded calls allocate, in subtrees sampled per code object (one call in
+    ``allocation_sample_every``, not the first) and cut off after
+    ``max_allocation_subtree_calls`` measured calls. tracemalloc runs only
+    while a subtree is measured. Measured events get ``alloc_bytes`` (the most
+    allocated at once, children included) and ``alloc_self_bytes``; the call
+    that started a subtree also gets ``alloc_blocks`` and
+    ``alloc_self_blocks``, the blocks its subtree still held when it returned.
+    Times in measured subtrees include tracemalloc's slowdown. Not available
+    with a collector.
+
+    With ``max_events`` set, only the most recent ``max_events`` events are
+    kept (a ring buffer), so memory stays bounded however long tracing runs.
+    FlightRecorder uses this to trace a long-running process on demand.
+    """
+
+    def __init__(self, entry_script: Optional[str] = None, project_root: Optional[str] = None,
+                 timing: bool = True, track_instances: bool = False, max_instances: int = 10000,
+                 collector: Optional[str] = None, trace_imports: bool = False,
+                 call_context: bool = False, max_context_depth: int = 64, max_context_nodes: int = 100000,
+                 sample_types: bool = False, type_sample_every: int = 16, type_reservoir_size: int = 32,
+                 max_events: Optional[int] = None, track_allocations: bool = False,
+                 allocation_sample_every: int = 16, max_allocation_subtree_calls: int = 256):
+        if collector and track_instances:
+            raise ValueError("Instance tracking needs the trace events, which are not kept with a collector")
+        if collector and trace_imports:
+            raise ValueError("Import tracing is not supported with a collector")
+        if collector and sample_types:
+            raise ValueError("Type sampling is not supported with a collector")
+        if collector and track_allocations:
+            raise ValueError("Allocation tracking is not supported with a collector")
         self.call_stack = []
-        self.call_events = []
+        # Bound once: frames keep the local trace function, and a new bound method per call would count as the call's memory
+        self._local_trace = self.trace_calls
+        self.call_events = deque(maxlen=max_events) if max_events else []
         self.depth = 0
         self.entry_script = entry_script  # Track the main script being executed
         self.project_root = project_root  # Track project root directory for filtering
         self.is_tracing = False
         self.has_recorded_external_call = False  # Track if we've already recorded a call outside project
+        self.timing = timing
+        self.dispatch_overhead_ns = 0
+        self._tracer_ns = 0  # Tracer time so far, subtracted from the calls it happened in
+        self._origin_ns = None  # perf_counter_ns() when tracing first started
+        self._active_codes = Counter()  # Recorded code objects currently on the stack
+        self._active_edges = Counter()  # (caller code, callee code) pairs of recorded calls currently on the stack
+        self.track_instances = track_instances
+        self.instances = InstanceRegistry(max_instances) if track_instances else None
+        self.collector_path = collector
+        self.collector = None  # CollectorClient, connected when tracing starts
+        self.trace_imports = trace_imports
+        self.imports = None  # ImportTracer, created when tracing starts
+        self.context = None
+        from renderer.tracer_stats import CALLBACK_SAMPLE_MASK, TracerStats
+        self._stats = TracerStats()
+        self._callback_sample_mask = CALLBACK_SAMPLE_MASK
+        self._file_filters = {}  # File name -> (in project, reason it is always skipped)
+        self.types = None
+        if sample_types:
+            from renderer.type_samples import TypeSampler, argument_types
+            self.types = TypeSampler(sample_every=type_sample_every, reservoir_size=type_reservoir_size)
+            self._argument_types = argument_types
+        self.allocations = None
+        if track_allocations:
+            from renderer.allocations import AllocationMeter
+            self.allocations = AllocationMeter(sample_every=allocation_sample_every,
+                                               max_subtree_calls=max_allocation_subtree_calls,
+                                               tracer_files=(__file__,))
+        if call_context:
+            from renderer.call_context import CallingContextTree
+            from renderer.chatty_calls import method_id
+            self.context = CallingContextTree(max_depth=max_context_depth, max_nodes=max_context_nodes)
+            self._method_id = method_id
+            # Calls without a traced caller come from the entry script's top-level code, like in the graph
+            self._context_root = 0
+            if entry_script:
+                self._context_root = self.context.enter(0, f"<module:{Path(entry_script).stem}>::<module>")
     
     def _is_in_project(self, filename: str) -> bool:
         """Check if a file is within the project directory."""
@@ -39,39 +453,65 @@ class CallTracer:
             filename: The filename to check
             is_caller_in_project: Whether the caller is in the project directory
         """
-        import sys
-        
-        # Skip generated code, frozen modules
-        if '<' in filename or filename.startswith('<frozen'):
-            return True
-        
-        # Skip trace_runner module
-        if 'trace_runner' in filename:
-            return True
+        return self._skip_reason(filename, is_caller_in_project) is not None
+
+    def _skip_reason(self, filename: str, is_caller_in_project: bool = True) -> Optional[str]:
+        """Why calls into a file are skipped (see tracer_stats.SKIP_REASONS), or None to record them.
         
-        # Check if this file is in the project
-        file_is_in_project = self._is_in_project(filename)
+        Args:
+            filename: The filename to check
+            is_caller_in_project: Whether the caller is in the project directory
+        """
+        file_is_in_project, reason = self._file_filter(filename)
+        if reason is not None:
+            return reason
         
         # If project_root is set:
         # - Always include files in project
         # - Include first external call (if caller is in project and we haven't recorded external yet)
         # - Skip subsequent external calls
+        if self.project_root and not file_is_in_project:
+            if is_caller_in_project and not self.has_recorded_external_call:
+                # This is the first external call from project - include it
+                self.has_recorded_external_call = True
+                return None
+            # Already recorded an external call, or caller is external - skip
+            return 'external'
+        return None
+
+    def _file_filter(self, filename: str) -> Tuple[bool, Optional[str]]:
+        """Whether a file is in the project, and why it is always skipped (None if it is not).
+
+        Both depend only on the file name, so they are computed once per file.
+        """
+        cached = self._file_filters.get(filename)
+        if cached is not None:
+            self._stats.filter_cache_hits += 1
+            return cached
+        self._stats.filter_cache_misses += 1
+        cached = self._file_filters[filename] = (self._is_in_project(filename), self._file_skip_reason(filename))
+        return cached
+
+    def _file_skip_reason(self, filename: str) -> Optional[str]:
+        """Why a file is skipped regardless of its caller, or None."""
+        # Skip generated code, frozen modules
+        if '<' in filename or filename.startswith('<frozen'):
+            return 'generated'
+        
+        # Skip the tracer's own modules (signal handlers and control code run under the trace function)
+        try:
+            if str(Path(filename).resolve()) in TRACER_FILES:
+                return 'tracer'
+        except (ValueError, OSError):
+            pass
+        
+        # With a project root, the caller decides (see _skip_reason)
         if self.project_root:
-            if file_is_in_project:
-                return False  # Always include project files
-            else:
-                # This is an external file
-                if is_caller_in_project and not self.has_recorded_external_call:
-                    # This is the first external call from project - include it
-                    self.has_recorded_external_call = True
-                    return False
-                else:
-                    # Already recorded an external call, or caller is external - skip
-                    return True
+            return None
         
         # Skip system directories (macOS) - but only if we don't have project filtering
         if filename.startswith('/System') or filename.startswith('/usr'):
-            return True
+            return 'system'
         
         # Skip Python standard library
         stdlib_paths = [
@@ -85,17 +525,17 @@ class CallTracer:
             if stdlib_path and filename.startswith(stdlib_path):
                 # Allow site-packages to be traced (third-party), but not stdlib itself
                 if 'site-packages' not in filename:
-                    return True
+                    return 'stdlib'
         
         # Skip distutils and setuptools internal modules
         if 'distutils' in filename or 'setuptools' in filename:
-            return True
+            return 'build_tools'
         
         # Skip importlib internal modules
         if filename.endswith('importlib/_bootstrap') or filename.endswith('importlib/_bootstrap_external'):
-            return True
+            return 'importlib'
         
-        return False
+        return None
     
     def _should_skip_class(self, class_name: str, filename: str) -> bool:
         """Check if a class should be skipped."""
@@ -123,7 +563,27 @@ class CallTracer:
     
     def trace_calls(self, frame, event, arg):
         """Callback for sys.settrace - called on each function call."""
+        if not self.is_tracing:
+            # Stopped from another thread: this thread drops the trace function at its next event
+            sys.settrace(None)
+            return None
+        if self.timing:
+            entered_ns = perf_counter_ns()
+        stats = self._stats
+        stats.events += 1
+        # Time one callback in CALLBACK_SAMPLE_EVERY
+        sampled = not stats.events & self._callback_sample_mask
+        if sampled:
+            sample_start_ns = perf_counter_ns()
+        meter = self.allocations
+        if meter is not None and meter.depth:
+            # What this callback allocates is the tracer's own, not the measured calls'
+            meter.callback_started()
+
         if event == 'call':
+            # Only call and return events are needed; skip per-line callbacks
+            frame.f_trace_lines = False
+
             # Get basic info
             filename = frame.f_code.co_filename
             function_name = frame.f_code.co_name
@@ -133,20 +593,25 @@ class CallTracer:
             is_caller_in_project = True
             if self.call_stack:
                 caller_filename = self.call_stack[-1].get('filename', '')
-                is_caller_in_project = self._is_in_project(caller_filename)
+                is_caller_in_project = self._file_filter(caller_filename)[0]
 
             # Check if we should skip this file
-            should_skip = self._should_skip_file(filename, is_caller_in_project=is_caller_in_project)
+            skip_reason = self._skip_reason(filename, is_caller_in_project=is_caller_in_project)
 
             # Try to determine the class name
             class_name = None
+            self_obj = None
             if 'self' in frame.f_locals:
                 self_obj = frame.f_locals['self']
                 class_name = self_obj.__class__.__name__
 
                 # Skip internal/stdlib classes
-                if self._should_skip_class(class_name, filename):
-                    should_skip = True
+                if skip_reason is None and self._should_skip_class(class_name, filename):
+                    skip_reason = 'class'
+            should_skip = skip_reason is not None
+
+            # Where the call was made from (the line in the calling frame)
+            calling_frame = frame.f_back
 
             # Create call info for stack management (always, even if skipped)
             call_info = {
@@ -154,6 +619,9 @@ class CallTracer:
                 'function': function_name,
                 'line': line_number,
                 'class': class_name,
+                'module': frame.f_globals.get('__name__'),
+                'call_file': calling_frame.f_code.co_filename if calling_frame else None,
+                'call_line': calling_frame.f_lineno if calling_frame else None,
                 'caller': None,
                 'depth': self.depth,
                 'entry_script': self.entry_script,
@@ -171,50 +639,359 @@ class CallTracer:
             # Always add to call stack for proper stack management
             self.call_stack.append(call_info)
             self.depth += 1
+            if self.depth > stats.peak_depth:
+                stats.peak_depth = self.depth
+
+            if should_skip:
+                stats.calls_skipped[skip_reason] += 1
+            else:
+                # Only add to events if not skipped
+                stats.calls_recorded += 1
+                if self.track_instances and class_name:
+                    call_info['instance'] = self.instances.id_for(self_obj)
+                    if function_name == '__init__':
+                        # Attributes are read back when __init__ returns
+                        call_info['receiver'] = self_obj
 
-            # Only add to events if not skipped
-            if not should_skip:
                 # Remove the 'skipped' flag from the event record
                 event_info = call_info.copy()
                 del event_info['skipped']
-                self.call_events.append(event_info)
+                event_info.pop('receiver', None)
+                if self.context is not None:
+                    caller = call_info['caller']
+                    parent = caller.get('context_node', 0) if caller is not None else self._context_root
+                    call_info['context_node'] = self.context.enter(parent, self._method_id(event_info))
+                if self.collector is None:
+                    self.call_events.append(event_info)
+                else:
+                    edge = self._method_edge(event_info)
+                    if edge is not None:
+                        self.collector.record_call(edge)
+                        call_info['edge'] = edge
+                if 'receiver' in call_info:
+                    call_info['event'] = event_info
+                if self.types is not None and class_name and self.types.should_sample(frame.f_code):
+                    # The return type is added when the call returns
+                    call_info['type_sample'] = (self._method_edge(event_info), self._argument_types(frame))
+                if meter is not None and (meter.depth or meter.should_sample(frame.f_code)):
+                    if not meter.depth:
+                        meter.start_subtree(frame.f_code)
+                    counters = meter.new_call()
+                    if counters is not None:
+                        call_info['event'] = event_info
+                        call_info['alloc'] = counters
+
+                if self.timing:
+                    code = frame.f_code
+                    if self._active_codes[code]:
+                        event_info['reentrant'] = True
+                    self._active_codes[code] += 1
+                    caller = call_info['caller']
+                    edge_key = (caller.get('code') if caller is not None else None, code)
+                    if self._active_edges[edge_key]:
+                        event_info['edge_reentrant'] = True
+                    self._active_edges[edge_key] += 1
+                    call_info['code'] = code
+                    call_info['edge_key'] = edge_key
+                    call_info['event'] = event_info
+                    call_info['child_ns'] = 0
+                    if sampled:
+                        stats.sampled_callbacks += 1
+                        stats.sampled_callback_ns += perf_counter_ns() - sample_start_ns
+                    # The clock starts after this callback, so its cost is not counted
+                    self._add_tracer_time(entered_ns)
+                    call_info['tracer_ns'] = self._tracer_ns
+                    call_info['start_ns'] = perf_counter_ns()
+                    event_info['start_ns'] = call_info['start_ns'] - self._origin_ns - self._tracer_ns
+                    if meter is not None and meter.depth:
+                        meter.callback_finished()
+                    return self._local_trace
 
         elif event == 'return':
             # Always pop from call stack (to match the push in 'call')
             if self.call_stack:
-                self.call_stack.pop()
+                call_info = self.call_stack.pop()
                 self.depth -= 1
+                if 'receiver' in call_info:
+                    self._record_wiring(call_info)
+                if 'type_sample' in call_info:
+                    self._record_types(call_info, arg)
+                if self.timing and 'start_ns' in call_info:
+                    self._record_time(call_info, entered_ns)
+                if 'alloc' in call_info:
+                    self._record_allocations(call_info)
+                # A finished call's stack entry is freed while this callback is still counted as the tracer's
+                call_info = None
+
+        if sampled:
+            stats.sampled_callbacks += 1
+            stats.sampled_callback_ns += perf_counter_ns() - sample_start_ns
+        if self.timing:
+            self._add_tracer_time(entered_ns)
+        if meter is not None and meter.depth:
+            meter.callback_finished()
+        return self._local_trace
+
+    def _add_tracer_time(self, entered_ns: int):
+        """Account the time of the current callback (plus dispatch) as tracer overhead."""
+        self._tracer_ns += perf_counter_ns() - entered_ns + self.dispatch_overhead_ns
+
+    def _record_time(self, call_info: Dict[str, Any], end_ns: int):
+        """Store wall and self time of a finished call on its event.
+
+        Args:
+            call_info: The call stack entry of the returning call
+            end_ns: perf_counter_ns() at the start of the return callback
+        """
+        overhead_ns = self._tracer_ns - call_info['tracer_ns']
+        wall_ns = max(0, end_ns - call_info['start_ns'] - overhead_ns)
+        event_info = call_info['event']
+        event_info['wall_ns'] = wall_ns
+        event_info['self_ns'] = max(0, wall_ns - call_info['child_ns'])
+        if 'context_node' in call_info:
+            self.context.add_time(call_info['context_node'], wall_ns, event_info['self_ns'])
+        if 'edge' in call_info:
+            self.collector.add_time(call_info['edge'], wall_ns, event_info['self_ns'],
+                                    event_info.get('reentrant', False), event_info.get('edge_reentrant', False))
 
-        return self.trace_calls
+        self._active_codes[call_info['code']] -= 1
+        self._active_edges[call_info['edge_key']] -= 1
+        caller = call_info['caller']
+        if caller is not None and 'child_ns' in caller:
+            caller['child_ns'] += wall_ns
+
+    def _record_allocations(self, call_info: Dict[str, Any]):
+        """Store what a measured call allocated on its event."""
+        figures = self.allocations.end_call(call_info.pop('alloc'))
+        if figures is None:
+            # Its subtree was cut off
+            return
+        event_info = call_info['event']
+        event_info['alloc_bytes'], event_info['alloc_self_bytes'], blocks = figures
+        if blocks is not None:
+            event_info['alloc_blocks'], event_info['alloc_self_blocks'] = blocks
+
+    def _record_wiring(self, call_info: Dict[str, Any]):
+        """Store which tracked objects an __init__ assigned to attributes of its receiver."""
+        receiver = call_info.pop('receiver')
+        try:
+            attributes = vars(receiver)
+        except TypeError:
+            return
+        wiring = []
+        for attribute, value in list(attributes.items()):
+            instance_id = self.instances.lookup(value)
+            if instance_id is not None:
+                wiring.append((attribute, value.__class__.__name__, instance_id))
+        if wiring:
+            call_info['event']['wiring'] = wiring
+
+    def _record_types(self, call_info: Dict[str, Any], return_value):
+        """Add a sampled call's argument and return types to the type sampler."""
+        (caller, callee), arg_types = call_info.pop('type_sample')
+        edge = (caller, callee) if caller is not None else None
+        self.types.record(callee, edge, (arg_types, type(return_value).__qualname__))
+
+    def _method_edge(self, event_info: Dict[str, Any]):
+        """The (caller id, callee id) edge a recorded call is counted on, or None for non-method calls."""
+        if not event_info.get('class'):
+            return None
+        edge = self._call_edge(event_info, track_module_calls=True)
+        callee = f"{event_info['class']}::{event_info['function']}"
+        if edge is None:
+            # Still marks the method as called
+            return None, callee
+        return f"{edge[0]}::{edge[1]}", callee
+
+    def _close_open_calls(self):
+        """Time calls that are still running when tracing stops up to now."""
+        now_ns = perf_counter_ns()
+        while self.call_stack:
+            call_info = self.call_stack.pop()
+            self.depth -= 1
+            call_info.pop('receiver', None)
+            if 'start_ns' in call_info:
+                self._record_time(call_info, now_ns)
     
     def start_tracing(self):
         """Enable tracing."""
-        sys.settrace(self.trace_calls)
+        if self.timing:
+            self.dispatch_overhead_ns = calibrate_dispatch_overhead()
+            if self._origin_ns is None:
+                self._origin_ns = perf_counter_ns()
+        if self.collector_path or self.types is not None:
+            from renderer.data_processor import call_edge
+            self._call_edge = call_edge
+        if self.collector_path and self.collector is None:
+            from renderer.collector import CollectorClient
+            name = Path(self.entry_script).stem if self.entry_script else None
+            self.collector = CollectorClient(self.collector_path, name=name,
+                                             project_root=self.project_root, timing=self.timing)
+        if self.trace_imports:
+            if self.imports is None:
+                clock = (lambda: perf_counter_ns() - self._tracer_ns) if self.timing else perf_counter_ns
+                self.imports = ImportTracer(self.project_root, clock=clock)
+            self.imports.start()
         self.is_tracing = True
+        sys.settrace(self.trace_calls)
     
     def stop_tracing(self):
-        """Disable tracing and return events."""
+        """Disable tracing and return events.
+
+        May be called from another thread while the traced thread is idle; the
+        traced thread then drops its trace function at its next event.
+        """
         sys.settrace(None)
         self.is_tracing = False
+        if self.imports is not None:
+            self.imports.stop()
+        if self.timing:
+            self._close_open_calls()
+        if self.allocations is not None:
+            self.allocations.stop()
+        # Calls still open will never report their return; tracing may start again later
+        self.call_stack.clear()
+        self.depth = 0
         return self.call_events
 
+    def graph_sections(self) -> Dict[str, Any]:
+        """The sections end() writes next to the nodes and links of the graph data.
+
+        Returns:
+            'imports' (with trace_imports), 'call_context' (with call_context) and 'tracer_stats'
+        """
+        sections = {}
+        if self.imports is not None:
+            sections['imports'] = self.imports.data()
+        if self.context is not None:
+            sections['call_context'] = self.context.to_dict()
+        sections['tracer_stats'] = self.stats()
+        return sections
+
+    def snapshot(self, on_traced_thread: bool = True) -> Dict[str, Any]:
+        """Copy everything the graph is built from, without stopping tracing.
+
+        Call it on the traced thread between trace callbacks (FlightRecorder
+        does); the time spent copying is left out of the calls it interrupts.
+
+        Args:
+            on_traced_thread: False when another thread copies while the traced
+                thread is idle, so no call is interrupted
+
+        Returns:
+            Dictionary with 'events' (copies), 'type_samples' (the type_samples
+            argument of generate_d3_data) and 'sections' (graph_sections())
+        """
+        started_ns = perf_counter_ns()
+        # list() copies in one step, so threads appending to a shared buffer cannot change it midway
+        events = list(self.call_events)
+        snapshot = {
+            'events': [dict(event) for event in events],
+            'type_samples': self.types.histograms() if self.types is not None else None,
+            'sections': self.graph_sections(),
+        }
+        if on_traced_thread and self.is_tracing and self.timing:
+            self._tracer_ns += perf_counter_ns() - started_ns
+        return snapshot
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of the tracer's own work so far (see renderer.tracer_stats).
+
+        Returns:
+            TracerStats counters plus ``buffer_bytes`` (approximate memory of
+            the kept events, or of the batches not yet sent to the collector),
+            ``dropped_calls`` (calls the collector never received),
+            ``truncated_context_calls``, ``evicted_instances`` and, with
+            timing, ``tracer_time_ns`` (measured time spent in the tracer)
+        """
+        stats = self._stats.to_dict()
+        stats['buffer_bytes'] = self._buffer_bytes()
+        stats['dropped_calls'] = self.collector.dropped_calls if self.collector is not None else 0
+        stats['truncated_context_calls'] = self.context.truncated_calls if self.context is not None else 0
+        stats['evicted_instances'] = self.instances.evicted if self.instances is not None else 0
+        if self.timing:
+            stats['tracer_time_ns'] = self._tracer_ns
+        if self.allocations is not None:
+            stats['allocation_subtrees'] = self.allocations.subtrees
+            stats['allocation_subtrees_cut'] = self.allocations.subtrees_cut
+        return stats
+
+    def _buffer_bytes(self, samples: int = 100) -> int:
+        """Approximate memory held for the output, estimated from up to `samples` events."""
+        if self.collector is not None:
+            return self.collector.buffered_bytes()
+        events = self.call_events
+        if not events:
+            return 0
+        step = max(1, len(events) // samples)
+        sampled = list(itertools.islice(events, 0, None, step))
+        # An event dict, its values and the stack entry of its caller, which it keeps alive
+        size = sum(
+            sys.getsizeof(event)
+            + sum(sys.getsizeof(value) for value in event.values() if not isinstance(value, dict))
+            + sys.getsizeof(event.get('caller') or {})
+            for event in sampled
+        )
+        return size * len(events) // len(sampled)
+
+    def export(self, output_file: str, fmt: str) -> int:
+        """Write the recorded calls as a Chrome trace, speedscope or pprof profile.
+
+        Args:
+            output_file: Path to write
+            fmt: 'chrome', 'speedscope' or 'pprof'
+
+        Returns:
+            Number of calls written
+        """
+        if self.collector_path:
+            raise ValueError("Trace events are not kept when tracing to a collector")
+        from renderer.trace_export import export_events
+        name = Path(self.entry_script).stem if self.entry_script else None
+        return export_events(self.call_events, output_file, fmt, name=name)
+
     def begin(self):
         """Start tracing - call this after imports are complete."""
         if not self.is_tracing:
             self.start_tracing()
 
-    def end(self, output_file: Optional[str] = None):
-        """Stop tracing and generate trace data file."""
-        if self.is_tracing:
+    def end(self, output_file: Optional[str] = None, scenario: Optional[str] = None,
+            store_run: bool = True, exports: Optional[Dict[str, str]] = None):
+        """Stop tracing and generate trace data file.
+
+        Args:
+            output_file: Where to write the graph JSON (defaults to renderer/static/trace_data.json)
+            scenario: Scenario name for the trace store (defaults to the entry script name)
+            store_run: If True, also keep this run in the trace store for later diffs
+            exports: Optional mapping of export format ('chrome', 'speedscope', 'pprof')
+                     to output path, written in addition to the graph JSON
+
+        When tracing to a collector, this only sends the remaining calls; the
+        collector writes and stores the graph, so the arguments do not apply.
+        """
+        if self.is_tracing and self.collector is not None:
+            self.stop_tracing()
+            self.collector.close(context=self.context.to_dict() if self.context is not None else None,
+                                 stats=self.stats())
+            # The collector builds, writes and stores the graph
+            print(f"Sent {self.collector.sent_batches} trace batches to collector: {self.collector_path}")
+            if self.collector.dropped_calls:
+                print(f"Dropped {self.collector.dropped_calls} calls in {self.collector.dropped_batches} "
+                      f"batches while the collector was behind")
+        elif self.is_tracing:
             events = self.stop_tracing()
 
             # Import here to avoid circular imports
             from renderer.data_processor import generate_d3_data
+            from renderer.trace_store import TraceStore, detect_git_info
             import json
             from pathlib import Path
 
             # Generate D3 data
-            graph_data = generate_d3_data(events, project_root=self.project_root, track_module_calls=True)
+            graph_data = generate_d3_data(events, project_root=self.project_root, track_module_calls=True,
+                                          type_samples=self.types.histograms() if self.types is not None else None)
+            graph_data.update(self.graph_sections())
+            stats = graph_data['tracer_stats']
 
             # Default output file
             if output_file is None:
@@ -230,6 +1007,26 @@ class CallTracer:
             print(f"Captured {len(events)} trace events")
             print(f"Trace data saved to: {output_file}")
             print(f"Generated {len(graph_data['nodes'])} nodes and {len(graph_data['links'])} links")
+            print(f"Tracer: {stats['calls_recorded']} of {stats['calls_seen']} calls recorded, "
+                  f"~{stats['callback_time_ns'] / 1e6:.1f} ms in {stats['events']} callbacks, "
+                  f"peak depth {stats['peak_depth']}")
+
+            for fmt, export_file in (exports or {}).items():
+                self.export(export_file, fmt)
+                print(f"Exported {fmt} profile to: {export_file}")
+
+            if store_run:
+                if scenario is None and self.entry_script:
+                    scenario = Path(self.entry_script).stem
+                git_info = detect_git_info(self.project_root or str(Path(__file__).parent))
+                run_id = TraceStore().save(
+                    graph_data,
+                    scenario=scenario,
+                    branch=git_info['branch'],
+                    commit=git_info['commit'],
+                    metadata={'event_count': len(events), 'project_root': self.project_root}
+                )
+                print(f"Stored trace run: {run_id}")
 
 
 def run_traced_script(script_path: str, project_root: Optional[str] = None) -> List[Dict[str, Any]]: